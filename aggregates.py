@@ -0,0 +1,194 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from roadmesh.mesh_history import ABSENT, status_code
+from roadmesh.storage import to_epoch
+
+# Rolling counters behind the /analytics page. Records are folded into
+# hourly buckets as they are read from the store, so a page view only
+# merges a bounded number of buckets regardless of how long the history is.
+# The bucket state and the read positions are checkpointed to disk so a
+# restart resumes where it left off instead of rescanning the history.
+
+BUCKET_SECONDS = 3600
+RETENTION_BUCKETS = 30 * 24
+WINDOWS = {'24h': 24 * 3600, '7d': 7 * 24 * 3600, '30d': 30 * 24 * 3600}
+CHECKPOINT_VERSION = 2
+
+# Same cut-off the page has always used for "lighting ON hours"
+LIGHTING_ON_CHARGE_PCT = 50
+
+
+def _new_bucket():
+    return {
+        'mesh_steps': 0,
+        'all_up_steps': 0,
+        'node_up': {},
+        'node_seen': [],
+        'battery_samples': 0,
+        'lighting_on': 0,
+        'first_ts': None,
+        'first_charge': None,
+        'last_ts': None,
+        'last_charge': None,
+    }
+
+def _merge(total, bucket):
+    total['mesh_steps'] += bucket['mesh_steps']
+    total['all_up_steps'] += bucket['all_up_steps']
+    for node, n in bucket['node_up'].items():
+        total['node_up'][node] = total['node_up'].get(node, 0) + n
+    total['node_seen'] = sorted(set(total['node_seen']) | set(bucket['node_seen']))
+    total['battery_samples'] += bucket['battery_samples']
+    total['lighting_on'] += bucket['lighting_on']
+    if bucket['first_ts'] is not None and (total['first_ts'] is None or bucket['first_ts'] < total['first_ts']):
+        total['first_ts'], total['first_charge'] = bucket['first_ts'], bucket['first_charge']
+    if bucket['last_ts'] is not None and (total['last_ts'] is None or bucket['last_ts'] >= total['last_ts']):
+        total['last_ts'], total['last_charge'] = bucket['last_ts'], bucket['last_charge']
+
+
+class AnalyticsAggregator:
+    def __init__(self, checkpoint_path=None, bucket_seconds=BUCKET_SECONDS,
+                 retention_buckets=RETENTION_BUCKETS, checkpoint_interval=60):
+        self.checkpoint_path = checkpoint_path
+        self.bucket_seconds = bucket_seconds
+        self.retention_buckets = retention_buckets
+        self.checkpoint_interval = checkpoint_interval
+        self._lock = threading.Lock()
+        self.totals = _new_bucket()
+        self.buckets = {}
+        self.battery_position = None
+        self.mesh_position = None
+        self._last_checkpoint = 0.0
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            self.load()
+
+    def _bucket(self, ts):
+        key = int(ts // self.bucket_seconds)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = _new_bucket()
+        return bucket
+
+    def _prune(self):
+        if len(self.buckets) > self.retention_buckets:
+            cutoff = max(self.buckets) - self.retention_buckets
+            for key in [k for k in self.buckets if k <= cutoff]:
+                del self.buckets[key]
+
+    # --- Ingest ---
+    def record_battery(self, timestamp, charge_pct):
+        ts = to_epoch(timestamp)
+        if ts is None or charge_pct is None or charge_pct == '':
+            return
+        charge_pct = float(charge_pct)
+        for bucket in (self.totals, self._bucket(ts)):
+            bucket['battery_samples'] += 1
+            if charge_pct > LIGHTING_ON_CHARGE_PCT:
+                bucket['lighting_on'] += 1
+            if bucket['first_ts'] is None or ts < bucket['first_ts']:
+                bucket['first_ts'], bucket['first_charge'] = ts, charge_pct
+            if bucket['last_ts'] is None or ts >= bucket['last_ts']:
+                bucket['last_ts'], bucket['last_charge'] = ts, charge_pct
+
+    def record_mesh_arrays(self, arrays):
+        # Fold a MeshStatusArrays block in, one vectorized pass per bucket
+        if not len(arrays.timestamps):
+            return
+        up = arrays.status == status_code(arrays, 'UP')
+        present = arrays.status != ABSENT
+        all_up = (up == present).all(axis=1)
+        keys = (arrays.timestamps // self.bucket_seconds).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        ends = np.r_[starts[1:], len(keys)]
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            node_up = up[start:end].sum(axis=0)
+            seen = present[start:end].any(axis=0)
+            counts = {arrays.node_ids[i]: int(node_up[i]) for i in np.flatnonzero(seen)}
+            for bucket in (self.totals, self._bucket(float(arrays.timestamps[start]))):
+                bucket['mesh_steps'] += end - start
+                bucket['all_up_steps'] += int(all_up[start:end].sum())
+                for node, n in counts.items():
+                    bucket['node_up'][node] = bucket['node_up'].get(node, 0) + n
+                bucket['node_seen'] = sorted(set(bucket['node_seen']) | counts.keys())
+
+    def refresh(self, backend):
+        # Pull only records appended since the last refresh
+        with self._lock:
+            rows, self.battery_position = backend.read_battery_history_since(self.battery_position)
+            for row in rows:
+                self.record_battery(to_epoch(row['timestamp']), row['charge_pct'])
+            arrays, self.mesh_position = backend.read_mesh_status_since(self.mesh_position)
+            self.record_mesh_arrays(arrays)
+            self._prune()
+            if self.checkpoint_path and time.monotonic() - self._last_checkpoint >= self.checkpoint_interval:
+                self._save()
+
+    # --- Queries ---
+    def summary(self, window=None, now=None):
+        # window: None for all time, a key of WINDOWS, or seconds
+        with self._lock:
+            if window is None:
+                total = self.totals
+            else:
+                seconds = WINDOWS[window] if isinstance(window, str) else window
+                first_key = int(((now or time.time()) - seconds) // self.bucket_seconds)
+                total = _new_bucket()
+                for key, bucket in self.buckets.items():
+                    if key >= first_key:
+                        _merge(total, bucket)
+            steps, nodes = total['mesh_steps'], len(total['node_seen'])
+            return {
+                'mesh_steps': steps,
+                'all_up_steps': total['all_up_steps'],
+                'mesh_uptime': total['all_up_steps'] / steps if steps else None,
+                'mesh_reliability': sum(total['node_up'].values()) / (steps * nodes) if steps and nodes else None,
+                'node_up_counts': dict(total['node_up']),
+                'battery_samples': total['battery_samples'],
+                'lighting_on_hours': total['lighting_on'],
+                'first_charge': total['first_charge'],
+                'last_charge': total['last_charge'],
+                'charge_delta': (total['last_charge'] - total['first_charge']
+                                 if total['battery_samples'] else None),
+            }
+
+    # --- Checkpoints ---
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        state = {
+            'version': CHECKPOINT_VERSION,
+            'bucket_seconds': self.bucket_seconds,
+            'battery_position': self.battery_position,
+            'mesh_position': self.mesh_position,
+            'totals': self.totals,
+            'buckets': {str(k): v for k, v in self.buckets.items()},
+        }
+        # A private temp file per writer; workers share the checkpoint path
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.checkpoint_path) or '.',
+                                   prefix=os.path.basename(self.checkpoint_path) + '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp, self.checkpoint_path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self._last_checkpoint = time.monotonic()
+
+    def load(self):
+        with open(self.checkpoint_path) as f:
+            state = json.load(f)
+        if state.get('version') != CHECKPOINT_VERSION or state['bucket_seconds'] != self.bucket_seconds:
+            return  # incompatible checkpoint; rebuild from the store
+        self.battery_position = state['battery_position']
+        self.mesh_position = state['mesh_position']
+        self.totals = state['totals']
+        self.buckets = {int(k): v for k, v in state['buckets'].items()}
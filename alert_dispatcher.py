@@ -0,0 +1,205 @@
+import logging
+import queue
+import smtplib
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from email.message import EmailMessage
+
+from roadmesh.monitoring import health_monitor
+
+logger = logging.getLogger(__name__)
+
+# Alert email delivery off the caller's thread. submit() only queues; a
+# worker thread collects whatever arrives within DIGEST_INTERVAL into one
+# email, drops subsystems that already alerted within their cooldown, and
+# sends over one SMTP connection that stays open between emails.
+
+COOLDOWN = 15 * 60       # seconds before the same subsystem alerts again
+DIGEST_INTERVAL = 30     # seconds to wait for more alerts before sending
+MAX_DIGEST = 100         # alerts per email at most
+IDLE_TIMEOUT = 5 * 60    # close the SMTP connection after this long unused
+QUEUE_SIZE = 10000
+
+_STOP = object()
+
+
+class AlertDispatcher:
+    def __init__(self, server=None, port=None, user=None, password=None, sender=None, recipient=None,
+                 subject=None, starttls=True, cooldown=COOLDOWN, digest_interval=DIGEST_INTERVAL,
+                 max_digest=MAX_DIGEST, idle_timeout=IDLE_TIMEOUT, smtp_factory=smtplib.SMTP, clock=time.monotonic):
+        # Defaults come from the HealthMonitor email settings
+        self.server = server or health_monitor.SMTP_SERVER
+        self.port = port or health_monitor.SMTP_PORT
+        self.user = health_monitor.SMTP_USER if user is None else user
+        self.password = health_monitor.SMTP_PASS if password is None else password
+        self.sender = sender or health_monitor.ALERT_EMAIL_FROM
+        self.recipient = recipient or health_monitor.ALERT_EMAIL_TO
+        self.subject = subject or health_monitor.ALERT_EMAIL_SUBJECT
+        self.starttls = starttls
+        self.cooldown = cooldown
+        self.digest_interval = digest_interval
+        self.max_digest = max_digest
+        self.idle_timeout = idle_timeout
+        self.smtp_factory = smtp_factory
+        self.clock = clock
+        self.stats = Counter()
+        self._queue = queue.Queue(QUEUE_SIZE)
+        self._last_sent = {}  # key -> clock() of the last email that carried it
+        self._suppressed = Counter()  # key -> alerts dropped since it was last sent
+        self._smtp = None
+        self._worker = None
+        self._lock = threading.Lock()
+
+    # --- Producer side ---
+    def submit(self, message, keys=None):
+        # keys: what the alert is about (e.g. subsystem names), for dedup
+        # and cooldown; defaults to the message itself. Never blocks.
+        self._start()
+        try:
+            self._queue.put_nowait((datetime.now(), message, tuple(keys) if keys else (message,)))
+            self.stats['submitted'] += 1
+        except queue.Full:
+            self.stats['dropped'] += 1
+            logger.error(f'Alert queue full, dropped: {message}')
+
+    def flush(self, timeout=None):
+        # Wait until everything submitted so far has been handled
+        if timeout is None:
+            self._queue.join()
+            return
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def close(self, timeout=None):
+        with self._lock:
+            worker = self._worker
+            self._worker = None
+        if worker is not None:
+            self._queue.put(_STOP)
+            worker.join(timeout)
+
+    def _start(self):
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='alert-dispatcher', daemon=True)
+                self._worker.start()
+
+    # --- Worker ---
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                self._disconnect()
+                continue
+            if item is _STOP:
+                self._queue.task_done()
+                self._disconnect()
+                return
+            batch = [item]
+            stop = self._collect(batch)
+            try:
+                self._dispatch(batch)
+            except Exception as e:
+                self.stats['failed'] += 1
+                logger.error(f'Alert dispatch failed: {e}')
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                self._queue.task_done()
+                self._disconnect()
+                return
+
+    def _collect(self, batch):
+        # Gather more alerts for the digest; True if a stop came in
+        deadline = time.monotonic() + self.digest_interval
+        while len(batch) < self.max_digest:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                return False
+            if item is _STOP:
+                return True
+            batch.append(item)
+        return False
+
+    def _dispatch(self, batch):
+        now = self.clock()
+        alerts, fresh = [], set()
+        for timestamp, message, keys in batch:
+            live = [k for k in keys if k in fresh or now - self._last_sent.get(k, -self.cooldown) >= self.cooldown]
+            if not live:
+                self.stats['suppressed'] += 1
+                for key in keys:
+                    self._suppressed[key] += 1
+                continue
+            fresh.update(live)
+            alerts.append((timestamp, message))
+        if not alerts:
+            return
+        # Collapse repeats of one message inside the digest
+        counts = Counter(message for _, message in alerts)
+        first = {}
+        for timestamp, message in alerts:
+            first.setdefault(message, timestamp)
+        repeated = {key: self._suppressed.pop(key) for key in fresh if key in self._suppressed}
+        self._send(self._compose(first, counts, repeated))
+        for key in fresh:
+            self._last_sent[key] = now
+        self.stats['emails'] += 1
+        self.stats['alerts'] += len(alerts)
+
+    def _compose(self, first, counts, repeated):
+        msg = EmailMessage()
+        msg['From'] = self.sender
+        msg['To'] = self.recipient
+        if len(first) == 1 and not repeated:
+            msg['Subject'] = self.subject
+            message = next(iter(first))
+            msg.set_content(message if counts[message] == 1 else f'{message} (x{counts[message]})')
+            return msg
+        msg['Subject'] = f'{self.subject} ({sum(counts.values())} alerts)'
+        lines = [f"{timestamp:%Y-%m-%d %H:%M:%S}  {message}" + (f' (x{counts[message]})' if counts[message] > 1 else '')
+                 for message, timestamp in first.items()]
+        if repeated:
+            lines.append('')
+            lines.append('Suppressed during cooldown since the last email:')
+            lines.extend(f'  {key}: {count}' for key, count in sorted(repeated.items(), key=lambda kv: str(kv[0])))
+        msg.set_content('\n'.join(lines))
+        return msg
+
+    # --- SMTP connection ---
+    def _connect(self):
+        smtp = self.smtp_factory(self.server, self.port)
+        if self.starttls:
+            smtp.starttls()
+        if self.user:
+            smtp.login(self.user, self.password)
+        self.stats['connections'] += 1
+        return smtp
+
+    def _send(self, msg):
+        # Reuse the open connection; reconnect once if the server dropped it
+        for attempt in (0, 1):
+            if self._smtp is None:
+                self._smtp = self._connect()
+            try:
+                self._smtp.send_message(msg)
+                return
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                self._smtp = None
+                if attempt:
+                    raise
+
+    def _disconnect(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
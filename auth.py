@@ -0,0 +1,457 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import Counter, deque, namedtuple
+from collections.abc import Mapping
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import bcrypt
+
+logger = logging.getLogger(__name__)
+
+# The authentication hot path.
+# - SessionStore: sessions in memory with a TTL. Every change is one line
+#   appended to a journal shared by all worker processes, which each replay
+#   at startup and then tail. The journal is rewritten once it is mostly
+#   dead records. Nothing rewrites the full session table.
+# - ApiKeyStore: several named API keys with scopes. Only SHA-256 digests
+#   are stored, and a lookup is one dict access on the presented key's
+#   digest. That takes the same time however much of a guess is right.
+#   One stat() per lookup picks up keys changed by other workers.
+# - PasswordVerifier: bcrypt runs on a fixed pool of threads. When too many
+#   verifications are already queued, a login fails fast with LoginBusy
+#   and the caller does not wait.
+
+SESSION_TTL = 12 * 3600       # seconds a session lives without use
+COMPACT_MIN_RECORDS = 1000    # journal records before compaction is considered
+COMPACT_RATIO = 4             # compact when records exceed live sessions this many times
+ROTATION_GRACE = 5 * 60       # seconds a rotated-out API key keeps working
+BCRYPT_WORKERS = max(2, (os.cpu_count() or 2) // 2)
+MAX_PENDING_VERIFIES = 32     # queued + running password checks
+VERIFY_TIMEOUT = 10
+
+SCOPE_ALL = '*'
+
+
+# --- Sessions ---
+@contextmanager
+def _file_lock(lock_file, shared=False):
+    # Between processes (flock on a side file), so one worker never
+    # rewrites a file while another appends to or rewrites it
+    fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+    try:
+        yield
+    finally:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class SessionStore(Mapping):
+    # session id -> username for live sessions. Every worker process opens
+    # the same journal: appends and compaction happen under an exclusive
+    # file lock, and before each lookup a worker reads whatever the others
+    # appended since (one stat() when nothing changed). A compaction
+    # replaces the file, and the other workers reload it on their next call.
+    def __init__(self, path, ttl=SESSION_TTL, clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        self.clock = clock
+        self._sessions = {}   # sid -> [username, expires]
+        self._expiry = deque()  # (expires, sid), roughly oldest first; stale entries skipped
+        self._records = 0
+        self._journal = None
+        self._offset = 0      # journal bytes applied
+        self._inode = None
+        self._lock = threading.Lock()
+        self._lock_file = open(f'{path}.lock', 'a')
+        with _file_lock(self._lock_file):
+            self._load()
+
+    # Journal records: ["c", sid, username, expires] created,
+    # ["t", sid, expires] touched, ["e", sid] ended
+    def _load(self):
+        # (Re)read the journal from the start; call with the file lock held
+        if self._journal is not None:
+            self._journal.close()
+        self._sessions, self._expiry, self._records, self._offset = {}, deque(), 0, 0
+        self._journal = open(self.path, 'ab+')
+        self._inode = os.fstat(self._journal.fileno()).st_ino
+        self._read()
+        if self._journal.tell() > self._offset:
+            # torn last line after a crash: end it so later records stay whole
+            self._journal.write(b'\n')
+            self._journal.flush()
+            self._offset = self._journal.tell()
+        now = self.clock()
+        live = sorted((expires, sid) for sid, (_, expires) in self._sessions.items() if expires > now)
+        self._sessions = {sid: self._sessions[sid] for _, sid in live}
+        self._expiry = deque(live)
+
+    def _read(self):
+        # Apply the complete lines past self._offset
+        self._journal.seek(self._offset)
+        data = self._journal.read()
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            try:
+                record = json.loads(line)
+                op, sid = record[0], record[1]
+            except (ValueError, IndexError):
+                continue  # torn line after a crash
+            self._records += 1
+            if op == 'c':
+                self._sessions[sid] = [record[2], record[3]]
+                self._expiry.append((record[3], sid))
+            elif op == 't' and sid in self._sessions:
+                self._sessions[sid][1] = record[2]
+                self._expiry.append((record[2], sid))
+            elif op == 'e':
+                self._sessions.pop(sid, None)
+        self._offset += end
+
+    def _sync(self):
+        # Catch up with the other processes
+        try:
+            stat = os.stat(self.path)
+            inode, size = stat.st_ino, stat.st_size
+        except FileNotFoundError:
+            inode, size = None, 0
+        if inode != self._inode:
+            with _file_lock(self._lock_file):
+                self._load()
+        elif size > self._offset:
+            self._read()
+
+    def _append(self, *record):
+        # The record takes effect when it is read back, after anything
+        # other processes wrote before it
+        with _file_lock(self._lock_file):
+            if os.stat(self.path).st_ino != self._inode:
+                self._load()
+            self._journal.write(json.dumps(record, separators=(',', ':')).encode() + b'\n')
+            self._journal.flush()
+            self._read()
+
+    def _evict(self, now):
+        while self._expiry and self._expiry[0][0] <= now:
+            expires, sid = self._expiry.popleft()
+            entry = self._sessions.get(sid)
+            if entry is not None and entry[1] == expires:
+                del self._sessions[sid]
+
+    def create(self, username, sid=None):
+        sid = sid or secrets.token_hex(16)
+        with self._lock:
+            now = self.clock()
+            self._append('c', sid, username, now + self.ttl)
+            self._evict(now)
+            self._maybe_compact()
+        return sid
+
+    def get_user(self, sid):
+        # Username for a live session; sliding expiry, journalled at most
+        # once per half TTL
+        with self._lock:
+            self._sync()
+            now = self.clock()
+            self._evict(now)
+            entry = self._sessions.get(sid)
+            if entry is None or entry[1] <= now:
+                return None
+            username = entry[0]
+            if entry[1] - now < self.ttl / 2:
+                self._append('t', sid, now + self.ttl)
+                self._maybe_compact()
+            return username
+
+    def end(self, sid):
+        with self._lock:
+            self._sync()
+            if sid in self._sessions:
+                self._append('e', sid)
+                self._maybe_compact()
+
+    def _maybe_compact(self):
+        if self._records > COMPACT_MIN_RECORDS and self._records > COMPACT_RATIO * len(self._sessions):
+            self._compact()
+
+    def compact(self):
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        # Rewrite the journal as one record per live session
+        with _file_lock(self._lock_file):
+            if os.stat(self.path).st_ino != self._inode:
+                self._load()
+            else:
+                self._read()
+            self._evict(self.clock())
+            tmp = f'{self.path}.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                for sid, (username, expires) in self._sessions.items():
+                    f.write(json.dumps(('c', sid, username, expires), separators=(',', ':')) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            self._load()
+
+    def close(self):
+        with self._lock:
+            self._journal.close()
+            self._lock_file.close()
+
+    def __getitem__(self, sid):
+        with self._lock:
+            self._sync()
+            entry = self._sessions.get(sid)
+            if entry is None or entry[1] <= self.clock():
+                raise KeyError(sid)
+            return entry[0]
+
+    def __iter__(self):
+        with self._lock:
+            self._sync()
+            self._evict(self.clock())
+            return iter(list(self._sessions))
+
+    def __len__(self):
+        with self._lock:
+            self._sync()
+            self._evict(self.clock())
+            return len(self._sessions)
+
+    # --- UserServiceManager integration ---
+    def attach(self, user_service):
+        # Serve user_service's sessions from the store. Sessions it loaded
+        # from the old table are imported once, when the journal is new.
+        if not self._records:
+            for sid, username in dict(user_service.sessions).items():
+                self.create(username, sid)
+        user_service.sessions = self
+        user_service.create_session = self.create
+        user_service.end_session = self.end
+        user_service.get_user_by_session = self.get_user
+        return user_service
+
+
+# --- API keys ---
+ApiKey = namedtuple('ApiKey', ['key_id', 'name', 'scopes', 'created', 'expires'])
+
+
+def _digest(key):
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class ApiKeyStore:
+    # Every worker process reads the same file. A lookup first stat()s it
+    # and reloads when another worker has changed it, so a key created,
+    # rotated or revoked anywhere takes effect everywhere. Changes are
+    # read-modify-write under an exclusive flock.
+    def __init__(self, path, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self._keys = {}  # digest -> ApiKey
+        self._stamp = None  # (inode, mtime, size) of the file as last read
+        self._lock = threading.Lock()
+        self._lock_file = open(f'{path}.lock', 'a')
+        with self._lock:
+            self._reload()
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _refresh(self):
+        if self._stat() != self._stamp:
+            with self._lock:
+                self._reload()
+
+    def _reload(self):
+        # Call with self._lock held
+        try:
+            f = open(self.path, encoding='utf-8')
+        except FileNotFoundError:
+            self._keys, self._stamp = {}, None
+            return
+        with f:
+            stat = os.fstat(f.fileno())
+            stamp = stat.st_ino, stat.st_mtime_ns, stat.st_size
+            if stamp == self._stamp:
+                return
+            records = json.load(f)['keys']
+        self._keys = {record['digest']: ApiKey(record['id'], record['name'], tuple(record['scopes']),
+                                               record['created'], record['expires']) for record in records}
+        self._stamp = stamp
+
+    @contextmanager
+    def _changing(self):
+        # Start from the file as it is now, so workers do not undo each
+        # other's changes
+        with self._lock, _file_lock(self._lock_file):
+            self._reload()
+            yield
+
+    def _save(self):
+        records = [{'digest': digest, 'id': key.key_id, 'name': key.name, 'scopes': list(key.scopes),
+                    'created': key.created, 'expires': key.expires} for digest, key in self._keys.items()]
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'keys': records}, f, indent=1)
+            f.flush()
+            stat = os.fstat(f.fileno())
+        os.replace(tmp, self.path)
+        self._stamp = stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def create(self, name, scopes=('read',), key=None):
+        # Returns (ApiKey, key); the key itself is not stored and cannot be
+        # shown again. Pass `key` to adopt an existing one.
+        key = key or secrets.token_hex(16)
+        record = ApiKey(secrets.token_hex(4), name, tuple(scopes), self.clock(), None)
+        with self._changing():
+            self._keys[_digest(key)] = record
+            self._save()
+        return record, key
+
+    def rotate(self, key_id, grace=ROTATION_GRACE):
+        # New key with the same id, name and scopes; the old one keeps
+        # working for `grace` seconds so clients can switch over
+        with self._changing():
+            current = [(d, k) for d, k in self._keys.items() if k.key_id == key_id and k.expires is None]
+            if not current:
+                raise KeyError(key_id)
+            now = self.clock()
+            for digest, old in current:
+                if grace:
+                    self._keys[digest] = old._replace(expires=now + grace)
+                else:
+                    del self._keys[digest]
+            key = secrets.token_hex(16)
+            record = current[0][1]._replace(created=now)
+            self._keys[_digest(key)] = record
+            self._save()
+        return record, key
+
+    def revoke(self, key_id):
+        with self._changing():
+            digests = [d for d, k in self._keys.items() if k.key_id == key_id]
+            for digest in digests:
+                del self._keys[digest]
+            if digests:
+                self._save()
+        return bool(digests)
+
+    def check(self, key, scope=None):
+        # The ApiKey for `key` if it is valid and has `scope`, else None
+        if not key:
+            return None
+        self._refresh()
+        digest = _digest(key)
+        record = self._keys.get(digest)
+        if record is None:
+            return None
+        if record.expires is not None and record.expires <= self.clock():
+            with self._changing():
+                if self._keys.get(digest) == record:
+                    del self._keys[digest]
+                    self._save()
+            return None
+        if scope is not None and scope not in record.scopes and SCOPE_ALL not in record.scopes:
+            return None
+        return record
+
+    def find(self, name):
+        self._refresh()
+        return next((k for k in self._keys.values() if k.name == name and k.expires is None), None)
+
+    def keys(self):
+        # Current keys, one per id (keys in their rotation grace excluded)
+        self._refresh()
+        return sorted((k for k in self._keys.values() if k.expires is None), key=lambda k: k.created)
+
+    def __len__(self):
+        self._refresh()
+        return len(self._keys)
+
+
+# --- Password checks ---
+class LoginBusy(Exception):
+    pass
+
+
+class PasswordVerifier:
+    def __init__(self, workers=BCRYPT_WORKERS, max_pending=MAX_PENDING_VERIFIES, timeout=VERIFY_TIMEOUT):
+        self.timeout = timeout
+        self.stats = Counter()
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix='bcrypt')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._dummy = None
+
+    def _reserve(self, count):
+        # Slots for `count` checks, or LoginBusy and none taken
+        for taken in range(count):
+            if not self._slots.acquire(blocking=False):
+                for _ in range(taken):
+                    self._slots.release()
+                self.stats['rejected'] += 1
+                raise LoginBusy('Too many password checks in progress')
+
+    def _start(self, func, *args):
+        future = self._pool.submit(func, *args)
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _result(self, future):
+        try:
+            return future.result(self.timeout)
+        except FutureTimeout:
+            self.stats['timed_out'] += 1
+            raise LoginBusy('Password check timed out')
+
+    def _submit(self, func, *args):
+        self._reserve(1)
+        return self._result(self._start(func, *args))
+
+    def verify(self, password, hashed):
+        # hashed None (unknown user) still costs one bcrypt check, so
+        # response time does not reveal which usernames exist
+        self.stats['verified'] += 1
+        return self._submit(self._check, password, hashed)
+
+    def hash(self, password):
+        return self._submit(self._hash, password)
+
+    def hash_many(self, passwords):
+        # Hashes in input order, all queued at once; LoginBusy unless the
+        # whole batch fits in the pending limit
+        passwords = list(passwords)
+        self._reserve(len(passwords))
+        futures = [self._start(self._hash, password) for password in passwords]
+        return [self._result(future) for future in futures]
+
+    def _hash(self, password):
+        return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+
+    def _check(self, password, hashed):
+        if hashed is None:
+            if self._dummy is None:
+                self._dummy = bcrypt.hashpw(b'', bcrypt.gensalt())
+            bcrypt.checkpw(password.encode(), self._dummy)
+            return False
+        return bcrypt.checkpw(password.encode(), hashed.encode())
+
+    def attach(self, user_service):
+        # user_service.authenticate() through the pool; raises LoginBusy
+        user_service.authenticate = lambda username, password: self.verify(password, user_service.users.get(username))
+        return user_service
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
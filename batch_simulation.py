@@ -0,0 +1,334 @@
+import argparse
+import logging
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from roadmesh.events import EventCode, make_event
+from roadmesh.metrics import histogram, timed
+
+logger = logging.getLogger(__name__)
+
+# Fleet-scale simulation for capacity planning. Battery, harvest and mode
+# state for every pole lives in NumPy arrays and one step advances all of
+# them on a virtual clock, so a year of 5,000 poles is ~8,800 vectorized
+# steps instead of 44M object method calls. SimulatedPole runs the same
+# model one object at a time; for the same seed both produce identical
+# mode transitions, which the tests check.
+
+CHARGE_EFFICIENCY = 0.9
+LIGHT_LOAD_A = {'on': 0.5, 'dim': 0.2, 'off': 0.0, 'emergency': 0.1}
+MESH_LOAD_FACTOR = {'normal': 1.0, 'reduced': 0.6, 'critical': 0.3}
+CLOUD_RANGE = (0.2, 1.0)    # daily fraction of clear-sky solar output
+NIGHT_HOURS = (18, 6)       # lights run from 18:00 to 06:00
+
+MESH_MODES = ('normal', 'reduced', 'critical')
+LIGHTING_MODES = ('on', 'dim', 'off', 'emergency')
+
+# Charge percentages above which the mesh runs normal / reduced, and the
+# lights on / dim / off (below `off` they drop to emergency lighting)
+Thresholds = namedtuple('Thresholds', ['normal', 'reduced', 'off'])
+THRESHOLDS = Thresholds(60, 30, 10)
+
+def mesh_mode(pct, thresholds=THRESHOLDS):
+    return 'normal' if pct > thresholds.normal else 'reduced' if pct > thresholds.reduced else 'critical'
+
+def lighting_mode(pct, night, thresholds=THRESHOLDS):
+    if not night:
+        return 'off'
+    if pct > thresholds.normal:
+        return 'on'
+    return 'dim' if pct > thresholds.reduced else 'off' if pct > thresholds.off else 'emergency'
+
+def solar_profile():
+    # Clear-sky output per hour of day, 0 at night, peak 1 at noon. Shared
+    # by both paths so they see bit-identical inputs.
+    hours = np.arange(24, dtype=np.float64)
+    return np.maximum(np.sin((hours - 6) / 12 * np.pi), 0.0)
+
+def is_night(hour):
+    return hour >= NIGHT_HOURS[0] or hour < NIGHT_HOURS[1]
+
+
+Fleet = namedtuple('Fleet', [
+    'node_ids',
+    'capacity_Ah',
+    'consumption_A',    # mesh radio draw in normal mode
+    'solar_peak_A',
+    'teg_A',
+    'initial_pct',
+])
+
+def make_fleet(n, seed=0, capacity_Ah=5.0, consumption_A=0.2, solar_peak_A=1.0, teg_A=0.02):
+    # Poles with per-pole shading and starting charge
+    rng = np.random.default_rng(seed)
+    return Fleet(
+        [f'N{i}' for i in range(n)],
+        np.full(n, capacity_Ah),
+        np.full(n, consumption_A),
+        solar_peak_A * rng.uniform(0.6, 1.0, n),
+        np.full(n, teg_A),
+        rng.uniform(40.0, 100.0, n),
+    )
+
+
+class VirtualClock:
+    def __init__(self, start, step=timedelta(hours=1)):
+        self.start = start
+        self.step = step
+        self.steps = 0
+
+    @property
+    def now(self):
+        return self.start + self.step * self.steps
+
+    @property
+    def hour(self):
+        return self.now.hour
+
+    def advance(self):
+        self.steps += 1
+
+    def time_of(self, step):
+        return self.start + self.step * step
+
+
+Transitions = namedtuple('Transitions', ['step', 'node', 'kind', 'old', 'new'])
+MESH, LIGHTING = 0, 1
+
+SimulationResult = namedtuple('SimulationResult', [
+    'start',
+    'steps',
+    'node_ids',
+    'final_pct',
+    'min_pct',
+    'mean_pct_by_step',   # fleet-wide mean charge after each step
+    'mesh_mode_hours',    # [nodes, len(MESH_MODES)]
+    'lighting_mode_hours',  # [nodes, len(LIGHTING_MODES)]
+    'dark_hours',         # per node: night hours with the light off
+    'down_hours',         # per node: hours ending with an empty battery
+    'all_up_steps',       # hours in which no pole was down
+    'transitions',        # Transitions of int arrays; old/new index the mode tuples
+])
+
+
+class BatchSimulation:
+    def __init__(self, fleet, start, seed=0, thresholds=THRESHOLDS, cloud_range=CLOUD_RANGE):
+        self.fleet = fleet
+        self.thresholds = thresholds
+        self.cloud_range = cloud_range
+        self.clock = VirtualClock(start)
+        self.rng = np.random.default_rng(seed)
+        self.profile = solar_profile()
+        n = len(fleet.node_ids)
+        self.charge = fleet.capacity_Ah * fleet.initial_pct / 100
+        self.cloud = None
+        pct = self.percentage()
+        night = is_night(self.clock.hour)
+        self.mesh_mode = _mesh_codes(pct, thresholds)
+        self.lighting_mode = _lighting_codes(pct, night, thresholds)
+        self.min_pct = pct.copy()
+        self.mesh_hours = np.zeros((n, len(MESH_MODES)), np.int64)
+        self.lighting_hours = np.zeros((n, len(LIGHTING_MODES)), np.int64)
+        self.dark_hours = np.zeros(n, np.int64)
+        self.down_hours = np.zeros(n, np.int64)
+        self.all_up_steps = 0
+        self._light_load = np.array([LIGHT_LOAD_A[m] for m in LIGHTING_MODES])
+        self._mesh_factor = np.array([MESH_LOAD_FACTOR[m] for m in MESH_MODES])
+        self._transitions = []
+        self._mean_pct = []
+
+    def percentage(self):
+        return self.charge / self.fleet.capacity_Ah * 100
+
+    @timed(histogram('roadmesh_batch_step_seconds', 'One fleet-wide BatchSimulation step'))
+    def step(self):
+        fleet, hour = self.fleet, self.clock.hour
+        if self.cloud is None or hour == 0:
+            self.cloud = self.rng.uniform(*self.cloud_range, len(fleet.node_ids))
+        harvest = fleet.solar_peak_A * self.profile[hour] * self.cloud + fleet.teg_A
+        self.charge = np.minimum(self.charge + harvest * CHARGE_EFFICIENCY, fleet.capacity_Ah)
+        load = fleet.consumption_A * self._mesh_factor[self.mesh_mode] + self._light_load[self.lighting_mode]
+        self.charge = np.maximum(self.charge - load, 0.0)
+        if is_night(hour):
+            self.dark_hours += self.lighting_mode == OFF
+        down = self.charge <= 0
+        self.down_hours += down
+        self.all_up_steps += not down.any()
+        self.clock.advance()
+        pct = self.percentage()
+        np.minimum(self.min_pct, pct, out=self.min_pct)
+        self._mean_pct.append(pct.mean())
+        mesh = _mesh_codes(pct, self.thresholds)
+        lighting = _lighting_codes(pct, is_night(self.clock.hour), self.thresholds)
+        self._record(MESH, self.mesh_mode, mesh)
+        self._record(LIGHTING, self.lighting_mode, lighting)
+        self.mesh_mode, self.lighting_mode = mesh, lighting
+        rows = np.arange(len(pct))
+        self.mesh_hours[rows, mesh] += 1
+        self.lighting_hours[rows, lighting] += 1
+
+    def _record(self, kind, old, new):
+        changed = np.flatnonzero(old != new)
+        if len(changed):
+            self._transitions.append((self.clock.steps, changed, kind, old[changed], new[changed]))
+
+    def run(self, steps):
+        for _ in range(steps):
+            self.step()
+        return self.result()
+
+    def result(self):
+        if self._transitions:
+            step = np.concatenate([np.full(len(c), s) for s, c, _, _, _ in self._transitions])
+            node = np.concatenate([c for _, c, _, _, _ in self._transitions])
+            kind = np.concatenate([np.full(len(c), k) for _, c, k, _, _ in self._transitions])
+            old = np.concatenate([o for _, _, _, o, _ in self._transitions])
+            new = np.concatenate([n for _, _, _, _, n in self._transitions])
+        else:
+            step = node = kind = old = new = np.empty(0, np.int64)
+        return SimulationResult(self.clock.start, self.clock.steps, self.fleet.node_ids, self.percentage(),
+                                self.min_pct.copy(), np.array(self._mean_pct), self.mesh_hours.copy(),
+                                self.lighting_hours.copy(), self.dark_hours.copy(), self.down_hours.copy(),
+                                self.all_up_steps, Transitions(step, node, kind, old, new))
+
+OFF = LIGHTING_MODES.index('off')
+
+def _mesh_codes(pct, thresholds):
+    return np.where(pct > thresholds.normal, 0, np.where(pct > thresholds.reduced, 1, 2))
+
+def _lighting_codes(pct, night, thresholds):
+    if not night:
+        return np.full(len(pct), OFF)
+    return np.where(pct > thresholds.normal, 0, np.where(pct > thresholds.reduced, 1,
+                                                         np.where(pct > thresholds.off, 2, 3)))
+
+
+class SimulatedPole:
+    # One pole of the same model, advanced object by object
+    def __init__(self, fleet, i, hour, thresholds=THRESHOLDS):
+        self.node_id = fleet.node_ids[i]
+        self.thresholds = thresholds
+        self.capacity_Ah = float(fleet.capacity_Ah[i])
+        self.consumption_A = float(fleet.consumption_A[i])
+        self.solar_peak_A = float(fleet.solar_peak_A[i])
+        self.teg_A = float(fleet.teg_A[i])
+        self.charge = self.capacity_Ah * float(fleet.initial_pct[i]) / 100
+        pct = self.percentage()
+        self.mesh_mode = mesh_mode(pct, thresholds)
+        self.lighting_mode = lighting_mode(pct, is_night(hour), thresholds)
+
+    def percentage(self):
+        return self.charge / self.capacity_Ah * 100
+
+    def step(self, solar, cloud, next_hour):
+        harvest = self.solar_peak_A * solar * cloud + self.teg_A
+        self.charge = min(self.charge + harvest * CHARGE_EFFICIENCY, self.capacity_Ah)
+        load = self.consumption_A * MESH_LOAD_FACTOR[self.mesh_mode] + LIGHT_LOAD_A[self.lighting_mode]
+        self.charge = max(self.charge - load, 0.0)
+        pct = self.percentage()
+        changes = []
+        mode = mesh_mode(pct, self.thresholds)
+        if mode != self.mesh_mode:
+            changes.append(('mesh', self.mesh_mode, mode))
+            self.mesh_mode = mode
+        mode = lighting_mode(pct, is_night(next_hour), self.thresholds)
+        if mode != self.lighting_mode:
+            changes.append(('lighting', self.lighting_mode, mode))
+            self.lighting_mode = mode
+        return changes
+
+def simulate_per_pole(fleet, start, steps, seed=0, thresholds=THRESHOLDS, cloud_range=CLOUD_RANGE):
+    # Reference path: returns [(step, node_id, kind, old, new)] in the same
+    # order as transition_list() on a batch result
+    clock = VirtualClock(start)
+    rng = np.random.default_rng(seed)
+    profile = solar_profile()
+    poles = [SimulatedPole(fleet, i, clock.hour, thresholds) for i in range(len(fleet.node_ids))]
+    cloud = None
+    transitions = []
+    for _ in range(steps):
+        hour = clock.hour
+        if cloud is None or hour == 0:
+            cloud = rng.uniform(*cloud_range, len(poles))
+        clock.advance()
+        step_changes = {'mesh': [], 'lighting': []}
+        for i, pole in enumerate(poles):
+            for kind, old, new in pole.step(profile[hour], cloud[i], clock.hour):
+                step_changes[kind].append((clock.steps, pole.node_id, kind, old, new))
+        transitions += step_changes['mesh'] + step_changes['lighting']
+    return transitions, poles
+
+def transition_list(result):
+    t = result.transitions
+    names = {MESH: ('mesh', MESH_MODES), LIGHTING: ('lighting', LIGHTING_MODES)}
+    return [(step, result.node_ids[node], names[kind][0], names[kind][1][old], names[kind][1][new])
+            for step, node, kind, old, new in zip(t.step.tolist(), t.node.tolist(), t.kind.tolist(),
+                                                  t.old.tolist(), t.new.tolist())]
+
+
+# --- Results ---
+def write_results(result, backend):
+    # Every transition as a structured event, in one batch. The messages
+    # are the standard ones, so the CSV layout parses them back
+    clock = VirtualClock(result.start)
+    events = []
+    for step, node_id, kind, old, new in transition_list(result):
+        code = EventCode.NODE_POWER_MODE if kind == 'mesh' else EventCode.LIGHTING_MODE
+        events.append((clock.time_of(step), make_event(code, node_id=node_id, old=old, new=new)))
+    with backend.batch():
+        backend.append_events(events)
+    return len(events)
+
+def save_results(result, path):
+    t = result.transitions
+    np.savez_compressed(path, start=result.start.isoformat(), steps=result.steps,
+                        node_ids=np.array(result.node_ids), final_pct=result.final_pct, min_pct=result.min_pct,
+                        mean_pct_by_step=result.mean_pct_by_step, mesh_mode_hours=result.mesh_mode_hours,
+                        lighting_mode_hours=result.lighting_mode_hours, dark_hours=result.dark_hours,
+                        down_hours=result.down_hours, all_up_steps=result.all_up_steps, transition_step=t.step,
+                        transition_node=t.node, transition_kind=t.kind, transition_old=t.old,
+                        transition_new=t.new)
+
+def summarize(result):
+    # Fleet-level metrics; per-pole hours are averaged over poles
+    hours, n = max(result.steps, 1), max(len(result.node_ids), 1)
+    return {
+        'nodes': len(result.node_ids),
+        'hours': result.steps,
+        'mean_final_pct': float(result.final_pct.mean()),
+        'min_pct': float(result.min_pct.min()),
+        'poles_ever_empty': int((result.min_pct <= 0).sum()),
+        'hours_dark': float(result.dark_hours.sum() / n),
+        'emergency_hours': float(result.lighting_mode_hours[:, LIGHTING_MODES.index('emergency')].sum() / n),
+        'critical_mesh_hours': float(result.mesh_mode_hours[:, MESH_MODES.index('critical')].sum() / n),
+        'mesh_uptime': result.all_up_steps / hours,
+        'node_availability': float(1 - result.down_hours.sum() / (hours * n)),
+        'transitions': int(len(result.transitions.step)),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Vectorized multi-pole RoadMesh simulation.')
+    parser.add_argument('--nodes', type=int, default=5000)
+    parser.add_argument('--days', type=float, default=365)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--start', default=None, help='ISO start time (default: now, on the hour)')
+    parser.add_argument('--output', default=None, help='write arrays to this .npz file')
+    parser.add_argument('--events', action='store_true', help='store mode transitions in the event log')
+    args = parser.parse_args(argv)
+    start = (datetime.fromisoformat(args.start) if args.start
+             else datetime.now().replace(minute=0, second=0, microsecond=0))
+    fleet = make_fleet(args.nodes, args.seed)
+    result = BatchSimulation(fleet, start, args.seed).run(int(args.days * 24))
+    if args.output:
+        save_results(result, args.output)
+    if args.events:
+        from roadmesh.persistence import get_backend
+        logger.info(f'Stored {write_results(result, get_backend())} transition events')
+    for key, value in summarize(result).items():
+        print(f'{key}: {value}')
+
+if __name__ == '__main__':
+    main()
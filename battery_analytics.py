@@ -0,0 +1,181 @@
+import math
+from collections import namedtuple
+from statistics import NormalDist
+
+import numpy as np
+
+from roadmesh.storage import to_epoch
+
+# Bulk battery analytics over typed arrays. Everything here works on whole
+# columns at once, so the cost per sample is a few NumPy operations rather
+# than a dict lookup and float() call per row.
+
+BatterySeries = namedtuple('BatterySeries', [
+    'timestamps',   # float64 epoch seconds, ascending
+    'voltage',      # float64, NaN where missing
+    'current',      # float64, NaN where missing
+    'charge_pct',   # float64, NaN where missing
+])
+
+HOUR = 3600.0
+LIGHTING_ON_CHARGE_PCT = 50
+STEADY_RATE = 1e-6  # pct/hour below which the trend counts as flat
+
+def empty_series():
+    empty = np.empty(0, np.float64)
+    return BatterySeries(empty, empty, empty, empty)
+
+def load_series(backend, since=None, until=None, limit=None):
+    # Typed arrays straight from the store, without per-row dicts
+    columns = backend.load_battery_columns(since, until, limit)
+    if columns is None:
+        return series_from_rows(backend.load_battery_history(since, until, limit))
+    return BatterySeries(*columns)
+
+def series_from_rows(rows):
+    # Build a BatterySeries from load_battery_history() style dict rows
+    def column(key):
+        return np.array([np.nan if row[key] in (None, '') else float(row[key]) for row in rows], np.float64)
+    timestamps = np.array([to_epoch(row['timestamp']) for row in rows], np.float64)
+    return BatterySeries(timestamps, column('voltage'), column('current'), column('charge_pct'))
+
+def _valid(series, column):
+    values = getattr(series, column)
+    mask = ~np.isnan(values) & ~np.isnan(series.timestamps)
+    return series.timestamps[mask], values[mask]
+
+def resample(series, seconds=HOUR, column='charge_pct'):
+    # Mean, min and max per fixed-width time bucket. Returns (bucket start
+    # times, mean, min, max); empty buckets are omitted.
+    if not (math.isfinite(seconds) and seconds > 0):
+        raise ValueError(f'Resample interval must be a positive number of seconds, got {seconds}')
+    t, y = _valid(series, column)
+    if not len(t):
+        empty = np.empty(0, np.float64)
+        return empty, empty, empty, empty
+    keys = np.floor(t / seconds).astype(np.int64)
+    if len(keys) > 1 and (keys[1:] < keys[:-1]).any():
+        order = np.argsort(keys, kind='stable')
+        keys, y = keys[order], y[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    counts = np.diff(np.r_[starts, len(keys)])
+    means = np.add.reduceat(y, starts) / counts
+    return (keys[starts] * seconds).astype(np.float64), means, np.minimum.reduceat(y, starts), \
+        np.maximum.reduceat(y, starts)
+
+def linear_fit(t, y):
+    # Ordinary least squares y = slope * t + intercept. Returns
+    # (slope, intercept, slope standard error, residual standard deviation).
+    n = len(t)
+    if n < 2:
+        return 0.0, float(y[0]) if n else 0.0, float('inf'), 0.0
+    t0 = t[0]
+    x = t - t0
+    x_mean, y_mean = x.mean(), y.mean()
+    dx = x - x_mean
+    sxx = np.dot(dx, dx)
+    if sxx == 0:
+        return 0.0, float(y_mean), float('inf'), 0.0
+    slope = np.dot(dx, y - y_mean) / sxx
+    intercept = y_mean - slope * x_mean - slope * t0
+    if n > 2:
+        residuals = y - (slope * x + (y_mean - slope * x_mean))
+        resid_std = np.sqrt(np.dot(residuals, residuals) / (n - 2))
+        slope_se = resid_std / np.sqrt(sxx)
+    else:
+        resid_std, slope_se = 0.0, float('inf')
+    return float(slope), float(intercept), float(slope_se), float(resid_std)
+
+def ewma_rate(t, y, halflife=6 * HOUR):
+    # Exponentially weighted mean of the per-interval rate dy/dt, weighting
+    # each interval by its age relative to the newest sample.
+    if len(t) < 2:
+        return 0.0
+    dt = np.diff(t)
+    ok = dt > 0
+    if not ok.any():
+        return 0.0
+    rates = np.diff(y)[ok] / dt[ok]
+    age = t[-1] - t[1:][ok]
+    weights = np.exp2(-age / halflife) * dt[ok]
+    return float(np.dot(weights, rates) / weights.sum())
+
+def z_score(confidence):
+    # Two-sided normal quantile, e.g. 1.96 for 0.95
+    if not 0 < confidence < 1:
+        raise ValueError(f'Confidence must be between 0 and 1, got {confidence}')
+    return NormalDist().inv_cdf((1 + confidence) / 2)
+
+def forecast(series, method='lstsq', since=None, confidence=0.95, halflife=6 * HOUR):
+    # Depletion / full-charge forecast from the charge trend. Rates are in
+    # percent per hour; `band` is the (earliest, latest) hours estimate at
+    # the requested confidence, from the least-squares slope error. The
+    # latest bound is None when the trend is not significant.
+    z = z_score(confidence)
+    t, y = _valid(series, 'charge_pct')
+    if since is not None:
+        keep = t >= since
+        t, y = t[keep], y[keep]
+    result = {'method': method, 'samples': int(len(t)), 'rate_pct_per_hour': None,
+              'direction': None, 'hours': None, 'band': None, 'last_charge': None}
+    if len(t) < 3:
+        return result
+    slope, _, slope_se, _ = linear_fit(t, y)
+    if method == 'ewma':
+        slope = ewma_rate(t, y, halflife)
+    elif method != 'lstsq':
+        raise ValueError(f'Unknown forecast method: {method}')
+    rate = slope * HOUR
+    last = float(y[-1])
+    result.update(rate_pct_per_hour=rate, last_charge=last)
+    if abs(rate) < STEADY_RATE:
+        result['direction'] = 'steady'
+        return result
+    remaining = max(last, 0.0) if rate < 0 else max(100.0 - last, 0.0)
+    result['direction'] = 'depleting' if rate < 0 else 'charging'
+    result['hours'] = remaining / abs(rate)
+    spread = z * slope_se * HOUR
+    fast, slow = abs(rate) + spread, abs(rate) - spread
+    result['band'] = (remaining / fast, remaining / slow if slow > 0 else None)
+    return result
+
+def energy_balance(series):
+    # Charge gained and lost between consecutive samples, time spent
+    # charging / discharging, and the current integrated over time (Ah).
+    t, y = _valid(series, 'charge_pct')
+    stats = {'samples': int(len(series.timestamps)), 'charge_gained_pct': 0.0, 'charge_lost_pct': 0.0,
+             'net_pct': 0.0, 'hours_charging': 0.0, 'hours_discharging': 0.0, 'hours_idle': 0.0,
+             'current_Ah': 0.0, 'lighting_on_samples': int(np.count_nonzero(y > LIGHTING_ON_CHARGE_PCT)),
+             'min_charge_pct': None, 'max_charge_pct': None, 'mean_charge_pct': None}
+    if len(y):
+        stats.update(min_charge_pct=float(y.min()), max_charge_pct=float(y.max()),
+                     mean_charge_pct=float(y.mean()))
+    if len(t) >= 2:
+        dy = np.diff(y)
+        hours = np.diff(t) / HOUR
+        stats['charge_gained_pct'] = float(dy[dy > 0].sum())
+        stats['charge_lost_pct'] = float(-dy[dy < 0].sum())
+        stats['net_pct'] = float(y[-1] - y[0])
+        stats['hours_charging'] = float(hours[dy > 0].sum())
+        stats['hours_discharging'] = float(hours[dy < 0].sum())
+        stats['hours_idle'] = float(hours[dy == 0].sum())
+    tc, current = _valid(series, 'current')
+    if len(tc) >= 2:
+        stats['current_Ah'] = float(np.sum((current[1:] + current[:-1]) * 0.5 * np.diff(tc)) / HOUR)
+    return stats
+
+def report(series, since=None, resample_seconds=HOUR, confidence=0.95):
+    # Everything the dashboard and JSON API show, in one call
+    times, mean, low, high = resample(series, resample_seconds)
+    return {
+        'forecast': forecast(series, 'lstsq', since, confidence),
+        'forecast_ewma': forecast(series, 'ewma', since, confidence),
+        'energy_balance': energy_balance(series),
+        'resampled': {
+            'seconds': resample_seconds,
+            'timestamps': times.tolist(),
+            'mean': mean.tolist(),
+            'min': low.tolist(),
+            'max': high.tolist(),
+        },
+    }
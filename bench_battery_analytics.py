@@ -0,0 +1,26 @@
+import time
+import numpy as np
+from roadmesh.monitoring import battery_analytics as ba
+
+# Bulk analytics over a 10M-sample synthetic battery history (one sample
+# every 3 seconds is roughly a year of data).
+SAMPLES = 10_000_000
+
+def timed(label, fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    print(f'{label:<28} {(time.perf_counter() - start) * 1000:>9.1f} ms')
+    return result
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    t = 1700000000.0 + np.arange(SAMPLES) * 3.0
+    hours = (t - t[0]) / 3600.0
+    charge = np.clip(60 + 30 * np.sin(hours * 2 * np.pi / 24) - hours * 0.001 + rng.normal(0, 0.5, SAMPLES), 0, 100)
+    current = np.gradient(charge) * 10
+    series = ba.BatterySeries(t, 3.0 + charge / 100 * 1.2, current, charge)
+    timed('resample (hourly)', ba.resample, series)
+    timed('forecast (least squares)', ba.forecast, series)
+    timed('forecast (EWMA)', ba.forecast, series, 'ewma')
+    timed('energy balance', ba.energy_balance, series)
+    timed('full report', ba.report, series)
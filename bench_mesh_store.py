@@ -0,0 +1,45 @@
+import time
+import tracemalloc
+from roadmesh.networking.mesh_manager import MeshNetworkManager
+from roadmesh.networking.mesh_store import MeshStore
+
+# Memory held by a highway mesh in the object-per-node manager versus the
+# array-backed store, and the cost of the reads a dashboard page makes.
+NODES = 50000
+PAGE_READS = 3  # get_topology()/get_node_statuses() calls per page
+
+def build(make):
+    tracemalloc.start()
+    mesh = make()
+    for i in range(NODES - 1):
+        mesh.add_link(f'node-{i}', f'node-{i + 1}', 90)
+        if i % 2 == 0 and i + 2 < NODES:
+            mesh.add_link(f'node-{i}', f'node-{i + 2}', 60)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return mesh, size
+
+def page(mesh):
+    start = time.perf_counter()
+    for _ in range(PAGE_READS):
+        mesh.get_topology()
+        mesh.get_node_statuses()
+    return time.perf_counter() - start
+
+def snapshot_page(mesh):
+    # The same information read from the shared snapshot's arrays
+    start = time.perf_counter()
+    for _ in range(PAGE_READS):
+        snapshot = mesh.snapshot()
+        snapshot.edges()
+        snapshot.all_up()
+        snapshot.down_nodes()
+    return time.perf_counter() - start
+
+if __name__ == '__main__':
+    for label, make in (('objects (MeshNetworkManager)', MeshNetworkManager), ('arrays (MeshStore)', MeshStore)):
+        mesh, size = build(make)
+        print(f'{label:<30} {size / NODES:>8.0f} bytes/node  {size / 2**20:>7.1f} MiB  '
+              f'page reads {page(mesh) * 1000:>7.1f} ms')
+    mesh.add_link('node-0', 'node-9', 50)  # the first snapshot_page read rebuilds
+    print(f"{'arrays, snapshot views':<30} {'':>36}  page reads {snapshot_page(mesh) * 1000:>7.1f} ms")
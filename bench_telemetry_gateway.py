@@ -0,0 +1,125 @@
+import argparse
+import asyncio
+import multiprocessing
+import random
+import socket
+import time
+from roadmesh.networking.telemetry_gateway import Reading, TelemetryGateway, encode_frame, encode_lines
+
+# Load generator for the telemetry gateway: client processes simulate poles
+# pushing batches over one transport for a fixed time, and the gateway
+# (in this process, with a counting sink) reports sustained readings/sec.
+POLES = 5000
+BATCH = 100
+SECONDS = 5.0
+
+
+def make_batch(poles, size):
+    now = time.time()
+    return [Reading(f'P-{random.randrange(poles)}', now, 12.0 + random.random(), random.random(),
+                    random.uniform(20, 100), 'UP' if random.random() > 0.01 else 'DOWN') for _ in range(size)]
+
+
+async def _stream(port, payload, deadline, token=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    sent = 0
+    while time.time() < deadline:
+        writer.write(payload)
+        await writer.drain()  # blocks while the gateway applies back-pressure
+        sent += 1
+    writer.close()
+    return sent
+
+
+async def _post(port, payload, deadline, token=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    auth = f'Authorization: Bearer {token}\r\n' if token else ''
+    request = (f'POST /telemetry HTTP/1.1\r\nHost: bench\r\n{auth}Content-Length: {len(payload)}\r\n\r\n').encode() + \
+        payload
+    sent = 0
+    while time.time() < deadline:
+        writer.write(request)
+        status = (await reader.readline()).split()[1]
+        length = 0
+        while True:
+            line = await reader.readline()
+            if line == b'\r\n':
+                break
+            if line.lower().startswith(b'content-length'):
+                length = int(line.split(b':')[1])
+        await reader.readexactly(length)
+        if status == b'202':
+            sent += 1
+        else:
+            await asyncio.sleep(0.05)
+    writer.close()
+    return sent
+
+
+def client(transport, port, poles, batch, seconds, connections, results, token=None):
+    # One process; returns batches sent through `results`. HTTP sends the
+    # token as a header, the others in every frame or line.
+    batches = [make_batch(poles, batch) for _ in range(16)]
+    body_token = None if transport == 'http' else token
+    if transport == 'ndjson':
+        payloads = [encode_lines(b, body_token) for b in batches]
+    else:
+        payloads = [encode_frame(b, body_token) for b in batches]
+    deadline = time.time() + seconds
+    if transport == 'udp':
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sent = 0
+        while time.time() < deadline:
+            sock.sendto(payloads[sent % len(payloads)], ('127.0.0.1', port))
+            sent += 1
+        results.put(sent)
+        return
+    send = _post if transport == 'http' else _stream
+
+    async def run():
+        return await asyncio.gather(*(send(port, payloads[i % len(payloads)], deadline, token)
+                                      for i in range(connections)))
+    results.put(sum(asyncio.run(run())))
+
+
+def bench(transport, poles=POLES, batch=BATCH, seconds=SECONDS, clients=1, connections=4, token=None):
+    flushed = []
+    gateway = TelemetryGateway(lambda readings: flushed.append(len(readings)), flush_interval=0.5, token=token)
+    ports = gateway.start_in_thread(host='127.0.0.1', tcp_port=0, udp_port=0, http_port=0)
+    port = ports['udp' if transport == 'udp' else 'http' if transport == 'http' else 'tcp']
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=client, args=(transport, port, poles, batch, seconds, connections, results,
+                                                          token))
+             for _ in range(clients)]
+    start = time.perf_counter()
+    for p in procs:
+        p.start()
+    sent = sum(results.get() for _ in procs) * batch
+    for p in procs:
+        p.join()
+    time.sleep(0.2)  # let the last datagrams and lines land
+    elapsed = time.perf_counter() - start
+    gateway.stop_thread()
+    stats = gateway.stats
+    print(f'{transport:<8} {stats["readings"] / elapsed:>12,.0f} readings/sec accepted '
+          f'({sent:,} sent, {stats["dropped"] * batch:,} dropped, {stats["coalesced"]:,} coalesced, '
+          f'{sum(flushed):,} node updates in {len(flushed)} flushes)')
+    return stats['readings'] / elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure telemetry gateway throughput.')
+    parser.add_argument('--transport', choices=['binary', 'ndjson', 'udp', 'http', 'all'], default='all')
+    parser.add_argument('--poles', type=int, default=POLES)
+    parser.add_argument('--batch', type=int, default=BATCH, help='readings per frame/request')
+    parser.add_argument('--seconds', type=float, default=SECONDS)
+    parser.add_argument('--clients', type=int, default=1, help='client processes')
+    parser.add_argument('--connections', type=int, default=4, help='connections per client process')
+    parser.add_argument('--token', default=None, help='run with gateway authentication on')
+    args = parser.parse_args(argv)
+    transports = ['binary', 'ndjson', 'udp', 'http'] if args.transport == 'all' else [args.transport]
+    for transport in transports:
+        bench(transport, args.poles, args.batch, args.seconds, args.clients, args.connections, args.token)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+import os
+import tempfile
+import time
+from datetime import datetime
+from roadmesh import persistence
+from roadmesh.storage import SQLiteBackend
+
+# Compares records/sec of the per-call persistence path against the
+# write-behind buffer, for both storage backends.
+RECORDS = 20000
+
+def run_hour(i):
+    persistence.append_battery_history(datetime.now(), 3.7, 0.2, i % 100)
+    persistence.save_battery_state(i * 0.001)
+    persistence.append_mesh_status({'A': ('UP', 'normal', 10), 'B': ('UP', 'reduced', 5)})
+    if i % 10 == 0:
+        persistence.append_event_log(f'Mesh mode changed to normal at {i}')
+
+def bench(label, make_backend, buffered):
+    with tempfile.TemporaryDirectory() as tmp:
+        previous = persistence.set_backend(make_backend(tmp))
+        try:
+            start = time.perf_counter()
+            if buffered:
+                with persistence.write_behind():
+                    for i in range(RECORDS):
+                        run_hour(i)
+            else:
+                for i in range(RECORDS):
+                    run_hour(i)
+                persistence.get_backend().sync()
+            elapsed = time.perf_counter() - start
+        finally:
+            persistence.get_backend().close()
+            persistence.set_backend(previous)
+    records = RECORDS * 3 + RECORDS // 10
+    print(f'{label:<24} {records / elapsed:>12,.0f} records/sec')
+
+if __name__ == '__main__':
+    bench('csv, per call', persistence.csv_backend, False)
+    bench('csv, write-behind', persistence.csv_backend, True)
+    bench('sqlite, per call', lambda d: SQLiteBackend(os.path.join(d, 'bench.db')), False)
+    bench('sqlite, write-behind', lambda d: SQLiteBackend(os.path.join(d, 'bench.db')), True)
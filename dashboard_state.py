@@ -0,0 +1,178 @@
+import json
+import threading
+import time
+
+# Versioned view of the dashboard state for /api/state and its diff/SSE
+# endpoints. Each subsystem is a section with a collect() callable. A
+# refresh re-collects the due sections, compares them with the previous
+# values, and stamps whatever changed with a new version. Clients then
+# fetch only what changed since the version they hold. Keyed sections
+# (nodes, lights, ...) are tracked per key, so one node changing state
+# sends that node and nothing else.
+
+MIN_REFRESH_INTERVAL = 1.0   # seconds; polls in between reuse the last refresh
+TOMBSTONE_LIMIT = 1024       # removed keys remembered for diffs
+HEARTBEAT_SECONDS = 15
+
+
+def _plain(value):
+    # JSON-ready copy: tuples become lists and dict keys strings. The copy
+    # also detaches the stored value from subsystem objects mutated in place.
+    if isinstance(value, dict):
+        return {str(k): _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    return value
+
+
+class StateTracker:
+    def __init__(self, min_interval=MIN_REFRESH_INTERVAL, tombstone_limit=TOMBSTONE_LIMIT):
+        self.min_interval = min_interval
+        self.tombstone_limit = tombstone_limit
+        self._sections = {}
+        self._values = {}
+        self._changed = {}
+        self._removed = {}
+        # Versions start at the process start time in milliseconds, so a
+        # version left over from a previous run falls below the floor and
+        # gets a full snapshot instead of a wrong diff
+        self.version = self._floor = int(time.time() * 1000)
+        self._last_refresh = None
+        self._cond = threading.Condition(threading.RLock())
+
+    def register(self, name, collect, ttl=0.0, keyed=False):
+        # ttl: minimum seconds between collections of this section, for
+        # expensive ones like health checks. keyed: collect() returns a
+        # mapping whose entries are diffed one by one.
+        with self._cond:
+            self._sections[name] = {'collect': collect, 'ttl': ttl, 'keyed': keyed, 'collected': None}
+
+    def invalidate(self, name=None):
+        # Force a re-collect on the next refresh, e.g. after a control action
+        with self._cond:
+            for section_name, section in self._sections.items():
+                if name is None or name == section_name:
+                    section['collected'] = None
+            self._last_refresh = None
+
+    def refresh(self, force=False):
+        with self._cond:
+            now = time.monotonic()
+            if not force and self._last_refresh is not None and now - self._last_refresh < self.min_interval:
+                return self.version
+            self._last_refresh = now
+            version = self.version + 1
+            changed = False
+            for name, section in self._sections.items():
+                if not force and section['collected'] is not None and now - section['collected'] < section['ttl']:
+                    continue
+                section['collected'] = now
+                value = _plain(section['collect']())
+                if section['keyed']:
+                    changed |= self._apply_keyed(name, value, version)
+                elif name not in self._values or self._values[name] != value:
+                    self._values[name] = value
+                    self._changed[name] = version
+                    changed = True
+            if changed:
+                self.version = version
+                self._cond.notify_all()
+            return self.version
+
+    def _apply_keyed(self, name, value, version):
+        old = self._values.get(name, {})
+        stamps = self._changed.setdefault(name, {})
+        removed = self._removed.setdefault(name, {})
+        changed = False
+        for key, item in value.items():
+            if key not in old or old[key] != item:
+                stamps[key] = version
+                removed.pop(key, None)
+                changed = True
+        for key in old.keys() - value.keys():
+            del stamps[key]
+            removed[key] = version
+            changed = True
+        self._values[name] = value
+        self._prune_tombstones()
+        return changed
+
+    def _prune_tombstones(self):
+        total = sum(len(r) for r in self._removed.values())
+        if total <= self.tombstone_limit:
+            return
+        stamps = sorted((v, name, key) for name, r in self._removed.items() for key, v in r.items())
+        for v, name, key in stamps[:total - self.tombstone_limit]:
+            del self._removed[name][key]
+            self._floor = max(self._floor, v)
+
+    # --- Queries ---
+    def keyed_sections(self):
+        with self._cond:
+            return [name for name, section in self._sections.items() if section['keyed']]
+
+    def snapshot(self):
+        with self._cond:
+            return {'version': self.version, 'full': True, 'state': _plain(self._values)}
+
+    def diff(self, since):
+        # Sections and keys changed after `since`; a full snapshot when
+        # `since` is missing, from the future, or older than the
+        # remembered removals
+        with self._cond:
+            if since is None or since < self._floor or since > self.version:
+                return self.snapshot()
+            changes, removed = {}, {}
+            for name, section in self._sections.items():
+                if name not in self._values:
+                    continue
+                if section['keyed']:
+                    items = {k: self._values[name][k] for k, v in self._changed[name].items() if v > since}
+                    gone = [k for k, v in self._removed[name].items() if v > since]
+                    if items:
+                        changes[name] = _plain(items)
+                    if gone:
+                        removed[name] = gone
+                elif self._changed[name] > since:
+                    changes[name] = _plain(self._values[name])
+            return {'version': self.version, 'full': False, 'since': since, 'changes': changes, 'removed': removed}
+
+    def wait(self, since, timeout=None):
+        # Block until the version moves past `since`; returns the version
+        with self._cond:
+            self._cond.wait_for(lambda: self.version > since, timeout)
+            return self.version
+
+
+# --- Server-Sent Events ---
+def sse_event(data, event=None, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    if event:
+        lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, separators=(",", ":"))}')
+    return '\n'.join(lines) + '\n\n'
+
+def event_stream(tracker, since=None, poll=MIN_REFRESH_INTERVAL, heartbeat=HEARTBEAT_SECONDS, max_seconds=None):
+    # Yields SSE frames: a snapshot (or a diff when resuming from
+    # `since`, e.g. Last-Event-ID), then a diff whenever the state moves.
+    # Refreshes are throttled inside the tracker, so any number of open
+    # streams cost one collection per interval.
+    started = last_sent = time.monotonic()
+    tracker.refresh()
+    payload = tracker.diff(since)
+    version = payload['version']
+    yield sse_event(payload, 'snapshot' if payload['full'] else 'diff', version)
+    while max_seconds is None or time.monotonic() - started < max_seconds:
+        tracker.refresh()
+        if tracker.version == version:
+            tracker.wait(version, poll)
+        if tracker.version != version:
+            payload = tracker.diff(version)
+            version = payload['version']
+            last_sent = time.monotonic()
+            yield sse_event(payload, 'snapshot' if payload['full'] else 'diff', version)
+        elif time.monotonic() - last_sent >= heartbeat:
+            last_sent = time.monotonic()
+            yield ': keepalive\n\n'
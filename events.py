@@ -0,0 +1,113 @@
+import re
+from collections import namedtuple
+from enum import IntEnum
+
+# Structured event records. Each event carries an integer code and
+# subsystem plus the node or light it concerns and the old/new value, so
+# counts and per-node lookups are index queries instead of text scans. The
+# human-readable message is rendered from those fields (or given
+# explicitly) and stored alongside them for display and substring search.
+
+
+class EventCode(IntEnum):
+    OTHER = 0
+    MESH_MODE = 1
+    LIGHTING_MODE = 2
+    LIGHTING_CONTROL = 3
+    NODE_STATUS = 4
+    NODE_POWER_MODE = 5
+    LINK_CHANGED = 6
+    USER_REGISTERED = 7
+    ALERT = 8
+
+
+class Subsystem(IntEnum):
+    SYSTEM = 0
+    BATTERY = 1
+    LIGHTING = 2
+    MESH = 3
+    USER = 4
+
+
+SUBSYSTEM = {
+    EventCode.OTHER: Subsystem.SYSTEM,
+    EventCode.MESH_MODE: Subsystem.MESH,
+    EventCode.LIGHTING_MODE: Subsystem.LIGHTING,
+    EventCode.LIGHTING_CONTROL: Subsystem.LIGHTING,
+    EventCode.NODE_STATUS: Subsystem.MESH,
+    EventCode.NODE_POWER_MODE: Subsystem.MESH,
+    EventCode.LINK_CHANGED: Subsystem.MESH,
+    EventCode.USER_REGISTERED: Subsystem.USER,
+    EventCode.ALERT: Subsystem.SYSTEM,
+}
+
+MESSAGES = {
+    EventCode.MESH_MODE: 'Mesh mode changed to {new}',
+    EventCode.LIGHTING_MODE: 'Lighting mode changed to {new}',
+    EventCode.LIGHTING_CONTROL: 'Lighting set to {new}',
+    EventCode.NODE_STATUS: 'Node {node_id} status changed from {old} to {new}',
+    EventCode.NODE_POWER_MODE: 'Node {node_id} power mode changed from {old} to {new}',
+    EventCode.LINK_CHANGED: 'Link {node_id} changed from {old} to {new}',
+    EventCode.USER_REGISTERED: 'User {new} registered',
+    EventCode.ALERT: 'Alert: {new}',
+}
+
+Event = namedtuple('Event', ['code', 'subsystem', 'node_id', 'old', 'new', 'value', 'message'])
+
+def make_event(code, node_id=None, old=None, new=None, value=None, message=None, subsystem=None):
+    code = EventCode(code)
+    if subsystem is None:
+        subsystem = SUBSYSTEM[code]
+    if message is None:
+        message = MESSAGES.get(code, '{new}').format(node_id=node_id, old=old, new=new, value=value)
+    return Event(code, Subsystem(subsystem), None if node_id is None else str(node_id),
+                 None if old is None else str(old), None if new is None else str(new),
+                 None if value is None else float(value), message)
+
+# Free-text messages, either written before events were structured or
+# read back from the CSV layout, which only keeps the message
+LEGACY_PATTERNS = (
+    (re.compile(r'Mesh mode changed to (?P<new>\S+)'), EventCode.MESH_MODE),
+    (re.compile(r'Lighting mode changed to (?P<new>\S+)'), EventCode.LIGHTING_MODE),
+    (re.compile(r'Lighting set to (?P<new>\S+)'), EventCode.LIGHTING_CONTROL),
+    (re.compile(r'Node (?P<node_id>\S+) status changed from (?P<old>\S+) to (?P<new>\S+)'), EventCode.NODE_STATUS),
+    (re.compile(r'Node (?P<node_id>\S+) power mode changed from (?P<old>\S+) to (?P<new>\S+)'),
+     EventCode.NODE_POWER_MODE),
+    (re.compile(r'Link (?P<node_id>\S+) changed from (?P<old>\S+) to (?P<new>\S+)'), EventCode.LINK_CHANGED),
+    (re.compile(r'User (?P<new>\S+) registered'), EventCode.USER_REGISTERED),
+    (re.compile(r'Alert: (?P<new>.+)', re.DOTALL), EventCode.ALERT),
+)
+
+def parse(message):
+    # Best-effort structure for a free-text message
+    for pattern, code in LEGACY_PATTERNS:
+        match = pattern.match(message)
+        if match:
+            return make_event(code, message=message, **match.groupdict())
+    return make_event(EventCode.OTHER, message=message)
+
+def as_event(event):
+    return event if isinstance(event, Event) else parse(event)
+
+def code_of(value):
+    # EventCode from an enum member, its number or its (case-insensitive) name
+    return _lookup(EventCode, value)
+
+def subsystem_of(value):
+    return _lookup(Subsystem, value)
+
+def _lookup(enum, value):
+    if isinstance(value, enum):
+        return value
+    try:
+        if isinstance(value, int) or (isinstance(value, str) and value.isdigit()):
+            return enum(int(value))
+        return enum[value.upper()]
+    except (KeyError, ValueError, AttributeError):
+        raise ValueError(f'Unknown {enum.__name__}: {value!r}')
+
+def type_name(code):
+    return EventCode(code).name.lower()
+
+def subsystem_name(subsystem):
+    return Subsystem(subsystem).name.lower()
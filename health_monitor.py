@@ -13,31 +13,80 @@ SMTP_PORT = 587
 SMTP_USER = 'alert@example.com'
 SMTP_PASS = 'yourpassword'
 
+# Scheduled check names -> the subsystem named in alerts
+SUBSYSTEMS = {'battery': 'Battery subsystem', 'lighting': 'Lighting subsystem', 'mesh': 'Mesh network',
+              'user': 'User service'}
+
 class HealthMonitor:
-    def __init__(self, battery, lighting, mesh, user_service):
+    def __init__(self, battery, lighting, mesh, user_service, connectivity=None, dispatcher=None,
+                 scheduler=None):
         self.battery = battery
         self.lighting = lighting
         self.mesh = mesh
         self.user_service = user_service
+        # Optional ConnectivityTracker following the mesh; answers without
+        # walking the graph
+        self.connectivity = connectivity
+        # Optional AlertDispatcher: alerts are queued, deduplicated and
+        # batched instead of sent inline
+        self.dispatcher = dispatcher
+        # Optional HealthScheduler: check_and_alert() reads its cached
+        # results instead of calling every health_check() inline
+        self.scheduler = scheduler
+
+    def schedule(self, scheduler, interval=None, timeout=None, alert=True):
+        # Register the subsystem checks with a HealthScheduler; with alert,
+        # any check turning unhealthy (or timing out) raises an alert at once
+        options = {k: v for k, v in (('interval', interval), ('timeout', timeout)) if v is not None}
+        scheduler.add('battery', self.battery.health_check, **options)
+        scheduler.add('lighting', self.lighting.health_check, **options)
+        scheduler.add('mesh', self.mesh.health_check, **options)
+        scheduler.add('user', self.user_service.health_check, **options)
+        if self.connectivity is not None:
+            # A partition with every node UP fails no subsystem check
+            scheduler.add('connectivity', self.connectivity.is_connected, **options)
+        if alert:
+            scheduler.subscribe(self._on_result)
+        self.scheduler = scheduler
+        return scheduler
+
+    def _on_result(self, result, previous):
+        watched = result.name in SUBSYSTEMS or result.name == 'connectivity'
+        if watched and not result.ok and (previous is None or previous.ok):
+            self.check_and_alert()
+
+    def _healthy(self):
+        if self.scheduler is not None:
+            status = self.scheduler.status()
+            return {name: status.get(name, True) for name in SUBSYSTEMS}
+        return {
+            'battery': self.battery.health_check(),
+            'lighting': self.lighting.health_check(),
+            'mesh': self.mesh.health_check(),
+            'user': self.user_service.health_check(),
+        }
 
     def check_and_alert(self):
-        issues = []
-        if not self.battery.health_check():
-            issues.append('Battery subsystem')
-        if not self.lighting.health_check():
-            issues.append('Lighting subsystem')
-        if not self.mesh.health_check():
-            issues.append('Mesh network')
-        if not self.user_service.health_check():
-            issues.append('User service')
+        healthy = self._healthy()
+        issues = [SUBSYSTEMS[name] for name in ('battery', 'lighting', 'mesh') if not healthy[name]]
+        keys = list(issues)  # dedup keys; stable while the same problem persists
+        if self.connectivity is not None and not self.connectivity.is_connected():
+            issues.append(f'Mesh partitioned into {self.connectivity.partition_count()} segments')
+            keys.append('Mesh partitioned')
+        if not healthy['user']:
+            issues.append(SUBSYSTEMS['user'])
+            keys.append(SUBSYSTEMS['user'])
         if issues:
             msg = f"ALERT: The following subsystems have issues: {', '.join(issues)}"
             logger.error(msg)
-            self.send_email_alert(msg)
+            self.send_email_alert(msg, keys)
         else:
             logger.info('All subsystems healthy')
 
-    def send_email_alert(self, message):
+    def send_email_alert(self, message, subsystems=None):
+        if self.dispatcher is not None:
+            self.dispatcher.submit(message, subsystems)
+            return
         try:
             msg = EmailMessage()
             msg['Subject'] = ALERT_EMAIL_SUBJECT
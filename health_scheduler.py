@@ -0,0 +1,226 @@
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from roadmesh.metrics import Family, LatencyHistogram, histogram_samples
+
+logger = logging.getLogger(__name__)
+
+# Health checks on a schedule instead of on demand. Each check runs every
+# `interval` seconds on a small thread pool; readers get the latest cached
+# result immediately and never wait on a subsystem. A check still running
+# after `timeout` is reported as failed (its thread cannot be killed, but
+# it is not started again until it returns), and checks marked exclusive
+# never overlap each other. Every run's duration goes into a per-check
+# latency histogram.
+
+CHECK_INTERVAL = 30
+CHECK_TIMEOUT = 5
+MAX_WORKERS = 4
+
+CheckResult = namedtuple('CheckResult', ['name', 'ok', 'checked_at', 'duration', 'error'])
+
+
+class _Check:
+    def __init__(self, name, func, interval, timeout, exclusive):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.timeout = timeout
+        self.exclusive = exclusive
+        self.next_due = 0.0
+        self.started = None  # clock() while a run is in flight
+        self.timed_out = False
+        self.future = None
+        self.result = None
+        self.latency = LatencyHistogram()
+        self.runs = self.failures = self.timeouts = 0
+
+
+class HealthScheduler:
+    def __init__(self, max_workers=MAX_WORKERS, clock=time.monotonic):
+        self.clock = clock
+        self._checks = {}
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix='health-check')
+        self._lock = threading.Lock()
+        self._exclusive = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._listeners = []
+
+    def add(self, name, func, interval=CHECK_INTERVAL, timeout=CHECK_TIMEOUT, exclusive=False):
+        with self._lock:
+            self._checks[name] = _Check(name, func, interval, timeout, exclusive)
+        self._wake.set()
+
+    def subscribe(self, listener):
+        # listener(result, previous) after every finished or timed-out run
+        self._listeners.append(listener)
+
+    # --- Scheduling ---
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='health-scheduler', daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._pool.shutdown(wait=False)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            delay = self._tick()
+            self._wake.wait(delay)
+            self._wake.clear()
+
+    def _tick(self):
+        # Start due checks, fail overdue ones; returns seconds to sleep
+        now = self.clock()
+        soonest = now + 1.0
+        with self._lock:
+            checks = list(self._checks.values())
+        for check in checks:
+            if check.started is not None:
+                deadline = check.started + check.timeout
+                if not check.timed_out and now >= deadline:
+                    self._timed_out(check)
+                elif not check.timed_out:
+                    soonest = min(soonest, deadline)
+            elif now >= check.next_due:
+                self._submit(check)
+                soonest = min(soonest, now + check.timeout)
+            else:
+                soonest = min(soonest, check.next_due)
+        return max(soonest - now, 0.01)
+
+    def _submit(self, check):
+        with self._lock:
+            if check.started is not None:
+                return None
+            check.started = self.clock()
+            check.timed_out = False
+            check.future = self._pool.submit(self._run, check)
+        return check.future
+
+    def _run(self, check):
+        started = time.perf_counter()
+        ok, error = False, None
+        try:
+            if check.exclusive:
+                with self._exclusive:
+                    ok = bool(check.func())
+            else:
+                ok = bool(check.func())
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+        self._finished(check, ok, error, time.perf_counter() - started)
+
+    def _finished(self, check, ok, error, duration):
+        with self._lock:
+            check.latency.observe(duration)
+            check.runs += 1
+            check.failures += not ok
+            late = check.timed_out
+            check.started = None
+            check.next_due = self.clock() + check.interval
+            previous, check.result = check.result, CheckResult(check.name, ok, time.time(), duration, error)
+        if late:
+            logger.warning(f'Health check {check.name} returned after {duration:.2f}s (timeout {check.timeout}s)')
+        self._notify(check.result, previous)
+        self._wake.set()
+
+    def _timed_out(self, check):
+        with self._lock:
+            if check.started is None or check.timed_out:
+                return
+            check.timed_out = True
+            check.timeouts += 1
+            previous = check.result
+            check.result = CheckResult(check.name, False, time.time(), check.timeout,
+                                       f'timed out after {check.timeout}s')
+        logger.error(f'Health check {check.name} timed out after {check.timeout}s')
+        self._notify(check.result, previous)
+
+    def _notify(self, result, previous):
+        for listener in list(self._listeners):
+            try:
+                listener(result, previous)
+            except Exception as e:
+                logger.error(f'Health listener failed: {e}')
+
+    def run_now(self, names=None, wait_for=None):
+        # Run the given (or all) checks immediately, waiting at most for the
+        # longest timeout; checks already in flight are waited for, not
+        # started twice
+        with self._lock:
+            checks = [c for n, c in self._checks.items() if names is None or n in names]
+        for check in checks:
+            self._submit(check)
+        futures = [c.future for c in checks if c.future is not None and not c.timed_out]
+        timeout = wait_for if wait_for is not None else max((c.timeout for c in checks), default=0)
+        wait(futures, timeout)
+        now = self.clock()
+        for check in checks:
+            if check.started is not None and not check.timed_out and now - check.started >= check.timeout:
+                self._timed_out(check)
+        return self.results()
+
+    # --- Reads ---
+    def results(self):
+        with self._lock:
+            return {name: check.result for name, check in self._checks.items() if check.result is not None}
+
+    def status(self):
+        # name -> bool from the cached results; runs everything once, in
+        # parallel, the first time so callers never see a missing check
+        self.start()
+        with self._lock:
+            pending = [name for name, check in self._checks.items() if check.result is None]
+        if pending:
+            self.run_now(pending)
+        with self._lock:
+            return {name: bool(check.result and check.result.ok) for name, check in self._checks.items()}
+
+    def report(self):
+        # Results plus timing per check, for the API
+        with self._lock:
+            return {name: {
+                'ok': check.result.ok if check.result else None,
+                'checked_at': check.result.checked_at if check.result else None,
+                'duration': check.result.duration if check.result else None,
+                'error': check.result.error if check.result else None,
+                'running': check.started is not None,
+                'interval': check.interval,
+                'timeout': check.timeout,
+                'runs': check.runs,
+                'failures': check.failures,
+                'timeouts': check.timeouts,
+                'latency': check.latency.snapshot(),
+            } for name, check in self._checks.items()}
+
+    def collect(self):
+        # Metrics families for roadmesh.metrics.REGISTRY.add_collector()
+        up, latency, runs, failures, timeouts = [], [], [], [], []
+        with self._lock:
+            for name, check in self._checks.items():
+                labels = {'check': name}
+                if check.result is not None:
+                    up.append(('roadmesh_health_check_up', labels, check.result.ok))
+                latency.extend(histogram_samples('roadmesh_health_check_seconds', labels, check.latency))
+                runs.append(('roadmesh_health_check_runs_total', labels, check.runs))
+                failures.append(('roadmesh_health_check_failures_total', labels, check.failures))
+                timeouts.append(('roadmesh_health_check_timeouts_total', labels, check.timeouts))
+        return [
+            Family('roadmesh_health_check_up', 'gauge', 'Latest health check result (1 healthy)', up),
+            Family('roadmesh_health_check_seconds', 'histogram', 'Health check run time', latency),
+            Family('roadmesh_health_check_runs_total', 'counter', 'Health check runs', runs),
+            Family('roadmesh_health_check_failures_total', 'counter', 'Failed health check runs', failures),
+            Family('roadmesh_health_check_timeouts_total', 'counter', 'Health checks past their timeout', timeouts),
+        ]
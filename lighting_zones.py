@@ -0,0 +1,184 @@
+import logging
+import re
+from collections import deque, namedtuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Per-light state for a whole corridor, held in two arrays (state code and
+# brightness %) instead of one object or list entry per light. Lights are
+# addressed by index, range or named zone; a batch of commands is applied
+# in one vectorized pass, and listeners hear only about the lights whose
+# state or level actually changed.
+
+STATES = ('OFF', 'DIM', 'ON', 'EMERGENCY')
+DEFAULT_LEVEL = {'OFF': 0, 'DIM': 40, 'ON': 100, 'EMERGENCY': 20}
+CHANGE_LOG_SIZE = 256  # batches kept for changes_since()
+
+Command = namedtuple('Command', ['target', 'state', 'level'])
+Command.__new__.__defaults__ = (None,)
+
+# indices, old/new state codes and new levels of the lights that changed
+LightChanges = namedtuple('LightChanges', ['version', 'indices', 'old_state', 'new_state', 'level'])
+
+_RANGE = re.compile(r'^\s*(\d+)\s*[-–:]\s*(\d+)\s*$')
+_STATE_NAMES = np.array(STATES, dtype=object)
+
+
+class LightingGrid:
+    def __init__(self, n, zones=None):
+        self.state = np.full(n, STATES.index('ON'), np.uint8)
+        self.level = np.full(n, DEFAULT_LEVEL['ON'], np.uint8)
+        self.zones = {}
+        self.version = 0
+        self._log = deque(maxlen=CHANGE_LOG_SIZE)
+        self._listeners = []
+        self._statuses = None
+        for name, lights in (zones or {}).items():
+            self.define_zone(name, lights)
+
+    def __len__(self):
+        return len(self.state)
+
+    # --- Addressing ---
+    def define_zone(self, name, lights):
+        self.zones[name] = self.select(lights)
+
+    def select(self, target):
+        # None/'all', a zone name, 'a-b' (inclusive), range, slice or a
+        # sequence of indices -> slice or index array
+        n = len(self.state)
+        if target is None or target == 'all':
+            return slice(0, n)
+        if isinstance(target, str):
+            if target in self.zones:
+                return self.zones[target]
+            match = _RANGE.match(target)
+            if not match:
+                raise ValueError(f'Unknown lights: {target}')
+            target = range(int(match.group(1)), int(match.group(2)) + 1)
+        if isinstance(target, range) and target.step == 1:
+            target = slice(target.start, target.stop)
+        if isinstance(target, slice):
+            start = 0 if target.start is None else target.start
+            stop = n if target.stop is None else target.stop
+            if not 0 <= start <= stop <= n:
+                raise ValueError(f'Lights out of range: {start}-{stop - 1}')
+            return slice(start, stop, target.step)
+        indices = np.asarray(target, np.intp)
+        if len(indices) and (indices.min() < 0 or indices.max() >= n):
+            raise ValueError('Lights out of range')
+        return indices
+
+    def _indices(self, selection):
+        if isinstance(selection, slice):
+            return np.arange(selection.start, selection.stop, selection.step or 1)
+        return selection
+
+    # --- Commands ---
+    def apply(self, commands):
+        # Later commands win where targets overlap. Returns the LightChanges.
+        parts, states, levels = [], [], []
+        for command in commands:
+            if command.state not in STATES:
+                raise ValueError(f'Unknown light state: {command.state}')
+            level = DEFAULT_LEVEL[command.state] if command.level is None else int(command.level)
+            if not 0 <= level <= 100:
+                raise ValueError(f'Light level out of range: {level}')
+            indices = self._indices(self.select(command.target))
+            parts.append(indices)
+            states.append(np.full(len(indices), STATES.index(command.state), np.uint8))
+            levels.append(np.full(len(indices), level, np.uint8))
+        if not parts:
+            empty = np.empty(0, np.uint8)
+            return self._changes(np.empty(0, np.intp), empty, empty, empty)
+        indices, states, levels = np.concatenate(parts), np.concatenate(states), np.concatenate(levels)
+        if len(parts) > 1:
+            # Keep the last write to each light
+            indices, last = np.unique(indices[::-1], return_index=True)
+            states, levels = states[::-1][last], levels[::-1][last]
+        changed = (self.state[indices] != states) | (self.level[indices] != levels)
+        indices, states, levels = indices[changed], states[changed], levels[changed]
+        old = self.state[indices]
+        if len(indices):
+            self.state[indices] = states
+            self.level[indices] = levels
+        return self._changes(indices, old, states, levels)
+
+    def set(self, target, state, level=None):
+        return self.apply([Command(target, state, level)])
+
+    def _changes(self, indices, old, new, level):
+        if not len(indices):
+            return LightChanges(self.version, indices, old, new, level)
+        self.version += 1
+        self._statuses = None
+        changes = LightChanges(self.version, indices, old, new, level)
+        self._log.append(changes)
+        for listener in list(self._listeners):
+            try:
+                listener(changes)
+            except Exception as e:
+                logger.error(f'Lighting listener failed: {e}')
+        return changes
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+        return listener
+
+    def unsubscribe(self, listener):
+        self._listeners.remove(listener)
+
+    # --- Reads ---
+    def changes_since(self, version):
+        # Indices changed after `version`, or None when the log no longer
+        # reaches back that far (read everything instead)
+        if version >= self.version:
+            return np.empty(0, np.intp)
+        if not self._log or self._log[0].version > version + 1:
+            return None
+        return np.unique(np.concatenate([c.indices for c in self._log if c.version > version]))
+
+    def statuses(self):
+        # [(index, state)] like LightingController.get_light_statuses(),
+        # built once per change and shared between readers
+        if self._statuses is None:
+            self._statuses = tuple(enumerate(_STATE_NAMES[self.state].tolist()))
+        return self._statuses
+
+    def describe(self, indices):
+        indices = np.asarray(indices, np.intp)
+        return {int(i): (s, int(l)) for i, s, l in
+                zip(indices.tolist(), _STATE_NAMES[self.state[indices]].tolist(), self.level[indices].tolist())}
+
+    def counts(self):
+        return dict(zip(STATES, np.bincount(self.state, minlength=len(STATES)).tolist()))
+
+    # --- LightingController integration ---
+    def attach(self, controller):
+        # Corridor-wide controller actions become one batch on the grid, and
+        # get_light_statuses() reads the grid's shared statuses
+        current = {}
+        for i, state in controller.get_light_statuses():
+            current.setdefault(state, []).append(i)
+        self.apply([Command(lights, state) for state, lights in current.items() if state in STATES])
+        actions = {'turn_on': 'ON', 'turn_off': 'OFF', 'dim': 'DIM'}
+        for name, state in actions.items():
+            original = getattr(controller, name)
+            def hooked(*args, _original=original, _state=state, **kwargs):
+                result = _original(*args, **kwargs)
+                self.set('all', _state)
+                return result
+            setattr(controller, name, hooked)
+        if hasattr(controller, 'update'):
+            update = controller.update
+            def updated(*args, **kwargs):
+                before = controller.state
+                result = update(*args, **kwargs)
+                if controller.state != before and controller.state in STATES:
+                    self.set('all', controller.state)
+                return result
+            controller.update = updated
+        controller.get_light_statuses = self.statuses
+        return controller
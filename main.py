@@ -8,9 +8,12 @@ from roadmesh.monitoring.energy import EnergyHarvestMonitor
 from roadmesh.monitoring.load import LoadController
 from roadmesh.monitoring.lighting import LightingController
 from roadmesh.monitoring.power_management import PowerManagement
+from roadmesh.monitoring.power_scheduler import PoleScheduler
 from roadmesh.networking.mesh_manager import MeshNetworkManager
 from roadmesh.networking.user_service import UserServiceManager
-from roadmesh.persistence import append_mesh_status, append_event_log
+from roadmesh.persistence import append_mesh_status, record_event, write_behind
+from roadmesh.events import EventCode
+from roadmesh.metrics import histogram
 
 logging.basicConfig(
     level=logging.INFO,
@@ -18,7 +21,10 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def simulate_system(days=1):
+STEP_SECONDS = histogram('roadmesh_simulation_step_seconds', 'One simulated hour of simulate_system()')
+POWER_UPDATE_SECONDS = histogram('roadmesh_power_update_seconds', 'PowerManagement.update() time')
+
+def simulate_system(days=1, planned=False):
     # Initialize modules
     battery = BatteryChargeMonitoring(capacity_Ah=5.0, consumption_rate=0.2)
     energy = EnergyHarvestMonitor()
@@ -27,6 +33,8 @@ def simulate_system(days=1):
     mesh = MeshNetworkManager()
     user_service = UserServiceManager()
     power_mgmt = PowerManagement(battery, lighting, mesh, load_ctrl)
+    # Look-ahead modes instead of the instantaneous thresholds
+    scheduler = PoleScheduler(battery, energy, power_mgmt, lighting, mesh) if planned else None
 
     # Example mesh setup
     mesh.add_node('A')
@@ -42,24 +50,31 @@ def simulate_system(days=1):
     curr = start
     last_mesh_mode = None
     last_lighting_mode = None
-    while curr < end:
-        logger.info(f"Simulating hour: {curr}")
-        energy.read_solar()
-        energy.read_teg()
-        battery.simulate_charge()
-        battery.simulate_discharge()
-        battery.read_voltage()
-        power_mgmt.update()
-        # Track mesh node statuses for uptime analytics
-        append_mesh_status(mesh.get_node_statuses())
-        # Log mode changes
-        if power_mgmt.mode != last_mesh_mode:
-            append_event_log(f"Mesh mode changed to {power_mgmt.mode} at {curr}")
-            last_mesh_mode = power_mgmt.mode
-        if power_mgmt.lighting_mode != last_lighting_mode:
-            append_event_log(f"Lighting mode changed to {power_mgmt.lighting_mode} at {curr}")
-            last_lighting_mode = power_mgmt.lighting_mode
-        curr += timedelta(hours=1)
+    with write_behind():
+        while curr < end:
+            with STEP_SECONDS.time():
+                logger.debug(f"Simulating hour: {curr}")
+                harvest_A = energy.read_solar() + energy.read_teg()
+                battery.simulate_charge()
+                battery.simulate_discharge()
+                battery.read_voltage()
+                with POWER_UPDATE_SECONDS.time():
+                    if scheduler:
+                        scheduler.update(curr, harvest_A)
+                    else:
+                        power_mgmt.update()
+                # Track mesh node statuses for uptime analytics
+                append_mesh_status(mesh.get_node_statuses())
+                # Log mode changes
+                if power_mgmt.mode != last_mesh_mode:
+                    record_event(EventCode.MESH_MODE, old=last_mesh_mode, new=power_mgmt.mode,
+                                 message=f"Mesh mode changed to {power_mgmt.mode} at {curr}")
+                    last_mesh_mode = power_mgmt.mode
+                if power_mgmt.lighting_mode != last_lighting_mode:
+                    record_event(EventCode.LIGHTING_MODE, old=last_lighting_mode, new=power_mgmt.lighting_mode,
+                                 message=f"Lighting mode changed to {power_mgmt.lighting_mode} at {curr}")
+                    last_lighting_mode = power_mgmt.lighting_mode
+            curr += timedelta(hours=1)
 
     logger.info('Simulation complete')
     mesh.print_topology()
@@ -0,0 +1,236 @@
+import itertools
+
+from roadmesh.networking.mesh_routing import MeshGraph
+
+# Connected components of the usable mesh (nodes not DOWN, links with a
+# positive quality), kept up to date as links and nodes change:
+#   - a new link merges two components, smaller into larger
+#   - a lost link that is known not to be a bridge changes nothing
+#   - any other lost link runs two searches, one from each end, in lock
+#     step; they either meet (still connected) or the smaller side runs
+#     out first and becomes a component of its own
+#   - a node going down leaves its component; unless it is known not to be
+#     an articulation point, its old neighbours are checked the same way
+# Articulation points and bridges are worked out per component, and only
+# again for components that changed since they were last asked for.
+
+
+class ConnectivityTracker(MeshGraph):
+    def __init__(self):
+        super().__init__()
+        self._component = {}  # node -> component id, for usable nodes only
+        self._members = {}  # component id -> set of nodes
+        self._critical = {}  # component id -> (articulation points, bridges)
+        self._ids = itertools.count()
+        self.version = 0
+
+    # --- Graph changes ---
+    def link_up(self, u, v):
+        quality = self._links.get(u, {}).get(v)
+        return bool(quality) and quality > 0 and self.usable(u) and self.usable(v)
+
+    def _up_neighbors(self, node):
+        return [n for n in self._links.get(node, ()) if self.link_up(node, n)]
+
+    def _change(self, edges, apply, nodes=()):
+        before = {(u, v): self.link_up(u, v) for u, v in edges}
+        apply()
+        touched = set(nodes)
+        for u, v in edges:
+            touched.update((u, v))
+        for node in touched:
+            if self.usable(node) and node in self._links and node not in self._component:
+                self._new_component({node})
+        orphaned = {}  # node that went down -> neighbours it was linked to
+        for (u, v), was_up in before.items():
+            now_up = self.link_up(u, v)
+            if now_up and not was_up:
+                self._join(u, v)
+            elif was_up and not now_up:
+                if self.usable(u) and self.usable(v):
+                    self._cut(u, v)
+                else:
+                    down, other = (u, v) if not self.usable(u) else (v, u)
+                    orphaned.setdefault(down, []).append(other)
+        for node in touched:
+            if not self.usable(node) and node in self._component:
+                self._node_down(node, orphaned.get(node, ()))
+
+    def add_node(self, node):
+        super().add_node(node)
+        if self.usable(node) and node not in self._component:
+            self._new_component({node})
+
+    def _new_component(self, nodes):
+        cid = next(self._ids)
+        self._members[cid] = nodes
+        for node in nodes:
+            self._component[node] = cid
+        self.version += 1
+        return cid
+
+    def _dirty(self, cid):
+        self._critical.pop(cid, None)
+        self.version += 1
+
+    def _join(self, u, v):
+        cu, cv = self._component[u], self._component[v]
+        if cu == cv:
+            self._dirty(cu)
+            return
+        if len(self._members[cu]) < len(self._members[cv]):
+            cu, cv = cv, cu
+        moved = self._members.pop(cv)
+        self._critical.pop(cv, None)
+        for node in moved:
+            self._component[node] = cu
+        self._members[cu] |= moved
+        self._dirty(cu)
+
+    def _cut(self, u, v):
+        cid = self._component[u]
+        critical = self._critical.get(cid)
+        self._dirty(cid)
+        if critical is None or frozenset((u, v)) in critical[1]:
+            self._split(u, v)
+
+    def _split(self, u, v):
+        # True if u and v are still connected; otherwise the smaller side
+        # becomes a component of its own
+        side = self._split_side(u, v)
+        if side is None:
+            return True
+        self._members[self._component[u]] -= side
+        self._new_component(side)
+        return False
+
+    def _node_down(self, node, neighbors):
+        # The node leaves its component; unless it is known not to be an
+        # articulation point, check which of its old neighbours still
+        # reach each other
+        cid = self._component.pop(node)
+        critical = self._critical.get(cid)
+        self._members[cid].discard(node)
+        if not self._members[cid]:
+            del self._members[cid]
+        self._dirty(cid)
+        if critical is not None and node not in critical[0]:
+            return
+        anchors = []  # one neighbour per component seen so far
+        for neighbor in neighbors:
+            for anchor in anchors:
+                if self.connected(anchor, neighbor) and self._split(anchor, neighbor):
+                    break
+            else:
+                anchors.append(neighbor)
+
+    def _split_side(self, u, v):
+        # Grow both searches one node at a time; returns the nodes on the
+        # side that ran out first, or None if the two ends still connect
+        seen = ({u}, {v})
+        frontiers = ([u], [v])
+        while True:
+            for i in (0, 1):
+                if not frontiers[i]:
+                    return seen[i]
+                node = frontiers[i].pop()
+                for neighbor in self._up_neighbors(node):
+                    if neighbor in seen[1 - i]:
+                        return None
+                    if neighbor not in seen[i]:
+                        seen[i].add(neighbor)
+                        frontiers[i].append(neighbor)
+
+    def remove_node(self, node):
+        # Going down first settles the split in one pass instead of one
+        # search per link
+        if node in self._links and self.usable(node):
+            self.set_node(node, status='DOWN')
+        super().remove_node(node)
+
+    # --- Queries ---
+    def partition_count(self):
+        return len(self._members)
+
+    def is_connected(self):
+        return len(self._members) <= 1
+
+    def component(self, node):
+        # Nodes reachable from `node`, empty if it is down or unknown
+        cid = self._component.get(node)
+        return set(self._members[cid]) if cid is not None else set()
+
+    def connected(self, a, b):
+        cid = self._component.get(a)
+        return cid is not None and cid == self._component.get(b)
+
+    def partitions(self):
+        # Connected segments, largest first
+        return sorted((set(m) for m in self._members.values()), key=len, reverse=True)
+
+    def down_nodes(self):
+        return {node for node in self._links if not self.usable(node)}
+
+    def down_count(self):
+        # Every known node that is not down sits in some component
+        return len(self._links) - len(self._component)
+
+    def cut_off(self, roots):
+        # Usable nodes with no path to any of `roots` (e.g. the gateways)
+        reached = {self._component[r] for r in roots if r in self._component}
+        return {node for cid, members in self._members.items() if cid not in reached for node in members}
+
+    def critical_nodes(self):
+        # Nodes whose loss would split their segment
+        return set().union(*(self._critical_of(cid)[0] for cid in self._members))
+
+    def bridges(self):
+        # Links whose loss would split their segment
+        return set().union(*(self._critical_of(cid)[1] for cid in self._members))
+
+    def _critical_of(self, cid):
+        critical = self._critical.get(cid)
+        if critical is None:
+            critical = self._critical[cid] = self._biconnected(next(iter(self._members[cid])))
+        return critical
+
+    def _biconnected(self, root):
+        # Iterative Tarjan over one component
+        index, low = {root: 0}, {root: 0}
+        points, bridges = set(), set()
+        root_children = 0
+        stack = [(root, None, iter(self._up_neighbors(root)))]
+        while stack:
+            node, parent, neighbors = stack[-1]
+            for neighbor in neighbors:
+                if neighbor == parent:
+                    continue
+                if neighbor in index:
+                    low[node] = min(low[node], index[neighbor])
+                else:
+                    index[neighbor] = low[neighbor] = len(index)
+                    stack.append((neighbor, node, iter(self._up_neighbors(neighbor))))
+                    break
+            else:
+                stack.pop()
+                if parent is None:
+                    continue
+                low[parent] = min(low[parent], low[node])
+                if low[node] > index[parent]:
+                    bridges.add(frozenset((parent, node)))
+                if parent == root:
+                    root_children += 1
+                elif low[node] >= index[parent]:
+                    points.add(parent)
+        if root_children > 1:
+            points.add(root)
+        return frozenset(points), frozenset(bridges)
+
+    def summary(self, roots=()):
+        # Cheap health view: counts only, plus the cut-off nodes when roots
+        # are given
+        summary = {'partitions': self.partition_count(), 'connected': self.is_connected(),
+                   'down': self.down_count()}
+        if roots:
+            summary['cut_off'] = sorted(map(str, self.cut_off(roots)))
+        return summary
@@ -0,0 +1,343 @@
+import os
+import struct
+from collections import namedtuple
+from datetime import datetime
+
+import numpy as np
+
+# Binary mesh status history. Node ids, status strings and power modes are
+# dictionary-encoded; each tick is stored column-wise as parallel arrays
+# (node index, status code, power mode code, bandwidth). Ticks are written as
+# delta frames holding only the nodes that changed, with a full keyframe
+# every KEYFRAME_INTERVAL ticks.
+#
+# Layout: MAGIC, then frames of FRAME header + payload.
+#   b'N' / b'S' / b'P'  new node / status / power mode names (count names,
+#                       each <H length + utf-8)
+#   b'K' / b'D'         keyframe / delta: uint32 node[count], uint8
+#                       status[count], uint8 mode[count], float32
+#                       bandwidth[count]
+# Code 0 in the status and mode columns means "node not present".
+# Timestamps are epoch seconds throughout.
+
+MAGIC = b'RMSH\x01'
+FRAME = struct.Struct('<cdI')
+NAME_LEN = struct.Struct('<H')
+KEYFRAME_INTERVAL = 256
+ABSENT = 0
+
+_NAME_KINDS = {b'N': 'nodes', b'S': 'statuses', b'P': 'power_modes'}
+
+MeshStatusArrays = namedtuple('MeshStatusArrays', [
+    'timestamps',   # float64[T], epoch seconds
+    'node_ids',     # list of N node ids, column order
+    'status',       # uint8[T, N] codes into status_names
+    'power_mode',   # uint8[T, N] codes into power_mode_names
+    'bandwidth',    # float32[T, N]
+    'status_names',
+    'power_mode_names',
+])
+
+def status_code(arrays, status):
+    # Code for a status string, or -1 if it never occurs in the history
+    try:
+        return arrays.status_names.index(status)
+    except ValueError:
+        return -1
+
+
+def _payload_size(kind, count, data, offset):
+    if kind in _NAME_KINDS:
+        size = 0
+        for _ in range(count):
+            if offset + size + NAME_LEN.size > len(data):
+                return None
+            (n,) = NAME_LEN.unpack_from(data, offset + size)
+            size += NAME_LEN.size + n
+        return size
+    return count * 10
+
+def _parse(data, names=None, resume=False):
+    # Returns (names, frames, end) where frames is a list of
+    # (kind, timestamp, nodes, status, mode, bandwidth) views into `data`
+    # and `end` is the offset just past the last complete frame. With
+    # `resume`, `data` starts at a frame boundary of an already parsed file
+    # and `names` holds the name tables seen up to there.
+    if names is None:
+        names = {'nodes': [], 'statuses': [None], 'power_modes': [None]}
+    frames = []
+    offset = 0
+    if not resume:
+        if len(data) < len(MAGIC):
+            return names, frames, 0
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError('Not a mesh status history file')
+        offset = len(MAGIC)
+    while offset + FRAME.size <= len(data):
+        kind, ts, count = FRAME.unpack_from(data, offset)
+        start = offset + FRAME.size
+        size = _payload_size(kind, count, data, start)
+        if size is None or start + size > len(data):
+            break
+        if kind in _NAME_KINDS:
+            table = names[_NAME_KINDS[kind]]
+            pos = start
+            for _ in range(count):
+                (n,) = NAME_LEN.unpack_from(data, pos)
+                table.append(bytes(data[pos + NAME_LEN.size:pos + NAME_LEN.size + n]).decode())
+                pos += NAME_LEN.size + n
+        elif kind in (b'K', b'D'):
+            pos = start
+            nodes = np.frombuffer(data, np.uint32, count, pos)
+            pos += 4 * count
+            status = np.frombuffer(data, np.uint8, count, pos)
+            pos += count
+            mode = np.frombuffer(data, np.uint8, count, pos)
+            pos += count
+            bandwidth = np.frombuffer(data, np.float32, count, pos)
+            frames.append((kind, ts, nodes, status, mode, bandwidth))
+        else:
+            raise ValueError(f'Corrupt mesh status history frame at offset {offset}')
+        offset = start + size
+    return names, frames, offset
+
+
+class MeshHistoryWriter:
+    def __init__(self, path, keyframe_interval=KEYFRAME_INTERVAL):
+        self.path = path
+        self.keyframe_interval = keyframe_interval
+        self._codes = {'nodes': {}, 'statuses': {None: ABSENT}, 'power_modes': {None: ABSENT}}
+        self._state = {}
+        self._since_keyframe = keyframe_interval
+        self.count = 0
+        self._recover()
+        self._file = open(path, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+
+    def _recover(self):
+        # Rebuild the dictionaries and last state from an existing file and
+        # drop any partially written trailing frame
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        names, frames, end = _parse(data)
+        for table, values in names.items():
+            self._codes[table] = {name: i for i, name in enumerate(values)}
+        state = {}
+        for kind, _, nodes, status, mode, bandwidth in frames:
+            if kind == b'K':
+                state = {}
+                self._since_keyframe = 0
+            for i, s, m, bw in zip(nodes.tolist(), status.tolist(), mode.tolist(), bandwidth.tolist()):
+                if s == ABSENT:
+                    state.pop(i, None)
+                else:
+                    state[i] = (s, m, bw)
+            self._since_keyframe += 1
+        self._state = state
+        self.count = len(frames)
+        if end < len(data):
+            with open(self.path, 'r+b') as f:
+                f.truncate(end)
+
+    def _code(self, table, kind, name, out):
+        # Names are stored as text and read back as text, so the table is
+        # keyed by text too: node 1 keeps its code across a restart. None
+        # stays the "not present" entry where the table has one.
+        codes = self._codes[table]
+        key = name if name is None and None in codes else str(name)
+        code = codes.get(key)
+        if code is None:
+            code = codes[key] = len(codes)
+            encoded = key.encode()
+            out += FRAME.pack(kind, 0.0, 1) + NAME_LEN.pack(len(encoded)) + encoded
+        return code
+
+    def append(self, timestamp, node_statuses):
+        self.append_many([(timestamp, node_statuses)])
+
+    def append_many(self, rows):
+        # Encode every row and write them with a single write() call
+        out = bytearray()
+        for timestamp, node_statuses in rows:
+            state = {}
+            for node, (status, power_mode, bandwidth) in node_statuses.items():
+                state[self._code('nodes', b'N', node, out)] = (
+                    self._code('statuses', b'S', status, out),
+                    self._code('power_modes', b'P', power_mode, out),
+                    float(bandwidth or 0))
+            if self._since_keyframe >= self.keyframe_interval:
+                kind, changed = b'K', state
+                self._since_keyframe = 0
+            else:
+                kind = b'D'
+                changed = {i: v for i, v in state.items() if self._state.get(i) != v}
+                for i in self._state.keys() - state.keys():
+                    changed[i] = (ABSENT, ABSENT, 0.0)
+            self._since_keyframe += 1
+            self._state = state
+            ids = sorted(changed)
+            out += FRAME.pack(kind, timestamp, len(ids))
+            out += np.array(ids, np.uint32).tobytes()
+            out += np.array([changed[i][0] for i in ids], np.uint8).tobytes()
+            out += np.array([changed[i][1] for i in ids], np.uint8).tobytes()
+            out += np.array([changed[i][2] for i in ids], np.float32).tobytes()
+            self.count += 1
+        self._file.write(out)
+        self._file.flush()
+
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def _replay(frames, rows, n_nodes, state=None):
+    # Apply frames[0..rows[-1]] to `state` (current status, mode and
+    # bandwidth per node) and capture the state after each frame in `rows`
+    status = np.zeros((len(rows), n_nodes), np.uint8)
+    mode = np.zeros((len(rows), n_nodes), np.uint8)
+    bandwidth = np.zeros((len(rows), n_nodes), np.float32)
+    cur_status = np.zeros(n_nodes, np.uint8)
+    cur_mode = np.zeros(n_nodes, np.uint8)
+    cur_bandwidth = np.zeros(n_nodes, np.float32)
+    if state is not None:
+        n = len(state[0])
+        cur_status[:n], cur_mode[:n], cur_bandwidth[:n] = state
+    out = 0
+    for i in range(int(rows[-1]) + 1 if len(rows) else len(frames)):
+        kind, _, nodes, s, m, bw = frames[i]
+        if kind == b'K':
+            cur_status[:] = ABSENT
+            cur_mode[:] = ABSENT
+            cur_bandwidth[:] = 0
+        cur_status[nodes] = s
+        cur_mode[nodes] = m
+        cur_bandwidth[nodes] = bw
+        if out < len(rows) and rows[out] == i:
+            status[out] = cur_status
+            mode[out] = cur_mode
+            bandwidth[out] = cur_bandwidth
+            out += 1
+    return status, mode, bandwidth, (cur_status, cur_mode, cur_bandwidth)
+
+def _read(path, offset=0):
+    if not os.path.exists(path):
+        return b''
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        return f.read()
+
+def read_arrays(path, since=None, until=None, limit=None):
+    # Decode the history into dense [T, N] arrays, one row per tick
+    names, frames, _ = _parse(_read(path))
+    timestamps = np.array([frame[1] for frame in frames], np.float64)
+    keep = np.ones(len(frames), bool)
+    if since is not None:
+        keep &= timestamps >= since
+    if until is not None:
+        keep &= timestamps < until
+    rows = np.flatnonzero(keep)
+    if limit is not None:
+        rows = rows[-limit:] if limit > 0 else rows[:0]
+    start = 0
+    if len(rows):
+        # Replay from the last keyframe at or before the first wanted tick
+        start = int(rows[0])
+        while start > 0 and frames[start][0] != b'K':
+            start -= 1
+    status, mode, bandwidth, _ = _replay(frames[start:] if len(rows) else [], rows - start,
+                                        len(names['nodes']))
+    return MeshStatusArrays(timestamps[rows], names['nodes'], status, mode, bandwidth,
+                            names['statuses'], names['power_modes'])
+
+def read_since(path, position=None):
+    # Incremental reader: decode only the frames appended after `position`,
+    # the value returned by the previous call (None to start from the top).
+    # Positions are plain JSON-serializable dicts so callers can checkpoint
+    # them. Returns (arrays, position).
+    if position is not None and (not os.path.exists(path) or os.path.getsize(path) < position['offset']):
+        position = None  # file was replaced; start over
+    if position is None:
+        names, offset, state = None, 0, None
+    else:
+        names = {table: list(position[table]) for table in ('nodes', 'statuses', 'power_modes')}
+        offset = position['offset']
+        state = (np.array(position['status'], np.uint8), np.array(position['power_mode'], np.uint8),
+                 np.array(position['bandwidth'], np.float32))
+    names, frames, consumed = _parse(_read(path, offset), names, resume=offset > 0)
+    rows = np.arange(len(frames))
+    status, mode, bandwidth, state = _replay(frames, rows, len(names['nodes']), state)
+    arrays = MeshStatusArrays(np.array([frame[1] for frame in frames], np.float64), names['nodes'],
+                              status, mode, bandwidth, names['statuses'], names['power_modes'])
+    position = dict(names, offset=offset + consumed,
+                    status=state[0].tolist(), power_mode=state[1].tolist(), bandwidth=state[2].tolist())
+    return arrays, position
+
+def iter_arrays(path, since=None, until=None, chunk_size=1024):
+    # Same ticks as read_arrays(), as MeshStatusArrays of at most chunk_size
+    # ticks. Only the compact frames are held in full; the dense [T, N]
+    # arrays are decoded one chunk at a time.
+    names, frames, _ = _parse(_read(path))
+    timestamps = np.array([frame[1] for frame in frames], np.float64)
+    keep = np.ones(len(frames), bool)
+    if since is not None:
+        keep &= timestamps >= since
+    if until is not None:
+        keep &= timestamps < until
+    rows = np.flatnonzero(keep)
+    if not len(rows):
+        return
+    position = int(rows[0])
+    while position > 0 and frames[position][0] != b'K':
+        position -= 1
+    state = None
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        status, mode, bandwidth, state = _replay(frames[position:int(chunk[-1]) + 1], chunk - position,
+                                                len(names['nodes']), state)
+        position = int(chunk[-1]) + 1
+        yield MeshStatusArrays(timestamps[chunk], names['nodes'], status, mode, bandwidth,
+                               names['statuses'], names['power_modes'])
+
+def to_records(arrays):
+    # Expand arrays back into the {'timestamp', 'node_statuses'} row format
+    records = []
+    status_names, mode_names = arrays.status_names, arrays.power_mode_names
+    for t, ts in enumerate(arrays.timestamps.tolist()):
+        present = np.flatnonzero(arrays.status[t])
+        statuses = {}
+        for i, s, m, bw in zip(present.tolist(), arrays.status[t, present].tolist(),
+                               arrays.power_mode[t, present].tolist(),
+                               arrays.bandwidth[t, present].tolist()):
+            statuses[arrays.node_ids[i]] = [status_names[s], mode_names[m],
+                                            int(bw) if bw.is_integer() else bw]
+        records.append({'timestamp': datetime.fromtimestamp(ts).isoformat(), 'node_statuses': statuses})
+    return records
+
+def from_records(records):
+    # Build MeshStatusArrays from {'timestamp', 'node_statuses'} rows with
+    # ISO format timestamps
+    node_ids, statuses, modes = {}, {None: ABSENT}, {None: ABSENT}
+    for record in records:
+        for node, (status, power_mode, _) in record['node_statuses'].items():
+            node_ids.setdefault(node, len(node_ids))
+            statuses.setdefault(status, len(statuses))
+            modes.setdefault(power_mode, len(modes))
+    status = np.zeros((len(records), len(node_ids)), np.uint8)
+    mode = np.zeros_like(status)
+    bandwidth = np.zeros(status.shape, np.float32)
+    for t, record in enumerate(records):
+        for node, (s, m, bw) in record['node_statuses'].items():
+            i = node_ids[node]
+            status[t, i] = statuses[s]
+            mode[t, i] = modes[m]
+            bandwidth[t, i] = float(bw or 0)
+    timestamps = np.array([datetime.fromisoformat(r['timestamp']).timestamp() for r in records],
+                          np.float64)
+    return MeshStatusArrays(timestamps, list(node_ids), status, mode, bandwidth,
+                            list(statuses), list(modes))
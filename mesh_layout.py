@@ -0,0 +1,231 @@
+from collections import deque
+
+import numpy as np
+from matplotlib.collections import LineCollection
+
+# Persistent node positions for the mesh graph. Positions are computed once
+# and then only adjusted around nodes whose links changed, so the picture
+# stays put between refreshes and a refresh never runs a full spring layout.
+# Nodes with known geographic coordinates (e.g. mile markers) are pinned.
+
+RELAX_ITERATIONS = 30
+MAX_RELAX_NODES = 400   # larger change sets keep their seeded positions
+LABEL_MAX_NODES = 60    # level of detail: no labels above this size
+STATUS_COLORS = {'normal': 'green', 'reduced': 'orange', 'critical': 'red'}
+
+
+class MeshLayout:
+    def __init__(self, seed=0):
+        self._rng = np.random.default_rng(seed)
+        self._index = {}
+        self._nodes = []
+        self._buf = np.zeros((64, 2))
+        self._adjacency = {}
+        self._fixed = set()
+        self.version = 0
+
+    def __len__(self):
+        return len(self._index)
+
+    @property
+    def _pos(self):
+        # View over the used part of the position buffer
+        return self._buf[:len(self._nodes)]
+
+    def position(self, node):
+        return tuple(self._pos[self._index[node]])
+
+    def positions(self):
+        return {node: tuple(self._pos[i]) for node, i in self._index.items()}
+
+    # --- Incremental updates ---
+    def set_coordinates(self, node, x, y=0.0):
+        # Pin a node, e.g. to its mile marker along the corridor
+        self._ensure(node, (x, y))
+        self._pos[self._index[node]] = (x, y)
+        self._fixed.add(node)
+        self.version += 1
+
+    def node_added(self, node):
+        if node not in self._index:
+            self._ensure(node, self._seed_position(node))
+            self.version += 1
+
+    def node_removed(self, node):
+        i = self._index.pop(node, None)
+        if i is None:
+            return
+        for n in self._adjacency.pop(node, ()):
+            self._adjacency[n].discard(node)
+        self._fixed.discard(node)
+        # Move the last node into the freed slot
+        last = len(self._nodes) - 1
+        if i != last:
+            moved = self._nodes[last]
+            self._nodes[i] = moved
+            self._buf[i] = self._buf[last]
+            self._index[moved] = i
+        self._nodes.pop()
+        self.version += 1
+
+    def link_added(self, a, b):
+        self.node_added(a)
+        self.node_added(b)
+        if b in self._adjacency[a]:
+            return
+        self._adjacency[a].add(b)
+        self._adjacency[b].add(a)
+        self._relax({a, b})
+
+    def link_removed(self, a, b):
+        if a in self._adjacency and b in self._adjacency[a]:
+            self._adjacency[a].discard(b)
+            self._adjacency[b].discard(a)
+            self._relax({a, b})
+
+    def sync(self, topology):
+        # Apply the difference between `topology` (node -> neighbors, as
+        # returned by get_topology()) and the last synced state
+        for node in [n for n in self._index if n not in topology]:
+            self.node_removed(node)
+        added = [n for n in topology if n not in self._index]
+        # Seed new nodes breadth-first so each one is placed next to an
+        # already placed neighbor and chains extend along the corridor
+        placed = set(self._index)
+        attached = [n for n in added if any(nb in placed for nb in topology[n])]
+        attached_set = set(attached)
+        order, seen = [], set()
+        for root in attached + [n for n in added if n not in attached_set]:
+            stack = deque([root])
+            while stack:
+                node = stack.pop()
+                if node in seen:
+                    continue
+                seen.add(node)
+                order.append(node)
+                stack.extend(nb for nb in topology[node]
+                             if nb in topology and nb not in seen and nb not in placed)
+        dirty = set()
+        for node in order:
+            self._adjacency.setdefault(node, set())
+            for nb in topology[node]:
+                if nb in self._index:
+                    self._adjacency[node].add(nb)
+                    self._adjacency[nb].add(node)
+            self._ensure(node, self._seed_position(node))
+            dirty.add(node)
+        for node, neighbors in topology.items():
+            current = self._adjacency.setdefault(node, set())
+            wanted = set(nb for nb in neighbors if nb in topology)
+            if current != wanted:
+                for nb in current - wanted:
+                    self._adjacency[nb].discard(node)
+                for nb in wanted - current:
+                    self._adjacency.setdefault(nb, set()).add(node)
+                self._adjacency[node] = wanted
+                dirty.add(node)
+                dirty |= current ^ wanted
+        if dirty:
+            self.version += 1
+            self._relax(dirty)
+
+    # --- Placement ---
+    def _ensure(self, node, position):
+        if node in self._index:
+            return
+        n = len(self._nodes)
+        if n == len(self._buf):
+            self._buf = np.concatenate([self._buf, np.zeros_like(self._buf)])
+        self._index[node] = n
+        self._nodes.append(node)
+        self._buf[n] = position
+        self._adjacency.setdefault(node, set())
+
+    def _seed_position(self, node):
+        placed = [nb for nb in self._adjacency.get(node, ()) if nb in self._index]
+        if len(placed) == 1:
+            # Continue away from the neighbor's own neighbors
+            anchor = self._pos[self._index[placed[0]]]
+            others = [n for n in self._adjacency[placed[0]] if n in self._index and n != node]
+            direction = np.array([1.0, 0.0])
+            if others:
+                away = anchor - self._pos[[self._index[n] for n in others]].mean(axis=0)
+                norm = np.hypot(*away)
+                if norm > 1e-9:
+                    direction = away / norm
+                else:
+                    direction = np.array([0.0, 1.0])
+            return anchor + direction + self._rng.normal(0, 0.05, 2)
+        if placed:
+            return self._pos[[self._index[n] for n in placed]].mean(axis=0) + self._rng.normal(0, 0.2, 2)
+        x = self._pos[:, 0].max() + 2.0 if len(self._pos) else 0.0
+        return np.array([x, 0.0])
+
+    def _relax(self, dirty, iterations=RELAX_ITERATIONS):
+        # Local force-directed pass over the changed nodes and their two-hop
+        # neighborhood; everything outside that set stays where it is
+        moving = [n for n in dirty if n in self._index and n not in self._fixed]
+        if not moving or len(moving) > MAX_RELAX_NODES:
+            return
+        local = set(moving)
+        for n in moving:
+            for nb in self._adjacency[n]:
+                local.add(nb)
+                local |= self._adjacency[nb]
+        local = [n for n in local if n in self._index]
+        if len(local) > 4 * MAX_RELAX_NODES:
+            return
+        li = {n: i for i, n in enumerate(local)}
+        idx = np.array([self._index[n] for n in local])
+        pos = self._pos[idx].copy()
+        move = np.array([n in moving for n in local])
+        edges = np.array([(li[a], li[b]) for a in local for b in self._adjacency[a]
+                          if b in li and li[a] < li[b]], dtype=np.int64).reshape(-1, 2)
+        k, temperature = 1.0, 0.3
+        for _ in range(iterations):
+            delta = pos[:, None, :] - pos[None, :, :]
+            dist = np.maximum(np.hypot(delta[..., 0], delta[..., 1]), 0.01)
+            force = (delta * (k * k / dist ** 2)[..., None]).sum(axis=1)
+            if len(edges):
+                d = pos[edges[:, 0]] - pos[edges[:, 1]]
+                dl = np.maximum(np.hypot(d[:, 0], d[:, 1]), 0.01)
+                pull = d * (dl / k)[:, None]
+                np.add.at(force, edges[:, 0], -pull)
+                np.add.at(force, edges[:, 1], pull)
+            length = np.maximum(np.hypot(force[:, 0], force[:, 1]), 1e-9)
+            step = force / length[:, None] * np.minimum(length, temperature)[:, None]
+            pos[move] += step[move]
+            temperature *= 0.9
+        self._pos[idx[move]] = pos[move]
+        self.version += 1
+
+    # --- Rendering ---
+    def edge_segments(self):
+        pairs = [(self._index[a], self._index[b]) for a, nbs in self._adjacency.items()
+                 for b in nbs if a in self._index and b in self._index and self._index[a] < self._index[b]]
+        if not pairs:
+            return np.zeros((0, 2, 2))
+        pairs = np.array(pairs)
+        return np.stack([self._pos[pairs[:, 0]], self._pos[pairs[:, 1]]], axis=1)
+
+    def draw(self, ax, node_statuses, label_max_nodes=LABEL_MAX_NODES):
+        # One LineCollection for every edge and one scatter for every node;
+        # large meshes drop labels and shrink markers
+        n = len(self._nodes)
+        ax.set_axis_off()
+        if not n:
+            return
+        ax.add_collection(LineCollection(self.edge_segments(), colors='black', linewidths=0.8 if n < 1000 else 0.3,
+                                         zorder=1, rasterized=n >= 1000))
+        colors = []
+        for node in self._nodes:
+            status, power_mode, _ = node_statuses.get(node, ('DOWN', 'off', 0))
+            colors.append(STATUS_COLORS.get(power_mode, 'gray') if status == 'UP' else 'gray')
+        size = 500 if n <= label_max_nodes else max(4, 20000 / n)
+        ax.scatter(self._pos[:, 0], self._pos[:, 1], s=size, c=colors, zorder=2,
+                   edgecolors='none' if n > label_max_nodes else 'black', rasterized=n >= 1000)
+        if n <= label_max_nodes:
+            for node, (x, y) in zip(self._nodes, self._pos.tolist()):
+                ax.annotate(str(node), (x, y), ha='center', va='center', zorder=3)
+        ax.margins(0.1)
+        ax.autoscale_view()
@@ -0,0 +1,367 @@
+import heapq
+import math
+from collections import OrderedDict, namedtuple
+from contextlib import nullcontext
+
+# Path computation over the mesh. Two metrics:
+#   etx     expected transmissions, 1 / (q/100)^2 per link, scaled up when
+#           either end runs in a reduced or critical power mode; lower wins
+#   widest  bottleneck link quality, scaled down by power mode; higher wins
+# Links are symmetric, so the shortest-path tree rooted at a destination is
+# also every node's next hop towards it. Trees are cached and repaired in
+# place when a link or node changes: a worse or removed tree edge only
+# re-routes the subtree that hung off it, and a better or new edge only
+# relaxes outwards from its end points.
+
+ETX = 'etx'
+WIDEST = 'widest'
+POWER_MODE_PENALTY = {'normal': 1.0, 'reduced': 1.5, 'critical': 3.0}
+POWER_MODE_CAPACITY = {'normal': 1.0, 'reduced': 0.5, 'critical': 0.25}
+MAX_TREES = 64  # cached trees per metric; each one is updated on every change
+
+Metric = namedtuple('Metric', ['name', 'origin', 'unreachable', 'extend', 'key'])
+METRICS = {
+    ETX: Metric(ETX, 0.0, math.inf, lambda d, w: d + w, lambda d: d),
+    WIDEST: Metric(WIDEST, math.inf, 0.0, min, lambda d: -d),
+}
+
+
+class _Tree:
+    # Shortest-path tree rooted at `root`; parent[n] is n's next hop
+    def __init__(self, router, root, metric):
+        self.router = router
+        self.root = root
+        self.metric = metric
+        self.dist = {root: metric.origin}
+        self.parent = {}
+        self.children = {}
+        self.version = 0
+        self._relax([root])
+
+    def _better(self, a, b):
+        return self.metric.key(a) < self.metric.key(b)
+
+    def _set_parent(self, node, parent):
+        old = self.parent.get(node)
+        if old is not None:
+            self.children[old].discard(node)
+        self.parent[node] = parent
+        self.children.setdefault(parent, set()).add(node)
+
+    def _detach(self, node):
+        old = self.parent.pop(node, None)
+        if old is not None:
+            self.children[old].discard(node)
+        self.dist.pop(node, None)
+
+    def _relax(self, labelled):
+        # Dijkstra from nodes whose labels were just set
+        metric, weight = self.metric, self.router.weight
+        heap = [(metric.key(self.dist[n]), n) for n in labelled if n in self.dist]
+        heapq.heapify(heap)
+        while heap:
+            key, node = heapq.heappop(heap)
+            d = self.dist.get(node)
+            if d is None or key != metric.key(d):
+                continue
+            for neighbor in self.router.neighbors(node):
+                w = weight(node, neighbor, metric.name)
+                if w is None or neighbor == self.root:
+                    continue
+                candidate = metric.extend(d, w)
+                if self._better(candidate, self.dist.get(neighbor, metric.unreachable)):
+                    self.dist[neighbor] = candidate
+                    self._set_parent(neighbor, node)
+                    heapq.heappush(heap, (metric.key(candidate), neighbor))
+
+    def edge_changed(self, u, v, old, new):
+        if new is not None and (old is None or self._better(new, old)):
+            labelled = []
+            for a, b in ((u, v), (v, u)):
+                if a in self.dist and b != self.root:
+                    candidate = self.metric.extend(self.dist[a], new)
+                    if self._better(candidate, self.dist.get(b, self.metric.unreachable)):
+                        self.dist[b] = candidate
+                        self._set_parent(b, a)
+                        labelled.append(b)
+            if labelled:
+                self._relax(labelled)
+                self.version += 1
+        elif self.parent.get(v) == u:
+            self._reroute(v)
+        elif self.parent.get(u) == v:
+            self._reroute(u)
+
+    def _reroute(self, top):
+        # Everything below `top` lost its route; re-attach it from the
+        # unaffected part of the tree
+        affected, stack = set(), [top]
+        while stack:
+            node = stack.pop()
+            affected.add(node)
+            stack.extend(self.children.get(node, ()))
+        for node in affected:
+            self._detach(node)
+        metric, weight = self.metric, self.router.weight
+        labelled = []
+        for node in affected:
+            best, via = metric.unreachable, None
+            for neighbor in self.router.neighbors(node):
+                if neighbor in affected or neighbor not in self.dist:
+                    continue
+                w = weight(neighbor, node, metric.name)
+                if w is None:
+                    continue
+                candidate = metric.extend(self.dist[neighbor], w)
+                if self._better(candidate, best):
+                    best, via = candidate, neighbor
+            if via is not None:
+                self.dist[node] = best
+                self._set_parent(node, via)
+                labelled.append(node)
+        self._relax(labelled)
+        self.version += 1
+
+    def node_removed(self, node):
+        # Its links are already gone, so nothing hangs off it any more
+        self._detach(node)
+        self.children.pop(node, None)
+
+
+class MeshGraph:
+    # Links, node status and power modes as last seen on the mesh. Every
+    # mutation goes through _change() so subclasses can update what they
+    # derive from the graph instead of recomputing it.
+    def __init__(self):
+        self._links = {}
+        self._status = {}
+        self._power_mode = {}
+
+    def neighbors(self, node):
+        return self._links.get(node, {})
+
+    def usable(self, node):
+        return self._status.get(node, 'UP') != 'DOWN'
+
+    def _change(self, edges, apply, nodes=()):
+        apply()
+
+    def _node_removed(self, node):
+        pass
+
+    def _incident(self, node):
+        return [(node, neighbor) for neighbor in self._links.get(node, {})]
+
+    def add_node(self, node):
+        self._links.setdefault(node, {})
+
+    def set_link(self, a, b, quality):
+        def apply():
+            self._links.setdefault(a, {})[b] = quality
+            self._links.setdefault(b, {})[a] = quality
+        self._change([(a, b)], apply)
+
+    def remove_link(self, a, b):
+        if b not in self._links.get(a, {}):
+            return
+        def apply():
+            self._links[a].pop(b, None)
+            self._links[b].pop(a, None)
+        self._change([(a, b)], apply)
+
+    def set_node(self, node, status=None, power_mode=None):
+        self.add_node(node)
+        def apply():
+            if status is not None:
+                self._status[node] = status
+            if power_mode is not None:
+                self._power_mode[node] = power_mode
+        self._change(self._incident(node), apply, (node,))
+
+    def remove_node(self, node):
+        if node not in self._links:
+            return
+        for neighbor in list(self._links[node]):
+            self.remove_link(node, neighbor)
+        del self._links[node]
+        self._status.pop(node, None)
+        self._power_mode.pop(node, None)
+        self._node_removed(node)
+
+    # --- MeshNetworkManager integration ---
+    def sync(self, mesh):
+        # Bring the graph in line with mesh.nodes; only differences go
+        # through _change()
+        for node in [n for n in self._links if n not in mesh.nodes]:
+            self.remove_node(node)
+        for node_id in mesh.nodes:
+            self._sync_node(mesh, node_id)
+
+    def _sync_node(self, mesh, node_id):
+        node = mesh.nodes.get(node_id)
+        if node is None:
+            self.remove_node(node_id)
+            return
+        self.add_node(node_id)
+        status, power_mode = getattr(node, 'status', 'UP'), getattr(node, 'power_mode', 'normal')
+        if self._status.get(node_id, 'UP') != status or self._power_mode.get(node_id, 'normal') != power_mode:
+            self.set_node(node_id, status, power_mode)
+        current = self._links[node_id]
+        for neighbor in [n for n in current if n not in node.neighbors]:
+            self.remove_link(node_id, neighbor)
+        for neighbor, quality in node.neighbors.items():
+            if current.get(neighbor) != quality:
+                self.set_link(node_id, neighbor, quality)
+
+    def attach(self, mesh, lock=None):
+        # Keep the graph current by wrapping the manager's mutators; `lock`
+        # is held while the graph catches up
+        with lock or nullcontext():
+            self.sync(mesh)
+        for name in ('add_node', 'remove_node', 'add_link', 'remove_link', 'set_node_status'):
+            original = getattr(mesh, name)
+            def hooked(*args, _original=original, **kwargs):
+                result = _original(*args, **kwargs)
+                with lock or nullcontext():
+                    for arg in args[:2]:
+                        if arg in mesh.nodes or arg in self._links:
+                            self._sync_node(mesh, arg)
+                return result
+            setattr(mesh, name, hooked)
+        return mesh
+
+
+class MeshRouter(MeshGraph):
+    def __init__(self, max_trees=MAX_TREES):
+        super().__init__()
+        self.max_trees = max_trees
+        self._trees = {name: OrderedDict() for name in METRICS}
+
+    def weight(self, u, v, metric=ETX):
+        quality = self._links.get(u, {}).get(v)
+        if not quality or quality <= 0 or not self.usable(u) or not self.usable(v):
+            return None
+        modes = (self._power_mode.get(u, 'normal'), self._power_mode.get(v, 'normal'))
+        if metric == ETX:
+            p = min(quality, 100) / 100
+            return 1 / (p * p) * max(POWER_MODE_PENALTY.get(m, 1.0) for m in modes)
+        return quality * min(POWER_MODE_CAPACITY.get(m, 1.0) for m in modes)
+
+    def _change(self, edges, apply, nodes=()):
+        # Apply a mutation and repair cached trees for every edge whose
+        # weight it changed
+        before = {(u, v): {m: self.weight(u, v, m) for m in METRICS} for u, v in edges}
+        apply()
+        for (u, v), weights in before.items():
+            for name, old in weights.items():
+                new = self.weight(u, v, name)
+                if new != old:
+                    for tree in self._trees[name].values():
+                        tree.edge_changed(u, v, old, new)
+
+    def _node_removed(self, node):
+        for trees in self._trees.values():
+            trees.pop(node, None)
+            for tree in trees.values():
+                tree.node_removed(node)
+
+    # --- Queries ---
+    def tree(self, root, metric=ETX):
+        trees = self._trees[metric]
+        tree = trees.get(root)
+        if tree is None:
+            if root not in self._links:
+                raise KeyError(root)
+            tree = trees[root] = _Tree(self, root, METRICS[metric])
+            while len(trees) > self.max_trees:
+                trees.popitem(last=False)
+        else:
+            trees.move_to_end(root)
+        return tree
+
+    def routes_to(self, dst, metric=ETX):
+        # node -> next hop towards dst, for every node that can reach it
+        return dict(self.tree(dst, metric).parent)
+
+    def next_hop(self, src, dst, metric=ETX):
+        return self.tree(dst, metric).parent.get(src)
+
+    def best_path(self, src, dst, metric=ETX):
+        # (path, cost); (None, unreachable cost) when there is no route
+        tree = self.tree(dst, metric)
+        if src not in tree.dist:
+            return None, tree.metric.unreachable
+        path = [src]
+        while path[-1] != dst:
+            path.append(tree.parent[path[-1]])
+        return path, tree.dist[src]
+
+    def next_hop_table(self, node, metric=ETX):
+        # Full routing table of one node: one tree per destination, so this
+        # is all-pairs work unless max_trees covers the mesh
+        return {dst: self.tree(dst, metric).parent.get(node) for dst in list(self._links) if dst != node}
+
+    def path_cost(self, path, metric=ETX):
+        metric = METRICS[metric]
+        cost = metric.origin
+        for u, v in zip(path, path[1:]):
+            w = self.weight(u, v, metric.name)
+            if w is None:
+                return metric.unreachable
+            cost = metric.extend(cost, w)
+        return cost
+
+    def _search(self, src, dst, metric, banned_nodes=(), banned_edges=()):
+        # Plain Dijkstra with early exit, for k-shortest spur paths
+        dist, parent = {src: metric.origin}, {}
+        heap = [(metric.key(metric.origin), src)]
+        while heap:
+            key, node = heapq.heappop(heap)
+            if key != metric.key(dist[node]):
+                continue
+            if node == dst:
+                path = [dst]
+                while path[-1] != src:
+                    path.append(parent[path[-1]])
+                return path[::-1], dist[dst]
+            for neighbor in self.neighbors(node):
+                if neighbor in banned_nodes or (node, neighbor) in banned_edges:
+                    continue
+                w = self.weight(node, neighbor, metric.name)
+                if w is None:
+                    continue
+                candidate = metric.extend(dist[node], w)
+                if metric.key(candidate) < metric.key(dist.get(neighbor, metric.unreachable)):
+                    dist[neighbor] = candidate
+                    parent[neighbor] = node
+                    heapq.heappush(heap, (metric.key(candidate), neighbor))
+        return None, metric.unreachable
+
+    def k_shortest_paths(self, src, dst, k=3, metric=ETX):
+        # Yen's algorithm: up to k loop-free paths as (path, cost), best first
+        m = METRICS[metric]
+        first, cost = self.best_path(src, dst, metric)
+        if first is None:
+            return []
+        paths, candidates, seen = [(first, cost)], [], {tuple(first)}
+        while len(paths) < k:
+            previous = paths[-1][0]
+            for i in range(len(previous) - 1):
+                root = previous[:i + 1]
+                banned_edges = set()
+                for path, _ in paths:
+                    if path[:i + 1] == root and len(path) > i + 1:
+                        banned_edges.add((path[i], path[i + 1]))
+                        banned_edges.add((path[i + 1], path[i]))
+                spur, _ = self._search(root[-1], dst, m, set(root[:-1]), banned_edges)
+                if spur is None:
+                    continue
+                path = root[:-1] + spur
+                if tuple(path) not in seen:
+                    seen.add(tuple(path))
+                    heapq.heappush(candidates, (m.key(self.path_cost(path, metric)), len(path), path))
+            if not candidates:
+                break
+            _, _, path = heapq.heappop(candidates)
+            paths.append((path, self.path_cost(path, metric)))
+        return paths
@@ -0,0 +1,384 @@
+from array import array
+from collections.abc import Mapping
+
+import numpy as np
+
+# Compact storage for large meshes. Node names are interned to small
+# integer ids; status, power mode and bandwidth live in parallel numpy
+# arrays indexed by id, and each node's links are one typed array of
+# (neighbour id, link quality) pairs. MeshStore offers the MeshNetworkManager
+# interface on top of that, so `mesh.nodes[n].neighbors` and friends keep
+# working, but the objects handed out are flyweight views, not records.
+#
+# snapshot() freezes the mesh into CSR arrays once per change; its views
+# can be iterated and indexed as often as needed without copying.
+
+INITIAL_CAPACITY = 64
+
+
+class InternTable:
+    # name <-> small integer id; ids of released names are reused
+    __slots__ = ('_ids', '_names', '_free')
+
+    def __init__(self, names=()):
+        self._ids = {}
+        self._names = []
+        self._free = []
+        for name in names:
+            self.intern(name)
+
+    def intern(self, name):
+        i = self._ids.get(name)
+        if i is None:
+            if self._free:
+                i = self._free.pop()
+                self._names[i] = name
+            else:
+                i = len(self._names)
+                self._names.append(name)
+            self._ids[name] = i
+        return i
+
+    def id(self, name):
+        return self._ids[name]
+
+    def get(self, name, default=None):
+        return self._ids.get(name, default)
+
+    def name(self, i):
+        return self._names[i]
+
+    def release(self, name):
+        i = self._ids.pop(name)
+        self._names[i] = None
+        self._free.append(i)
+        return i
+
+    def names(self):
+        return tuple(self._names)
+
+    def __contains__(self, name):
+        return name in self._ids
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __len__(self):
+        return len(self._ids)
+
+
+class NeighborView(Mapping):
+    # neighbour name -> link quality for one node, read-only
+    __slots__ = ('_store', '_id')
+
+    def __init__(self, store, i):
+        self._store = store
+        self._id = i
+
+    def _pairs(self):
+        return self._store._adjacency[self._id] or ()
+
+    def __getitem__(self, name):
+        j = self._store._names.get(name)
+        pairs = self._pairs()
+        if j is not None:
+            for k in range(0, len(pairs), 2):
+                if pairs[k] == j:
+                    return pairs[k + 1]
+        raise KeyError(name)
+
+    def __iter__(self):
+        name = self._store._names.name
+        pairs = self._pairs()
+        return (name(pairs[k]) for k in range(0, len(pairs), 2))
+
+    def __len__(self):
+        return len(self._pairs()) // 2
+
+
+class MeshNodeView:
+    # Stand-in for a MeshNode record; attributes read and write the arrays
+    __slots__ = ('_store', '_id')
+
+    def __init__(self, store, i):
+        self._store = store
+        self._id = i
+
+    @property
+    def node_id(self):
+        return self._store._names.name(self._id)
+
+    @property
+    def neighbors(self):
+        return NeighborView(self._store, self._id)
+
+    @property
+    def status(self):
+        return self._store._statuses.name(self._store._status[self._id])
+
+    @status.setter
+    def status(self, value):
+        self._store._set(self._store._status, self._id, self._store._statuses.intern(value))
+
+    @property
+    def power_mode(self):
+        return self._store._modes.name(self._store._power_mode[self._id])
+
+    @power_mode.setter
+    def power_mode(self, value):
+        self._store._set(self._store._power_mode, self._id, self._store._modes.intern(value))
+
+    @property
+    def bandwidth(self):
+        return int(self._store._bandwidth[self._id])
+
+    @bandwidth.setter
+    def bandwidth(self, value):
+        self._store._set(self._store._bandwidth, self._id, value)
+
+
+class NodesView(Mapping):
+    # name -> MeshNodeView, read-only; mutate through the MeshStore methods
+    __slots__ = ('_store',)
+
+    def __init__(self, store):
+        self._store = store
+
+    def __getitem__(self, name):
+        return MeshNodeView(self._store, self._store._names.id(name))
+
+    def __contains__(self, name):
+        return name in self._store._names
+
+    def __iter__(self):
+        return iter(self._store._names)
+
+    def __len__(self):
+        return len(self._store._names)
+
+
+class MeshStore:
+    def __init__(self, capacity=INITIAL_CAPACITY, default_bandwidth=10):
+        self.default_bandwidth = default_bandwidth
+        self._names = InternTable()
+        self._statuses = InternTable(['UP', 'DOWN'])
+        self._modes = InternTable(['normal', 'reduced', 'critical'])
+        self._status = np.zeros(capacity, np.uint8)
+        self._power_mode = np.zeros(capacity, np.uint8)
+        self._bandwidth = np.zeros(capacity, np.int32)
+        self._adjacency = []  # id -> array('i') of neighbour id, quality pairs, or None
+        self.nodes = NodesView(self)
+        self.version = 0
+        self._snapshot = None
+
+    def _set(self, column, i, value):
+        column[i] = value
+        self.version += 1
+
+    def _grow(self, needed):
+        capacity = len(self._status)
+        if needed <= capacity:
+            return
+        capacity = max(capacity * 2, needed)  # capacity may start at 0
+        for name in ('_status', '_power_mode', '_bandwidth'):
+            old = getattr(self, name)
+            new = np.zeros(capacity, old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    # --- MeshNetworkManager interface ---
+    def add_node(self, node_id):
+        if node_id in self._names:
+            return
+        i = self._names.intern(node_id)
+        self._grow(i + 1)
+        if i == len(self._adjacency):
+            self._adjacency.append(None)
+        self._status[i] = 0
+        self._power_mode[i] = 0
+        self._bandwidth[i] = self.default_bandwidth
+        self.version += 1
+
+    def remove_node(self, node_id):
+        i = self._names.get(node_id)
+        if i is None:
+            return
+        for j in (self._adjacency[i] or ())[::2]:
+            self._unlink(j, i)
+        self._adjacency[i] = None
+        self._names.release(node_id)
+        self.version += 1
+
+    def _link(self, i, j, quality):
+        pairs = self._adjacency[i]
+        if pairs is None:
+            self._adjacency[i] = array('i', (j, quality))
+            return
+        for k in range(0, len(pairs), 2):
+            if pairs[k] == j:
+                pairs[k + 1] = quality
+                return
+        pairs.extend((j, quality))
+
+    def _unlink(self, i, j):
+        pairs = self._adjacency[i]
+        if pairs is None:
+            return
+        for k in range(0, len(pairs), 2):
+            if pairs[k] == j:
+                del pairs[k:k + 2]
+                break
+        if not pairs:
+            self._adjacency[i] = None
+
+    def add_link(self, a, b, quality=100):
+        self.add_node(a)
+        self.add_node(b)
+        i, j = self._names.id(a), self._names.id(b)
+        self._link(i, j, quality)
+        self._link(j, i, quality)
+        self.version += 1
+
+    def remove_link(self, a, b):
+        i, j = self._names.get(a), self._names.get(b)
+        if i is None or j is None:
+            return
+        self._unlink(i, j)
+        self._unlink(j, i)
+        self.version += 1
+
+    def set_node_status(self, node_id, status):
+        self.nodes[node_id].status = status
+
+    def set_power_mode(self, node_id, power_mode):
+        self.nodes[node_id].power_mode = power_mode
+
+    def get_topology(self):
+        return self.snapshot().topology_dict()
+
+    def get_node_statuses(self):
+        return self.snapshot().statuses_dict()
+
+    def health_check(self):
+        return self.snapshot().all_up()
+
+    def print_topology(self):
+        print(self.get_topology())
+
+    # --- Snapshots ---
+    def snapshot(self):
+        # Immutable view of the mesh, rebuilt only after a change
+        if self._snapshot is None or self._snapshot.version != self.version:
+            self._snapshot = MeshSnapshot(self)
+        return self._snapshot
+
+
+def _frozen(values):
+    values.setflags(write=False)
+    return values
+
+
+class MeshSnapshot:
+    # CSR arrays: the neighbours of id i are indices[indptr[i]:indptr[i + 1]]
+    __slots__ = ('version', 'names', 'ids', 'status', 'power_mode', 'bandwidth', 'indptr', 'indices',
+                 'quality', '_statuses', '_modes', '_index')
+
+    def __init__(self, store):
+        self.version = store.version
+        self.names = store._names.names()
+        self.ids = _frozen(np.fromiter(sorted(store._names._ids.values()), np.int64, len(store._names)))
+        n = len(self.names)
+        self.status = _frozen(store._status[:n].copy())
+        self.power_mode = _frozen(store._power_mode[:n].copy())
+        self.bandwidth = _frozen(store._bandwidth[:n].copy())
+        adjacency = store._adjacency[:n]
+        degree = np.fromiter((len(pairs) // 2 if pairs else 0 for pairs in adjacency), np.int64, n)
+        self.indptr = _frozen(np.concatenate(([0], np.cumsum(degree))))
+        pairs = np.frombuffer(b''.join(p for p in adjacency if p), np.int32).reshape(-1, 2)
+        self.indices = _frozen(pairs[:, 0])
+        self.quality = _frozen(pairs[:, 1])
+        self._statuses = store._statuses.names()
+        self._modes = store._modes.names()
+        self._index = store._names._ids.copy()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        names = self.names
+        return (names[i] for i in self.ids)
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def id(self, name):
+        return self._index[name]
+
+    def neighbor_ids(self, name):
+        i = self._index[name]
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def neighbors(self, name):
+        names = self.names
+        return (names[j] for j in self.neighbor_ids(name))
+
+    def link_qualities(self, name):
+        i = self._index[name]
+        return self.quality[self.indptr[i]:self.indptr[i + 1]]
+
+    def edges(self):
+        # (node ids, neighbour ids, qualities), one row per link direction
+        sources = np.repeat(np.arange(len(self.names)), np.diff(self.indptr))
+        return sources, self.indices, self.quality
+
+    def node_status(self, name):
+        i = self._index[name]
+        return (self._statuses[self.status[i]], self._modes[self.power_mode[i]], int(self.bandwidth[i]))
+
+    def statuses(self):
+        return SnapshotView(self, self.node_status)
+
+    def topology(self):
+        return SnapshotView(self, lambda name: tuple(self.neighbors(name)))
+
+    def all_up(self):
+        up = self._statuses.index('UP')
+        return bool(np.all(self.status[self.ids] == up))
+
+    def down_nodes(self):
+        down = self._statuses.index('DOWN')
+        names = self.names
+        return [names[i] for i in self.ids[self.status[self.ids] == down]]
+
+    # Plain copies in the MeshNetworkManager shapes, e.g. for JSON
+    def topology_dict(self):
+        names, indptr = self.names, self.indptr.tolist()
+        neighbors = [names[j] for j in self.indices.tolist()]
+        return {names[i]: neighbors[indptr[i]:indptr[i + 1]] for i in self.ids.tolist()}
+
+    def statuses_dict(self):
+        names, statuses, modes = self.names, self._statuses, self._modes
+        return {names[i]: (statuses[s], modes[m], b) for i, s, m, b in
+                zip(self.ids.tolist(), self.status[self.ids].tolist(), self.power_mode[self.ids].tolist(),
+                    self.bandwidth[self.ids].tolist())}
+
+
+class SnapshotView(Mapping):
+    # Read-only name -> value mapping over a snapshot; values are made on
+    # access, nothing is copied up front
+    __slots__ = ('_snapshot', '_value')
+
+    def __init__(self, snapshot, value):
+        self._snapshot = snapshot
+        self._value = value
+
+    def __getitem__(self, name):
+        if name not in self._snapshot:
+            raise KeyError(name)
+        return self._value(name)
+
+    def __iter__(self):
+        return iter(self._snapshot)
+
+    def __len__(self):
+        return len(self._snapshot)
@@ -0,0 +1,436 @@
+import bisect
+import inspect
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter as _Counter, deque, namedtuple
+from contextlib import contextmanager
+from functools import wraps
+from itertools import count
+
+logger = logging.getLogger(__name__)
+
+# In-process metrics: counters, gauges and latency histograms with labels,
+# kept in a registry and rendered in the Prometheus text format for
+# /metrics. Updates are a lock and an add (a bisect for histograms), so
+# hot paths can be timed on every call. Values computed at scrape time
+# come from collectors registered with add_collector().
+#
+# SamplingProfiler is the opt-in other half: while a block runs it samples
+# that thread's stack every few milliseconds, giving collapsed stacks
+# (flame graph input) for one slow request without a deploy.
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+# One metric as exposed: samples are (name, labels dict, value)
+Family = namedtuple('Family', ['name', 'kind', 'help', 'samples'])
+
+
+class LatencyHistogram:
+    # Prometheus-style buckets: counts[i] holds the observations of at most
+    # buckets[i] seconds but more than buckets[i - 1]. Not locked.
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[min(bisect.bisect_left(self.buckets, seconds), len(self.buckets) - 1)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation; None before any
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'buckets': [['+Inf' if b == math.inf else b, n] for b, n in zip(self.buckets, self.counts)],
+        }
+
+
+def histogram_samples(name, labels, histogram):
+    # _bucket (cumulative, with le), _sum and _count samples of a LatencyHistogram
+    samples, total = [], 0
+    for bound, n in zip(histogram.buckets, histogram.counts):
+        total += n
+        samples.append((f'{name}_bucket', {**labels, 'le': _format(bound)}, total))
+    if histogram.buckets[-1] != math.inf:
+        samples.append((f'{name}_bucket', {**labels, 'le': '+Inf'}, histogram.count))
+    samples.append((f'{name}_sum', labels, histogram.sum))
+    samples.append((f'{name}_count', labels, histogram.count))
+    return samples
+
+
+# --- Metric types ---
+class _CounterValue:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        if amount < 0:
+            raise ValueError('Counters only go up')
+        with self._lock:
+            self.value += amount
+
+    def samples(self, name, labels):
+        return [(name, labels, self.value)]
+
+
+class _GaugeValue:
+    __slots__ = ('value', 'function', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set_function(self, function):
+        # Read function() at scrape time instead of a stored value
+        self.function = function
+
+    def samples(self, name, labels):
+        return [(name, labels, self.function() if self.function else self.value)]
+
+
+class _HistogramValue:
+    __slots__ = ('histogram', '_lock')
+
+    def __init__(self, buckets):
+        self.histogram = LatencyHistogram(buckets)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self.histogram.observe(seconds)
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def samples(self, name, labels):
+        with self._lock:
+            return histogram_samples(name, labels, self.histogram)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help='', labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values, **named):
+        if named:
+            values = tuple(named[label] for label in self.label_names)
+        values = tuple(map(str, values))
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f'{self.name} takes labels {self.label_names}')
+            with self._lock:
+                child = self._children.setdefault(values, self._new())
+        return child
+
+    def _new(self):
+        raise NotImplementedError
+
+    def collect(self):
+        samples = []
+        for values, child in list(self._children.items()):
+            samples.extend(child.samples(self.name, dict(zip(self.label_names, values))))
+        return Family(self.name, self.kind, self.help, samples)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new(self):
+        return _CounterValue()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new(self):
+        return _GaugeValue()
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+    def set_function(self, function):
+        self.labels().set_function(function)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help='', labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def _new(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, seconds):
+        self.labels().observe(seconds)
+
+    def time(self):
+        return self.labels().time()
+
+
+def timed(histogram, *labels):
+    # Decorator observing each call's duration. A labelled histogram with no
+    # labels given is labelled with the function name. Generators are timed
+    # across their whole iteration, counting only time spent inside them.
+    def decorate(func):
+        child = histogram.labels(*(labels or ((func.__name__,) if histogram.label_names else ())))
+        if inspect.isgeneratorfunction(func):
+            @wraps(func)
+            def generator(*args, **kwargs):
+                inner, elapsed = func(*args, **kwargs), 0.0
+                try:
+                    while True:
+                        start = time.perf_counter()
+                        try:
+                            item = next(inner)
+                        except StopIteration:
+                            return
+                        finally:
+                            elapsed += time.perf_counter() - start
+                        yield item
+                finally:
+                    inner.close()
+                    child.observe(elapsed)
+            return generator
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+# --- Registry ---
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        # Returns the metric already registered under the name, if any, so
+        # modules can declare their metrics at import time
+        with self._lock:
+            existing = self._metrics.setdefault(metric.name, metric)
+        if type(existing) is not type(metric) or existing.label_names != metric.label_names:
+            raise ValueError(f'Metric {metric.name} already registered differently')
+        return existing
+
+    def counter(self, name, help='', labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name, help='', labels=()):
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(self, name, help='', labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def add_collector(self, collect):
+        # collect() -> iterable of Family, called on every scrape
+        self._collectors.append(collect)
+
+    def collect(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        families = [metric.collect() for metric in metrics]
+        for collect in list(self._collectors):
+            try:
+                families.extend(collect())
+            except Exception as e:
+                logger.error(f'Metrics collector failed: {e}')
+        return families
+
+    def render(self):
+        lines = []
+        for family in self.collect():
+            if family.help:
+                lines.append(f'# HELP {family.name} {_escape_help(family.help)}')
+            lines.append(f'# TYPE {family.name} {family.kind}')
+            for name, labels, value in family.samples:
+                lines.append(f'{name}{_labels(labels)} {_format(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _format(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, int):
+        return str(value)
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    if value != value:
+        return 'NaN'
+    return repr(float(value))
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"') for v in labels.values())
+    return '{' + ','.join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + '}'
+
+
+def _escape_help(text):
+    return text.replace('\\', '\\\\').replace('\n', '\\n')
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+
+# --- Sampling profiler ---
+PROFILE_INTERVAL = 0.005  # seconds between stack samples
+MAX_STACK_DEPTH = 64
+RECENT_PROFILES = 20
+
+
+class Profile:
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+        self.started = time.time()
+        self.duration = None
+        self.samples = _Counter()  # collapsed stack -> samples
+
+    def collapsed(self):
+        # 'outer;inner;leaf count' lines, as flamegraph.pl and speedscope read
+        return '\n'.join(f'{stack} {n}' for stack, n in self.samples.most_common())
+
+    def top(self, n=20):
+        # Functions by samples spent in them directly
+        leaves = _Counter()
+        for stack, samples in self.samples.items():
+            leaves[stack.rsplit(';', 1)[-1]] += samples
+        return leaves.most_common(n)
+
+    def summary(self):
+        return {'id': self.id, 'name': self.name, 'started': self.started, 'duration': self.duration,
+                'samples': sum(self.samples.values()), 'top': self.top(10)}
+
+
+def _stack(frame):
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class SamplingProfiler:
+    # One daemon thread samples every thread currently inside profile(); it
+    # exits when none is, so an idle profiler costs nothing
+    def __init__(self, interval=PROFILE_INTERVAL, keep=RECENT_PROFILES):
+        self.interval = interval
+        self.recent = deque(maxlen=keep)
+        self._targets = {}
+        self._ids = count(1)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def profile(self, name=''):
+        profile = Profile(next(self._ids), name)
+        thread_id = threading.get_ident()
+        started = time.perf_counter()
+        with self._lock:
+            self._targets[thread_id] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+                self._thread.start()
+        try:
+            yield profile
+        finally:
+            with self._lock:
+                self._targets.pop(thread_id, None)
+            profile.duration = time.perf_counter() - started
+            self.recent.append(profile)
+
+    def get(self, profile_id):
+        return next((p for p in self.recent if p.id == profile_id), None)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._targets:
+                    self._thread = None
+                    return
+                targets = list(self._targets.items())
+            frames = sys._current_frames()
+            for thread_id, profile in targets:
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    profile.samples[_stack(frame)] += 1
+            del frames
+            time.sleep(self.interval)
@@ -1,7 +1,12 @@
-import csv
 import os
+from contextlib import contextmanager
 from datetime import datetime
 
+from roadmesh.events import make_event
+from roadmesh.metrics import histogram, timed
+from roadmesh.storage import CSVBackend, SQLiteBackend
+from roadmesh.write_buffer import WriteBuffer
+
 # File paths (can be moved to config if needed)
 BATTERY_STATE_FILE = 'battery_state.csv'
 BATTERY_HISTORY_FILE = 'battery_history.csv'
@@ -9,111 +14,201 @@ USERS_FILE = 'users.csv'
 SESSIONS_FILE = 'sessions.csv'
 EVENT_LOG_FILE = 'event_log.csv'
 MESH_STATUS_HISTORY_FILE = 'mesh_status_history.csv'
+MESH_STATUS_HISTORY_BIN = 'mesh_status_history.bin'
+ANALYTICS_CHECKPOINT_FILE = 'analytics_checkpoint.json'
+SESSION_JOURNAL_FILE = 'sessions.journal'
+API_KEYS_FILE = 'api_keys.json'
+
+# Storage backend: 'sqlite' (indexed, WAL mode) or 'csv' (legacy flat files).
+# Existing CSV installs can be imported with `python -m roadmesh.storage`.
+STORAGE_BACKEND = 'sqlite'
+DATABASE_FILE = 'roadmesh.db'
+
+_backend = None
+_write_buffer = None
+
+# Every storage call below is timed, labelled with the function name
+PERSISTENCE_SECONDS = histogram('roadmesh_persistence_seconds', 'Time spent in persistence calls', ['op'])
+
+def csv_backend(directory='.'):
+    return CSVBackend(
+        os.path.join(directory, BATTERY_STATE_FILE),
+        os.path.join(directory, BATTERY_HISTORY_FILE),
+        os.path.join(directory, USERS_FILE),
+        os.path.join(directory, SESSIONS_FILE),
+        os.path.join(directory, EVENT_LOG_FILE),
+        os.path.join(directory, MESH_STATUS_HISTORY_FILE),
+    )
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        if STORAGE_BACKEND == 'sqlite':
+            _backend = SQLiteBackend(DATABASE_FILE, MESH_STATUS_HISTORY_BIN)
+        elif STORAGE_BACKEND == 'csv':
+            _backend = csv_backend()
+        else:
+            raise ValueError(f'Unknown storage backend: {STORAGE_BACKEND}')
+    return _backend
+
+def set_backend(backend):
+    # Swap the active backend (tests, tools); returns the previous one
+    global _backend
+    previous, _backend = _backend, backend
+    return previous
+
+def batch():
+    # Commit every persistence call made inside the block at once
+    return get_backend().batch()
+
+@contextmanager
+def write_behind(max_records=1000, flush_interval=1.0, background=True):
+    # Route the append/save functions below through a WriteBuffer for the
+    # duration of the block; everything is flushed and synced on exit.
+    global _write_buffer
+    if _write_buffer is not None:
+        yield _write_buffer
+        return
+    buffer = WriteBuffer(get_backend(), max_records, flush_interval, background)
+    _write_buffer = buffer
+    try:
+        yield buffer
+    finally:
+        _write_buffer = None
+        buffer.close()
+
+def flush():
+    if _write_buffer is not None:
+        _write_buffer.flush()
+
+@timed(PERSISTENCE_SECONDS)
+def data_version(table):
+    # Opaque value that changes when `table` gains rows
+    flush()
+    return get_backend().data_version(table)
 
 # --- Battery State ---
+@timed(PERSISTENCE_SECONDS)
 def save_battery_state(current_charge_Ah):
-    with open(BATTERY_STATE_FILE, 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(['current_charge_Ah'])
-        writer.writerow([current_charge_Ah])
+    if _write_buffer is not None:
+        _write_buffer.save_battery_state(current_charge_Ah)
+        return
+    get_backend().save_battery_state(current_charge_Ah)
 
+@timed(PERSISTENCE_SECONDS)
 def load_battery_state():
-    if not os.path.exists(BATTERY_STATE_FILE):
-        return 0.0
-    with open(BATTERY_STATE_FILE, 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            return float(row['current_charge_Ah'])
-    return 0.0
+    flush()
+    return get_backend().load_battery_state()
 
 # --- Battery History ---
+@timed(PERSISTENCE_SECONDS)
 def append_battery_history(timestamp, voltage, current, charge_pct):
-    file_exists = os.path.exists(BATTERY_HISTORY_FILE)
-    with open(BATTERY_HISTORY_FILE, 'a', newline='') as f:
-        writer = csv.writer(f)
-        if not file_exists:
-            writer.writerow(['timestamp', 'voltage', 'current', 'charge_pct'])
-        writer.writerow([timestamp, voltage, current, charge_pct])
-
-def load_battery_history():
-    if not os.path.exists(BATTERY_HISTORY_FILE):
-        return []
-    with open(BATTERY_HISTORY_FILE, 'r') as f:
-        reader = csv.DictReader(f)
-        return list(reader)
+    if _write_buffer is not None:
+        _write_buffer.append_battery_history(timestamp, voltage, current, charge_pct)
+        return
+    get_backend().append_battery_history([(timestamp, voltage, current, charge_pct)])
+
+@timed(PERSISTENCE_SECONDS)
+def load_battery_history(since=None, until=None, limit=None):
+    flush()
+    return get_backend().load_battery_history(since, until, limit)
 
 # --- Users ---
+@timed(PERSISTENCE_SECONDS)
 def save_users(users):
     # users: dict username -> hashed_password
-    with open(USERS_FILE, 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(['username', 'hashed_password'])
-        for username, hashed in users.items():
-            writer.writerow([username, hashed])
+    get_backend().save_users(users)
 
+@timed(PERSISTENCE_SECONDS)
 def load_users():
-    if not os.path.exists(USERS_FILE):
-        return {}
-    users = {}
-    with open(USERS_FILE, 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            users[row['username']] = row['hashed_password']
-    return users
+    return get_backend().load_users()
+
+@timed(PERSISTENCE_SECONDS)
+def add_users(users):
+    # users: (username, hashed_password) pairs, committed together; names
+    # already taken are skipped. Returns the usernames added.
+    return get_backend().add_users(users)
+
+@timed(PERSISTENCE_SECONDS)
+def get_user(username):
+    # Hashed password for one user, or None
+    return get_backend().get_user(username)
+
+@timed(PERSISTENCE_SECONDS)
+def existing_users(usernames):
+    return get_backend().existing_users(usernames)
 
 # --- Sessions ---
+@timed(PERSISTENCE_SECONDS)
 def save_sessions(sessions):
     # sessions: dict session_id -> username
-    with open(SESSIONS_FILE, 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(['session_id', 'username'])
-        for sid, username in sessions.items():
-            writer.writerow([sid, username])
+    get_backend().save_sessions(sessions)
 
+@timed(PERSISTENCE_SECONDS)
 def load_sessions():
-    if not os.path.exists(SESSIONS_FILE):
-        return {}
-    sessions = {}
-    with open(SESSIONS_FILE, 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            sessions[row['session_id']] = row['username']
-    return sessions
+    return get_backend().load_sessions()
 
 # --- Event Log ---
-def append_event_log(event):
-    file_exists = os.path.exists(EVENT_LOG_FILE)
-    with open(EVENT_LOG_FILE, 'a', newline='') as f:
-        writer = csv.writer(f)
-        if not file_exists:
-            writer.writerow(['timestamp', 'event'])
-        writer.writerow([datetime.now().isoformat(), event])
-
-def load_event_log():
-    if not os.path.exists(EVENT_LOG_FILE):
-        return []
-    with open(EVENT_LOG_FILE, 'r') as f:
-        reader = csv.DictReader(f)
-        return list(reader)
+@timed(PERSISTENCE_SECONDS)
+def append_event_log(event, timestamp=None):
+    # event: an events.Event or a free-text message
+    if _write_buffer is not None:
+        _write_buffer.append_event_log(event, timestamp)
+        return
+    get_backend().append_events([(timestamp or datetime.now(), event)])
+
+def record_event(code, node_id=None, old=None, new=None, value=None, message=None, timestamp=None):
+    # Structured event, e.g. record_event(EventCode.MESH_MODE, old='normal', new='reduced')
+    append_event_log(make_event(code, node_id, old, new, value, message), timestamp)
+
+@timed(PERSISTENCE_SECONDS)
+def load_event_log(since=None, until=None, limit=None):
+    flush()
+    return get_backend().load_event_log(since, until, limit)
 
+@timed(PERSISTENCE_SECONDS)
+def query_events(since=None, until=None, contains=None, kind=None, cursor=None, limit=100, descending=False,
+                 subsystem=None, node_id=None):
+    # One page of events; returns (rows, next_cursor)
+    flush()
+    return get_backend().query_events(since, until, contains, kind, cursor, limit, descending,
+                                      subsystem, node_id)
+
+@timed(PERSISTENCE_SECONDS)
+def iter_events(since=None, until=None, contains=None, kind=None, cursor=None, descending=False,
+                subsystem=None, node_id=None, page_size=1000):
+    # Every matching event, fetched a page at a time so memory stays bounded
+    flush()
+    backend = get_backend()
+    while True:
+        rows, cursor = backend.query_events(since, until, contains, kind, cursor, page_size, descending,
+                                            subsystem, node_id)
+        yield from rows
+        if cursor is None:
+            return
+
+@timed(PERSISTENCE_SECONDS)
+def event_counts(by='type', since=None, until=None, kind=None, subsystem=None, node_id=None):
+    # e.g. event_counts() -> {'mesh_mode': 12, 'lighting_mode': 9}
+    flush()
+    return get_backend().event_counts(by, since, until, kind, subsystem, node_id)
+
+# --- Mesh Status History ---
+@timed(PERSISTENCE_SECONDS)
 def append_mesh_status(node_statuses):
     # node_statuses: dict of node_id -> (status, power_mode, bandwidth)
-    import json
-    file_exists = os.path.exists(MESH_STATUS_HISTORY_FILE)
-    with open(MESH_STATUS_HISTORY_FILE, 'a', newline='') as f:
-        writer = csv.writer(f)
-        if not file_exists:
-            writer.writerow(['timestamp', 'node_statuses'])
-        writer.writerow([datetime.now().isoformat(), json.dumps(node_statuses)])
-
-def load_mesh_status_history():
-    import json
-    if not os.path.exists(MESH_STATUS_HISTORY_FILE):
-        return []
-    with open(MESH_STATUS_HISTORY_FILE, 'r') as f:
-        reader = csv.DictReader(f)
-        records = []
-        for row in reader:
-            row['node_statuses'] = json.loads(row['node_statuses'])
-            records.append(row)
-        return records 
\ No newline at end of file
+    if _write_buffer is not None:
+        _write_buffer.append_mesh_status(node_statuses)
+        return
+    get_backend().append_mesh_status([(datetime.now(), node_statuses)])
+
+@timed(PERSISTENCE_SECONDS)
+def load_mesh_status_history(since=None, until=None, limit=None):
+    flush()
+    return get_backend().load_mesh_status_history(since, until, limit)
+
+@timed(PERSISTENCE_SECONDS)
+def load_mesh_status_arrays(since=None, until=None, limit=None):
+    # Columnar view of the history (see roadmesh.mesh_history.MeshStatusArrays)
+    flush()
+    return get_backend().load_mesh_status_arrays(since, until, limit)
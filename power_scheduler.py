@@ -0,0 +1,230 @@
+import logging
+from collections import namedtuple
+
+import numpy as np
+
+from roadmesh.batch_simulation import (CHARGE_EFFICIENCY, LIGHT_LOAD_A, MESH_LOAD_FACTOR, MESH_MODES,
+                                       LIGHTING_MODES, NIGHT_HOURS, THRESHOLDS, is_night, _mesh_codes,
+                                       _lighting_codes)
+
+logger = logging.getLogger(__name__)
+
+# Look-ahead mode scheduling. Instead of picking modes from the charge
+# right now, plan every hour up to the end of the coming night: given the
+# expected harvest per hour (learned from history) and each pole's draw,
+# choose mesh and lighting modes that maximize lit hours and mesh uptime
+# while keeping the battery above a reserve. The plan is a dynamic
+# program over charge levels, vectorized across poles, so a whole fleet
+# is re-planned every tick. Battery and load model: batch_simulation.
+
+# Value of one hour in each mode; lighting only counts at night
+LIGHT_VALUE = {'on': 1.0, 'dim': 0.6, 'emergency': 0.2, 'off': 0.0}
+MESH_VALUE = {'normal': 1.0, 'reduced': 0.7, 'critical': 0.4}
+Weights = namedtuple('Weights', ['light', 'mesh', 'reserve'])
+WEIGHTS = Weights(1.0, 1.0, 100.0)  # reserve: cost per % below the reserve, per hour
+RESERVE_PCT = 10
+LEVELS = 101  # charge levels in the plan, 0..100%
+HISTORY_DECAY = 0.3  # weight of the newest day in the per-hour harvest average
+
+Plan = namedtuple('Plan', [
+    'start_hour',
+    'mesh_mode',      # [poles, hours] index into MESH_MODES
+    'lighting_mode',  # [poles, hours] index into LIGHTING_MODES
+    'pct',            # [poles, hours + 1] expected charge, starting now
+    'value',          # per pole: planned light + mesh value
+    'meets_reserve',  # per pole: charge stays above the reserve throughout
+])
+
+# Every (mesh, lighting) combination; by day the lights are off
+ACTIONS = [(m, l) for m in range(len(MESH_MODES)) for l in range(len(LIGHTING_MODES))]
+DAY_ACTIONS = [i for i, (m, l) in enumerate(ACTIONS) if LIGHTING_MODES[l] == 'off']
+_MESH_FACTOR = np.array([MESH_LOAD_FACTOR[MESH_MODES[m]] for m, _ in ACTIONS])
+_LIGHT_LOAD = np.array([LIGHT_LOAD_A[LIGHTING_MODES[l]] for _, l in ACTIONS])
+_MESH_VALUE = np.array([MESH_VALUE[MESH_MODES[m]] for m, _ in ACTIONS])
+_LIGHT_VALUE = np.array([LIGHT_VALUE[LIGHTING_MODES[l]] for _, l in ACTIONS])
+_MESH_MODE = np.array([m for m, _ in ACTIONS])
+_LIGHTING_MODE = np.array([l for _, l in ACTIONS])
+
+
+def horizon(hour):
+    # Hours from `hour` to the end of the current or coming night
+    return (NIGHT_HOURS[1] - hour) % 24 or 24
+
+
+class HarvestForecast:
+    # Expected harvest current (A) per pole and hour of day: an
+    # exponentially weighted average over the days recorded so far
+    def __init__(self, poles, decay=HISTORY_DECAY):
+        self.decay = decay
+        self.mean = np.zeros((poles, 24))
+        self.seen = np.zeros(24, bool)
+
+    def record(self, hour, harvest_A):
+        harvest = np.asarray(harvest_A, np.float64)
+        if self.seen[hour]:
+            self.mean[:, hour] += self.decay * (harvest - self.mean[:, hour])
+        else:
+            self.mean[:, hour] = harvest
+            self.seen[hour] = True
+
+    def load(self, rows):
+        # rows of (datetime, harvest_A per pole), oldest first
+        for timestamp, harvest in rows:
+            self.record(timestamp.hour, harvest)
+        return self
+
+    def expected(self, start_hour, hours):
+        return self.mean[:, (start_hour + np.arange(hours)) % 24]
+
+
+def _step(pct, harvest_A, load_A, capacity_Ah):
+    # One hour of the batch_simulation battery model, in percent
+    charged = np.minimum(pct + harvest_A * CHARGE_EFFICIENCY / capacity_Ah * 100, 100.0)
+    return np.maximum(charged - load_A / capacity_Ah * 100, 0.0)
+
+
+def plan_modes(pct, capacity_Ah, consumption_A, harvest_A, start_hour, reserve_pct=RESERVE_PCT,
+               weights=WEIGHTS, levels=LEVELS):
+    # pct, capacity_Ah, consumption_A: per pole; harvest_A: [poles, hours]
+    pct = np.asarray(pct, np.float64)
+    poles, hours = harvest_A.shape
+    capacity_Ah = np.broadcast_to(np.asarray(capacity_Ah, np.float64), (poles,))
+    consumption_A = np.broadcast_to(np.asarray(consumption_A, np.float64), (poles,))
+    load = consumption_A[:, None] * _MESH_FACTOR + _LIGHT_LOAD  # [poles, actions]
+    grid = np.linspace(0.0, 100.0, levels)
+    scale = (levels - 1) / 100
+    nights = [is_night((start_hour + t) % 24) for t in range(hours)]
+    # Backwards: value[p, level] of the best plan from hour t on; floor()
+    # onto the grid keeps the plan on the pessimistic side
+    value = np.zeros((poles, levels))
+    policy = np.empty((hours, poles, levels), np.int8)
+    rows = np.arange(poles)[:, None]
+    for t in range(hours - 1, -1, -1):
+        actions = range(len(ACTIONS)) if nights[t] else DAY_ACTIONS
+        best = np.full((poles, levels), -np.inf)
+        choice = np.zeros((poles, levels), np.int8)
+        for a in actions:
+            after = _step(grid[None, :], harvest_A[:, t:t + 1], load[:, a:a + 1], capacity_Ah[:, None])
+            q = value[rows, np.floor(after * scale + 1e-9).astype(np.intp)]
+            q += weights.mesh * _MESH_VALUE[a] + (weights.light * _LIGHT_VALUE[a] if nights[t] else 0.0)
+            q -= weights.reserve * np.maximum(reserve_pct - after, 0.0)
+            better = q > best
+            best[better] = q[better]
+            choice[better] = a
+        value, policy[t] = best, choice
+    # Forwards from the actual charge
+    mesh = np.empty((poles, hours), np.int64)
+    lighting = np.empty((poles, hours), np.int64)
+    trace = np.empty((poles, hours + 1))
+    trace[:, 0] = pct
+    total = np.zeros(poles)
+    ok = np.ones(poles, bool)
+    current = pct.copy()
+    for t in range(hours):
+        a = policy[t, np.arange(poles), np.floor(current * scale + 1e-9).astype(np.intp)]
+        mesh[:, t] = _MESH_MODE[a]
+        lighting[:, t] = _LIGHTING_MODE[a]
+        current = _step(current, harvest_A[:, t], load[np.arange(poles), a], capacity_Ah)
+        trace[:, t + 1] = current
+        total += weights.mesh * _MESH_VALUE[a] + (weights.light * _LIGHT_VALUE[a] if nights[t] else 0.0)
+        ok &= current >= reserve_pct
+    return Plan(start_hour, mesh, lighting, trace, total, ok)
+
+
+def threshold_modes(pct, capacity_Ah, consumption_A, harvest_A, start_hour, reserve_pct=RESERVE_PCT,
+                    weights=WEIGHTS, thresholds=THRESHOLDS):
+    # The same horizon run with the instantaneous 60/30/10% rules, for
+    # comparison with plan_modes()
+    pct = np.asarray(pct, np.float64)
+    poles, hours = harvest_A.shape
+    light_load = np.array([LIGHT_LOAD_A[m] for m in LIGHTING_MODES])
+    mesh_factor = np.array([MESH_LOAD_FACTOR[m] for m in MESH_MODES])
+    mesh_value = np.array([MESH_VALUE[m] for m in MESH_MODES])
+    light_value = np.array([LIGHT_VALUE[m] for m in LIGHTING_MODES])
+    mesh = np.empty((poles, hours), np.int64)
+    lighting = np.empty((poles, hours), np.int64)
+    trace = np.empty((poles, hours + 1))
+    trace[:, 0] = pct
+    total = np.zeros(poles)
+    ok = np.ones(poles, bool)
+    current = pct.copy()
+    for t in range(hours):
+        night = is_night((start_hour + t) % 24)
+        mesh[:, t] = _mesh_codes(current, thresholds)
+        lighting[:, t] = _lighting_codes(current, night, thresholds)
+        load = np.asarray(consumption_A) * mesh_factor[mesh[:, t]] + light_load[lighting[:, t]]
+        current = _step(current, harvest_A[:, t], load, np.asarray(capacity_Ah, np.float64))
+        trace[:, t + 1] = current
+        total += weights.mesh * mesh_value[mesh[:, t]] + (weights.light * light_value[lighting[:, t]] if night else 0)
+        ok &= current >= reserve_pct
+    return Plan(start_hour, mesh, lighting, trace, total, ok)
+
+
+def describe(plan, i):
+    # [(mesh mode, lighting mode)] for each planned hour of pole i
+    return [(MESH_MODES[m], LIGHTING_MODES[l]) for m, l in zip(plan.mesh_mode[i], plan.lighting_mode[i])]
+
+
+class PowerScheduler:
+    # Fleet scheduler: feed it each hour's harvest and charge, get the
+    # modes to run for the next hour
+    def __init__(self, capacity_Ah, consumption_A, reserve_pct=RESERVE_PCT, weights=WEIGHTS, levels=LEVELS):
+        self.capacity_Ah = np.atleast_1d(np.asarray(capacity_Ah, np.float64))
+        self.consumption_A = np.broadcast_to(np.asarray(consumption_A, np.float64), self.capacity_Ah.shape)
+        self.reserve_pct = reserve_pct
+        self.weights = weights
+        self.levels = levels
+        self.forecast = HarvestForecast(len(self.capacity_Ah))
+        self.plan = None
+
+    def observe(self, hour, harvest_A):
+        self.forecast.record(hour, harvest_A)
+
+    def tick(self, hour, pct):
+        hours = horizon(hour)
+        self.plan = plan_modes(np.atleast_1d(pct), self.capacity_Ah, self.consumption_A,
+                               self.forecast.expected(hour, hours), hour, self.reserve_pct, self.weights,
+                               self.levels)
+        return self.plan.mesh_mode[:, 0], self.plan.lighting_mode[:, 0]
+
+
+class PoleScheduler:
+    # One pole wired to its monitors: update() takes the place of
+    # PowerManagement.update(), with planned rather than threshold modes,
+    # and drives the lights and mesh nodes it is given to match
+    def __init__(self, battery, energy, power_mgmt, lighting=None, mesh=None, reserve_pct=RESERVE_PCT,
+                 weights=WEIGHTS):
+        self.battery = battery
+        self.energy = energy
+        self.power_mgmt = power_mgmt
+        self.lighting = lighting
+        self.mesh = mesh
+        self.scheduler = PowerScheduler(battery.capacity_Ah, battery.consumption_rate, reserve_pct, weights)
+        self.modes = None
+
+    def update(self, now, harvest_A=None):
+        # harvest_A: this hour's solar + TEG current, if already read
+        if harvest_A is None:
+            harvest_A = self.energy.read_solar() + self.energy.read_teg()
+        self.scheduler.observe(now.hour, [harvest_A])
+        mesh, lighting = self.scheduler.tick(now.hour, [self.battery.calculate_percentage()])
+        modes = (MESH_MODES[mesh[0]], LIGHTING_MODES[lighting[0]])
+        if modes != self.modes:
+            logger.info(f'Planned modes: mesh {modes[0]}, lighting {modes[1]}')
+            self.modes = modes
+        self.power_mgmt.mode, self.power_mgmt.lighting_mode = modes
+        self.apply(*modes)
+        return modes
+
+    def apply(self, mesh_mode, lighting_mode):
+        if self.lighting is not None:
+            # The controller has no emergency level; dim is the nearest
+            if lighting_mode == 'on':
+                self.lighting.turn_on()
+            elif lighting_mode == 'off':
+                self.lighting.turn_off()
+            else:
+                self.lighting.dim()
+        if self.mesh is not None:
+            for node in self.mesh.nodes.values():
+                node.power_mode = mesh_mode
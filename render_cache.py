@@ -0,0 +1,107 @@
+import hashlib
+import io
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from roadmesh.metrics import counter, histogram
+
+# PNG cache for the dashboard charts. Entries are keyed on
+# (chart name, data version, size); the ETag is derived from that key, so a
+# conditional request can be answered before anything is rendered. Charts
+# are drawn with the object-oriented Agg API, never pyplot, so concurrent
+# renders in a threaded server do not share global figure state.
+
+RenderedChart = namedtuple('RenderedChart', ['png', 'etag'])
+
+RENDER_SECONDS = histogram('roadmesh_chart_render_seconds', 'Chart render time', ['chart'])
+CACHE_LOOKUPS = counter('roadmesh_chart_cache_lookups_total', 'Chart cache lookups', ['chart', 'result'])
+
+def new_figure(figsize):
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig
+
+def figure_png(fig, **savefig_kwargs):
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', **savefig_kwargs)
+    return buf.getvalue()
+
+def make_etag(key):
+    return hashlib.blake2b(repr(key).encode(), digest_size=12).hexdigest()
+
+
+class RenderCache:
+    def __init__(self, max_entries=64, workers=0, serve_stale=True):
+        # workers > 0 renders on a background pool; with serve_stale the
+        # previous image of the same chart and size is returned while a new
+        # version renders, instead of blocking the request
+        self.max_entries = max_entries
+        self.serve_stale = serve_stale
+        self._entries = OrderedDict()
+        self._latest = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix='render') if workers else None
+        self.hits = 0
+        self.misses = 0
+
+    def etag(self, name, version, size):
+        return make_etag((name, version, size))
+
+    def get(self, name, version, size, render):
+        # render(size) -> PNG bytes; called at most once per key
+        key = (name, version, size)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                CACHE_LOOKUPS.labels(name, 'hit').inc()
+                return entry
+            self.misses += 1
+            CACHE_LOOKUPS.labels(name, 'miss').inc()
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+            stale = self._latest.get((name, size))
+        if owner:
+            if self._pool is not None:
+                self._pool.submit(self._render, key, render, future)
+            else:
+                self._render(key, render, future)
+        if stale is not None and self.serve_stale and self._pool is not None and not future.done():
+            return stale
+        return future.result()
+
+    def _render(self, key, render, future):
+        try:
+            with RENDER_SECONDS.labels(key[0]).time():
+                entry = RenderedChart(render(key[2]), make_etag(key))
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            return
+        with self._lock:
+            del self._inflight[key]
+            self._entries[key] = entry
+            self._latest[(key[0], key[2])] = entry
+            while len(self._entries) > self.max_entries:
+                (name, _, size), evicted = self._entries.popitem(last=False)
+                if self._latest.get((name, size)) is evicted:
+                    del self._latest[(name, size)]  # only ever points at a cached entry
+        future.set_result(entry)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._latest.clear()
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
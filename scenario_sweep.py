@@ -0,0 +1,215 @@
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from roadmesh import persistence
+from roadmesh.batch_simulation import BatchSimulation, Thresholds, THRESHOLDS, make_fleet, summarize, write_results
+from roadmesh.storage import SQLiteBackend
+
+logger = logging.getLogger(__name__)
+
+# Parameter sweeps over the batch simulation. Each scenario runs in a
+# worker process whose working directory is private to it, so persistence
+# files with fixed names never collide between runs. Finished scenarios are
+# appended to a results CSV as they complete; re-running the same sweep
+# skips every scenario already in the table.
+
+# Harvest profiles: (solar peak A, daily cloud factor range)
+HARVEST_PROFILES = {
+    'clear': (1.2, (0.7, 1.0)),
+    'mixed': (1.0, (0.2, 1.0)),
+    'winter': (0.6, (0.1, 0.6)),
+}
+
+DEFAULTS = {
+    'capacity_Ah': 5.0,
+    'consumption_rate': 0.2,
+    'harvest': 'mixed',
+    'days': 30,
+    'nodes': 100,
+    'threshold_normal': THRESHOLDS.normal,
+    'threshold_reduced': THRESHOLDS.reduced,
+    'threshold_off': THRESHOLDS.off,
+    'seed': 0,
+}
+PARAMETERS = tuple(DEFAULTS)
+# Values are cast to these before use and hashing, so 4 and 4.0 (or a
+# number read back from JSON or the command line) name the same scenario
+PARAMETER_TYPES = {
+    'capacity_Ah': float,
+    'consumption_rate': float,
+    'harvest': str,
+    'days': float,
+    'nodes': int,
+    'threshold_normal': float,
+    'threshold_reduced': float,
+    'threshold_off': float,
+    'seed': int,
+}
+METRICS = ('mean_final_pct', 'min_pct', 'poles_ever_empty', 'hours_dark', 'emergency_hours',
+           'critical_mesh_hours', 'mesh_uptime', 'node_availability', 'transitions', 'elapsed')
+FIELDS = ('scenario_id',) + PARAMETERS + METRICS
+SIMULATION_START = datetime(2024, 1, 1)
+
+def normalize(params):
+    try:
+        return {name: PARAMETER_TYPES[name](params[name]) for name in PARAMETERS}
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'Bad sweep parameter value: {e}')
+
+def scenario_id(params):
+    key = json.dumps(list(normalize(params).values()))
+    return hashlib.blake2b(key.encode(), digest_size=6).hexdigest()
+
+def expand_grid(grid):
+    # grid: parameter -> value or list of values; missing ones use DEFAULTS
+    unknown = set(grid) - set(PARAMETERS)
+    if unknown:
+        raise ValueError(f'Unknown sweep parameters: {sorted(unknown)}')
+    axes = [grid.get(name, DEFAULTS[name]) for name in PARAMETERS]
+    axes = [axis if isinstance(axis, (list, tuple)) else [axis] for axis in axes]
+    scenarios = []
+    for values in itertools.product(*axes):
+        params = normalize(dict(zip(PARAMETERS, values)))
+        if params['harvest'] not in HARVEST_PROFILES:
+            raise ValueError(f"Unknown harvest profile: {params['harvest']}")
+        params['scenario_id'] = scenario_id(params)
+        scenarios.append(params)
+    return scenarios
+
+
+# --- Workers ---
+def _init_worker(work_root):
+    # Private working directory: any relative persistence path lands here
+    path = os.path.join(work_root, f'worker-{os.getpid()}')
+    os.makedirs(path, exist_ok=True)
+    os.chdir(path)
+    persistence.set_backend(None)
+
+def run_scenario(params, store_events=False, scenario_root=None):
+    started = time.perf_counter()
+    solar_peak_A, cloud_range = HARVEST_PROFILES[params['harvest']]
+    fleet = make_fleet(int(params['nodes']), params['seed'], params['capacity_Ah'], params['consumption_rate'],
+                       solar_peak_A)
+    thresholds = Thresholds(params['threshold_normal'], params['threshold_reduced'], params['threshold_off'])
+    simulation = BatchSimulation(fleet, SIMULATION_START, params['seed'], thresholds, cloud_range)
+    result = simulation.run(int(params['days'] * 24))
+    if store_events:
+        path = os.path.join(scenario_root or 'scenarios', params['scenario_id'])
+        os.makedirs(path, exist_ok=True)
+        store = SQLiteBackend(os.path.join(path, persistence.DATABASE_FILE),
+                              os.path.join(path, persistence.MESH_STATUS_HISTORY_BIN))
+        try:
+            write_results(result, store)
+        finally:
+            store.close()
+    row = dict(params)
+    row.update(summarize(result))
+    row['elapsed'] = time.perf_counter() - started
+    return {field: row[field] for field in FIELDS}
+
+
+# --- Results table ---
+def _number(value):
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+def load_results(path):
+    # Rows cut short by an interrupted run are left out, so their
+    # scenarios run again
+    if not os.path.exists(path):
+        return []
+    with open(path, newline='') as f:
+        return [{key: value if key in ('scenario_id', 'harvest') else _number(value) for key, value in row.items()}
+                for row in csv.DictReader(f) if None not in row and None not in row.values()]
+
+def append_result(path, row):
+    new = not os.path.exists(path) or os.path.getsize(path) == 0
+    torn = False
+    if not new:
+        with open(path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            torn = f.read(1) != b'\n'
+    with open(path, 'a', newline='') as f:
+        writer = csv.DictWriter(f, FIELDS)
+        if new:
+            writer.writeheader()
+        if torn:
+            f.write('\r\n')  # finish the cut-off row instead of running into it
+        writer.writerow(row)
+
+
+def run_sweep(grid, output_dir, workers=None, store_events=False, resume=True):
+    # Returns the full results table, including rows from earlier runs
+    os.makedirs(output_dir, exist_ok=True)
+    output_dir = os.path.abspath(output_dir)
+    table = os.path.join(output_dir, 'results.csv')
+    if not resume and os.path.exists(table):
+        os.remove(table)
+    done = {row['scenario_id'] for row in load_results(table)}
+    pending = [params for params in expand_grid(grid) if params['scenario_id'] not in done]
+    if done:
+        logger.info(f'Resuming sweep: {len(done)} scenarios done, {len(pending)} to run')
+    if pending:
+        with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                 initargs=(os.path.join(output_dir, 'work'),)) as pool:
+            futures = {pool.submit(run_scenario, params, store_events, os.path.join(output_dir, 'scenarios')): params
+                       for params in pending}
+            try:
+                for future in as_completed(futures):
+                    params = futures[future]
+                    try:
+                        row = future.result()
+                    except Exception as e:
+                        logger.error(f"Scenario {params['scenario_id']} failed: {e}")
+                        continue
+                    append_result(table, row)
+            except BaseException:
+                # Interrupted: keep what finished, drop the queue
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+    return load_results(table)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run RoadMesh simulation scenarios in parallel.')
+    parser.add_argument('output', help='directory for results.csv and per-scenario stores')
+    parser.add_argument('--grid', help='JSON file mapping parameters to lists of values')
+    parser.add_argument('--capacity', type=float, nargs='+', dest='capacity_Ah')
+    parser.add_argument('--consumption', type=float, nargs='+', dest='consumption_rate')
+    parser.add_argument('--harvest', nargs='+', choices=sorted(HARVEST_PROFILES))
+    parser.add_argument('--days', type=float, nargs='+')
+    parser.add_argument('--nodes', type=int, nargs='+')
+    parser.add_argument('--seed', type=int, nargs='+')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--events', action='store_true', help='store each scenario\'s transitions')
+    parser.add_argument('--restart', action='store_true', help='discard earlier results instead of resuming')
+    args = parser.parse_args(argv)
+    grid = {}
+    if args.grid:
+        with open(args.grid) as f:
+            grid.update(json.load(f))
+    for name in ('capacity_Ah', 'consumption_rate', 'harvest', 'days', 'nodes', 'seed'):
+        if getattr(args, name) is not None:
+            grid[name] = getattr(args, name)
+    rows = run_sweep(grid, args.output, args.workers, args.events, resume=not args.restart)
+    print(f"{len(rows)} scenarios in {os.path.join(args.output, 'results.csv')}")
+    for row in sorted(rows, key=lambda r: (r['hours_dark'], r['emergency_hours'])):
+        print(', '.join(f'{name}={row[name]}' for name in PARAMETERS[:5]),
+              f"-> dark {row['hours_dark']:.1f} h, emergency {row['emergency_hours']:.1f} h, "
+              f"uptime {row['mesh_uptime']:.3f}")
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,344 @@
+import errno
+import ipaddress
+import logging
+import os
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import AuthenticationError, Client, Listener
+
+from roadmesh.dashboard_state import MIN_REFRESH_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Dashboard state shared between worker processes (gunicorn -w N).
+# - One process, the owner, holds the subsystems, the StateTracker and the
+#   alert ring. It serves them on a local socket (multiprocessing
+#   connections, authenticated with a shared key).
+# - Every other worker gets a StateClient. A StateClient has the tracker's
+#   read interface (refresh/snapshot/diff/wait/version), pulls diffs from
+#   the owner at most once per interval and keeps a local copy. Reads
+#   between pulls cost no IPC.
+# - Writes are named commands, run in the owner one at a time and in
+#   arrival order, so every worker sees the same lighting state. The
+#   worker that sent a command pulls again before its next read, so it
+#   always sees its own change.
+# - Reads of the subsystems themselves (charts, routes, health reports)
+#   are named queries. They run in the owner, outside the command lock.
+# share() makes the first process to bind the address the owner.
+# Requests are pickles, so a peer that has the key can run code in every
+# worker: the key must be a real secret, and TCP addresses are limited to
+# loopback (prefer a Unix socket path, which file permissions protect).
+
+ALERT_CAPACITY = 200   # alerts kept in the ring
+IPC_TIMEOUT = 10       # seconds to wait for the owner's reply
+
+
+class StateUnavailable(Exception):
+    pass
+
+
+class AlertRing:
+    # The newest `capacity` alerts, numbered in order. Iterates and slices
+    # like the list of messages it replaces.
+    def __init__(self, capacity=ALERT_CAPACITY):
+        self._alerts = deque(maxlen=capacity)  # (seq, time, message)
+        self.last_seq = 0
+        self._lock = threading.Lock()
+
+    def append(self, message):
+        with self._lock:
+            self.last_seq += 1
+            self._alerts.append((self.last_seq, time.time(), message))
+            return self.last_seq
+
+    def since(self, seq=0):
+        return [alert for alert in list(self._alerts) if alert[0] > seq]
+
+    def __iter__(self):
+        return iter([message for _, _, message in list(self._alerts)])
+
+    def __getitem__(self, index):
+        return list(self)[index]
+
+    def __len__(self):
+        return len(self._alerts)
+
+
+def _loopback(host):
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return host == 'localhost'
+
+
+def _address(address):
+    # 'host:port' for TCP on loopback, anything else is a Unix socket path
+    host, _, port = address.rpartition(':') if isinstance(address, str) else ('', '', '')
+    if not (host and port.isdigit()):
+        return address
+    if not _loopback(host):
+        raise ValueError(f'Shared state only listens on loopback or a Unix socket, not {address}')
+    return host, int(port)
+
+
+# --- Owner ---
+class StateOwner:
+    def __init__(self, tracker, alerts, alert_section='alerts'):
+        self.tracker = tracker
+        self.alerts = alerts
+        self.alert_section = alert_section
+        self._commands = {}  # name -> (func, sections it changes)
+        self._queries = {}   # name -> func
+        self._lock = threading.Lock()  # commands run one at a time
+        self._listener = None
+
+    def register(self, name, func, sections=()):
+        # func(*args) runs in the owner; its result goes back to the caller
+        # and must pickle. `sections` are re-collected on the next refresh.
+        self._commands[name] = (func, tuple(sections))
+
+    def register_query(self, name, func):
+        # func(*args) only reads, so it runs alongside commands and other
+        # queries; its result must pickle
+        self._queries[name] = func
+
+    def query(self, name, *args):
+        try:
+            func = self._queries[name]
+        except KeyError:
+            raise ValueError(f'Unknown state query: {name}')
+        return func(*args)
+
+    def command(self, name, *args):
+        try:
+            func, sections = self._commands[name]
+        except KeyError:
+            raise ValueError(f'Unknown state command: {name}')
+        with self._lock:
+            result = func(*args)
+            for section in sections:
+                self.tracker.invalidate(section)
+        return result
+
+    def alert(self, message):
+        seq = self.alerts.append(message)
+        self.tracker.invalidate(self.alert_section)
+        return seq
+
+    # The tracker's read interface, as StateClient offers it
+    @property
+    def version(self):
+        return self.tracker.version
+
+    def refresh(self, force=False):
+        return self.tracker.refresh(force)
+
+    def snapshot(self):
+        return self.tracker.snapshot()
+
+    def diff(self, since):
+        return self.tracker.diff(since)
+
+    def wait(self, since, timeout=None):
+        return self.tracker.wait(since, timeout)
+
+    # --- Serving other workers ---
+    def serve(self, address, authkey):
+        # Requests are pickled, so the key is not optional
+        if not authkey:
+            raise ValueError('Serving shared state needs an authkey')
+        self._listener = Listener(_address(address), authkey=authkey)
+        threading.Thread(target=self._accept, name='state-owner', daemon=True).start()
+        logger.info(f'Serving dashboard state on {address}')
+
+    def close(self):
+        if self._listener is not None:
+            listener, self._listener = self._listener, None
+            listener.close()
+
+    def _accept(self):
+        while self._listener is not None:
+            try:
+                conn = self._listener.accept()
+            except (AuthenticationError, EOFError):
+                logger.warning('Rejected a state connection that failed authentication')
+                continue
+            except OSError:
+                return  # closed
+            threading.Thread(target=self._serve, args=(conn,), name='state-conn', daemon=True).start()
+
+    def _serve(self, conn):
+        with conn:
+            while True:
+                try:
+                    op, *args = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    reply = ('ok', self._handle(op, args))
+                except Exception as e:
+                    reply = ('error', e)
+                try:
+                    conn.send(reply)
+                except (OSError, ValueError):
+                    return
+
+    def _handle(self, op, args):
+        if op == 'diff':
+            self.tracker.refresh()
+            return self.tracker.diff(*args)
+        if op == 'command':
+            return self.command(*args)
+        if op == 'query':
+            return self.query(*args)
+        if op == 'alert':
+            return self.alert(*args)
+        if op == 'alerts':
+            return self.alerts.since(*args)
+        if op == 'hello':
+            return {'keyed': self.tracker.keyed_sections(), 'min_interval': self.tracker.min_interval}
+        raise ValueError(f'Unknown state request: {op}')
+
+
+# --- Workers ---
+class StateClient:
+    def __init__(self, address, authkey, timeout=IPC_TIMEOUT):
+        self.address = _address(address)
+        self.authkey = authkey
+        self.timeout = timeout
+        self.version = None
+        self.min_interval = MIN_REFRESH_INTERVAL
+        self._keyed = None
+        self._state = {}  # replaced, never mutated, so readers need no lock
+        self._last_refresh = None
+        self._conn = None
+        self._conn_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def _call(self, *request):
+        with self._conn_lock:
+            for attempt in range(2):  # once more on a fresh connection
+                try:
+                    if self._conn is None:
+                        self._conn = Client(self.address, authkey=self.authkey)
+                    self._conn.send(request)
+                    if not self._conn.poll(self.timeout):
+                        raise TimeoutError('No reply from the state owner')
+                    status, result = self._conn.recv()
+                    break
+                except (OSError, EOFError, AuthenticationError) as e:
+                    if self._conn is not None:
+                        self._conn.close()
+                        self._conn = None
+                    if attempt or isinstance(e, (TimeoutError, AuthenticationError)):
+                        raise StateUnavailable(f'State owner at {self.address} unreachable: {e}')
+        if status == 'error':
+            raise result
+        return result
+
+    def refresh(self, force=False):
+        with self._refresh_lock:
+            now = time.monotonic()
+            if not force and self._last_refresh is not None and now - self._last_refresh < self.min_interval:
+                return self.version
+            if self._keyed is None:
+                hello = self._call('hello')
+                self._keyed, self.min_interval = set(hello['keyed']), hello['min_interval']
+            self._apply(self._call('diff', self.version))
+            self._last_refresh = now
+            return self.version
+
+    def _apply(self, payload):
+        if payload['full']:
+            state = payload['state']
+        else:
+            state = dict(self._state)
+            for name, value in payload['changes'].items():
+                state[name] = {**state.get(name, {}), **value} if name in self._keyed else value
+            for name, keys in payload['removed'].items():
+                keys = set(keys)
+                state[name] = {k: v for k, v in state.get(name, {}).items() if k not in keys}
+        self._state = state
+        self.version = payload['version']
+
+    def snapshot(self):
+        if self.version is None:
+            self.refresh()
+        return {'version': self.version, 'full': True, 'state': self._state}
+
+    def diff(self, since):
+        if self.version is None:
+            self.refresh()
+        if since is not None and since == self.version:
+            return {'version': self.version, 'full': False, 'since': since, 'changes': {}, 'removed': {}}
+        payload = self._call('diff', since)
+        if payload['version'] > self.version:
+            self.refresh(force=True)  # keep version() at least as new as what callers saw
+        return payload
+
+    def wait(self, since, timeout=None):
+        # Polls the owner once per refresh interval
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.refresh() <= since:
+            remaining = self.min_interval if deadline is None else min(self.min_interval, deadline - time.monotonic())
+            if remaining <= 0:
+                break
+            time.sleep(remaining)
+        return self.version
+
+    def command(self, name, *args):
+        try:
+            return self._call('command', name, *args)
+        finally:
+            self._last_refresh = None  # read our own write
+
+    def query(self, name, *args):
+        return self._call('query', name, *args)
+
+    def alert(self, message):
+        try:
+            return self._call('alert', message)
+        finally:
+            self._last_refresh = None
+
+    def close(self):
+        with self._conn_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def _alive(address, authkey):
+    try:
+        Client(address, authkey=authkey).close()
+    except (ConnectionRefusedError, FileNotFoundError):
+        return False
+    except (OSError, AuthenticationError, EOFError):
+        pass
+    return True
+
+
+def share(owner, address=None, authkey=None):
+    # This process's view of the state: the owner itself when there is no
+    # address or this process binds it first, else a client of the process
+    # that did. A socket file left by a dead owner is taken over.
+    if address is None:
+        return owner
+    if not authkey:
+        raise ValueError('Sharing state needs an authkey')
+    for attempt in range(2):
+        try:
+            owner.serve(address, authkey)
+            return owner
+        except OSError as e:
+            if e.errno != errno.EADDRINUSE:
+                raise
+        path = _address(address)
+        if attempt or not isinstance(path, str) or _alive(path, authkey):
+            break
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+    return StateClient(address, authkey)
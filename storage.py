@@ -0,0 +1,718 @@
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+from roadmesh import mesh_history
+from roadmesh.events import Event, EventCode, Subsystem, as_event, code_of, subsystem_of, subsystem_name, type_name
+
+# Range queries use since <= timestamp < until. `limit` keeps the most
+# recent matching rows, returned oldest first.
+
+def to_epoch(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.timestamp()
+
+def to_isoformat(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value).isoformat()
+    return str(value)
+
+# Event pages are keyed on (ts, id); the cursor is the last row's key
+def encode_cursor(ts, row_id):
+    return f'{ts!r}:{row_id}'
+
+def decode_cursor(cursor):
+    try:
+        ts, row_id = cursor.split(':')
+        return float(ts), int(row_id)
+    except (AttributeError, ValueError):
+        raise ValueError(f'Invalid cursor: {cursor!r}')
+
+def _event_row(row_id, ts, timestamp, event):
+    # Query result for one stored event; `id` doubles as its sequence number
+    return {'id': row_id, 'ts': ts, 'timestamp': timestamp, 'event': event.message,
+            'type': type_name(event.code), 'subsystem': subsystem_name(event.subsystem),
+            'node_id': event.node_id, 'old': event.old, 'new': event.new, 'value': event.value}
+
+EVENT_GROUPS = {'type': 'code', 'subsystem': 'subsystem', 'node_id': 'node_id'}
+
+def _in_range(ts, since, until):
+    if since is not None and (ts is None or ts < since):
+        return False
+    if until is not None and (ts is None or ts >= until):
+        return False
+    return True
+
+
+class CSVBackend:
+    # Original flat-file layout. Every query scans the whole file, so this is
+    # only kept for small installs and as the source for migrate_csv().
+    def __init__(self, battery_state_file, battery_history_file, users_file,
+                 sessions_file, event_log_file, mesh_status_history_file):
+        self.battery_state_file = battery_state_file
+        self.battery_history_file = battery_history_file
+        self.users_file = users_file
+        self.sessions_file = sessions_file
+        self.event_log_file = event_log_file
+        self.mesh_status_history_file = mesh_status_history_file
+        self._users = None  # username -> hash, read once and then kept in step
+
+    @contextmanager
+    def batch(self):
+        yield self
+
+    def close(self):
+        pass
+
+    def data_version(self, table):
+        # Changes whenever the table's file does; used as a cache key
+        path = {'battery_history': self.battery_history_file, 'event_log': self.event_log_file,
+                'mesh_status_history': self.mesh_status_history_file}[table]
+        if not os.path.exists(path):
+            return None
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def sync(self):
+        for path in (self.battery_state_file, self.battery_history_file, self.event_log_file,
+                     self.mesh_status_history_file):
+            if os.path.exists(path):
+                with open(path, 'rb+') as f:
+                    os.fsync(f.fileno())
+
+    def _append_rows(self, path, header, rows):
+        file_exists = os.path.exists(path)
+        with open(path, 'a', newline='') as f:
+            writer = csv.writer(f)
+            if not file_exists:
+                writer.writerow(header)
+            writer.writerows(rows)
+
+    def _read_rows(self, path, since=None, until=None, limit=None):
+        if not os.path.exists(path):
+            return []
+        since, until = to_epoch(since), to_epoch(until)
+        with open(path, 'r', newline='') as f:
+            reader = csv.DictReader(f)
+            if since is None and until is None:
+                rows = list(reader)
+            else:
+                rows = [row for row in reader
+                        if _in_range(to_epoch(row['timestamp']), since, until)]
+        if limit is not None:
+            rows = rows[-limit:] if limit > 0 else []
+        return rows
+
+    # --- Battery State ---
+    def save_battery_state(self, current_charge_Ah):
+        with open(self.battery_state_file, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['current_charge_Ah'])
+            writer.writerow([current_charge_Ah])
+
+    def load_battery_state(self):
+        if not os.path.exists(self.battery_state_file):
+            return 0.0
+        with open(self.battery_state_file, 'r') as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                return float(row['current_charge_Ah'])
+        return 0.0
+
+    # --- Battery History ---
+    def append_battery_history(self, rows):
+        rows = [(to_isoformat(ts), voltage, current, charge_pct)
+                for ts, voltage, current, charge_pct in rows]
+        self._append_rows(self.battery_history_file,
+                          ['timestamp', 'voltage', 'current', 'charge_pct'], rows)
+
+    def load_battery_history(self, since=None, until=None, limit=None):
+        return self._read_rows(self.battery_history_file, since, until, limit)
+
+    def read_battery_history_since(self, position=None):
+        # Rows appended after `position`, in file order, so rows sharing a
+        # timestamp or written late are not skipped. Restarts if the file
+        # was truncated or replaced.
+        read = position['rows'] if position else 0
+        rows = self._read_rows(self.battery_history_file)
+        if len(rows) < read:
+            read = 0
+        return rows[read:], {'rows': len(rows)}
+
+    def load_battery_columns(self, since=None, until=None, limit=None):
+        return None  # callers fall back to load_battery_history()
+
+    # --- Users ---
+    def save_users(self, users):
+        with open(self.users_file, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['username', 'hashed_password'])
+            for username, hashed in users.items():
+                writer.writerow([username, hashed])
+        self._users = dict(users)
+
+    def load_users(self):
+        if not os.path.exists(self.users_file):
+            return {}
+        with open(self.users_file, 'r') as f:
+            return {row['username']: row['hashed_password'] for row in csv.DictReader(f)}
+
+    def _user_index(self):
+        if self._users is None:
+            self._users = self.load_users()
+        return self._users
+
+    def add_users(self, users):
+        # Appended, not rewritten; usernames already present are skipped
+        index = self._user_index()
+        new = {}
+        for username, hashed in users:
+            if username not in index and username not in new:
+                new[username] = hashed
+        self._append_rows(self.users_file, ['username', 'hashed_password'], new.items())
+        index.update(new)
+        return list(new)
+
+    def get_user(self, username):
+        return self._user_index().get(username)
+
+    def existing_users(self, usernames):
+        index = self._user_index()
+        return {username for username in usernames if username in index}
+
+    # --- Sessions ---
+    def save_sessions(self, sessions):
+        with open(self.sessions_file, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['session_id', 'username'])
+            for sid, username in sessions.items():
+                writer.writerow([sid, username])
+
+    def load_sessions(self):
+        if not os.path.exists(self.sessions_file):
+            return {}
+        with open(self.sessions_file, 'r') as f:
+            return {row['session_id']: row['username'] for row in csv.DictReader(f)}
+
+    # --- Event Log ---
+    def append_events(self, rows):
+        # Only the message is kept in the CSV layout; structure is re-parsed
+        rows = [(to_isoformat(ts), as_event(event).message) for ts, event in rows]
+        self._append_rows(self.event_log_file, ['timestamp', 'event'], rows)
+
+    def load_event_log(self, since=None, until=None, limit=None):
+        return self._read_rows(self.event_log_file, since, until, limit)
+
+    def _scan_events(self, since=None, until=None, contains=None, kind=None, subsystem=None, node_id=None):
+        if not os.path.exists(self.event_log_file):
+            return
+        since, until = to_epoch(since), to_epoch(until)
+        kind = code_of(kind) if kind is not None else None
+        subsystem = subsystem_of(subsystem) if subsystem is not None else None
+        needle = contains.lower() if contains else None
+        with open(self.event_log_file, 'r', newline='') as f:
+            for row_id, row in enumerate(csv.DictReader(f), 1):
+                ts = to_epoch(row['timestamp'])
+                if not _in_range(ts, since, until):
+                    continue
+                if needle is not None and needle not in row['event'].lower():
+                    continue
+                event = as_event(row['event'])
+                if kind is not None and event.code != kind:
+                    continue
+                if subsystem is not None and event.subsystem != subsystem:
+                    continue
+                if node_id is not None and event.node_id != str(node_id):
+                    continue
+                yield _event_row(row_id, ts, row['timestamp'], event)
+
+    def query_events(self, since=None, until=None, contains=None, kind=None, cursor=None,
+                     limit=100, descending=False, subsystem=None, node_id=None):
+        # Same contract as SQLiteBackend.query_events, by scanning the file;
+        # row ids are line numbers
+        after = decode_cursor(cursor)[1] if cursor else None
+        rows = [row for row in self._scan_events(since, until, contains, kind, subsystem, node_id)
+                if after is None or (row['id'] < after if descending else row['id'] > after)]
+        if descending:
+            rows.reverse()
+        return _page(rows, limit)
+
+    def event_counts(self, by='type', since=None, until=None, kind=None, subsystem=None, node_id=None):
+        if by not in EVENT_GROUPS:
+            raise ValueError(f'Cannot group events by {by!r}')
+        counts = {}
+        for row in self._scan_events(since, until, None, kind, subsystem, node_id):
+            counts[row[by]] = counts.get(row[by], 0) + 1
+        return counts
+
+    # --- Mesh Status History ---
+    def append_mesh_status(self, rows):
+        rows = [(to_isoformat(ts), json.dumps(statuses)) for ts, statuses in rows]
+        self._append_rows(self.mesh_status_history_file, ['timestamp', 'node_statuses'], rows)
+
+    def load_mesh_status_history(self, since=None, until=None, limit=None):
+        rows = self._read_rows(self.mesh_status_history_file, since, until, limit)
+        for row in rows:
+            row['node_statuses'] = json.loads(row['node_statuses'])
+        return rows
+
+    def load_mesh_status_arrays(self, since=None, until=None, limit=None):
+        return mesh_history.from_records(self.load_mesh_status_history(since, until, limit))
+
+    def read_mesh_status_since(self, position=None):
+        # Rows newer than the last timestamp seen; still a full file scan
+        last = position['ts'] if position else None
+        records = [row for row in self.load_mesh_status_history(since=last)
+                   if last is None or to_epoch(row['timestamp']) > last]
+        if records:
+            last = to_epoch(records[-1]['timestamp'])
+        return mesh_history.from_records(records), {'ts': last}
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS battery_state (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    current_charge_Ah REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS battery_history (
+    id INTEGER PRIMARY KEY,
+    ts REAL,
+    timestamp TEXT,
+    voltage REAL,
+    current REAL,
+    charge_pct REAL
+);
+CREATE INDEX IF NOT EXISTS battery_history_ts ON battery_history (ts);
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    hashed_password TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    username TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS event_log (
+    id INTEGER PRIMARY KEY,
+    ts REAL,
+    timestamp TEXT,
+    event TEXT,
+    code INTEGER,
+    subsystem INTEGER,
+    node_id TEXT,
+    old_value TEXT,
+    new_value TEXT,
+    value REAL
+);
+CREATE INDEX IF NOT EXISTS event_log_ts ON event_log (ts);
+'''
+
+# Applied after _migrate() has added the structured columns to older
+# databases. The trigram full-text index answers substring filters without
+# scanning the log; builds without FTS5 fall back to LIKE.
+EVENT_INDEX_SCHEMA = '''
+CREATE INDEX IF NOT EXISTS event_log_code_ts ON event_log (code, ts);
+CREATE INDEX IF NOT EXISTS event_log_subsystem_ts ON event_log (subsystem, ts);
+CREATE INDEX IF NOT EXISTS event_log_node_ts ON event_log (node_id, ts) WHERE node_id IS NOT NULL;
+'''
+EVENT_COLUMNS = (('code', 'INTEGER'), ('subsystem', 'INTEGER'), ('node_id', 'TEXT'),
+                 ('old_value', 'TEXT'), ('new_value', 'TEXT'), ('value', 'REAL'))
+EVENT_SEARCH_SCHEMA = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS event_log_fts USING fts5(
+    event, content='event_log', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS event_log_fts_insert AFTER INSERT ON event_log BEGIN
+    INSERT INTO event_log_fts (rowid, event) VALUES (new.id, new.event);
+END;
+CREATE TRIGGER IF NOT EXISTS event_log_fts_delete AFTER DELETE ON event_log BEGIN
+    INSERT INTO event_log_fts (event_log_fts, rowid, event) VALUES ('delete', old.id, old.event);
+END;
+'''
+TRIGRAM = 3  # shorter search strings cannot use the trigram index
+
+def _page(rows, limit):
+    # rows were fetched with one extra to tell whether another page exists
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1]['ts'], rows[-1]['id'])
+
+
+class SQLiteBackend:
+    # Single-file store in WAL mode: readers never block the writer, and the
+    # ts indexes turn since/until/limit into index range scans. Mesh status
+    # history lives next to the database in the columnar format from
+    # roadmesh.mesh_history rather than as JSON rows.
+    def __init__(self, path, mesh_history_path=None):
+        self.path = path
+        self.mesh_history_path = mesh_history_path or os.path.splitext(path)[0] + '_mesh_status.bin'
+        self.mesh_history = mesh_history.MeshHistoryWriter(self.mesh_history_path)
+        self._lock = threading.RLock()
+        self._batch_depth = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+        self.conn.commit()
+
+    def _migrate(self):
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(event_log)')]
+        if 'code' not in columns:
+            # Free-text event log: add the structured columns and fill them
+            # from the messages
+            for name, sql_type in EVENT_COLUMNS:
+                self.conn.execute(f'ALTER TABLE event_log ADD COLUMN {name} {sql_type}')
+            rows = self.conn.execute('SELECT id, event FROM event_log').fetchall()
+            self.conn.executemany(
+                'UPDATE event_log SET code = ?, subsystem = ?, node_id = ?, old_value = ?, new_value = ?, '
+                'value = ? WHERE id = ?', (as_event(event)[:6] + (row_id,) for row_id, event in rows))
+        self.conn.execute('DROP INDEX IF EXISTS event_log_type_ts')
+        self.conn.executescript(EVENT_INDEX_SCHEMA)
+        exists = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'event_log_fts'").fetchone()
+        try:
+            self.conn.executescript(EVENT_SEARCH_SCHEMA)
+        except sqlite3.OperationalError:
+            self.fts = False
+            return
+        self.fts = True
+        if not exists:
+            self.conn.execute("INSERT INTO event_log_fts (event_log_fts) VALUES ('rebuild')")
+
+    @contextmanager
+    def batch(self):
+        # Group every write inside the block into a single commit
+        with self._lock:
+            self._batch_depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._batch_depth -= 1
+                if not self._batch_depth:
+                    self.conn.rollback()
+                raise
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self.conn.commit()
+
+    def _write(self, sql, params=(), many=False):
+        with self._lock:
+            if many:
+                self.conn.executemany(sql, params)
+            else:
+                self.conn.execute(sql, params)
+            if not self._batch_depth:
+                self.conn.commit()
+
+    def _range(self, since, until):
+        clauses, params = [], []
+        since, until = to_epoch(since), to_epoch(until)
+        if since is not None:
+            clauses.append('ts >= ?')
+            params.append(since)
+        if until is not None:
+            clauses.append('ts < ?')
+            params.append(until)
+        return (f" WHERE {' AND '.join(clauses)}" if clauses else ''), params
+
+    def _query(self, table, columns, since=None, until=None, limit=None):
+        where, params = self._range(since, until)
+        if limit is None:
+            sql = f'SELECT {columns} FROM {table}{where} ORDER BY ts, id'
+        else:
+            sql = (f'SELECT * FROM (SELECT id, {columns} FROM {table}{where} '
+                   f'ORDER BY ts DESC, id DESC LIMIT ?) ORDER BY ts, id')
+            params.append(max(limit, 0))
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [{key: row[key] for key in row.keys() if key not in ('id', 'ts')} for row in rows]
+
+    def close(self):
+        with self._lock:
+            self.conn.commit()
+            self.conn.close()
+            self.mesh_history.close()
+
+    def data_version(self, table):
+        # Changes whenever rows are appended; used as a cache key
+        if table == 'mesh_status_history':
+            return self.mesh_history.count
+        with self._lock:
+            return self.conn.execute(f'SELECT MAX(id) FROM {table}').fetchone()[0]
+
+    def sync(self):
+        # synchronous=NORMAL leaves recent commits in the WAL; a FULL
+        # checkpoint copies them into the database file and fsyncs it
+        with self._lock:
+            self.conn.commit()
+            self.conn.execute('PRAGMA wal_checkpoint(FULL)')
+            self.mesh_history.sync()
+
+    # --- Battery State ---
+    def save_battery_state(self, current_charge_Ah):
+        self._write('INSERT OR REPLACE INTO battery_state (id, current_charge_Ah) VALUES (0, ?)',
+                    (current_charge_Ah,))
+
+    def load_battery_state(self):
+        with self._lock:
+            row = self.conn.execute('SELECT current_charge_Ah FROM battery_state WHERE id = 0').fetchone()
+        return float(row[0]) if row else 0.0
+
+    # --- Battery History ---
+    def append_battery_history(self, rows):
+        rows = [(to_epoch(ts), to_isoformat(ts), voltage, current, charge_pct)
+                for ts, voltage, current, charge_pct in rows]
+        self._write('INSERT INTO battery_history (ts, timestamp, voltage, current, charge_pct) '
+                    'VALUES (?, ?, ?, ?, ?)', rows, many=True)
+
+    def load_battery_history(self, since=None, until=None, limit=None):
+        return self._query('battery_history', 'ts, timestamp, voltage, current, charge_pct',
+                           since, until, limit)
+
+    def read_battery_history_since(self, position=None):
+        # Rows inserted after `position`, in insert order (by rowid), so
+        # rows sharing a timestamp or backfilled later are not skipped
+        last = position['id'] if position else 0
+        with self._lock:
+            rows = self.conn.execute('SELECT id, timestamp, voltage, current, charge_pct FROM battery_history '
+                                     'WHERE id > ? ORDER BY id', (last,)).fetchall()
+        if rows:
+            last = rows[-1]['id']
+        return [{key: row[key] for key in row.keys() if key != 'id'} for row in rows], {'id': last}
+
+    def load_battery_columns(self, since=None, until=None, limit=None, chunk_size=100000):
+        # (ts, voltage, current, charge_pct) as float64 arrays, NULL as NaN
+        where, params = self._range(since, until)
+        sql = f'SELECT ts, voltage, current, charge_pct FROM battery_history{where} ORDER BY ts, id'
+        if limit is not None:
+            sql = (f'SELECT ts, voltage, current, charge_pct FROM (SELECT id, ts, voltage, current, '
+                   f'charge_pct FROM battery_history{where} ORDER BY ts DESC, id DESC LIMIT ?) ORDER BY ts, id')
+            params.append(max(limit, 0))
+        chunks = []
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.row_factory = None
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                chunks.append(np.array(rows, np.float64))
+        data = np.concatenate(chunks) if chunks else np.empty((0, 4), np.float64)
+        return tuple(np.ascontiguousarray(data[:, i]) for i in range(4))
+
+    # --- Users ---
+    def save_users(self, users):
+        with self.batch():
+            self.conn.execute('DELETE FROM users')
+            self.conn.executemany('INSERT INTO users (username, hashed_password) VALUES (?, ?)',
+                                  users.items())
+
+    def load_users(self):
+        with self._lock:
+            return dict(self.conn.execute('SELECT username, hashed_password FROM users').fetchall())
+
+    def add_users(self, users):
+        # Inserts only the new usernames, in one transaction; returns them
+        first = {}
+        for username, hashed in users:
+            first.setdefault(username, hashed)
+        users = first
+        with self.batch():
+            existing = self.existing_users(users)
+            new = [(username, hashed) for username, hashed in users.items() if username not in existing]
+            self.conn.executemany('INSERT INTO users (username, hashed_password) VALUES (?, ?)', new)
+        return [username for username, _ in new]
+
+    def get_user(self, username):
+        # Primary key lookup; the table is never read in full
+        with self._lock:
+            row = self.conn.execute('SELECT hashed_password FROM users WHERE username = ?', (username,)).fetchone()
+        return row[0] if row else None
+
+    def existing_users(self, usernames, chunk_size=500):
+        usernames, found = list(usernames), set()
+        with self._lock:
+            for i in range(0, len(usernames), chunk_size):
+                chunk = usernames[i:i + chunk_size]
+                found.update(row[0] for row in self.conn.execute(
+                    f"SELECT username FROM users WHERE username IN ({','.join('?' * len(chunk))})", chunk))
+        return found
+
+    # --- Sessions ---
+    def save_sessions(self, sessions):
+        with self.batch():
+            self.conn.execute('DELETE FROM sessions')
+            self.conn.executemany('INSERT INTO sessions (session_id, username) VALUES (?, ?)',
+                                  sessions.items())
+
+    def load_sessions(self):
+        with self._lock:
+            return dict(self.conn.execute('SELECT session_id, username FROM sessions').fetchall())
+
+    # --- Event Log ---
+    def append_events(self, rows):
+        # rows: (timestamp, Event or free-text message)
+        rows = [(to_epoch(ts), to_isoformat(ts), event.message) + tuple(event[:6])
+                for ts, event in ((ts, as_event(event)) for ts, event in rows)]
+        self._write('INSERT INTO event_log (ts, timestamp, event, code, subsystem, node_id, old_value, '
+                    'new_value, value) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows, many=True)
+
+    def load_event_log(self, since=None, until=None, limit=None):
+        return self._query('event_log', 'ts, timestamp, event', since, until, limit)
+
+    def _event_filters(self, since, until, contains=None, kind=None, subsystem=None, node_id=None):
+        where, params = self._range(since, until)
+        clauses = [where[len(' WHERE '):]] if where else []
+        if kind is not None:
+            clauses.append('code = ?')
+            params.append(int(code_of(kind)))
+        if subsystem is not None:
+            clauses.append('subsystem = ?')
+            params.append(int(subsystem_of(subsystem)))
+        if node_id is not None:
+            clauses.append('node_id = ?')
+            params.append(str(node_id))
+        if contains:
+            if self.fts and len(contains) >= TRIGRAM:
+                clauses.append('id IN (SELECT rowid FROM event_log_fts WHERE event_log_fts MATCH ?)')
+                params.append('"' + contains.replace('"', '""') + '"')
+            else:
+                clauses.append("event LIKE ? ESCAPE '\\'")
+                escaped = contains.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+                params.append(f'%{escaped}%')
+        return clauses, params
+
+    def query_events(self, since=None, until=None, contains=None, kind=None, cursor=None,
+                     limit=100, descending=False, subsystem=None, node_id=None):
+        # One page of events in (ts, id) order, filtered on the ts, code,
+        # subsystem, node and full-text indexes. Returns (rows, next_cursor);
+        # next_cursor is None on the last page.
+        clauses, params = self._event_filters(since, until, contains, kind, subsystem, node_id)
+        if cursor:
+            clauses.append('(ts, id) < (?, ?)' if descending else '(ts, id) > (?, ?)')
+            params.extend(decode_cursor(cursor))
+        order = 'DESC' if descending else 'ASC'
+        sql = (f"SELECT id, ts, timestamp, event, code, subsystem, node_id, old_value, new_value, value "
+               f"FROM event_log{' WHERE ' + ' AND '.join(clauses) if clauses else ''} "
+               f"ORDER BY ts {order}, id {order}")
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(max(limit, 0) + 1)
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        rows = [_event_row(row['id'], row['ts'], row['timestamp'], Event(
+                    EventCode(row['code']), Subsystem(row['subsystem']), row['node_id'], row['old_value'],
+                    row['new_value'], row['value'], row['event'])) for row in rows]
+        return _page(rows, limit)
+
+    def event_counts(self, by='type', since=None, until=None, kind=None, subsystem=None, node_id=None):
+        # Number of events per type, subsystem or node, counted on the indexes
+        if by not in EVENT_GROUPS:
+            raise ValueError(f'Cannot group events by {by!r}')
+        column = EVENT_GROUPS[by]
+        clauses, params = self._event_filters(since, until, None, kind, subsystem, node_id)
+        if by == 'node_id':
+            clauses.append('node_id IS NOT NULL')
+        sql = (f"SELECT {column}, COUNT(*) FROM event_log"
+               f"{' WHERE ' + ' AND '.join(clauses) if clauses else ''} GROUP BY {column}")
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        name = {'type': type_name, 'subsystem': subsystem_name}.get(by, str)
+        return {name(key): n for key, n in rows}
+
+    # --- Mesh Status History ---
+    def append_mesh_status(self, rows):
+        rows = [(to_epoch(ts), statuses) for ts, statuses in rows]
+        with self._lock:
+            self.mesh_history.append_many(rows)
+
+    def load_mesh_status_arrays(self, since=None, until=None, limit=None):
+        return mesh_history.read_arrays(self.mesh_history_path, to_epoch(since), to_epoch(until), limit)
+
+    def load_mesh_status_history(self, since=None, until=None, limit=None):
+        return mesh_history.to_records(self.load_mesh_status_arrays(since, until, limit))
+
+    def read_mesh_status_since(self, position=None):
+        return mesh_history.read_since(self.mesh_history_path, position)
+
+    def count(self, table):
+        if table == 'mesh_status_history':
+            return self.mesh_history.count
+        with self._lock:
+            return self.conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+
+# --- CSV migration ---
+def migrate_csv(source, target):
+    # One-shot import of an existing CSV install into `target`. Tables that
+    # already hold data are skipped so the tool is safe to re-run.
+    counts = {}
+    with target.batch():
+        if not target.count('battery_state') and os.path.exists(source.battery_state_file):
+            target.save_battery_state(source.load_battery_state())
+            counts['battery_state'] = 1
+        if not target.count('battery_history'):
+            rows = source.load_battery_history()
+            target.append_battery_history(
+                (row['timestamp'], _float_or_none(row['voltage']), _float_or_none(row['current']),
+                 _float_or_none(row['charge_pct'])) for row in rows)
+            counts['battery_history'] = len(rows)
+        if not target.count('users'):
+            users = source.load_users()
+            target.save_users(users)
+            counts['users'] = len(users)
+        if not target.count('sessions'):
+            sessions = source.load_sessions()
+            target.save_sessions(sessions)
+            counts['sessions'] = len(sessions)
+        if not target.count('event_log'):
+            rows = source.load_event_log()
+            target.append_events((row['timestamp'], row['event']) for row in rows)
+            counts['event_log'] = len(rows)
+        if not target.count('mesh_status_history'):
+            rows = source.load_mesh_status_history()
+            target.append_mesh_status((row['timestamp'], row['node_statuses']) for row in rows)
+            counts['mesh_status_history'] = len(rows)
+    return {table: n for table, n in counts.items() if n}
+
+def _float_or_none(value):
+    return float(value) if value not in (None, '') else None
+
+
+def main(argv=None):
+    from roadmesh import persistence
+    parser = argparse.ArgumentParser(description='Import RoadMesh CSV files into the SQLite store.')
+    parser.add_argument('--source', default='.', help='directory holding the CSV files')
+    parser.add_argument('--database', default=persistence.DATABASE_FILE, help='SQLite file to create or extend')
+    parser.add_argument('--mesh-history', default=persistence.MESH_STATUS_HISTORY_BIN,
+                        help='columnar mesh status history file')
+    args = parser.parse_args(argv)
+    source = persistence.csv_backend(args.source)
+    target = SQLiteBackend(args.database, args.mesh_history)
+    try:
+        counts = migrate_csv(source, target)
+    finally:
+        target.close()
+    for table, n in counts.items():
+        print(f'{table}: imported {n} rows')
+    if not counts:
+        print('Nothing to import: target tables already populated')
+
+if __name__ == '__main__':
+    main()
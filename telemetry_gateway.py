@@ -0,0 +1,568 @@
+import argparse
+import asyncio
+import hmac
+import ipaddress
+import json
+import logging
+import math
+import os
+import struct
+import threading
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
+
+from roadmesh import persistence
+from roadmesh.events import EventCode
+from roadmesh.metrics import Family, LatencyHistogram, histogram_samples
+
+logger = logging.getLogger(__name__)
+
+# Telemetry from field nodes over the network. Poles push batches of
+# readings as NDJSON lines or compact binary frames, over TCP, UDP or HTTP
+# POST, to one asyncio service. Readings are validated and coalesced per
+# node (the newest value of each field wins). Once per flush interval the
+# coalesced batch goes to a sink on a worker thread. When the sink falls
+# behind, back-pressure applies: TCP connections stop being read, HTTP
+# answers 503 and UDP datagrams are dropped and counted.
+#
+# Binary frame: HEADER (magic 'RM', version, flags, payload length), then a
+# u16 reading count and per reading a u8 node id length, the id (UTF-8)
+# and RECORD. NaN floats and status 255 mean "not reported".
+#
+# NDJSON line: {"node": "P-17", "ts": 1718000000.5, "v": 12.6, "i": 0.4,
+# "pct": 81.5, "status": "UP"}; everything but "node" is optional.
+#
+# Authentication: a gateway given a token accepts only data that carries
+# it. Frames set FLAG_TOKEN and start their payload with a u8 length and
+# the token, NDJSON lines add "token", and HTTP requests send
+# "Authorization: Bearer <token>". Without a token the gateway only
+# listens on loopback. The token is not encrypted, so anything past a
+# trusted network needs a VPN or TLS tunnel in front.
+
+MAGIC = b'RM'
+VERSION = 1
+HEADER = struct.Struct('!2sBBI')  # magic, version, flags, payload bytes
+COUNT = struct.Struct('!H')
+RECORD = struct.Struct('!dfffB')  # ts, voltage, current, charge %, status
+STATUSES = ('UP', 'DOWN')
+NO_STATUS = 255
+FLAG_TOKEN = 1                 # header flag: the payload starts with the token
+
+MAX_FRAME = 1 << 20            # bytes per binary frame or HTTP body
+MAX_LINE = 64 * 1024           # bytes per NDJSON line
+MAX_NODE_ID = 64
+MAX_FUTURE_SKEW = 300          # seconds a reading's timestamp may be ahead
+FLUSH_INTERVAL = 1.0           # seconds between sink calls
+MAX_PENDING_NODES = 50000      # coalesced nodes waiting before back-pressure
+LIMITS = {'voltage': (0.0, 60.0), 'current': (-50.0, 50.0), 'charge_pct': (0.0, 100.0)}
+
+Reading = namedtuple('Reading', ['node_id', 'ts', 'voltage', 'current', 'charge_pct', 'status'])
+Reading.__new__.__defaults__ = (None, None, None, None)
+
+
+class Unauthorized(Exception):
+    pass
+
+
+# --- Wire formats ---
+def _float(value):
+    return math.nan if value is None else value
+
+
+def _optional(value):
+    return None if value != value else value
+
+
+def _token(token):
+    return token.encode() if isinstance(token, str) else token
+
+
+def encode_frame(readings, token=None):
+    token = _token(token)
+    parts = [bytes((len(token),)) + token] if token else []
+    parts.append(COUNT.pack(len(readings)))
+    for r in readings:
+        node = r.node_id.encode()
+        status = NO_STATUS if r.status is None else STATUSES.index(r.status)
+        parts.append(bytes((len(node),)) + node +
+                     RECORD.pack(r.ts, _float(r.voltage), _float(r.current), _float(r.charge_pct), status))
+    payload = b''.join(parts)
+    return HEADER.pack(MAGIC, VERSION, FLAG_TOKEN if token else 0, len(payload)) + payload
+
+
+def decode_payload(payload):
+    try:
+        (n,), offset = COUNT.unpack_from(payload), COUNT.size
+        readings = []
+        for _ in range(n):
+            size = payload[offset]
+            node = payload[offset + 1:offset + 1 + size].decode()
+            offset += 1 + size
+            ts, voltage, current, pct, status = RECORD.unpack_from(payload, offset)
+            offset += RECORD.size
+            readings.append(Reading(node, ts, _optional(voltage), _optional(current), _optional(pct),
+                                    STATUSES[status] if status < len(STATUSES) else None))
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise ValueError(f'Malformed telemetry frame: {e}')
+    if offset != len(payload):
+        raise ValueError('Trailing bytes in telemetry frame')
+    return readings
+
+
+def read_header(data):
+    # (payload bytes, flags)
+    magic, version, flags, size = HEADER.unpack(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('Not a telemetry frame')
+    if size > MAX_FRAME:
+        raise ValueError(f'Telemetry frame too large: {size} bytes')
+    return size, flags
+
+
+def check_frame(payload, flags, token=None):
+    # The payload past its token; Unauthorized unless the token matches
+    # (token None: no check)
+    presented = b''
+    if flags & FLAG_TOKEN:
+        size = payload[0] if payload else 0
+        presented, payload = payload[1:1 + size], payload[1 + size:]
+    if token is not None and not hmac.compare_digest(presented, token):
+        raise Unauthorized('Telemetry frame without a valid token')
+    return payload
+
+
+def decode_line(line, now, token=None):
+    record = json.loads(line)
+    if token is not None and not hmac.compare_digest(str(record.get('token', '')).encode(), token):
+        raise Unauthorized('Telemetry line without a valid token')
+    status = record.get('status')
+    return Reading(str(record['node']), float(record.get('ts') or now),
+                   *(None if record.get(k) is None else float(record[k]) for k in ('v', 'i', 'pct')),
+                   None if status is None else str(status).upper())
+
+
+def encode_lines(readings, token=None):
+    extra = {'token': token.decode() if isinstance(token, bytes) else token} if token else {}
+    return ''.join(json.dumps({'node': r.node_id, 'ts': r.ts, 'v': r.voltage, 'i': r.current,
+                               'pct': r.charge_pct, 'status': r.status, **extra}, separators=(',', ':')) + '\n'
+                   for r in readings).encode()
+
+
+def parse_body(data, now, token=None):
+    # One UDP datagram or HTTP body: binary frames or NDJSON lines.
+    # Returns (readings, lines that did not parse); Unauthorized if any
+    # frame or line lacks `token`.
+    readings, bad = [], 0
+    if data[:2] == MAGIC:
+        offset = 0
+        while offset < len(data):
+            size, flags = read_header(data[offset:offset + HEADER.size])
+            start = offset + HEADER.size
+            if start + size > len(data):
+                raise ValueError('Truncated telemetry frame')
+            readings.extend(decode_payload(check_frame(data[start:start + size], flags, token)))
+            offset = start + size
+        return readings, bad
+    for line in data.splitlines():
+        if line.strip():
+            try:
+                readings.append(decode_line(line, now, token))
+            except (ValueError, KeyError, TypeError, AttributeError):
+                bad += 1
+    return readings, bad
+
+
+def valid(reading, now):
+    if not reading.node_id or len(reading.node_id) > MAX_NODE_ID:
+        return False
+    if not (math.isfinite(reading.ts) and 0 < reading.ts <= now + MAX_FUTURE_SKEW):
+        return False
+    for field, (low, high) in LIMITS.items():
+        value = getattr(reading, field)
+        if value is not None and not low <= value <= high:
+            return False
+    return reading.status is None or reading.status in STATUSES
+
+
+def merge(old, new):
+    # Newest value of each field; fields a reading leaves out keep the older value
+    if new.ts < old.ts:
+        old, new = new, old
+    return Reading(new.node_id, new.ts, *(n if n is not None else o for o, n in zip(old[2:], new[2:])))
+
+
+# --- Sink ---
+class SubsystemSink:
+    # Applies coalesced readings on the gateway's worker thread:
+    # - batteries: node id -> BatteryChargeMonitoring for poles whose
+    #   charge is tracked here; gets charge and voltage, and its history is
+    #   persisted
+    # - mesh: anything with set_node_status(); status changes are applied,
+    #   logged as NODE_STATUS events and the node statuses persisted
+    def __init__(self, batteries=None, mesh=None, lock=None, persist=True):
+        self.batteries = batteries or {}
+        self.mesh = mesh
+        self.lock = lock
+        self.persist = persist
+        self.statuses = {}  # last status applied per node
+
+    def __call__(self, readings):
+        changed = []
+        with self.lock or nullcontext():
+            for r in readings:
+                battery = self.batteries.get(r.node_id)
+                if battery is not None and r.charge_pct is not None:
+                    battery.current_charge_Ah = battery.capacity_Ah * r.charge_pct / 100
+                if battery is not None and r.voltage is not None:
+                    battery.voltage_data.append({'timestamp': datetime.fromtimestamp(r.ts), 'voltage': r.voltage})
+                if self.mesh is not None and r.status is not None:
+                    old = self.statuses.get(r.node_id)
+                    if old is None and r.node_id in self.mesh.nodes:
+                        old = self.mesh.nodes[r.node_id].status
+                    if r.status != old:
+                        if r.node_id not in self.mesh.nodes:
+                            self.mesh.add_node(r.node_id)
+                        self.mesh.set_node_status(r.node_id, r.status)
+                        changed.append((r, old))
+                    self.statuses[r.node_id] = r.status
+            statuses = self.mesh.get_node_statuses() if changed else None
+        if not self.persist:
+            return
+        with persistence.batch():
+            for r in readings:
+                if r.node_id in self.batteries and r.voltage is not None:
+                    persistence.append_battery_history(datetime.fromtimestamp(r.ts), r.voltage, r.current,
+                                                       r.charge_pct)
+            for r, old in changed:
+                if old is None:
+                    continue  # first report from a new node
+                persistence.record_event(EventCode.NODE_STATUS, r.node_id, old, r.status,
+                                         timestamp=datetime.fromtimestamp(r.ts))
+            if statuses is not None:
+                persistence.append_mesh_status(statuses)
+
+
+# --- Gateway ---
+class _UDPProtocol(asyncio.DatagramProtocol):
+    def __init__(self, gateway):
+        self.gateway = gateway
+
+    def datagram_received(self, data, addr):
+        gateway = self.gateway
+        if gateway.saturated:
+            gateway.stats['dropped'] += 1  # no way to slow a UDP sender down
+            return
+        try:
+            readings, bad = parse_body(data, gateway.clock(), gateway.token)
+        except ValueError:
+            gateway.stats['bad_frames'] += 1
+            return
+        except Unauthorized:
+            gateway.stats['unauthorized'] += 1
+            return
+        gateway.ingest(readings, bad)
+
+
+def _loopback(host):
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return host == 'localhost'
+
+
+class TelemetryGateway:
+    def __init__(self, sink, flush_interval=FLUSH_INTERVAL, max_pending=MAX_PENDING_NODES, clock=time.time,
+                 token=None):
+        self.sink = sink
+        self.token = _token(token) or None
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.clock = clock
+        self.stats = Counter()
+        self.flush_latency = LatencyHistogram()
+        self.ports = {}
+        self._pending = {}  # node id -> coalesced Reading
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix='telemetry-sink')
+        self._servers = []
+        self._connections = {}  # TCP and HTTP handler task -> writer
+        self._udp = None
+        self._flusher = None
+        self._loop = None
+        self._thread = None
+
+    @property
+    def saturated(self):
+        return len(self._pending) >= self.max_pending
+
+    def ingest(self, readings, bad=0):
+        # Runs on the event loop; returns (accepted, rejected)
+        now, pending = self.clock(), self._pending
+        accepted = 0
+        for r in readings:
+            if not valid(r, now):
+                continue
+            accepted += 1
+            old = pending.get(r.node_id)
+            if old is None:
+                pending[r.node_id] = r
+            else:
+                pending[r.node_id] = merge(old, r)
+                self.stats['coalesced'] += 1
+        rejected = len(readings) - accepted + bad
+        self.stats['readings'] += accepted
+        self.stats['rejected'] += rejected
+        if self.saturated:
+            self._capacity.clear()
+            self._full.set()
+        return accepted, rejected
+
+    async def wait_capacity(self):
+        if self.saturated:
+            self.stats['throttled'] += 1
+            await self._capacity.wait()
+
+    async def flush(self):
+        if not self._pending:
+            return 0
+        batch = list(self._pending.values())
+        self._pending = {}
+        started = time.perf_counter()
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self.sink, batch)
+        except Exception as e:
+            self.stats['flush_errors'] += 1
+            logger.error(f'Telemetry sink failed on {len(batch)} readings: {e}')
+        self.flush_latency.observe(time.perf_counter() - started)
+        self.stats['flushed'] += len(batch)
+        self.stats['flushes'] += 1
+        if not self.saturated:
+            self._capacity.set()
+        return len(batch)
+
+    async def _flush_loop(self):
+        # One sink call at a time: while it runs, new readings coalesce
+        # into the next batch, up to max_pending nodes
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            await self.flush()
+
+    # --- Servers ---
+    async def start(self, host='127.0.0.1', tcp_port=None, udp_port=None, http_port=None):
+        if self.token is None and not _loopback(host):
+            raise ValueError(f'A telemetry gateway listening on {host} needs a token')
+        self._loop = asyncio.get_running_loop()
+        self._capacity = asyncio.Event()
+        self._capacity.set()
+        self._full = asyncio.Event()
+        if tcp_port is not None:
+            server = await asyncio.start_server(self._handle_tcp, host, tcp_port, limit=MAX_LINE)
+            self._servers.append(server)
+            self.ports['tcp'] = server.sockets[0].getsockname()[1]
+        if udp_port is not None:
+            self._udp, _ = await self._loop.create_datagram_endpoint(lambda: _UDPProtocol(self),
+                                                                     local_addr=(host, udp_port))
+            self.ports['udp'] = self._udp.get_extra_info('sockname')[1]
+        if http_port is not None:
+            server = await asyncio.start_server(self._handle_http, host, http_port, limit=MAX_LINE)
+            self._servers.append(server)
+            self.ports['http'] = server.sockets[0].getsockname()[1]
+        self._flusher = asyncio.create_task(self._flush_loop())
+        logger.info(f'Telemetry gateway listening on {self.ports}')
+        return self.ports
+
+    async def stop(self):
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        if self._udp is not None:
+            self._udp.close()
+        # Closing the sockets ends the handlers at their next read
+        for writer in list(self._connections.values()):
+            writer.close()
+        self._capacity.set()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+        self._executor.shutdown(wait=True)
+
+    async def _handle_tcp(self, reader, writer):
+        # Binary frames and NDJSON lines may be mixed on one connection
+        self.stats['connections'] += 1
+        self._connections[asyncio.current_task()] = writer
+        try:
+            while True:
+                await self.wait_capacity()
+                head = await reader.readexactly(2)
+                if head == MAGIC:
+                    size, flags = read_header(head + await reader.readexactly(HEADER.size - 2))
+                    self.stats['frames'] += 1
+                    payload = check_frame(await reader.readexactly(size), flags, self.token)
+                    self.ingest(decode_payload(payload))
+                    continue
+                line = head + await reader.readline()
+                try:
+                    self.ingest([decode_line(line, self.clock(), self.token)])
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    if line.strip():
+                        self.stats['rejected'] += 1
+        except asyncio.IncompleteReadError:
+            pass  # client closed
+        except Unauthorized as e:
+            self.stats['unauthorized'] += 1
+            logger.warning(f'Closing telemetry connection: {e}')
+        except (ValueError, asyncio.LimitOverrunError, ConnectionError) as e:
+            # A bad binary frame leaves the stream out of step; drop it
+            self.stats['bad_frames'] += 1
+            logger.debug(f'Closing telemetry connection: {e}')
+        finally:
+            self._connections.pop(asyncio.current_task(), None)
+            writer.close()
+
+    async def _handle_http(self, reader, writer):
+        # Minimal HTTP/1.1: POST /telemetry with Content-Length, keep-alive
+        self._connections[asyncio.current_task()] = writer
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path = request_line.decode('latin-1').split()[:2]
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length') or 0)
+                if 'transfer-encoding' in headers or length > MAX_FRAME:
+                    await self._respond(writer, 413 if length > MAX_FRAME else 411, {'error': 'bad body length'}, True)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                status, payload, extra = self._http_request(method, path.split('?')[0], body,
+                                                            headers.get('authorization', ''))
+                close = headers.get('connection', '').lower() == 'close'
+                await self._respond(writer, status, payload, close, extra)
+                if close:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            self._connections.pop(asyncio.current_task(), None)
+            writer.close()
+
+    def _http_request(self, method, path, body, authorization=''):
+        if self.token is not None and not hmac.compare_digest(authorization.encode('latin-1'),
+                                                              b'Bearer ' + self.token):
+            self.stats['unauthorized'] += 1
+            return 401, {'error': 'missing or wrong token'}, {'WWW-Authenticate': 'Bearer'}
+        if path == '/telemetry' and method == 'POST':
+            if self.saturated:
+                self.stats['throttled'] += 1
+                return 503, {'error': 'busy, retry shortly'}, {'Retry-After': '1'}
+            try:
+                readings, bad = parse_body(body, self.clock())
+            except ValueError as e:
+                self.stats['bad_frames'] += 1
+                return 400, {'error': str(e)}, {}
+            accepted, rejected = self.ingest(readings, bad)
+            return 202, {'accepted': accepted, 'rejected': rejected}, {}
+        if path == '/stats' and method == 'GET':
+            return 200, dict(self.stats, pending=len(self._pending)), {}
+        return 404, {'error': 'not found'}, {}
+
+    async def _respond(self, writer, status, payload, close, extra=None):
+        body = json.dumps(payload).encode()
+        reason = {200: 'OK', 202: 'Accepted', 400: 'Bad Request', 401: 'Unauthorized', 404: 'Not Found',
+                  411: 'Length Required', 413: 'Payload Too Large', 503: 'Service Unavailable'}[status]
+        head = [f'HTTP/1.1 {status} {reason}', 'Content-Type: application/json', f'Content-Length: {len(body)}']
+        head += [f'{k}: {v}' for k, v in (extra or {}).items()]
+        if close:
+            head.append('Connection: close')
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode() + body)
+        await writer.drain()
+
+    # --- Running beside a threaded app ---
+    def start_in_thread(self, **ports):
+        # Own event loop on a daemon thread; returns the bound ports
+        started, failure = threading.Event(), []
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
+                loop.run_until_complete(self.start(**ports))
+            except Exception as e:
+                failure.append(e)
+                started.set()
+                return
+            started.set()
+            loop.run_forever()
+        self._thread = threading.Thread(target=run, name='telemetry-gateway', daemon=True)
+        self._thread.start()
+        started.wait()
+        if failure:
+            raise failure[0]
+        return self.ports
+
+    def stop_thread(self, timeout=None):
+        if self._thread is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.stop(), self._loop).result(timeout)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def collect(self):
+        # Metrics families for roadmesh.metrics.REGISTRY.add_collector()
+        stats = self.stats
+        return [
+            Family('roadmesh_telemetry_total', 'counter', 'Telemetry gateway activity',
+                   [('roadmesh_telemetry_total', {'event': k}, v) for k, v in sorted(stats.items())]),
+            Family('roadmesh_telemetry_pending_nodes', 'gauge', 'Coalesced nodes awaiting the sink',
+                   [('roadmesh_telemetry_pending_nodes', {}, len(self._pending))]),
+            Family('roadmesh_telemetry_flush_seconds', 'histogram', 'Telemetry sink call time',
+                   histogram_samples('roadmesh_telemetry_flush_seconds', {}, self.flush_latency)),
+        ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='RoadMesh telemetry ingestion gateway.')
+    parser.add_argument('--host', default='127.0.0.1', help='other than loopback, needs --token')
+    parser.add_argument('--token', default=os.environ.get('ROADMESH_TELEMETRY_TOKEN'),
+                        help='shared token clients must send (default: $ROADMESH_TELEMETRY_TOKEN)')
+    parser.add_argument('--tcp', type=int, default=7700, help='TCP port (frames or NDJSON)')
+    parser.add_argument('--udp', type=int, default=7701, help='UDP port (one batch per datagram)')
+    parser.add_argument('--http', type=int, default=7702, help='HTTP port (POST /telemetry)')
+    parser.add_argument('--flush-interval', type=float, default=FLUSH_INTERVAL)
+    args = parser.parse_args(argv)
+    # Standalone: node statuses into a compact mesh store and the database
+    from roadmesh.networking.mesh_store import MeshStore
+    gateway = TelemetryGateway(SubsystemSink(mesh=MeshStore()), args.flush_interval, token=args.token)
+
+    async def serve():
+        await gateway.start(args.host, args.tcp, args.udp, args.http)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await gateway.stop()
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
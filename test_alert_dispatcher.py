@@ -0,0 +1,114 @@
+import socketserver
+import threading
+import time
+import unittest
+from email import message_from_bytes
+from unittest.mock import MagicMock
+from roadmesh.monitoring.alert_dispatcher import AlertDispatcher
+from roadmesh.monitoring.health_monitor import HealthMonitor
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    # Just enough SMTP for smtplib: collects messages, counts connections
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, delay=0.0):
+        self.messages, self.connections, self.delay = [], 0, delay
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 sink')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command in (b'EHLO', b'HELO'):
+                self.reply('250 sink')
+            elif command == b'DATA':
+                self.reply('354 go ahead')
+                data = []
+                for line in iter(self.rfile.readline, b'.\r\n'):
+                    data.append(line)
+                time.sleep(self.server.delay)
+                self.server.messages.append(message_from_bytes(b''.join(data)))
+                self.reply('250 queued')
+            elif command == b'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('250 ok')
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+
+class TestAlertDispatcher(unittest.TestCase):
+    def setUp(self):
+        self.sink = SMTPSink()
+        self.clock = FakeClock()
+        self.dispatcher = AlertDispatcher('127.0.0.1', self.sink.server_address[1], user='', starttls=False,
+                                          cooldown=60, digest_interval=0.05, clock=self.clock)
+
+    def tearDown(self):
+        self.dispatcher.close(timeout=2)
+        self.sink.shutdown()
+        self.sink.server_close()
+
+    def test_digest_and_cooldown(self):
+        for _ in range(3):
+            self.dispatcher.submit('Battery low', ['Battery subsystem'])
+        self.dispatcher.submit('Mesh down', ['Mesh network'])
+        self.dispatcher.flush(timeout=2)
+        self.assertEqual(len(self.sink.messages), 1)
+        digest = self.sink.messages[0]
+        self.assertIn('(4 alerts)', digest['Subject'])
+        self.assertIn('Battery low (x3)', digest.get_payload())
+        # Within the cooldown the same subsystems stay quiet
+        self.dispatcher.submit('Battery low', ['Battery subsystem'])
+        self.dispatcher.flush(timeout=2)
+        self.assertEqual(len(self.sink.messages), 1)
+        self.assertEqual(self.dispatcher.stats['suppressed'], 1)
+        # After it they alert again, over the same connection
+        self.clock.now = 61
+        self.dispatcher.submit('Battery low', ['Battery subsystem'])
+        self.dispatcher.flush(timeout=2)
+        self.assertEqual(len(self.sink.messages), 2)
+        self.assertIn('Battery subsystem: 1', self.sink.messages[1].get_payload())
+        self.assertEqual(self.sink.connections, 1)
+
+    def test_check_and_alert_does_not_wait_for_smtp(self):
+        self.sink.delay = 0.2
+        self.dispatcher.digest_interval = 1  # all 50 alerts land in one digest
+        subsystems = [MagicMock() for _ in range(4)]
+        for subsystem in subsystems:
+            subsystem.health_check.return_value = False
+        monitor = HealthMonitor(*subsystems, dispatcher=self.dispatcher)
+        started = time.perf_counter()
+        for _ in range(50):
+            monitor.check_and_alert()
+        elapsed = time.perf_counter() - started
+        self.assertLess(elapsed, 0.2)
+        self.dispatcher.flush(timeout=5)
+        self.assertEqual(len(self.sink.messages), 1)
+        self.assertEqual(self.dispatcher.stats['alerts'], 50)
+
+    def test_reconnects_after_disconnect(self):
+        self.dispatcher.submit('first')
+        self.dispatcher.flush(timeout=2)
+        self.dispatcher._smtp.close()  # as after the server timed the session out
+        self.dispatcher.submit('second')
+        self.dispatcher.flush(timeout=2)
+        self.assertEqual([m.get_payload().strip() for m in self.sink.messages], ['first', 'second'])
+        self.assertEqual(self.dispatcher.stats['connections'], 2)
+
+if __name__ == '__main__':
+    unittest.main()
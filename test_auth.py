@@ -0,0 +1,200 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+
+import bcrypt
+
+from roadmesh.networking import auth
+from roadmesh.networking.auth import ApiKeyStore, LoginBusy, PasswordVerifier, SessionStore
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestSessionStore(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'sessions.journal')
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def store(self, ttl=100):
+        return SessionStore(self.path, ttl, self.clock)
+
+    def test_create_get_end(self):
+        store = self.store()
+        sid = store.create('alice')
+        self.assertEqual(store.get_user(sid), 'alice')
+        self.assertEqual(dict(store), {sid: 'alice'})
+        store.end(sid)
+        self.assertIsNone(store.get_user(sid))
+        self.assertEqual(len(store), 0)
+
+    def test_ttl_and_sliding_expiry(self):
+        store = self.store(ttl=100)
+        kept, dropped = store.create('alice'), store.create('bob')
+        self.clock.now += 60
+        self.assertEqual(store.get_user(kept), 'alice')  # past half the TTL: extended
+        self.clock.now += 60
+        self.assertEqual(store.get_user(kept), 'alice')
+        self.assertIsNone(store.get_user(dropped))
+        self.assertEqual(len(store), 1)
+
+    def test_journal_replay(self):
+        store = self.store()
+        a, b, c = store.create('alice'), store.create('bob'), store.create('carol')
+        store.end(b)
+        store.close()
+        with open(self.path, 'a') as f:
+            f.write('["c","torn')  # partial last write
+        reopened = self.store()
+        self.assertEqual(dict(reopened), {a: 'alice', c: 'carol'})
+        self.clock.now += 200
+        self.assertEqual(len(self.store()), 0)
+
+    def test_compaction(self):
+        store = self.store()
+        keep = store.create('alice')
+        for _ in range(auth.COMPACT_MIN_RECORDS):
+            store.end(store.create('bob'))
+        with open(self.path) as f:
+            records = sum(1 for _ in f)
+        self.assertLess(records, auth.COMPACT_MIN_RECORDS)
+        store.close()
+        self.assertEqual(dict(self.store()), {keep: 'alice'})
+
+    def test_workers_share_the_journal(self):
+        first, second = self.store(), self.store()
+        sid = first.create('alice')
+        self.assertEqual(second.get_user(sid), 'alice')
+        second.end(sid)
+        self.assertIsNone(first.get_user(sid))
+        # One worker compacts while the other keeps appending
+        keep = second.create('bob')
+        for _ in range(auth.COMPACT_MIN_RECORDS):
+            first.end(first.create('carol'))
+        late = second.create('dave')
+        self.assertEqual(dict(first), {keep: 'bob', late: 'dave'})
+        for store in (first, second):
+            store.close()
+        self.assertEqual(dict(self.store()), {keep: 'bob', late: 'dave'})
+
+    def test_attach_imports_existing_sessions(self):
+        service = SimpleNamespace(sessions={'old': 'alice'})
+        store = self.store()
+        store.attach(service)
+        self.assertIs(service.sessions, store)
+        self.assertEqual(service.get_user_by_session('old'), 'alice')
+        sid = service.create_session('bob')
+        service.end_session('old')
+        self.assertEqual(dict(service.sessions), {sid: 'bob'})
+
+
+class TestApiKeyStore(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'api_keys.json')
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_scopes_and_persistence(self):
+        keys = ApiKeyStore(self.path, self.clock)
+        record, key = keys.create('grafana', ['read', 'metrics'])
+        self.assertEqual(keys.check(key, 'read'), record)
+        self.assertIsNone(keys.check(key, 'write'))
+        self.assertIsNone(keys.check('wrong', 'read'))
+        with open(self.path) as f:
+            self.assertNotIn(key, f.read())
+        admin, admin_key = keys.create('ops', ['*'])
+        reloaded = ApiKeyStore(self.path, self.clock)
+        self.assertEqual(reloaded.check(key, 'metrics').name, 'grafana')
+        self.assertEqual(reloaded.check(admin_key, 'admin'), admin)
+
+    def test_rotate_with_grace(self):
+        keys = ApiKeyStore(self.path, self.clock)
+        record, old = keys.create('default', ['*'], key='changeme')
+        rotated, new = keys.rotate(record.key_id, grace=60)
+        self.assertEqual(rotated.key_id, record.key_id)
+        self.assertIsNotNone(keys.check(old))
+        self.assertIsNotNone(keys.check(new))
+        self.clock.now += 61
+        self.assertIsNone(keys.check(old))
+        self.assertIsNotNone(keys.check(new))
+        self.assertEqual([k.key_id for k in keys.keys()], [record.key_id])
+
+    def test_revoke(self):
+        keys = ApiKeyStore(self.path, self.clock)
+        record, key = keys.create('old client')
+        self.assertTrue(keys.revoke(record.key_id))
+        self.assertIsNone(keys.check(key))
+        self.assertFalse(keys.revoke(record.key_id))
+
+
+    def test_workers_see_each_others_changes(self):
+        first, second = ApiKeyStore(self.path, self.clock), ApiKeyStore(self.path, self.clock)
+        record, key = first.create('grafana')
+        self.assertEqual(second.check(key), record)
+        other, other_key = second.create('ops', ['*'])
+        self.assertTrue(second.revoke(record.key_id))
+        self.assertIsNone(first.check(key))
+        self.assertEqual(first.check(other_key), other)
+        self.assertEqual([k.name for k in first.keys()], ['ops'])
+
+
+class TestPasswordVerifier(unittest.TestCase):
+    def setUp(self):
+        self.verifier = PasswordVerifier(workers=1, max_pending=2)
+
+    def tearDown(self):
+        self.verifier.shutdown()
+
+    def test_verify(self):
+        hashed = bcrypt.hashpw(b'secret', bcrypt.gensalt(4)).decode()
+        self.assertTrue(self.verifier.verify('secret', hashed))
+        self.assertFalse(self.verifier.verify('guess', hashed))
+        self.assertFalse(self.verifier.verify('secret', None))
+
+    def test_attach(self):
+        service = SimpleNamespace(users={'alice': bcrypt.hashpw(b'pw', bcrypt.gensalt(4)).decode()})
+        self.verifier.attach(service)
+        self.assertTrue(service.authenticate('alice', 'pw'))
+        self.assertFalse(service.authenticate('mallory', 'pw'))
+
+    def test_hash_many_fits_the_pending_limit_or_fails_whole(self):
+        self.verifier._hash = lambda password: bcrypt.hashpw(password.encode(), bcrypt.gensalt(4)).decode()
+        hashes = self.verifier.hash_many(['a', 'b'])
+        self.assertTrue(bcrypt.checkpw(b'b', hashes[1].encode()))
+        with self.assertRaises(LoginBusy):
+            self.verifier.hash_many(['a', 'b', 'c'])
+        self.assertEqual(self.verifier._slots._value, 2)
+
+    def test_burst_is_rejected_not_queued(self):
+        release = threading.Event()
+        blockers = [threading.Thread(target=self.verifier._submit, args=(release.wait,)) for _ in range(2)]
+        for thread in blockers:
+            thread.start()
+        while self.verifier._slots._value:
+            time.sleep(0.001)
+        with self.assertRaises(LoginBusy):
+            self.verifier.verify('pw', None)
+        release.set()
+        for thread in blockers:
+            thread.join()
+        self.assertEqual(self.verifier.stats['rejected'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
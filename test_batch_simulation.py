@@ -0,0 +1,57 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+import numpy as np
+from roadmesh.batch_simulation import (BatchSimulation, make_fleet, simulate_per_pole, transition_list,
+                                       write_results, summarize)
+from roadmesh.persistence import csv_backend
+from roadmesh.storage import SQLiteBackend
+
+class TestBatchSimulation(unittest.TestCase):
+    def test_matches_per_pole_path(self):
+        fleet = make_fleet(40, seed=3)
+        start = datetime(2024, 1, 1, 15)
+        result = BatchSimulation(fleet, start, seed=7).run(24 * 10)
+        expected, poles = simulate_per_pole(fleet, start, 24 * 10, seed=7)
+        self.assertGreater(len(expected), 0)
+        self.assertEqual(transition_list(result), expected)
+        np.testing.assert_array_equal(result.final_pct, [pole.percentage() for pole in poles])
+
+    def test_seed_changes_outcome(self):
+        fleet = make_fleet(20, seed=1)
+        start = datetime(2024, 6, 1)
+        a = BatchSimulation(fleet, start, seed=1).run(24 * 5)
+        b = BatchSimulation(fleet, start, seed=2).run(24 * 5)
+        self.assertNotEqual(a.final_pct.tolist(), b.final_pct.tolist())
+        self.assertEqual(a.mesh_mode_hours.sum(), 20 * 24 * 5)
+        self.assertEqual(summarize(a)['nodes'], 20)
+
+    def test_write_results(self):
+        fleet = make_fleet(5, seed=0)
+        result = BatchSimulation(fleet, datetime(2024, 1, 1), seed=0).run(48)
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SQLiteBackend(os.path.join(tmp, 'sim.db'))
+            written = write_results(result, store)
+            self.assertEqual(written, len(result.transitions.step))
+            self.assertEqual(sum(store.event_counts('type').values()), written)
+            store.close()
+
+    def test_write_results_csv_round_trip(self):
+        fleet = make_fleet(5, seed=0)
+        result = BatchSimulation(fleet, datetime(2024, 1, 1), seed=0).run(48)
+        transitions = transition_list(result)
+        mesh = [t for t in transitions if t[2] == 'mesh']
+        self.assertGreater(len(mesh), 0)
+        with tempfile.TemporaryDirectory() as tmp:
+            store = csv_backend(tmp)
+            self.assertEqual(write_results(result, store), len(transitions))
+            counts = store.event_counts('type')
+            self.assertNotIn('other', counts)
+            self.assertEqual(sum(counts.values()), len(transitions))
+            rows, _ = store.query_events(kind='node_power_mode', limit=len(mesh))
+            self.assertEqual([(row['node_id'], row['old'], row['new']) for row in rows],
+                             [(node_id, old, new) for _, node_id, _, old, new in mesh])
+
+if __name__ == '__main__':
+    unittest.main()
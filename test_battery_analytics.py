@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from roadmesh.monitoring import battery_analytics as ba
+from roadmesh.storage import SQLiteBackend
+
+HOUR = 3600.0
+
+def make_series(charge, current=None):
+    t = 1700000000.0 + np.arange(len(charge)) * HOUR
+    current = np.zeros(len(charge)) if current is None else current
+    return ba.BatterySeries(t, np.full(len(charge), 3.7), np.asarray(current, float), np.asarray(charge, float))
+
+class TestBatteryAnalytics(unittest.TestCase):
+    def test_lstsq_and_ewma_forecast(self):
+        series = make_series(80.0 - 2.0 * np.arange(10))
+        fc = ba.forecast(series)
+        self.assertEqual(fc['direction'], 'depleting')
+        self.assertAlmostEqual(fc['rate_pct_per_hour'], -2.0)
+        self.assertAlmostEqual(fc['hours'], 62.0 / 2.0)
+        self.assertAlmostEqual(ba.forecast(series, 'ewma')['rate_pct_per_hour'], -2.0)
+        charging = ba.forecast(make_series(50.0 + np.arange(10)))
+        self.assertEqual(charging['direction'], 'charging')
+        self.assertAlmostEqual(charging['hours'], 41.0)
+
+    def test_confidence_band_widens_with_noise(self):
+        rng = np.random.default_rng(1)
+        series = make_series(90.0 - 1.0 * np.arange(48) + rng.normal(0, 3, 48))
+        low, high = ba.forecast(series)['band']
+        hours = ba.forecast(series)['hours']
+        self.assertLess(low, hours)
+        self.assertGreater(high, hours)
+
+    def test_confidence_and_resample_are_validated(self):
+        self.assertAlmostEqual(ba.z_score(0.95), 1.95996, places=4)
+        self.assertAlmostEqual(ba.z_score(0.5), 0.67449, places=4)
+        series = make_series(80.0 - 2.0 * np.arange(10))
+        for confidence in (0, 1, 1.5, -0.2, float('nan')):
+            with self.assertRaises(ValueError):
+                ba.forecast(series, confidence=confidence)
+        for seconds in (0, -60, float('nan')):
+            with self.assertRaises(ValueError):
+                ba.resample(series, seconds)
+
+    def test_resample_and_energy_balance(self):
+        series = make_series([10, 20, 15, 15, 30], current=[1, 1, 1, 1, 1])
+        times, mean, low, high = ba.resample(series, seconds=2 * HOUR)
+        self.assertEqual(len(times), 3)
+        stats = ba.energy_balance(series)
+        self.assertEqual(stats['charge_gained_pct'], 25.0)
+        self.assertEqual(stats['charge_lost_pct'], 5.0)
+        self.assertEqual(stats['hours_idle'], 1.0)
+        self.assertAlmostEqual(stats['current_Ah'], 4.0)
+
+    def test_load_series_from_sqlite(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SQLiteBackend(os.path.join(tmp, 'test.db'))
+            store.append_battery_history([(1700000000.0 + h * HOUR, 3.7, None, 90.0 - h) for h in range(5)])
+            series = ba.load_series(store, limit=3)
+            store.close()
+        self.assertEqual(series.charge_pct.tolist(), [88.0, 87.0, 86.0])
+        self.assertTrue(np.isnan(series.current).all())
+
+if __name__ == '__main__':
+    unittest.main()
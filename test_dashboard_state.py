@@ -0,0 +1,100 @@
+import json
+import threading
+import unittest
+from roadmesh.dashboard_state import StateTracker, event_stream, sse_event
+
+class Subsystems:
+    def __init__(self):
+        self.pct = 80
+        self.nodes = {'A': ('UP', 'normal', 10), 'B': ('UP', 'normal', 10)}
+        self.health_calls = 0
+
+    def health(self):
+        self.health_calls += 1
+        return {'battery': True}
+
+def make_tracker(sub, **kwargs):
+    tracker = StateTracker(min_interval=0, **kwargs)
+    tracker.register('battery', lambda: {'pct': sub.pct})
+    tracker.register('nodes', lambda: sub.nodes, keyed=True)
+    tracker.register('health', sub.health, ttl=60)
+    return tracker
+
+class TestStateTracker(unittest.TestCase):
+    def test_snapshot_and_diff(self):
+        sub = Subsystems()
+        tracker = make_tracker(sub)
+        v1 = tracker.refresh()
+        snap = tracker.snapshot()
+        self.assertTrue(snap['full'])
+        self.assertEqual(snap['state']['nodes']['A'], ['UP', 'normal', 10])
+        # Nothing changed: same version, empty diff
+        self.assertEqual(tracker.refresh(), v1)
+        self.assertEqual(tracker.diff(v1)['changes'], {})
+        sub.nodes['B'] = ('DOWN', 'off', 0)
+        v2 = tracker.refresh()
+        self.assertGreater(v2, v1)
+        diff = tracker.diff(v1)
+        self.assertFalse(diff['full'])
+        self.assertEqual(diff['changes'], {'nodes': {'B': ['DOWN', 'off', 0]}})
+        del sub.nodes['A']
+        sub.pct = 70
+        tracker.refresh()
+        diff = tracker.diff(v2)
+        self.assertEqual(diff['changes'], {'battery': {'pct': 70}})
+        self.assertEqual(diff['removed'], {'nodes': ['A']})
+        # Unknown or stale versions get a full snapshot
+        self.assertTrue(tracker.diff(None)['full'])
+        self.assertTrue(tracker.diff(v1 - 10 ** 9)['full'])
+        self.assertTrue(tracker.diff(tracker.version + 1)['full'])
+
+    def test_section_ttl_and_invalidate(self):
+        sub = Subsystems()
+        tracker = make_tracker(sub)
+        tracker.refresh()
+        tracker.refresh()
+        self.assertEqual(sub.health_calls, 1)
+        tracker.invalidate('health')
+        tracker.refresh()
+        self.assertEqual(sub.health_calls, 2)
+
+    def test_refresh_throttle(self):
+        sub = Subsystems()
+        tracker = make_tracker(sub)
+        tracker.min_interval = 60
+        v1 = tracker.refresh()
+        sub.pct = 10
+        self.assertEqual(tracker.refresh(), v1)
+        tracker.invalidate()
+        self.assertGreater(tracker.refresh(), v1)
+
+    def test_tombstone_limit_forces_snapshot(self):
+        sub = Subsystems()
+        tracker = make_tracker(sub, tombstone_limit=1)
+        v1 = tracker.refresh()
+        sub.nodes = {}
+        tracker.refresh()
+        self.assertTrue(tracker.diff(v1)['full'])
+
+    def test_event_stream(self):
+        sub = Subsystems()
+        tracker = make_tracker(sub)
+        stream = event_stream(tracker, poll=0.01, heartbeat=0.05)
+        first = next(stream)
+        self.assertIn('event: snapshot', first)
+        timer = threading.Timer(0.05, lambda: sub.nodes.update(A=('DOWN', 'off', 0)))
+        timer.start()
+        frame = next(stream)
+        while frame.startswith(':'):
+            frame = next(stream)
+        self.assertIn('event: diff', frame)
+        data = json.loads(frame.split('data: ', 1)[1])
+        self.assertEqual(data['changes'], {'nodes': {'A': ['DOWN', 'off', 0]}})
+        self.assertEqual(next(stream), ': keepalive\n\n')
+        stream.close()
+
+    def test_sse_event_format(self):
+        self.assertEqual(sse_event({'a': 1}, 'diff', 5), 'id: 5\nevent: diff\ndata: {"a":1}\n\n')
+
+if __name__ == '__main__':
+    unittest.main()
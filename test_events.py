@@ -0,0 +1,104 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from roadmesh import persistence
+from roadmesh.events import EventCode, Subsystem, make_event, parse, code_of
+from roadmesh.storage import SQLiteBackend
+
+class TestEvents(unittest.TestCase):
+    def test_make_and_parse(self):
+        event = make_event(EventCode.NODE_STATUS, node_id='B', old='UP', new='DOWN')
+        self.assertEqual(event.subsystem, Subsystem.MESH)
+        self.assertEqual(event.message, 'Node B status changed from UP to DOWN')
+        legacy = parse('Mesh mode changed to reduced at 2024-01-01 05:00:00')
+        self.assertEqual((legacy.code, legacy.new), (EventCode.MESH_MODE, 'reduced'))
+        self.assertEqual(parse('something else').code, EventCode.OTHER)
+        self.assertEqual(code_of('mesh_mode'), EventCode.MESH_MODE)
+        self.assertEqual(code_of('2'), EventCode.LIGHTING_MODE)
+        with self.assertRaises(ValueError):
+            code_of('nope')
+
+class TestEventStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.start = datetime(2024, 1, 1)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def fill(self, store):
+        with store.batch():
+            store.append_events([
+                (self.start, make_event(EventCode.MESH_MODE, old='normal', new='reduced')),
+                (self.start + timedelta(hours=1), make_event(EventCode.NODE_STATUS, node_id='B', old='UP', new='DOWN')),
+                (self.start + timedelta(hours=2), make_event(EventCode.NODE_STATUS, node_id='B', old='DOWN', new='UP')),
+                (self.start + timedelta(hours=3), make_event(EventCode.NODE_POWER_MODE, node_id='C', new='critical',
+                                                             value=12.5)),
+                (self.start + timedelta(hours=4), 'Lighting mode changed to dim at noon'),
+            ])
+
+    def test_sqlite_lookups(self):
+        store = SQLiteBackend(os.path.join(self.tmp.name, 'events.db'))
+        self.fill(store)
+        self.assertEqual(store.event_counts(), {'mesh_mode': 1, 'node_status': 2, 'node_power_mode': 1,
+                                                'lighting_mode': 1})
+        self.assertEqual(store.event_counts('subsystem'), {'mesh': 4, 'lighting': 1})
+        self.assertEqual(store.event_counts('node_id', kind='node_status'), {'B': 2})
+        rows, _ = store.query_events(node_id='B')
+        self.assertEqual([(r['old'], r['new']) for r in rows], [('UP', 'DOWN'), ('DOWN', 'UP')])
+        rows, _ = store.query_events(node_id='C')
+        self.assertEqual(rows[0]['value'], 12.5)
+        rows, _ = store.query_events(subsystem='lighting')
+        self.assertEqual((rows[0]['type'], rows[0]['new']), ('lighting_mode', 'dim'))
+        ids = [r['id'] for r in store.query_events(limit=None)[0]]
+        self.assertEqual(ids, sorted(ids))
+        plan = ' '.join(row[3] for row in store.conn.execute(
+            'EXPLAIN QUERY PLAN SELECT COUNT(*) FROM event_log WHERE node_id = ?', ('B',)))
+        self.assertIn('event_log_node_ts', plan)
+        store.close()
+
+    def test_csv_matches_sqlite(self):
+        csv_store = persistence.csv_backend(self.tmp.name)
+        self.fill(csv_store)
+        self.assertEqual(csv_store.event_counts('subsystem'), {'mesh': 4, 'lighting': 1})
+        rows, _ = csv_store.query_events(kind=EventCode.LIGHTING_MODE)
+        self.assertEqual(rows[0]['new'], 'dim')
+
+    def test_every_code_counts_the_same_in_both_backends(self):
+        events = [make_event(code, node_id='A-B', old='x', new='low battery on A', value=1.0)
+                  if code == EventCode.ALERT else
+                  make_event(code, node_id='A-B', old='40', new='60', value=1.0)
+                  for code in EventCode if code != EventCode.OTHER]
+        events.append(make_event(EventCode.OTHER, new='operator note'))
+        rows = [(self.start + timedelta(minutes=i), event) for i, event in enumerate(events)]
+        sqlite_store = SQLiteBackend(os.path.join(self.tmp.name, 'events.db'))
+        csv_store = persistence.csv_backend(self.tmp.name)
+        for store in (sqlite_store, csv_store):
+            store.append_events(rows)
+        self.assertEqual(len(sqlite_store.event_counts()), len(EventCode))
+        for by in ('type', 'subsystem'):
+            self.assertEqual(csv_store.event_counts(by), sqlite_store.event_counts(by))
+        self.assertEqual(csv_store.event_counts('node_id', kind='link_changed'), {'A-B': 1})
+        rows, _ = csv_store.query_events(kind='alert')
+        self.assertEqual(rows[0]['new'], 'low battery on A')
+        sqlite_store.close()
+
+    def test_free_text_log_is_migrated(self):
+        path = os.path.join(self.tmp.name, 'old.db')
+        conn = sqlite3.connect(path)
+        conn.execute('CREATE TABLE event_log (id INTEGER PRIMARY KEY, ts REAL, timestamp TEXT, event TEXT)')
+        conn.executemany('INSERT INTO event_log (ts, timestamp, event) VALUES (?, ?, ?)', [
+            (0, '1970-01-01T00:00:00', 'Mesh mode changed to reduced at x'),
+            (1, '1970-01-01T00:00:01', 'Lighting mode changed to off at y')])
+        conn.commit()
+        conn.close()
+        store = SQLiteBackend(path)
+        self.assertEqual(store.event_counts(), {'mesh_mode': 1, 'lighting_mode': 1})
+        rows, _ = store.query_events(kind='mesh_mode')
+        self.assertEqual(rows[0]['new'], 'reduced')
+        store.close()
+
+if __name__ == '__main__':
+    unittest.main()
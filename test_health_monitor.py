@@ -37,5 +37,22 @@ class TestHealthMonitor(unittest.TestCase):
         self.monitor.check_and_alert()
         mock_send_email.assert_called_once()
 
+    @patch('roadmesh.monitoring.health_monitor.HealthMonitor.send_email_alert')
+    def test_partitioned_mesh(self, mock_send_email):
+        connectivity = MagicMock()
+        connectivity.is_connected.return_value = False
+        connectivity.partition_count.return_value = 3
+        monitor = HealthMonitor(self.battery, self.lighting, self.mesh, self.user_service, connectivity)
+        for subsystem in (self.battery, self.lighting, self.mesh, self.user_service):
+            subsystem.health_check.return_value = True
+        monitor.check_and_alert()
+        mock_send_email.assert_called_once()
+        self.assertIn('3 segments', mock_send_email.call_args[0][0])
+        # The segment count is in the message but not the dedup key
+        connectivity.partition_count.return_value = 4
+        monitor.check_and_alert()
+        self.assertIn('4 segments', mock_send_email.call_args[0][0])
+        self.assertEqual(mock_send_email.call_args[0][1], ['Mesh partitioned'])
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,139 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from roadmesh.monitoring.health_monitor import HealthMonitor
+from roadmesh.monitoring.health_scheduler import HealthScheduler
+from roadmesh.networking.mesh_connectivity import ConnectivityTracker
+
+
+class TestHealthScheduler(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = HealthScheduler(max_workers=4)
+
+    def tearDown(self):
+        self.scheduler.stop(1)
+
+    def test_run_now_caches_results(self):
+        calls = []
+        self.scheduler.add('a', lambda: calls.append('a') or True)
+        self.scheduler.add('b', lambda: False)
+        results = self.scheduler.run_now()
+        self.assertTrue(results['a'].ok)
+        self.assertFalse(results['b'].ok)
+        self.assertEqual(self.scheduler.status(), {'a': True, 'b': False})
+        self.assertEqual(calls, ['a'])  # status() served from the cache
+
+    def test_exception_is_a_failure(self):
+        def broken():
+            raise RuntimeError('sensor offline')
+        self.scheduler.add('broken', broken)
+        result = self.scheduler.run_now()['broken']
+        self.assertFalse(result.ok)
+        self.assertIn('sensor offline', result.error)
+
+    def test_checks_run_in_parallel(self):
+        barrier = threading.Barrier(3, timeout=2)
+        for name in 'abc':
+            self.scheduler.add(name, lambda: barrier.wait() is not None)
+        results = self.scheduler.run_now()
+        self.assertTrue(all(r.ok for r in results.values()))
+
+    def test_exclusive_checks_do_not_overlap(self):
+        running, overlaps = [0], []
+        def check():
+            running[0] += 1
+            overlaps.append(running[0])
+            time.sleep(0.02)
+            running[0] -= 1
+            return True
+        for name in 'abc':
+            self.scheduler.add(name, check, exclusive=True)
+        self.scheduler.run_now()
+        self.assertEqual(max(overlaps), 1)
+
+    def test_slow_check_times_out_without_blocking(self):
+        release = threading.Event()
+        self.scheduler.add('slow', lambda: release.wait(5), timeout=0.1)
+        self.scheduler.add('fast', lambda: True, timeout=0.1)
+        started = time.monotonic()
+        results = self.scheduler.run_now()
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertFalse(results['slow'].ok)
+        self.assertIn('timed out', results['slow'].error)
+        self.assertTrue(results['fast'].ok)
+        # Not started again while the first run is still going
+        self.scheduler.run_now(['slow'], wait_for=0.05)
+        self.assertEqual(self.scheduler.report()['slow']['timeouts'], 1)
+        release.set()
+        deadline = time.monotonic() + 2
+        while self.scheduler.report()['slow']['running'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        report = self.scheduler.report()['slow']
+        self.assertTrue(report['ok'])
+        self.assertEqual(report['runs'], 1)
+        self.assertEqual(report['latency']['count'], 1)
+
+    def test_background_loop_honours_interval(self):
+        calls = []
+        self.scheduler.add('often', lambda: calls.append(1) or True, interval=0.05)
+        self.scheduler.add('rarely', lambda: True, interval=60)
+        self.scheduler.start()
+        time.sleep(0.4)
+        report = self.scheduler.report()
+        self.assertGreaterEqual(report['often']['runs'], 3)
+        self.assertEqual(report['rarely']['runs'], 1)
+        self.assertEqual(report['often']['latency']['count'], report['often']['runs'])
+
+
+class TestScheduledHealthMonitor(unittest.TestCase):
+    def setUp(self):
+        self.subsystems = [MagicMock() for _ in range(4)]
+        for subsystem in self.subsystems:
+            subsystem.health_check.return_value = True
+        self.monitor = HealthMonitor(*self.subsystems)
+        self.scheduler = HealthScheduler()
+
+    def tearDown(self):
+        self.scheduler.stop(1)
+
+    @patch('roadmesh.monitoring.health_monitor.HealthMonitor.send_email_alert')
+    def test_alerts_from_cached_results(self, mock_send_email):
+        self.monitor.schedule(self.scheduler, interval=60, alert=False)
+        self.subsystems[2].health_check.return_value = False
+        self.monitor.check_and_alert()
+        mock_send_email.assert_called_once()
+        self.assertIn('Mesh network', mock_send_email.call_args[0][0])
+        # Checks ran once for the cache, not again for the alert
+        self.monitor.check_and_alert()
+        self.assertEqual(self.subsystems[2].health_check.call_count, 1)
+
+    @patch('roadmesh.monitoring.health_monitor.HealthMonitor.send_email_alert')
+    def test_timeout_raises_alert(self, mock_send_email):
+        release = threading.Event()
+        self.subsystems[0].health_check.side_effect = lambda: release.wait(5)
+        self.monitor.schedule(self.scheduler, timeout=0.1)
+        self.scheduler.run_now()
+        release.set()
+        mock_send_email.assert_called_once()
+        self.assertIn('Battery subsystem', mock_send_email.call_args[0][0])
+
+    def test_partition_with_all_nodes_up_raises_alert(self):
+        tracker = ConnectivityTracker()
+        for i in range(3):
+            tracker.set_link(i, i + 1, 90)
+        dispatcher = MagicMock()
+        monitor = HealthMonitor(*self.subsystems, connectivity=tracker, dispatcher=dispatcher)
+        monitor.schedule(self.scheduler, interval=60)
+        self.scheduler.run_now()
+        dispatcher.submit.assert_not_called()
+        # Every node stays UP; only the link goes away
+        tracker.remove_link(1, 2)
+        self.scheduler.run_now(['connectivity'])
+        dispatcher.submit.assert_called_once()
+        self.assertIn('Mesh partitioned', dispatcher.submit.call_args[0][1])
+
+
+if __name__ == '__main__':
+    unittest.main()
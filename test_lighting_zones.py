@@ -0,0 +1,76 @@
+import unittest
+import numpy as np
+from roadmesh.monitoring.lighting_zones import LightingGrid, Command
+
+class Controller:
+    def __init__(self, n):
+        self.state = 'ON'
+        self.lights = ['ON'] * n
+    def turn_off(self):
+        self.state = 'OFF'
+        self.lights = ['OFF'] * len(self.lights)
+    def turn_on(self):
+        self.state = 'ON'
+        self.lights = ['ON'] * len(self.lights)
+    def dim(self):
+        self.state = 'DIM'
+        self.lights = ['DIM'] * len(self.lights)
+    def get_light_statuses(self):
+        return list(enumerate(self.lights))
+
+class TestLightingGrid(unittest.TestCase):
+    def setUp(self):
+        self.grid = LightingGrid(1000, zones={'north': range(0, 500), 'ramp': [10, 20, 990]})
+        self.seen = []
+        self.grid.subscribe(self.seen.append)
+
+    def test_batched_commands(self):
+        changes = self.grid.apply([Command('120-480', 'DIM', 40), Command('north', 'OFF'),
+                                   Command('400-600', 'ON')])
+        # Later commands win; lights already ON at 100% are not reported
+        self.assertEqual(len(changes.indices), 400)
+        self.assertEqual(self.grid.describe([0, 399, 400, 700]),
+                         {0: ('OFF', 0), 399: ('OFF', 0), 400: ('ON', 100), 700: ('ON', 100)})
+        self.assertEqual(self.grid.counts(), {'OFF': 400, 'DIM': 0, 'ON': 600, 'EMERGENCY': 0})
+        self.assertEqual(len(self.seen), 1)
+        # Re-sending the same state changes nothing and notifies no one
+        self.assertEqual(len(self.grid.set('north', 'OFF').indices), 100)
+        self.assertEqual(len(self.grid.set('0-499', 'OFF').indices), 0)
+        self.assertEqual(len(self.seen), 2)
+
+    def test_changes_since(self):
+        version = self.grid.version
+        self.grid.set('ramp', 'EMERGENCY')
+        self.grid.set([5], 'DIM', 10)
+        self.assertEqual(self.grid.changes_since(version).tolist(), [5, 10, 20, 990])
+        self.assertEqual(len(self.grid.changes_since(self.grid.version)), 0)
+        for i in range(300):
+            self.grid.set([i % 2], 'DIM', i % 100)
+        self.assertIsNone(self.grid.changes_since(version))
+
+    def test_validation(self):
+        with self.assertRaises(ValueError):
+            self.grid.set('990-1000', 'ON')
+        with self.assertRaises(ValueError):
+            self.grid.set('south', 'ON')
+        with self.assertRaises(ValueError):
+            self.grid.set('all', 'BRIGHT')
+        with self.assertRaises(ValueError):
+            self.grid.set('all', 'DIM', 140)
+
+    def test_attach_controller(self):
+        controller = Controller(6)
+        controller.lights[2] = 'OFF'
+        grid = LightingGrid(6)
+        grid.attach(controller)
+        self.assertEqual(controller.get_light_statuses()[2], (2, 'OFF'))
+        controller.dim()
+        statuses = controller.get_light_statuses()
+        self.assertEqual({state for _, state in statuses}, {'DIM'})
+        self.assertIs(controller.get_light_statuses(), statuses)
+        grid.set('0-1', 'ON')
+        self.assertEqual(controller.get_light_statuses()[:3], ((0, 'ON'), (1, 'ON'), (2, 'DIM')))
+        np.testing.assert_array_equal(grid.level[:3], [100, 100, 40])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import random
+import time
+import unittest
+from roadmesh.networking.mesh_connectivity import ConnectivityTracker
+
+def components(graph, skip=None):
+    # Reference: plain traversal over the usable graph
+    seen, result = set(), []
+    for start in graph._links:
+        if start in seen or start == skip or not graph.usable(start):
+            continue
+        part, stack = {start}, [start]
+        while stack:
+            for n in graph._up_neighbors(stack.pop()):
+                if n not in part and n != skip:
+                    part.add(n)
+                    stack.append(n)
+        seen |= part
+        result.append(part)
+    return result
+
+class TestConnectivityTracker(unittest.TestCase):
+    def test_highway_segments(self):
+        tracker = ConnectivityTracker()
+        for i in range(5):
+            tracker.set_link(i, i + 1, 90)
+        self.assertTrue(tracker.is_connected())
+        self.assertEqual(tracker.critical_nodes(), {1, 2, 3, 4})
+        self.assertEqual(len(tracker.bridges()), 5)
+        tracker.set_node(3, status='DOWN')
+        self.assertEqual(tracker.partitions(), [{0, 1, 2}, {4, 5}])
+        self.assertEqual(tracker.cut_off([0]), {4, 5})
+        self.assertEqual(tracker.summary([0]), {'partitions': 2, 'connected': False, 'down': 1,
+                                                'cut_off': ['4', '5']})
+        # A bypass link makes the segment whole again
+        tracker.set_link(2, 4, 40)
+        self.assertTrue(tracker.is_connected())
+        tracker.set_node(3, status='UP')
+        self.assertEqual(tracker.critical_nodes(), {1, 2, 4})
+        tracker.remove_link(2, 4)
+        tracker.remove_node(3)
+        self.assertEqual(tracker.partition_count(), 2)
+        self.assertFalse(tracker.connected(0, 5))
+
+    def test_matches_traversal(self):
+        rng = random.Random(11)
+        tracker = ConnectivityTracker()
+        nodes = list(range(30))
+        for _ in range(300):
+            a, b = rng.sample(nodes, 2)
+            action = rng.random()
+            if action < 0.45:
+                tracker.set_link(a, b, rng.choice([0, 50, 100]))
+            elif action < 0.75:
+                tracker.remove_link(a, b)
+            elif action < 0.95:
+                tracker.set_node(a, status=rng.choice(['UP', 'DOWN']))
+            else:
+                tracker.remove_node(a)
+            if rng.random() < 0.3:
+                tracker.critical_nodes()  # warm the cache so the fast paths run
+            expected = components(tracker)
+            self.assertEqual(sorted(map(sorted, tracker.partitions())), sorted(map(sorted, expected)))
+            articulation = {n for part in expected for n in part
+                            if len([p for p in components(tracker, skip=n) if p & part]) > 1}
+            self.assertEqual(tracker.critical_nodes(), articulation)
+
+    def test_status_changes_are_cheap(self):
+        tracker = ConnectivityTracker()
+        n = 20000
+        for i in range(n - 1):
+            tracker.set_link(i, i + 1, 90)
+        for i in range(0, n - 2, 2):
+            tracker.set_link(i, i + 2, 50)
+        tracker.critical_nodes()
+        started = time.perf_counter()
+        for i in range(1, n - 1, 200):
+            tracker.set_node(i, status='DOWN')
+            self.assertTrue(tracker.is_connected())
+        self.assertLess(time.perf_counter() - started, 0.5)
+
+if __name__ == '__main__':
+    unittest.main()
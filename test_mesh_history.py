@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+from roadmesh.mesh_history import MeshHistoryWriter, iter_arrays, read_arrays, to_records, status_code, ABSENT
+
+class TestMeshHistory(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'mesh.bin')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_roundtrip_arrays_and_records(self):
+        writer = MeshHistoryWriter(self.path, keyframe_interval=4)
+        history = []
+        for hour in range(10):
+            statuses = {'A': ['UP', 'normal', 10], 'B': ['UP' if hour % 3 else 'DOWN', 'reduced', 5]}
+            if hour >= 5:
+                statuses['C'] = ['UP', 'critical', 1]
+            history.append((1700000000.0 + hour * 3600, statuses))
+        writer.append_many(history)
+        writer.close()
+        arrays = read_arrays(self.path)
+        self.assertEqual(arrays.node_ids, ['A', 'B', 'C'])
+        self.assertEqual(arrays.status.shape, (10, 3))
+        up = status_code(arrays, 'UP')
+        self.assertEqual((arrays.status[:, 1] == up).sum(), 6)
+        self.assertTrue((arrays.status[:5, 2] == ABSENT).all())
+        self.assertEqual([r['node_statuses'] for r in to_records(arrays)], [s for _, s in history])
+
+    def test_iter_arrays_matches_read_arrays(self):
+        writer = MeshHistoryWriter(self.path, keyframe_interval=4)
+        for hour in range(11):
+            writer.append(1700000000.0 + hour * 3600, {'A': ['UP' if hour % 2 else 'DOWN', 'normal', hour],
+                                                       'B': ['UP', 'reduced', 5]})
+        writer.close()
+        since = 1700000000.0 + 2 * 3600
+        whole = read_arrays(self.path, since)
+        chunks = list(iter_arrays(self.path, since, chunk_size=3))
+        self.assertEqual([len(c.timestamps) for c in chunks], [3, 3, 3])
+        for name in ('timestamps', 'status', 'power_mode', 'bandwidth'):
+            self.assertEqual(sum((getattr(c, name).tolist() for c in chunks), []), getattr(whole, name).tolist())
+
+    def test_deltas_only_store_changes(self):
+        writer = MeshHistoryWriter(self.path, keyframe_interval=1000)
+        statuses = {f'N{i}': ['UP', 'normal', 10] for i in range(100)}
+        writer.append(1700000000.0, statuses)
+        size_after_keyframe = os.path.getsize(self.path)
+        for hour in range(1, 50):
+            writer.append(1700000000.0 + hour * 3600, statuses)
+        writer.close()
+        # Unchanged ticks cost only a frame header each
+        self.assertLess(os.path.getsize(self.path) - size_after_keyframe, 50 * 20)
+
+    def test_range_and_reopen(self):
+        writer = MeshHistoryWriter(self.path, keyframe_interval=3)
+        for hour in range(6):
+            writer.append(float(hour), {'A': ['UP' if hour % 2 else 'DOWN', 'normal', hour]})
+        writer.close()
+        # Reopening picks up dictionaries and state from the file
+        writer = MeshHistoryWriter(self.path, keyframe_interval=3)
+        self.assertEqual(writer.count, 6)
+        writer.append(6.0, {'A': ['DOWN', 'normal', 6]})
+        writer.close()
+        arrays = read_arrays(self.path, since=2.0, until=6.5)
+        self.assertEqual(arrays.timestamps.tolist(), [2.0, 3.0, 4.0, 5.0, 6.0])
+        self.assertEqual(arrays.bandwidth[:, 0].tolist(), [2.0, 3.0, 4.0, 5.0, 6.0])
+        self.assertEqual(read_arrays(self.path, limit=2).timestamps.tolist(), [5.0, 6.0])
+
+    def test_numeric_node_ids_keep_their_code_after_reopen(self):
+        writer = MeshHistoryWriter(self.path)
+        writer.append(0.0, {1: ['UP', 'normal', 1], 2: ['UP', 'normal', 2]})
+        writer.close()
+        writer = MeshHistoryWriter(self.path)
+        writer.append(1.0, {1: ['DOWN', 'normal', 1], 2: ['UP', 'normal', 2]})
+        writer.close()
+        arrays = read_arrays(self.path)
+        self.assertEqual(arrays.node_ids, ['1', '2'])
+        self.assertEqual(arrays.status[:, 0].tolist(), [status_code(arrays, 'UP'), status_code(arrays, 'DOWN')])
+
+if __name__ == '__main__':
+    unittest.main()
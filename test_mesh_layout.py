@@ -0,0 +1,72 @@
+import unittest
+from roadmesh.networking.mesh_layout import MeshLayout
+from roadmesh.render_cache import new_figure, figure_png
+
+def chain(n):
+    topo = {i: [] for i in range(n)}
+    for i in range(n - 1):
+        topo[i].append(i + 1)
+        topo[i + 1].append(i)
+    return topo
+
+class TestMeshLayout(unittest.TestCase):
+    def test_sync_is_stable(self):
+        layout = MeshLayout()
+        layout.sync(chain(10))
+        before = layout.positions()
+        version = layout.version
+        layout.sync(chain(10))
+        self.assertEqual(layout.positions(), before)
+        self.assertEqual(layout.version, version)
+
+    def test_incremental_changes_stay_local(self):
+        layout = MeshLayout()
+        topo = chain(50)
+        layout.sync(topo)
+        before = layout.positions()
+        topo[50] = [49]
+        topo[49].append(50)
+        layout.sync(topo)
+        after = layout.positions()
+        self.assertIn(50, after)
+        moved = [n for n in before if before[n] != after[n]]
+        self.assertTrue(set(moved) <= {47, 48, 49, 50})
+        # Removing a node keeps everyone else in place
+        del topo[50]
+        topo[49].remove(50)
+        layout.sync(topo)
+        self.assertNotIn(50, layout.positions())
+        self.assertEqual(len(layout), 50)
+        self.assertEqual(layout.position(10), after[10])
+
+    def test_link_hooks(self):
+        layout = MeshLayout()
+        layout.link_added('A', 'B')
+        layout.link_added('B', 'C')
+        self.assertEqual(len(layout.edge_segments()), 2)
+        layout.link_removed('A', 'B')
+        self.assertEqual(len(layout.edge_segments()), 1)
+        layout.node_removed('C')
+        self.assertEqual(len(layout), 2)
+        self.assertEqual(len(layout.edge_segments()), 0)
+
+    def test_pinned_coordinates(self):
+        layout = MeshLayout()
+        layout.set_coordinates(0, 0.0)
+        layout.set_coordinates(1, 5.0)
+        layout.sync({0: [1, 2], 1: [0, 2], 2: [0, 1]})
+        self.assertEqual(layout.position(0), (0.0, 0.0))
+        self.assertEqual(layout.position(1), (5.0, 0.0))
+
+    def test_draw_large_mesh(self):
+        layout = MeshLayout()
+        layout.sync(chain(2000))
+        fig = new_figure((4, 2))
+        ax = fig.add_subplot()
+        layout.draw(ax, {0: ('UP', 'normal', 10)})
+        self.assertEqual(len(ax.collections), 2)
+        self.assertEqual(len(ax.texts), 0)
+        self.assertTrue(figure_png(fig).startswith(b'\x89PNG'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import random
+import time
+import unittest
+from roadmesh.networking.mesh_routing import MeshRouter, ETX, WIDEST
+
+class FakeNode:
+    def __init__(self):
+        self.neighbors = {}
+        self.status = 'UP'
+        self.power_mode = 'normal'
+
+class FakeMesh:
+    def __init__(self):
+        self.nodes = {}
+    def add_node(self, n):
+        self.nodes.setdefault(n, FakeNode())
+    def remove_node(self, n):
+        self.nodes.pop(n, None)
+        for node in self.nodes.values():
+            node.neighbors.pop(n, None)
+    def add_link(self, a, b, quality=100):
+        self.add_node(a)
+        self.add_node(b)
+        self.nodes[a].neighbors[b] = quality
+        self.nodes[b].neighbors[a] = quality
+    def remove_link(self, a, b):
+        self.nodes[a].neighbors.pop(b, None)
+        self.nodes[b].neighbors.pop(a, None)
+    def set_node_status(self, n, status):
+        self.nodes[n].status = status
+
+def rebuilt(router, root, metric):
+    # Reference: a fresh router over the same graph
+    fresh = MeshRouter()
+    for a, links in router._links.items():
+        fresh.add_node(a)
+        for b, q in links.items():
+            fresh._links.setdefault(a, {})[b] = q
+    fresh._status, fresh._power_mode = dict(router._status), dict(router._power_mode)
+    return fresh.tree(root, metric).dist
+
+class TestMeshRouter(unittest.TestCase):
+    def test_paths_and_metrics(self):
+        router = MeshRouter()
+        router.set_link('A', 'B', 90)
+        router.set_link('B', 'D', 90)
+        router.set_link('A', 'C', 50)
+        router.set_link('C', 'D', 100)
+        self.assertEqual(router.best_path('A', 'D', ETX)[0], ['A', 'B', 'D'])
+        self.assertEqual(router.best_path('A', 'D', WIDEST), (['A', 'B', 'D'], 90))
+        self.assertEqual(router.next_hop('A', 'D'), 'B')
+        # Throttled relay is avoided
+        router.set_node('B', power_mode='critical')
+        self.assertEqual(router.best_path('A', 'D', ETX)[0], ['A', 'C', 'D'])
+        router.set_node('C', status='DOWN')
+        self.assertEqual(router.best_path('A', 'D', ETX)[0], ['A', 'B', 'D'])
+        router.remove_node('B')
+        self.assertEqual(router.best_path('A', 'D'), (None, float('inf')))
+        self.assertEqual(router.next_hop_table('A'), {'C': None, 'D': None})
+
+    def test_k_shortest(self):
+        router = MeshRouter()
+        for a, b in [('A', 'B'), ('B', 'D'), ('A', 'C'), ('C', 'D'), ('B', 'C')]:
+            router.set_link(a, b, 100)
+        paths = router.k_shortest_paths('A', 'D', k=4)
+        self.assertEqual(len(paths), 4)
+        self.assertEqual({tuple(p) for p, _ in paths[:2]}, {('A', 'B', 'D'), ('A', 'C', 'D')})
+        self.assertEqual(sorted(cost for _, cost in paths), [cost for _, cost in paths])
+        self.assertEqual(len({tuple(p) for p, _ in paths}), 4)
+
+    def test_incremental_matches_rebuild(self):
+        rng = random.Random(4)
+        router = MeshRouter()
+        nodes = [f'N{i}' for i in range(40)]
+        for i in range(39):
+            router.set_link(nodes[i], nodes[i + 1], rng.randint(30, 100))
+        for metric in (ETX, WIDEST):
+            router.tree('N0', metric)
+            router.tree('N20', metric)
+        for _ in range(300):
+            a, b = rng.sample(nodes, 2)
+            action = rng.random()
+            if action < 0.4:
+                router.set_link(a, b, rng.randint(10, 100))
+            elif action < 0.7:
+                router.remove_link(a, b)
+            elif action < 0.85:
+                router.set_node(a, power_mode=rng.choice(['normal', 'reduced', 'critical']))
+            else:
+                router.set_node(a, status=rng.choice(['UP', 'DOWN']))
+            for metric in (ETX, WIDEST):
+                for root in ('N0', 'N20'):
+                    dist = router.tree(root, metric).dist
+                    expected = rebuilt(router, root, metric)
+                    self.assertEqual(dist.keys(), expected.keys())
+                    for node, d in expected.items():
+                        self.assertAlmostEqual(dist[node], d)
+
+    def test_attach_tracks_manager(self):
+        mesh = FakeMesh()
+        mesh.add_link('A', 'B', 80)
+        router = MeshRouter()
+        router.attach(mesh)
+        mesh.add_link('B', 'C', 70)
+        self.assertEqual(router.best_path('A', 'C')[0], ['A', 'B', 'C'])
+        mesh.set_node_status('B', 'DOWN')
+        self.assertIsNone(router.best_path('A', 'C')[0])
+        mesh.set_node_status('B', 'UP')
+        mesh.remove_node('C')
+        with self.assertRaises(KeyError):
+            router.best_path('A', 'C')
+        mesh.nodes['B'].power_mode = 'reduced'
+        router.sync(mesh)
+        self.assertEqual(router.best_path('A', 'B', WIDEST)[1], 40)
+
+    def test_highway_updates_are_fast(self):
+        router = MeshRouter()
+        n = 10000
+        for i in range(n - 1):
+            router.set_link(i, i + 1, 90)
+        router.tree(0)
+        started = time.perf_counter()
+        router.set_link(n - 2, n - 1, 80)
+        router.set_node(n - 5, power_mode='reduced')
+        elapsed = time.perf_counter() - started
+        self.assertLess(elapsed, 0.05)
+        self.assertEqual(router.next_hop(n - 1, 0), n - 2)
+
+if __name__ == '__main__':
+    unittest.main()
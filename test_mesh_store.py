@@ -0,0 +1,69 @@
+import unittest
+from roadmesh.networking.mesh_store import MeshStore, InternTable
+from roadmesh.networking.mesh_routing import MeshRouter
+
+class TestMeshStore(unittest.TestCase):
+    def setUp(self):
+        self.mesh = MeshStore(capacity=2)
+        self.mesh.add_link('A', 'B', quality=80)
+        self.mesh.add_link('B', 'C')
+
+    def test_manager_interface(self):
+        mesh = self.mesh
+        self.assertIn('B', mesh.nodes['A'].neighbors)
+        self.assertEqual(mesh.nodes['A'].neighbors['B'], 80)
+        self.assertEqual(mesh.get_topology(), {'A': ['B'], 'B': ['A', 'C'], 'C': ['B']})
+        self.assertEqual(mesh.get_node_statuses()['C'], ('UP', 'normal', 10))
+        self.assertTrue(mesh.health_check())
+        mesh.set_node_status('A', 'DOWN')
+        mesh.nodes['B'].power_mode = 'reduced'
+        self.assertFalse(mesh.health_check())
+        self.assertEqual(mesh.get_node_statuses()['B'], ('UP', 'reduced', 10))
+        mesh.remove_link('A', 'B')
+        self.assertNotIn('B', mesh.nodes['A'].neighbors)
+        mesh.remove_node('B')
+        self.assertNotIn('B', mesh.nodes)
+        self.assertEqual(mesh.get_topology(), {'A': [], 'C': []})
+        # The freed id is reused
+        mesh.add_link('D', 'C', 50)
+        self.assertEqual(mesh.get_topology(), {'A': [], 'D': ['C'], 'C': ['D']})
+
+    def test_snapshot_views(self):
+        snapshot = self.mesh.snapshot()
+        self.assertIs(self.mesh.snapshot(), snapshot)
+        self.assertEqual(list(snapshot.neighbors('B')), ['A', 'C'])
+        self.assertEqual(snapshot.link_qualities('B').tolist(), [80, 100])
+        self.assertEqual(dict(snapshot.statuses())['A'], ('UP', 'normal', 10))
+        self.assertEqual(snapshot.topology()['C'], ('B',))
+        sources, targets, quality = snapshot.edges()
+        self.assertEqual(sorted(zip(sources.tolist(), targets.tolist())), [(0, 1), (1, 0), (1, 2), (2, 1)])
+        with self.assertRaises(ValueError):
+            snapshot.neighbor_ids('B')[0] = 5
+        # Later changes leave the snapshot alone
+        self.mesh.add_link('C', 'D')
+        self.assertNotIn('D', snapshot)
+        self.assertIsNot(self.mesh.snapshot(), snapshot)
+        self.assertEqual(snapshot.down_nodes(), [])
+
+    def test_router_follows_store(self):
+        router = MeshRouter()
+        router.attach(self.mesh)
+        self.mesh.add_link('C', 'D', 90)
+        self.assertEqual(router.best_path('A', 'D')[0], ['A', 'B', 'C', 'D'])
+
+    def test_grows_from_zero_capacity(self):
+        mesh = MeshStore(capacity=0)
+        for name in 'ABCDE':
+            mesh.add_node(name)
+        self.assertEqual(len(mesh.get_node_statuses()), 5)
+
+    def test_intern_table(self):
+        table = InternTable(['x', 'y'])
+        self.assertEqual(table.id('y'), 1)
+        table.release('x')
+        self.assertEqual(table.intern('z'), 0)
+        self.assertEqual(table.names(), ('z', 'y'))
+        self.assertEqual(sorted(table), ['y', 'z'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import time
+import unittest
+
+from roadmesh.metrics import Family, LatencyHistogram, Registry, SamplingProfiler, timed
+
+
+def busy_loop(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    def test_buckets_and_quantiles(self):
+        histogram = LatencyHistogram((0.01, 0.1, 1.0, float('inf')))
+        for seconds in (0.005, 0.005, 0.05, 0.5, 3.0):
+            histogram.observe(seconds)
+        self.assertEqual(histogram.counts, [2, 1, 1, 1])
+        self.assertEqual(histogram.count, 5)
+        self.assertAlmostEqual(histogram.sum, 3.56)
+        self.assertEqual(histogram.quantile(0.4), 0.01)
+        self.assertEqual(histogram.quantile(1.0), 3.0)
+        self.assertIsNone(LatencyHistogram().quantile(0.5))
+
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_render_prometheus_text(self):
+        requests = self.registry.counter('requests_total', 'Requests served', ['method'])
+        requests.labels('GET').inc()
+        requests.labels(method='GET').inc(2)
+        self.registry.gauge('temperature', 'Enclosure "temp"').set(21.5)
+        latency = self.registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0))
+        latency.observe(0.05)
+        latency.observe(0.5)
+        text = self.registry.render()
+        self.assertIn('# TYPE requests_total counter', text)
+        self.assertIn('requests_total{method="GET"} 3.0', text)
+        self.assertIn('temperature 21.5', text)
+        self.assertIn('latency_seconds_bucket{le="0.1"} 1', text)
+        self.assertIn('latency_seconds_bucket{le="1.0"} 2', text)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 2', text)
+        self.assertIn('latency_seconds_count 2', text)
+
+    def test_register_returns_existing(self):
+        first = self.registry.counter('events_total', labels=['kind'])
+        self.assertIs(self.registry.counter('events_total', labels=['kind']), first)
+        with self.assertRaises(ValueError):
+            self.registry.gauge('events_total')
+
+    def test_label_values_are_escaped(self):
+        self.registry.counter('errors_total', labels=['message']).labels('bad "quote"\n').inc()
+        self.assertIn('errors_total{message="bad \\"quote\\"\\n"} 1.0', self.registry.render())
+
+    def test_collectors(self):
+        self.registry.add_collector(lambda: [Family('up', 'gauge', '', [('up', {'node': 'A'}, True)])])
+        self.registry.add_collector(lambda: 1 / 0)
+        self.assertIn('up{node="A"} 1', self.registry.render())
+
+    def test_timed(self):
+        latency = self.registry.histogram('call_seconds', labels=['op'])
+
+        @timed(latency)
+        def work():
+            busy_loop(0.01)
+            return 'done'
+
+        @timed(latency)
+        def rows():
+            for i in range(3):
+                busy_loop(0.005)
+                yield i
+
+        self.assertEqual(work(), 'done')
+        for _ in rows():
+            time.sleep(0.05)  # the consumer's time is not counted
+        work_hist = latency.labels('work').histogram
+        rows_hist = latency.labels('rows').histogram
+        self.assertEqual((work_hist.count, rows_hist.count), (1, 1))
+        self.assertGreaterEqual(work_hist.sum, 0.01)
+        self.assertLess(rows_hist.sum, 0.1)
+
+
+class TestSamplingProfiler(unittest.TestCase):
+    def test_profile_collects_stacks(self):
+        profiler = SamplingProfiler(interval=0.001)
+        with profiler.profile('busy') as profile:
+            busy_loop(0.1)
+        self.assertGreater(sum(profile.samples.values()), 5)
+        self.assertIn('busy_loop', profile.top(1)[0][0])
+        self.assertIn('test_profile_collects_stacks', profile.collapsed())
+        self.assertIs(profiler.get(profile.id), profile)
+        self.assertEqual(profile.summary()['name'], 'busy')
+
+
+if __name__ == '__main__':
+    unittest.main()
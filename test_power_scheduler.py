@@ -0,0 +1,86 @@
+import time as clock
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock
+import numpy as np
+from roadmesh.monitoring.power_scheduler import (plan_modes, threshold_modes, horizon, describe, HarvestForecast,
+                                                 PoleScheduler, PowerScheduler, Weights, RESERVE_PCT)
+from roadmesh.batch_simulation import solar_profile
+
+def harvest_for(poles, hour, seed=0):
+    rng = np.random.default_rng(seed)
+    hours = (hour + np.arange(horizon(hour))) % 24
+    return rng.uniform(0.2, 0.8, (poles, 1)) * solar_profile()[hours] + 0.02
+
+class TestPowerScheduler(unittest.TestCase):
+    def test_horizon(self):
+        self.assertEqual(horizon(18), 12)
+        self.assertEqual(horizon(6), 24)
+        self.assertEqual(horizon(5), 1)
+
+    def test_plan_beats_thresholds(self):
+        pct = np.random.default_rng(1).uniform(20, 90, 500)
+        for hour in (18, 6):
+            harvest = harvest_for(500, hour)
+            plan = plan_modes(pct, 5.0, 0.2, harvest, hour)
+            baseline = threshold_modes(pct, 5.0, 0.2, harvest, hour)
+            self.assertGreater(plan.value.mean(), baseline.value.mean())
+            self.assertTrue(np.all(plan.meets_reserve >= baseline.meets_reserve))
+            self.assertEqual(plan.mesh_mode.shape, (500, horizon(hour)))
+
+    def test_stretches_a_low_battery_over_the_night(self):
+        # 60% at dusk: the thresholds dim the light and then turn it off
+        # at 30%; the plan spreads the charge over more lit hours
+        harvest = np.full((1, 12), 0.02)
+        weights = Weights(light=1.0, mesh=0.1, reserve=100.0)
+        plan = plan_modes([60], 5.0, 0.2, harvest, 18, weights=weights)
+        baseline = threshold_modes([60], 5.0, 0.2, harvest, 18, weights=weights)
+        lit = lambda p: sum(light != 'off' for _, light in describe(p, 0))
+        self.assertGreater(lit(plan), lit(baseline))
+        self.assertGreaterEqual(plan.pct[0].min(), RESERVE_PCT)
+
+    def test_forecast(self):
+        forecast = HarvestForecast(2, decay=0.5)
+        forecast.record(12, [1.0, 2.0])
+        forecast.record(12, [0.0, 2.0])
+        np.testing.assert_allclose(forecast.expected(11, 3), [[0, 0.5, 0], [0, 2.0, 0]])
+
+    def test_pole_scheduler(self):
+        battery = MagicMock(capacity_Ah=5.0, consumption_rate=0.2)
+        battery.calculate_percentage.return_value = 90.0
+        energy = MagicMock()
+        energy.read_solar.return_value = 0.0
+        energy.read_teg.return_value = 0.02
+        power_mgmt = MagicMock(mode='normal', lighting_mode='on')
+        scheduler = PoleScheduler(battery, energy, power_mgmt)
+        self.assertEqual(scheduler.update(datetime(2024, 1, 1, 20))[0], 'normal')
+        battery.calculate_percentage.return_value = 15.0
+        mode, lighting = scheduler.update(datetime(2024, 1, 1, 21))
+        self.assertNotEqual(lighting, 'on')
+        self.assertEqual((power_mgmt.mode, power_mgmt.lighting_mode), (mode, lighting))
+
+    def test_pole_scheduler_drives_lights_and_mesh(self):
+        battery = MagicMock(capacity_Ah=5.0, consumption_rate=0.2)
+        battery.calculate_percentage.return_value = 15.0
+        energy, lighting = MagicMock(), MagicMock()
+        mesh = MagicMock(nodes={'A': MagicMock(power_mode='normal'), 'B': MagicMock(power_mode='normal')})
+        scheduler = PoleScheduler(battery, energy, MagicMock(), lighting, mesh)
+        mode, light = scheduler.update(datetime(2024, 1, 1, 21), harvest_A=0.02)
+        energy.read_solar.assert_not_called()
+        self.assertEqual({node.power_mode for node in mesh.nodes.values()}, {mode})
+        actuated = {'on': lighting.turn_on, 'off': lighting.turn_off}.get(light, lighting.dim)
+        actuated.assert_called_once_with()
+
+    def test_fleet_tick_is_fast(self):
+        poles = 2000
+        scheduler = PowerScheduler(np.full(poles, 5.0), 0.2)
+        shading = np.random.default_rng(2).uniform(0.2, 0.8, poles)
+        for hour in range(24):
+            scheduler.observe(hour, shading * solar_profile()[hour] + 0.02)
+        started = clock.perf_counter()
+        mesh, lighting = scheduler.tick(6, np.full(poles, 50.0))
+        self.assertLess((clock.perf_counter() - started) / poles, 0.01)
+        self.assertEqual(len(mesh), poles)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import threading
+import time
+import unittest
+from roadmesh.render_cache import RenderCache, new_figure, figure_png
+
+def render_png(size):
+    fig = new_figure(size)
+    fig.add_subplot().plot([0, 1], [1, 0])
+    return figure_png(fig)
+
+class TestRenderCache(unittest.TestCase):
+    def test_hit_miss_and_etag(self):
+        cache = RenderCache(max_entries=2)
+        calls = []
+        def render(size):
+            calls.append(size)
+            return render_png(size)
+        first = cache.get('plot', 1, (4, 2), render)
+        self.assertTrue(first.png.startswith(b'\x89PNG'))
+        self.assertIs(cache.get('plot', 1, (4, 2), render), first)
+        self.assertEqual(first.etag, cache.etag('plot', 1, (4, 2)))
+        self.assertNotEqual(first.etag, cache.etag('plot', 2, (4, 2)))
+        self.assertEqual(len(calls), 1)
+        # LRU eviction
+        cache.get('plot', 2, (4, 2), render)
+        cache.get('plot', 3, (4, 2), render)
+        cache.get('plot', 1, (4, 2), render)
+        self.assertEqual(len(calls), 4)
+
+    def test_concurrent_requests_render_once(self):
+        cache = RenderCache(workers=2)
+        calls = []
+        def slow(size):
+            calls.append(size)
+            time.sleep(0.05)
+            return b'png'
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get('plot', 1, (4, 2), slow)))
+                   for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        cache.shutdown()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual({r.png for r in results}, {b'png'})
+
+    def test_serves_stale_while_rendering(self):
+        cache = RenderCache(workers=1)
+        cache.get('plot', 1, (4, 2), lambda size: b'old')
+        release = threading.Event()
+        def slow(size):
+            release.wait(1)
+            return b'new'
+        self.assertEqual(cache.get('plot', 2, (4, 2), slow).png, b'old')
+        release.set()
+        cache.shutdown()
+        self.assertEqual(cache.get('plot', 2, (4, 2), slow).png, b'new')
+
+    def test_latest_is_bounded_by_eviction(self):
+        cache = RenderCache(max_entries=3)
+        for size in range(10):
+            cache.get('plot', 1, (size, 2), lambda size: b'png')
+        self.assertEqual(len(cache._entries), 3)
+        self.assertEqual(sorted(cache._latest), [('plot', (7, 2)), ('plot', (8, 2)), ('plot', (9, 2))])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import tempfile
+import unittest
+from roadmesh.scenario_sweep import expand_grid, run_sweep, load_results, append_result, run_scenario
+
+GRID = {'capacity_Ah': [4.0, 8.0], 'harvest': ['clear', 'winter'], 'days': 3, 'nodes': 20}
+
+class TestScenarioSweep(unittest.TestCase):
+    def test_expand_grid(self):
+        scenarios = expand_grid(GRID)
+        self.assertEqual(len(scenarios), 4)
+        self.assertEqual(len({s['scenario_id'] for s in scenarios}), 4)
+        self.assertEqual(scenarios[0]['consumption_rate'], 0.2)
+        # Equal values name the same scenario whatever their Python type
+        same = expand_grid({**GRID, 'capacity_Ah': [4, 8], 'days': 3.0, 'nodes': 20.0})
+        self.assertEqual([s['scenario_id'] for s in same], [s['scenario_id'] for s in scenarios])
+        self.assertIsInstance(same[0]['capacity_Ah'], float)
+        self.assertIsInstance(same[0]['nodes'], int)
+        with self.assertRaises(ValueError):
+            expand_grid({'bogus': [1]})
+        with self.assertRaises(ValueError):
+            expand_grid({'harvest': 'monsoon'})
+
+    def test_parallel_sweep_and_resume(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            # One scenario finished before an interruption
+            first = expand_grid(GRID)[0]
+            append_result(os.path.join(tmp, 'results.csv'), run_scenario(first))
+            rows = run_sweep(GRID, tmp, workers=2, store_events=True)
+            self.assertEqual(len(rows), 4)
+            self.assertEqual(len({r['scenario_id'] for r in rows}), 4)
+            # Only the three missing scenarios ran, each in its own store
+            stores = os.listdir(os.path.join(tmp, 'scenarios'))
+            self.assertEqual(len(stores), 3)
+            self.assertNotIn(first['scenario_id'], stores)
+            winter = [r for r in rows if r['harvest'] == 'winter' and r['capacity_Ah'] == 4.0][0]
+            clear = [r for r in rows if r['harvest'] == 'clear' and r['capacity_Ah'] == 4.0][0]
+            self.assertGreaterEqual(winter['hours_dark'], clear['hours_dark'])
+            # A second run has nothing left to do
+            self.assertEqual(len(run_sweep(GRID, tmp, workers=2)), 4)
+            self.assertEqual(len(load_results(os.path.join(tmp, 'results.csv'))), 4)
+
+    def test_truncated_row_runs_again(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            table = os.path.join(tmp, 'results.csv')
+            first, second = expand_grid(GRID)[:2]
+            append_result(table, run_scenario(first))
+            with open(table, 'a', newline='') as f:
+                f.write(f"{second['scenario_id']},0.5")  # killed mid-write
+            self.assertEqual([r['scenario_id'] for r in load_results(table)], [first['scenario_id']])
+            rows = run_sweep(GRID, tmp, workers=2)
+            self.assertEqual(len(rows), 4)
+            self.assertIn(second['scenario_id'], {r['scenario_id'] for r in rows})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import os
+import socket
+import tempfile
+import unittest
+
+from roadmesh.dashboard_state import StateTracker
+from roadmesh.shared_state import AlertRing, StateClient, StateOwner, StateUnavailable, share
+
+AUTHKEY = b'test-key'
+
+
+class TestAlertRing(unittest.TestCase):
+    def test_keeps_newest(self):
+        ring = AlertRing(capacity=3)
+        for i in range(5):
+            ring.append(f'alert {i}')
+        self.assertEqual(list(ring), ['alert 2', 'alert 3', 'alert 4'])
+        self.assertEqual(ring[-2:], ['alert 3', 'alert 4'])
+        self.assertEqual([seq for seq, _, _ in ring.since(3)], [4, 5])
+        self.assertEqual(len(ring), 3)
+
+
+class TestSharedState(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.address = os.path.join(self.tmp.name, 'state.sock')
+        self.nodes = {'A': 'UP', 'B': 'UP'}
+        self.mode = {'value': 'on'}
+        self.alerts = AlertRing()
+        self.tracker = StateTracker(min_interval=0)
+        self.tracker.register('nodes', lambda: self.nodes, keyed=True)
+        self.tracker.register('lighting', lambda: {'mode': self.mode['value']})
+        self.tracker.register('alerts', lambda: list(self.alerts))
+        self.owner = StateOwner(self.tracker, self.alerts)
+        self.owner.register('set_mode', self.set_mode, ['lighting'])
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.close()
+        self.owner.close()
+        self.tmp.cleanup()
+
+    def set_mode(self, mode):
+        if mode not in ('on', 'off', 'dim'):
+            raise ValueError(f'Bad mode {mode}')
+        self.mode['value'] = mode
+        return mode
+
+    def share(self, owner=None):
+        state = share(owner or self.owner, self.address, AUTHKEY)
+        if isinstance(state, StateClient):
+            self.clients.append(state)
+        return state
+
+    def test_first_process_owns_and_others_follow(self):
+        self.assertIs(self.share(), self.owner)
+        client = self.share(StateOwner(StateTracker(), AlertRing()))
+        self.assertIsInstance(client, StateClient)
+        client.refresh()
+        self.assertEqual(client.snapshot()['state']['nodes'], {'A': 'UP', 'B': 'UP'})
+        self.assertEqual(client.version, self.owner.version)
+
+        self.nodes = {'A': 'DOWN', 'C': 'UP'}
+        version = client.refresh(force=True)
+        self.assertEqual(client.snapshot()['state']['nodes'], {'A': 'DOWN', 'C': 'UP'})
+        self.assertEqual(client.diff(version)['changes'], {})
+        self.assertEqual(client.wait(version - 1, timeout=0), version)
+
+    def test_commands_run_in_owner_and_are_read_back(self):
+        self.share()
+        client = self.share(StateOwner(StateTracker(), AlertRing()))
+        client.min_interval = 3600
+        client.refresh()
+        self.assertEqual(client.command('set_mode', 'dim'), 'dim')
+        self.assertEqual(self.mode['value'], 'dim')
+        client.alert('Lighting set to DIM')
+        client.refresh()  # within min_interval, but after our own writes
+        state = client.snapshot()['state']
+        self.assertEqual(state['lighting'], {'mode': 'dim'})
+        self.assertEqual(state['alerts'], ['Lighting set to DIM'])
+        with self.assertRaises(ValueError):
+            client.command('set_mode', 'disco')
+        with self.assertRaises(ValueError):
+            client.command('self_destruct')
+
+    def test_queries_read_the_owner(self):
+        self.owner.register_query('node', lambda name: self.nodes.get(name))
+        self.share()
+        client = self.share(StateOwner(StateTracker(), AlertRing()))
+        version = client.refresh()
+        client.min_interval = 3600
+        self.nodes = {'A': 'DOWN'}
+        self.assertEqual(client.query('node', 'A'), 'DOWN')
+        self.assertEqual(self.owner.query('node', 'A'), 'DOWN')
+        self.assertEqual(client.refresh(), version)  # a read forces no refresh
+        with self.assertRaises(ValueError):
+            client.query('set_mode', 'dim')
+
+    def test_stale_socket_is_taken_over(self):
+        stale = socket.socket(socket.AF_UNIX)
+        stale.bind(self.address)
+        stale.close()  # the file stays behind, nobody listens
+        self.assertIs(self.share(), self.owner)
+
+    def test_unreachable_owner(self):
+        client = StateClient(self.address, AUTHKEY)
+        with self.assertRaises(StateUnavailable):
+            client.refresh()
+        self.share()
+        with self.assertRaises(StateUnavailable):
+            StateClient(self.address, b'wrong key').refresh()
+        self.assertIsNotNone(client.refresh())
+        client.close()
+
+    def test_serving_needs_a_key(self):
+        with self.assertRaises(ValueError):
+            share(self.owner, self.address, b'')
+        self.assertIs(share(self.owner), self.owner)
+        self.share()
+        with self.assertRaises(ValueError):  # a worker joining without a key
+            share(StateOwner(StateTracker(), AlertRing()), self.address, None)
+
+    def test_tcp_is_loopback_only(self):
+        with self.assertRaises(ValueError):
+            share(self.owner, '0.0.0.0:7800', AUTHKEY)
+        with self.assertRaises(ValueError):
+            StateClient('10.0.0.5:7800', AUTHKEY)
+        self.assertIs(share(self.owner, '127.0.0.1:0', AUTHKEY), self.owner)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from roadmesh import persistence
+from roadmesh.storage import SQLiteBackend, migrate_csv
+
+class TestSQLiteBackend(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = SQLiteBackend(os.path.join(self.tmp.name, 'test.db'))
+        self.start = datetime(2024, 1, 1)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def test_battery_history_range_queries(self):
+        with self.store.batch():
+            self.store.append_battery_history(
+                (self.start + timedelta(hours=h), 3.7, 0.1, float(h)) for h in range(48))
+        rows = self.store.load_battery_history(since=self.start + timedelta(hours=10),
+                                               until=self.start + timedelta(hours=20))
+        self.assertEqual([r['charge_pct'] for r in rows], [float(h) for h in range(10, 20)])
+        rows = self.store.load_battery_history(limit=3)
+        self.assertEqual([r['charge_pct'] for r in rows], [45.0, 46.0, 47.0])
+        self.assertEqual(rows[0]['timestamp'], (self.start + timedelta(hours=45)).isoformat())
+
+    def test_batch_rolls_back_on_error(self):
+        with self.assertRaises(RuntimeError):
+            with self.store.batch():
+                self.store.append_events([(self.start, 'lost')])
+                raise RuntimeError
+        self.assertEqual(self.store.load_event_log(), [])
+
+    def test_event_pages_and_filters(self):
+        for store in (self.store, persistence.csv_backend(self.tmp.name)):
+            with store.batch():
+                store.append_events((self.start + timedelta(minutes=m),
+                                     f'Mesh mode changed to {"reduced" if m % 2 else "normal"} at {m}'
+                                     if m % 3 else f'Lighting mode changed to dim at {m}') for m in range(30))
+            rows, cursor = store.query_events(limit=7)
+            seen = [r['id'] for r in rows]
+            while cursor:
+                rows, cursor = store.query_events(limit=7, cursor=cursor)
+                seen += [r['id'] for r in rows]
+            self.assertEqual(len(seen), 30)
+            self.assertEqual(len(set(seen)), 30)
+            rows, _ = store.query_events(kind='lighting_mode', limit=None)
+            self.assertEqual(len(rows), 10)
+            rows, _ = store.query_events(contains='REDUCED', since=self.start + timedelta(minutes=10),
+                                         until=self.start + timedelta(minutes=20), limit=None)
+            self.assertEqual([r['event'][-2:] for r in rows], ['11', '13', '17', '19'])
+            rows, cursor = store.query_events(contains='%', limit=5)
+            self.assertEqual(rows, [])
+            rows, cursor = store.query_events(descending=True, limit=2)
+            self.assertEqual([r['event'][-2:] for r in rows], ['29', '28'])
+            rows, _ = store.query_events(descending=True, limit=2, cursor=cursor)
+            self.assertEqual([r['event'][-2:] for r in rows], ['27', '26'])
+        with self.assertRaises(ValueError):
+            self.store.query_events(cursor='garbage')
+
+    def test_event_type_migration(self):
+        path = os.path.join(self.tmp.name, 'old.db')
+        conn = sqlite3.connect(path)
+        conn.execute('CREATE TABLE event_log (id INTEGER PRIMARY KEY, ts REAL, timestamp TEXT, event TEXT)')
+        conn.execute("INSERT INTO event_log (ts, timestamp, event) VALUES (0, '1970-01-01', 'Lighting set to ON by admin')")
+        conn.commit()
+        conn.close()
+        store = SQLiteBackend(path)
+        rows, _ = store.query_events(kind='lighting_control', contains='set to')
+        self.assertEqual(len(rows), 1)
+        store.close()
+
+    def test_state_users_sessions_roundtrip(self):
+        self.assertEqual(self.store.load_battery_state(), 0.0)
+        self.store.save_battery_state(2.5)
+        self.assertEqual(self.store.load_battery_state(), 2.5)
+        self.store.save_users({'admin': 'hash'})
+        self.store.save_sessions({'sid': 'admin'})
+        self.assertEqual(self.store.load_users(), {'admin': 'hash'})
+        self.assertEqual(self.store.load_sessions(), {'sid': 'admin'})
+
+    def test_add_users(self):
+        for store in (self.store, persistence.csv_backend(self.tmp.name)):
+            store.save_users({'admin': 'hash'})
+            added = store.add_users([('crew1', 'h1'), ('admin', 'other'), ('crew2', 'h2'), ('crew1', 'again')])
+            self.assertEqual(added, ['crew1', 'crew2'])
+            self.assertEqual(store.get_user('crew1'), 'h1')
+            self.assertEqual(store.get_user('admin'), 'hash')
+            self.assertIsNone(store.get_user('nobody'))
+            self.assertEqual(store.existing_users(['crew2', 'nobody', 'admin']), {'crew2', 'admin'})
+            self.assertEqual(store.load_users(), {'admin': 'hash', 'crew1': 'h1', 'crew2': 'h2'})
+
+class TestMigration(unittest.TestCase):
+    def test_migrate_csv(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source = persistence.csv_backend(tmp)
+            source.append_battery_history([('2024-01-01T00:00:00', 3.9, 0.2, 80.0)])
+            source.append_events([('2024-01-01T01:00:00', 'Mesh mode changed to normal')])
+            source.append_mesh_status([('2024-01-01T00:00:00', {'A': ['UP', 'normal', 10]})])
+            source.save_users({'admin': 'hash'})
+            target = SQLiteBackend(os.path.join(tmp, 'roadmesh.db'))
+            counts = migrate_csv(source, target)
+            self.assertEqual(counts['battery_history'], 1)
+            self.assertEqual(target.load_battery_history()[0]['charge_pct'], 80.0)
+            self.assertEqual(target.load_event_log()[0]['event'], 'Mesh mode changed to normal')
+            self.assertEqual(target.load_mesh_status_history()[0]['node_statuses'], {'A': ['UP', 'normal', 10]})
+            self.assertEqual(target.load_users(), {'admin': 'hash'})
+            # Second run is a no-op
+            self.assertEqual(migrate_csv(source, target), {})
+            target.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,202 @@
+import asyncio
+import math
+import os
+import tempfile
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+
+from roadmesh import persistence
+from roadmesh.networking.mesh_store import MeshStore
+from roadmesh.networking.telemetry_gateway import (Reading, SubsystemSink, TelemetryGateway, decode_payload,
+                                                    encode_frame, encode_lines, merge, parse_body, valid, HEADER)
+from roadmesh.storage import SQLiteBackend
+
+
+class TestWireFormats(unittest.TestCase):
+    def test_frame_round_trip(self):
+        readings = [Reading('P-1', 1000.5, 12.5, 0.25, 80.0, 'UP'), Reading('P-2', 1001.0, status='DOWN'),
+                    Reading('P-3', 1002.0, 11.0)]
+        decoded, bad = parse_body(encode_frame(readings) + encode_frame(readings[:1]), 2000)
+        self.assertEqual(decoded, readings + readings[:1])
+        self.assertEqual(bad, 0)
+
+    def test_malformed_frames(self):
+        frame = encode_frame([Reading('P-1', 1000.0, 12.0)])
+        with self.assertRaises(ValueError):
+            parse_body(frame[:-3], 2000)
+        with self.assertRaises(ValueError):
+            decode_payload(frame[HEADER.size:] + b'x')
+
+    def test_ndjson(self):
+        body = encode_lines([Reading('P-1', 1000.0, 12.0, None, 50.0, 'UP')]) + b'not json\n\n{"ts": 1}\n'
+        body += b'{"node": "P-2", "status": "down"}\n'
+        readings, bad = parse_body(body, 1500.0)
+        self.assertEqual(readings, [Reading('P-1', 1000.0, 12.0, None, 50.0, 'UP'), Reading('P-2', 1500.0, status='DOWN')])
+        self.assertEqual(bad, 2)
+
+    def test_validation(self):
+        now = 1000.0
+        self.assertTrue(valid(Reading('P-1', now, 12.0, -1.0, 100.0, 'UP'), now))
+        for reading in (Reading('', now), Reading('P' * 65, now), Reading('P-1', now + 301),
+                        Reading('P-1', math.nan), Reading('P-1', now, 61.0), Reading('P-1', now, math.nan),
+                        Reading('P-1', now, charge_pct=101.0), Reading('P-1', now, status='MAYBE')):
+            self.assertFalse(valid(reading, now), reading)
+
+    def test_merge_keeps_newest_fields(self):
+        old = Reading('P-1', 10.0, 12.0, 0.5, 80.0, 'UP')
+        new = Reading('P-1', 11.0, 11.5, status='DOWN')
+        expected = Reading('P-1', 11.0, 11.5, 0.5, 80.0, 'DOWN')
+        self.assertEqual(merge(old, new), expected)
+        self.assertEqual(merge(new, old), expected)
+
+
+class TestTelemetryGateway(unittest.TestCase):
+    def setUp(self):
+        self.batches = []
+        self.gateway = TelemetryGateway(self.batches.append, flush_interval=0.05)
+
+    def run_with_gateway(self, scenario):
+        async def run():
+            ports = await self.gateway.start('127.0.0.1', tcp_port=0, udp_port=0, http_port=0)
+            try:
+                return await scenario(ports)
+            finally:
+                await self.gateway.stop()
+        return asyncio.run(run())
+
+    def flushed(self):
+        return {r.node_id: r for batch in self.batches for r in batch}
+
+    def test_tcp_udp_and_http(self):
+        async def scenario(ports):
+            reader, writer = await asyncio.open_connection('127.0.0.1', ports['tcp'])
+            writer.write(encode_frame([Reading('P-1', time.time(), 12.0), Reading('P-1', time.time() + 1, 12.5)]))
+            writer.write(encode_lines([Reading('P-2', time.time(), status='DOWN')]) + b'garbage\n')
+            await writer.drain()
+            transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+                asyncio.DatagramProtocol, remote_addr=('127.0.0.1', ports['udp']))
+            transport.sendto(encode_frame([Reading('P-3', time.time(), 13.0)]))
+            reader2, writer2 = await asyncio.open_connection('127.0.0.1', ports['http'])
+            body = encode_lines([Reading('P-4', time.time(), 14.0), Reading('P-5', time.time() + 3600)])
+            writer2.write(b'POST /telemetry HTTP/1.1\r\nContent-Length: %d\r\nConnection: close\r\n\r\n' % len(body) + body)
+            response = await reader2.read()
+            await asyncio.sleep(0.2)
+            writer.close()
+            transport.close()
+            return response
+
+        response = self.run_with_gateway(scenario)
+        self.assertTrue(response.startswith(b'HTTP/1.1 202 Accepted'))
+        self.assertTrue(response.endswith(b'{"accepted": 1, "rejected": 1}'))
+        flushed = self.flushed()
+        self.assertEqual(sorted(flushed), ['P-1', 'P-2', 'P-3', 'P-4'])
+        self.assertEqual(flushed['P-1'].voltage, 12.5)
+        self.assertEqual(flushed['P-2'].status, 'DOWN')
+        self.assertEqual(self.gateway.stats['coalesced'], 1)
+        self.assertEqual(self.gateway.stats['rejected'], 2)
+
+    def test_backpressure(self):
+        release = threading.Event()
+        self.gateway.sink = lambda readings: release.wait(5)
+        self.gateway.max_pending = 2
+
+        async def post(ports, nodes):
+            reader, writer = await asyncio.open_connection('127.0.0.1', ports['http'])
+            body = encode_lines([Reading(n, time.time(), 12.0) for n in nodes])
+            writer.write(b'POST /telemetry HTTP/1.1\r\nContent-Length: %d\r\nConnection: close\r\n\r\n' % len(body) + body)
+            return (await reader.read()).split(b'\r\n')
+
+        async def scenario(ports):
+            first = await post(ports, ['A', 'B'])   # fills the queue; the sink then blocks on it
+            await asyncio.sleep(0.1)
+            second = await post(ports, ['C', 'D'])  # queued behind the blocked sink
+            third = await post(ports, ['E'])
+            release.set()
+            await asyncio.sleep(0.1)
+            fourth = await post(ports, ['E'])
+            return first, second, third, fourth
+
+        first, second, third, fourth = self.run_with_gateway(scenario)
+        self.assertIn(b'202', first[0])
+        self.assertIn(b'202', second[0])
+        self.assertIn(b'503', third[0])
+        self.assertIn(b'Retry-After: 1', third)
+        self.assertIn(b'202', fourth[0])
+        self.assertEqual(self.gateway.stats['throttled'], 1)
+
+    def test_token_is_required_when_set(self):
+        self.gateway = TelemetryGateway(self.batches.append, flush_interval=0.05, token='s3cret')
+
+        async def post(ports, body, token=None):
+            reader, writer = await asyncio.open_connection('127.0.0.1', ports['http'])
+            auth = b'Authorization: Bearer %s\r\n' % token.encode() if token else b''
+            writer.write(b'POST /telemetry HTTP/1.1\r\n%sContent-Length: %d\r\nConnection: close\r\n\r\n'
+                         % (auth, len(body)) + body)
+            return (await reader.read()).split(b'\r\n')[0]
+
+        async def scenario(ports):
+            reader, writer = await asyncio.open_connection('127.0.0.1', ports['tcp'])
+            writer.write(encode_frame([Reading('P-1', time.time(), 12.0)], 's3cret'))
+            writer.write(encode_lines([Reading('P-2', time.time(), 12.0)], 's3cret'))
+            writer.write(encode_lines([Reading('P-3', time.time(), 12.0)], 'guess'))
+            await writer.drain()
+            closed = await reader.read()
+            transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+                asyncio.DatagramProtocol, remote_addr=('127.0.0.1', ports['udp']))
+            transport.sendto(encode_frame([Reading('P-4', time.time(), 13.0)]))
+            transport.sendto(encode_frame([Reading('P-5', time.time(), 13.0)], 's3cret'))
+            body = encode_lines([Reading('P-6', time.time(), 14.0)])
+            statuses = await post(ports, body), await post(ports, body, 'guess'), await post(ports, body, 's3cret')
+            await asyncio.sleep(0.2)
+            transport.close()
+            return closed, statuses
+
+        closed, statuses = self.run_with_gateway(scenario)
+        self.assertEqual(closed, b'')
+        self.assertEqual([status.split()[1] for status in statuses], [b'401', b'401', b'202'])
+        self.assertEqual(sorted(self.flushed()), ['P-1', 'P-2', 'P-5', 'P-6'])
+        self.assertEqual(self.gateway.stats['unauthorized'], 4)
+
+    def test_needs_a_token_beyond_loopback(self):
+        with self.assertRaises(ValueError):
+            asyncio.run(self.gateway.start('0.0.0.0', http_port=0))
+
+
+
+class TestSubsystemSink(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = SQLiteBackend(os.path.join(self.tmp.name, 'test.db'))
+        self.previous = persistence.set_backend(self.store)
+
+    def tearDown(self):
+        persistence.set_backend(self.previous)
+        self.store.close()
+        self.tmp.cleanup()
+
+    def test_updates_battery_mesh_and_history(self):
+        battery = SimpleNamespace(capacity_Ah=100.0, current_charge_Ah=10.0, voltage_data=[])
+        mesh = MeshStore()
+        mesh.add_node('P-2')
+        sink = SubsystemSink({'P-1': battery}, mesh)
+        sink([Reading('P-1', 1000.0, 12.5, 0.5, 75.0, 'UP'), Reading('P-2', 1000.0, status='DOWN'),
+              Reading('P-3', 1000.0, 12.0, status='UP')])
+        self.assertEqual(battery.current_charge_Ah, 75.0)
+        self.assertEqual(battery.voltage_data[0]['voltage'], 12.5)
+        self.assertEqual(mesh.nodes['P-2'].status, 'DOWN')
+        self.assertIn('P-3', mesh.nodes)
+        self.assertEqual(len(persistence.load_battery_history()), 1)
+        events = persistence.load_event_log()
+        self.assertEqual(len(events), 1)
+        self.assertIn('P-2', str(events[0]))
+        self.assertEqual(len(persistence.load_mesh_status_history()), 1)
+
+        sink([Reading('P-2', 1001.0, status='DOWN')])  # no change, nothing recorded
+        self.assertEqual(len(persistence.load_event_log()), 1)
+        self.assertEqual(len(persistence.load_mesh_status_history()), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import io
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+import bcrypt
+
+from roadmesh import persistence
+from roadmesh.networking import user_provisioning
+from roadmesh.networking.user_provisioning import hash_passwords, parse_users, provision_users, read_users
+from roadmesh.storage import SQLiteBackend
+
+
+class TestUserProvisioning(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = SQLiteBackend(os.path.join(self.tmp.name, 'test.db'))
+        self.previous = persistence.set_backend(self.store)
+        self.store.save_users({'admin': 'hash'})
+
+    def tearDown(self):
+        persistence.set_backend(self.previous)
+        self.store.close()
+        self.tmp.cleanup()
+
+    def test_read_csv_and_jsonl(self):
+        rows = list(parse_users('username,password\ncrew1,pw1\n,nopass\n', 'csv'))
+        self.assertEqual(rows, [(2, 'crew1', 'pw1'), (3, '', 'nopass')])
+        rows = list(parse_users('{"username": "crew1", "password": "pw1"}\n\nnot json\n', 'jsonl'))
+        self.assertEqual(rows, [(1, 'crew1', 'pw1'), (3, None, None)])
+        path = os.path.join(self.tmp.name, 'crew.csv')
+        with open(path, 'w') as f:
+            f.write('username,password\ncrew9,pw\n')
+        self.assertEqual(list(read_users(path)), [(2, 'crew9', 'pw')])
+        with self.assertRaises(ValueError):
+            list(read_users(io.StringIO(''), 'xml'))
+
+    def test_parallel_hashes_verify(self):
+        hashes = hash_passwords(['a', 'b', 'c'], rounds=4, processes=2)
+        self.assertEqual(len(hashes), 3)
+        self.assertTrue(all(h.startswith('$2b$04$') for h in hashes))
+        self.assertTrue(bcrypt.checkpw(b'b', hashes[1].encode()))
+        with self.assertRaises(ValueError):
+            hash_passwords(['a'], rounds=3)
+
+    def test_provision(self):
+        service = SimpleNamespace(users={'admin': 'hash'})
+        rows = parse_users('username,password\ncrew1,pw1\nadmin,x\ncrew2,pw2\ncrew1,again\n,x\n', 'csv')
+        result = provision_users(rows, rounds=4, processes=1, user_service=service)
+        self.assertEqual(result.added, ['crew1', 'crew2'])
+        self.assertEqual(result.existing, ['admin'])
+        self.assertEqual(result.duplicates, ['crew1'])
+        self.assertEqual(result.invalid, [(6, 'missing username or password')])
+        self.assertTrue(bcrypt.checkpw(b'pw2', persistence.get_user('crew2').encode()))
+        self.assertEqual(set(service.users), {'admin', 'crew1', 'crew2'})
+        hashed = provision_users(parse_users('username,password\ncrew4,pw4\n', 'csv'),
+                                 hash_all=lambda passwords: [f'h:{p}' for p in passwords])
+        self.assertEqual(hashed.added, ['crew4'])
+        self.assertEqual(persistence.get_user('crew4'), 'h:pw4')
+        dry = provision_users(parse_users('username,password\ncrew3,pw\ncrew1,pw\n', 'csv'), dry_run=True)
+        self.assertEqual((dry.added, dry.existing), (['crew3'], ['crew1']))
+        self.assertIsNone(persistence.get_user('crew3'))
+
+    def test_attach_register_user(self):
+        service = SimpleNamespace(users={'admin': 'hash'})
+        user_provisioning.attach(service, lambda password: f'hashed:{password}')
+        self.assertTrue(service.register_user('crew1', 'pw'))
+        self.assertFalse(service.register_user('crew1', 'pw'))
+        self.assertFalse(service.register_user('admin', 'pw'))
+        self.assertEqual(self.store.load_users(), {'admin': 'hash', 'crew1': 'hashed:pw'})
+
+    def test_cli(self):
+        path = os.path.join(self.tmp.name, 'crew.jsonl')
+        with open(path, 'w') as f:
+            f.write('{"username": "crew1", "password": "pw"}\n{"username": "crew2", "password": "pw"}\n')
+        self.assertEqual(user_provisioning.main([path, '--rounds', '4', '--processes', '1']), 0)
+        self.assertEqual(self.store.existing_users(['crew1', 'crew2']), {'crew1', 'crew2'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+
+import numpy as np
+
+from roadmesh.monitoring.voltage_history import VoltageHistory
+
+
+class TestVoltageHistory(unittest.TestCase):
+    def test_ring_keeps_newest_as_views(self):
+        history = VoltageHistory(capacity=4, tiers=())
+        for i in range(6):
+            history.add(1000.0 + i, 12.0 + i)
+        self.assertEqual(len(history), 4)
+        self.assertEqual(history.times().tolist(), [1002.0, 1003.0, 1004.0, 1005.0])
+        self.assertEqual(history.voltages().tolist(), [14.0, 15.0, 16.0, 17.0])
+        self.assertTrue(np.shares_memory(history.voltages(), history._raw.columns['voltage']))
+        with self.assertRaises(ValueError):
+            history.voltages()[0] = 0.0
+        self.assertEqual(history.latest(), (1005.0, 17.0))
+        self.assertIsNone(VoltageHistory().latest())
+
+    def test_tiers_downsample(self):
+        history = VoltageHistory(capacity=10, tiers=((60, 10), (300, 10)))
+        for i in range(0, 640, 10):  # one reading every 10 s for 10+ minutes
+            history.add(i, 12.0 + (i % 60) / 60)
+        minutes = history.tier(0)
+        self.assertEqual(minutes.start.tolist(), [0.0, 60.0, 120.0, 180.0, 240.0, 300.0, 360.0, 420.0, 480.0, 540.0])
+        self.assertEqual(minutes.count.tolist(), [6] * 10)
+        self.assertAlmostEqual(minutes.low[0], 12.0)
+        self.assertAlmostEqual(minutes.high[0], 12 + 50 / 60)
+        self.assertAlmostEqual(minutes.mean[0], 12 + 25 / 60)
+        five = history.tier(1)
+        self.assertEqual(five.start.tolist(), [0.0])
+        self.assertEqual(five.count.tolist(), [30])
+        self.assertAlmostEqual(five.mean[0], 12 + 25 / 60)
+
+    def test_series_picks_finest_covering_level(self):
+        history = VoltageHistory(capacity=10, tiers=((60, 100),))
+        for i in range(0, 600, 10):
+            history.add(i, 12.0)
+        raw = history.series(since=550)
+        self.assertEqual(raw.resolution, 0)
+        self.assertEqual(raw.times.tolist(), [550.0, 560.0, 570.0, 580.0, 590.0])
+        everything = history.series()
+        self.assertEqual(everything.resolution, 60)
+        self.assertEqual(everything.times[0], 0.0)
+        self.assertEqual(history.series(since=120).times[0], 120.0)
+
+    def test_series_copy_is_not_overwritten(self):
+        history = VoltageHistory(capacity=4, tiers=())
+        for i in range(4):
+            history.add(1000.0 + i, 12.0 + i)
+        view, copied = history.series(), history.series(copy=True)
+        history.add(1004.0, 20.0)
+        self.assertEqual(copied.times.tolist(), [1000.0, 1001.0, 1002.0, 1003.0])
+        self.assertEqual(copied.mean.tolist(), [12.0, 13.0, 14.0, 15.0])
+        self.assertTrue(copied.low is copied.mean and copied.times.flags.writeable)
+        self.assertNotEqual(view.times.tolist(), copied.times.tolist())  # the view moved on
+
+    def test_attach_keeps_voltage_data_interface(self):
+        now = datetime(2024, 6, 1, 12, 0)
+        battery = SimpleNamespace(voltage_data=[{'timestamp': now, 'voltage': 3.9}])
+        history = VoltageHistory(capacity=100)
+        history.attach(battery)
+        self.assertIs(battery.voltage_data, history)
+        battery.voltage_data.append({'timestamp': now.replace(minute=1), 'voltage': 3.1})
+        self.assertEqual(battery.voltage_data[-1], {'timestamp': now.replace(minute=1), 'voltage': 3.1})
+        self.assertEqual([d['voltage'] for d in battery.voltage_data], [3.9, 3.1])
+        self.assertTrue(battery.voltage_data)
+        self.assertEqual(history.version, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock
+from roadmesh import persistence
+from roadmesh.storage import SQLiteBackend
+from roadmesh.write_buffer import WriteBuffer
+
+class TestWriteBuffer(unittest.TestCase):
+    def test_flushes_by_size_in_one_batch(self):
+        backend = MagicMock()
+        buf = WriteBuffer(backend, max_records=3, background=False)
+        buf.append_event_log('one')
+        buf.append_mesh_status({'A': ('UP', 'normal', 10)})
+        backend.append_events.assert_not_called()
+        buf.append_battery_history(datetime(2024, 1, 1), 3.7, 0.1, 50.0)
+        backend.batch.assert_called_once()
+        self.assertEqual(len(backend.append_events.call_args[0][0]), 1)
+        self.assertEqual(len(buf), 0)
+
+    def test_battery_state_coalesced_and_synced_on_close(self):
+        backend = MagicMock()
+        buf = WriteBuffer(backend, background=False)
+        for charge in (1.0, 2.0, 3.0):
+            buf.save_battery_state(charge)
+        buf.close()
+        backend.save_battery_state.assert_called_once_with(3.0)
+        backend.sync.assert_called_once()
+        with self.assertRaises(RuntimeError):
+            buf.append_event_log('late')
+
+    def test_failed_flush_keeps_records(self):
+        backend = MagicMock()
+        backend.append_events.side_effect = [OSError('disk full'), None]
+        buf = WriteBuffer(backend, background=False)
+        buf.append_event_log('one')
+        buf.save_battery_state(1.0)
+        with self.assertRaises(OSError):
+            buf.flush()
+        self.assertEqual(len(buf), 1)
+        buf.append_event_log('two')
+        self.assertEqual(buf.flush(), 2)
+        self.assertEqual([event for _, event in backend.append_events.call_args[0][0]], ['one', 'two'])
+        backend.save_battery_state.assert_called_with(1.0)
+
+    def test_close_retries_the_writer_threads_failed_flush(self):
+        backend = MagicMock()
+        backend.append_events.side_effect = [OSError('disk full'), None]
+        buf = WriteBuffer(backend, flush_interval=60)
+        buf.append_event_log('one')
+        buf.close()  # the thread's final flush fails, the caller's succeeds
+        self.assertEqual(backend.append_events.call_count, 2)
+        self.assertEqual([event for _, event in backend.append_events.call_args[0][0]], ['one'])
+        backend.sync.assert_called_once()
+
+    def test_close_raises_when_records_cannot_be_written(self):
+        backend = MagicMock()
+        backend.append_events.side_effect = OSError('disk full')
+        buf = WriteBuffer(backend, flush_interval=60)
+        buf.append_event_log('one')
+        with self.assertLogs('roadmesh.write_buffer', 'ERROR') as logs, self.assertRaises(OSError):
+            buf.close()
+        self.assertIn('1 records unwritten', logs.output[-1])
+        backend.sync.assert_not_called()
+
+    def test_write_behind_routes_persistence_calls(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            previous = persistence.set_backend(SQLiteBackend(os.path.join(tmp, 'test.db')))
+            try:
+                with persistence.write_behind(flush_interval=60) as buf:
+                    persistence.append_event_log('queued')
+                    self.assertEqual(len(buf), 1)
+                    # Reads see queued records
+                    self.assertEqual(persistence.load_event_log()[0]['event'], 'queued')
+                    persistence.append_event_log('second')
+                self.assertEqual(len(persistence.load_event_log()), 2)
+            finally:
+                persistence.get_backend().close()
+                persistence.set_backend(previous)
+
+if __name__ == '__main__':
+    unittest.main()
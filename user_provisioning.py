@@ -0,0 +1,141 @@
+import argparse
+import csv
+import io
+import json
+import logging
+import multiprocessing
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+
+from roadmesh import persistence
+
+logger = logging.getLogger(__name__)
+
+# Bulk account creation. Users come from CSV (username,password header) or
+# JSON lines ({"username": ..., "password": ...}). Names already taken are
+# found with one indexed query, passwords are hashed across a process pool,
+# and every new account is written in a single commit.
+
+BCRYPT_ROUNDS = 12
+MIN_ROUNDS, MAX_ROUNDS = 4, 16
+FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+
+# added/existing/duplicates are usernames; invalid is (line, reason)
+ProvisionResult = namedtuple('ProvisionResult', ['added', 'existing', 'duplicates', 'invalid'])
+
+
+def read_users(source, format=None):
+    # source: path or text file; yields (line number, username, password)
+    if isinstance(source, (str, os.PathLike)):
+        format = format or FORMATS.get(os.path.splitext(source)[1].lower())
+        with open(source, newline='', encoding='utf-8') as f:
+            yield from read_users(f, format)
+        return
+    if format == 'csv':
+        reader = csv.DictReader(source)
+        for row in reader:
+            yield reader.line_num, (row.get('username') or '').strip(), row.get('password') or ''
+    elif format == 'jsonl':
+        for line, text in enumerate(source, 1):
+            if not text.strip():
+                continue
+            try:
+                record = json.loads(text)
+                yield line, str(record.get('username') or '').strip(), str(record.get('password') or '')
+            except (ValueError, AttributeError):
+                yield line, None, None
+    else:
+        raise ValueError(f'Unknown user file format: {format!r} (csv or jsonl)')
+
+
+def parse_users(text, format):
+    return read_users(io.StringIO(text, newline=''), format)
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds)).decode()
+
+
+def hash_passwords(passwords, rounds=BCRYPT_ROUNDS, processes=None):
+    # bcrypt across worker processes, in input order
+    if not MIN_ROUNDS <= rounds <= MAX_ROUNDS:
+        raise ValueError(f'bcrypt rounds must be {MIN_ROUNDS}-{MAX_ROUNDS}')
+    passwords = list(passwords)
+    processes = min(processes or os.cpu_count() or 1, len(passwords))
+    if processes <= 1:
+        return [_hash(password, rounds) for password in passwords]
+    # spawn, not fork, in case the caller has other threads running
+    with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('spawn')) as pool:
+        chunksize = max(1, len(passwords) // (processes * 4))
+        return list(pool.map(_hash, passwords, [rounds] * len(passwords), chunksize=chunksize))
+
+
+def provision_users(rows, rounds=BCRYPT_ROUNDS, processes=None, user_service=None, dry_run=False,
+                    hash_all=None):
+    # rows from read_users(); with user_service, its in-memory users are
+    # updated too. hash_all(passwords) -> hashes replaces the process pool
+    # (the dashboard hashes on its PasswordVerifier threads instead).
+    accounts, duplicates, invalid = {}, [], []
+    for line, username, password in rows:
+        if not username or not password:
+            invalid.append((line, 'missing username or password'))
+        elif username in accounts:
+            duplicates.append(username)
+        else:
+            accounts[username] = password
+    existing = persistence.existing_users(accounts)
+    pending = [username for username in accounts if username not in existing]
+    if dry_run:
+        return ProvisionResult(pending, sorted(existing), duplicates, invalid)
+    passwords = [accounts[username] for username in pending]
+    hashes = hash_all(passwords) if hash_all else hash_passwords(passwords, rounds, processes)
+    added = persistence.add_users(zip(pending, hashes)) if pending else []
+    if user_service is not None:
+        new = set(added)
+        user_service.users.update((username, hashed) for username, hashed in zip(pending, hashes) if username in new)
+    logger.info(f'Provisioned {len(added)} users ({len(existing)} existing, {len(duplicates)} duplicate, '
+                f'{len(invalid)} invalid rows)')
+    return ProvisionResult(added, sorted(existing), duplicates, invalid)
+
+
+def attach(user_service, hash_password=None):
+    # register_user() adds one row instead of rewriting the users table;
+    # hash_password defaults to bcrypt in the calling thread
+    hash_password = hash_password or (lambda password: _hash(password, BCRYPT_ROUNDS))
+
+    def register_user(username, password):
+        if username in user_service.users or persistence.get_user(username) is not None:
+            return False
+        hashed = hash_password(password)
+        if not persistence.add_users([(username, hashed)]):
+            return False
+        user_service.users[username] = hashed
+        return True
+    user_service.register_user = register_user
+    return user_service
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Create RoadMesh user accounts in bulk.')
+    parser.add_argument('file', help='CSV with username,password columns, or JSON lines')
+    parser.add_argument('--format', choices=sorted(set(FORMATS.values())), default=None,
+                        help='default: from the file extension')
+    parser.add_argument('--rounds', type=int, default=BCRYPT_ROUNDS, help='bcrypt cost factor')
+    parser.add_argument('--processes', type=int, default=None, help='hashing processes (default: CPUs)')
+    parser.add_argument('--dry-run', action='store_true', help='validate and report, write nothing')
+    args = parser.parse_args(argv)
+    result = provision_users(read_users(args.file, args.format), args.rounds, args.processes, dry_run=args.dry_run)
+    for line, reason in result.invalid:
+        print(f'line {line}: {reason}')
+    print(f"{'would add' if args.dry_run else 'added'}: {len(result.added)}")
+    print(f'existing: {len(result.existing)}')
+    print(f'duplicates: {len(result.duplicates)}')
+    print(f'invalid: {len(result.invalid)}')
+    return 1 if result.invalid else 0
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    raise SystemExit(main())
@@ -0,0 +1,182 @@
+import threading
+from collections import namedtuple
+from datetime import datetime
+
+import numpy as np
+
+from roadmesh.storage import to_epoch
+
+# Bounded in-memory voltage history. Recent readings sit in a fixed-size
+# ring of typed arrays. Every reading is also folded into coarser tiers of
+# min/max/mean buckets (by default minutes for a day, hours for a month), so
+# memory stays constant however long the process runs while older data
+# remains plottable.
+#
+# Each ring stores its rows twice over, at i and i + capacity. The newest
+# rows are then always one contiguous slice, and times()/voltages()/tier()
+# return read-only NumPy views with no copying. A view aliases the ring:
+# once the ring wraps, new readings overwrite its oldest rows, so .copy()
+# anything kept across appends.
+#
+# attach(battery) swaps BatteryChargeMonitoring.voltage_data for the
+# history. It still takes and hands out {'timestamp', 'voltage'} dicts, so
+# read_voltage() and health_check() work unchanged.
+
+CAPACITY = 3600                          # raw readings kept
+TIERS = ((60, 24 * 60), (3600, 31 * 24))  # (bucket seconds, buckets kept)
+
+# Closed buckets of one tier; start is the bucket's epoch second
+Tier = namedtuple('Tier', ['start', 'low', 'high', 'mean', 'count'])
+# What series() picked: resolution 0 is raw readings (low == high == mean)
+Series = namedtuple('Series', ['times', 'mean', 'low', 'high', 'resolution'])
+
+
+class _Ring:
+    def __init__(self, capacity, columns):
+        if capacity < 1:
+            raise ValueError('Ring capacity must be at least 1')
+        self.capacity = capacity
+        self.columns = {name: np.zeros(2 * capacity, dtype) for name, dtype in columns}
+        self.head = 0      # next row written
+        self.size = 0
+        self.wrapped = False  # has a row been overwritten yet
+
+    def append(self, *row):
+        head, capacity = self.head, self.capacity
+        for column, value in zip(self.columns.values(), row):
+            column[head] = column[head + capacity] = value
+        self.head = (head + 1) % capacity
+        if self.size < capacity:
+            self.size += 1
+        else:
+            self.wrapped = True
+
+    def view(self, name):
+        end = self.head + self.capacity
+        view = self.columns[name][end - self.size:end]
+        view.flags.writeable = False
+        return view
+
+    def last(self, name):
+        return self.columns[name][self.head + self.capacity - 1] if self.size else None
+
+
+class VoltageHistory:
+    def __init__(self, capacity=CAPACITY, tiers=TIERS):
+        self.tier_seconds = tuple(seconds for seconds, _ in tiers)
+        self.version = 0  # bumped on every reading
+        self._raw = _Ring(capacity, (('time', np.float64), ('voltage', np.float64)))
+        self._tiers = [_Ring(kept, (('start', np.float64), ('low', np.float64), ('high', np.float64),
+                                    ('mean', np.float64), ('count', np.uint32))) for _, kept in tiers]
+        self._open = [None] * len(tiers)  # per tier: [start, low, high, total, count]
+        self._lock = threading.Lock()
+
+    def add(self, timestamp, voltage):
+        # timestamp: datetime or epoch seconds; readings are expected in
+        # time order (a late one joins the tiers' current bucket)
+        ts = to_epoch(timestamp)
+        with self._lock:
+            self._raw.append(ts, voltage)
+            if self._tiers:
+                self._fold(0, ts, voltage, voltage, voltage, 1)
+            self.version += 1
+
+    def _fold(self, level, ts, low, high, total, count):
+        seconds = self.tier_seconds[level]
+        start = ts - ts % seconds
+        bucket = self._open[level]
+        if bucket is not None and start > bucket[0]:
+            self._close(level)
+            bucket = None
+        if bucket is None:
+            self._open[level] = [start, low, high, total, count]
+            return
+        bucket[1] = min(bucket[1], low)
+        bucket[2] = max(bucket[2], high)
+        bucket[3] += total
+        bucket[4] += count
+
+    def _close(self, level):
+        start, low, high, total, count = self._open[level]
+        self._open[level] = None
+        self._tiers[level].append(start, low, high, total / count, count)
+        if level + 1 < len(self._tiers):
+            self._fold(level + 1, start, low, high, total, count)
+
+    # --- Views ---
+    def times(self):
+        return self._raw.view('time')
+
+    def voltages(self):
+        return self._raw.view('voltage')
+
+    def latest(self):
+        # (epoch seconds, voltage) of the newest reading, or None
+        with self._lock:
+            if not self._raw.size:
+                return None
+            return float(self._raw.last('time')), float(self._raw.last('voltage'))
+
+    def tier(self, level):
+        ring = self._tiers[level]
+        return Tier(*(ring.view(name) for name in ring.columns))
+
+    def series(self, since=None, copy=False):
+        # The finest data reaching back to `since` (epoch seconds or
+        # datetime; None: everything still held). Buckets still filling
+        # are left out of the tiers. copy=True returns arrays copied under
+        # the lock, for use after later readings may have been added.
+        if not copy:
+            return self._series(to_epoch(since))
+        with self._lock:
+            times, mean, low, high, resolution = self._series(to_epoch(since))
+            mean = mean.copy()
+            if not resolution:
+                return Series(times.copy(), mean, mean, mean, 0)
+            return Series(times.copy(), mean, low.copy(), high.copy(), resolution)
+
+    def _series(self, since):
+        raw = self._raw
+        if self._covers(raw, 'time', since) or not self._tiers:
+            times, volts = self._since(since, self.times(), self.voltages())
+            return Series(times, volts, volts, volts, 0)
+        for level, ring in enumerate(self._tiers):
+            if self._covers(ring, 'start', since) or level == len(self._tiers) - 1:
+                tier = self.tier(level)
+                return Series(*self._since(since, tier.start, tier.mean, tier.low, tier.high),
+                              self.tier_seconds[level])
+
+    def _covers(self, ring, column, since):
+        if not ring.wrapped:
+            return True
+        return since is not None and ring.view(column)[0] <= since
+
+    def _since(self, since, times, *columns):
+        if since is None:
+            return (times,) + columns
+        i = int(np.searchsorted(times, since))
+        return (times[i:],) + tuple(column[i:] for column in columns)
+
+    # --- voltage_data compatibility ---
+    def append(self, reading):
+        self.add(reading['timestamp'], reading['voltage'])
+
+    def __len__(self):
+        return self._raw.size
+
+    def __getitem__(self, index):
+        times, volts = self.times(), self.voltages()
+        if isinstance(index, slice):
+            return [{'timestamp': datetime.fromtimestamp(t), 'voltage': float(v)}
+                    for t, v in zip(times[index].tolist(), volts[index].tolist())]
+        return {'timestamp': datetime.fromtimestamp(float(times[index])), 'voltage': float(volts[index])}
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def attach(self, battery):
+        # Take over battery.voltage_data, keeping the readings it already has
+        for reading in battery.voltage_data:
+            self.append(reading)
+        battery.voltage_data = self
+        return battery
@@ -1,17 +1,39 @@
-from flask import Flask, render_template_string, request, redirect, session, url_for, send_file, jsonify
+from flask import Flask, Response, g, render_template_string, request, redirect, session, url_for, jsonify
 import logging
-import io
-import matplotlib.pyplot as plt
-import networkx as nx
+import numpy as np
 from datetime import datetime
 from roadmesh.monitoring.battery import BatteryChargeMonitoring
 from roadmesh.monitoring.lighting import LightingController
 from roadmesh.networking.mesh_manager import MeshNetworkManager
 from roadmesh.networking.user_service import UserServiceManager
+from roadmesh.networking.auth import ApiKeyStore, LoginBusy, PasswordVerifier, SessionStore
+from roadmesh.networking import user_provisioning
+from roadmesh.networking.telemetry_gateway import SubsystemSink, TelemetryGateway
 from roadmesh.monitoring.health_monitor import HealthMonitor
+from roadmesh.monitoring.alert_dispatcher import AlertDispatcher
+from roadmesh.monitoring.health_scheduler import HealthScheduler
 from roadmesh.monitoring.power_management import PowerManagement
-from roadmesh.persistence import load_battery_history, load_event_log, load_mesh_status_history
-import secrets
+from roadmesh.persistence import (query_events, iter_events, event_counts, get_backend, data_version,
+                                  ANALYTICS_CHECKPOINT_FILE, API_KEYS_FILE, SESSION_JOURNAL_FILE)
+from roadmesh.render_cache import RenderCache, new_figure, figure_png, make_etag
+from roadmesh.networking.mesh_layout import MeshLayout
+from roadmesh.networking.mesh_routing import MeshRouter, METRICS as ROUTE_METRICS
+from roadmesh.networking.mesh_connectivity import ConnectivityTracker
+from roadmesh.dashboard_state import StateTracker, event_stream
+from roadmesh.shared_state import AlertRing, StateOwner, StateUnavailable, share
+from roadmesh.aggregates import AnalyticsAggregator, WINDOWS
+from roadmesh.monitoring import battery_analytics
+from roadmesh.monitoring.battery_analytics import load_series
+from roadmesh.monitoring.lighting_zones import LightingGrid, Command
+from roadmesh.monitoring.voltage_history import VoltageHistory
+from roadmesh.metrics import REGISTRY, CONTENT_TYPE, Family, SamplingProfiler, counter, histogram
+import json
+import math
+import os
+import random
+import threading
+import time
+import zlib
 
 app = Flask(__name__)
 app.secret_key = 'supersecretkey'  # Change for production
@@ -19,13 +41,49 @@ logger = logging.getLogger(__name__)
 
 # Initialize subsystems (in production, pass real objects)
 battery = BatteryChargeMonitoring(5.0, 0.2)
+# Recent voltage readings in a fixed-size ring, older ones as min/max/mean
+# buckets, so a long-running dashboard holds a bounded history
+voltage_history = VoltageHistory()
+voltage_history.attach(battery)
 lighting = LightingController(battery)
+# Per-light state by zone; named zones map to ranges of light indices
+LIGHTING_ZONES = {}
+lighting_grid = LightingGrid(len(lighting.get_light_statuses()), LIGHTING_ZONES)
+lighting_grid.attach(lighting)
 mesh = MeshNetworkManager()
 user_service = UserServiceManager()
+# Sessions in memory with a TTL, backed by an append-only journal; password
+# checks on a bounded bcrypt pool
+session_store = SessionStore(SESSION_JOURNAL_FILE)
+session_store.attach(user_service)
+password_verifier = PasswordVerifier()
+password_verifier.attach(user_service)
+# New accounts are added as single rows, hashed on the same pool
+user_provisioning.attach(user_service, password_verifier.hash)
 power_mgmt = PowerManagement(battery, lighting, mesh)
-health_monitor = HealthMonitor(battery, lighting, mesh, user_service)
+# Components of the live mesh, updated on every node/link change
+mesh_connectivity = ConnectivityTracker()
+mesh_connectivity_lock = threading.Lock()
+mesh_connectivity.attach(mesh, mesh_connectivity_lock)
+# Alert emails go out from a background queue, batched and rate-limited
+alert_dispatcher = AlertDispatcher()
+health_monitor = HealthMonitor(battery, lighting, mesh, user_service, mesh_connectivity, alert_dispatcher)
+# Subsystem health checks run on their own schedule in a small thread pool;
+# pages and alerts read the latest results, so a slow check stalls neither
+HEALTH_CHECK_INTERVAL = 30
+HEALTH_CHECK_TIMEOUT = 5
+health_scheduler = health_monitor.schedule(HealthScheduler(), HEALTH_CHECK_INTERVAL, HEALTH_CHECK_TIMEOUT)
+analytics_aggregator = AnalyticsAggregator(ANALYTICS_CHECKPOINT_FILE)
+# Pole telemetry (binary frames or NDJSON over TCP, UDP and HTTP) coalesced
+# per node into the battery, the mesh and the database; started with the app
+TELEMETRY_PORTS = {'tcp_port': 7700, 'udp_port': 7701, 'http_port': 7702}
+# Loopback only unless a token is set; poles then send it with every batch
+TELEMETRY_HOST = os.environ.get('ROADMESH_TELEMETRY_HOST', '127.0.0.1')
+TELEMETRY_TOKEN = os.environ.get('ROADMESH_TELEMETRY_TOKEN')
+TELEMETRY_BATTERY_NODE = 'controller'  # node id this controller's battery reports as
+telemetry_gateway = TelemetryGateway(SubsystemSink({TELEMETRY_BATTERY_NODE: battery}, mesh), token=TELEMETRY_TOKEN)
 
-RECENT_ALERTS = []
+RECENT_ALERTS = AlertRing()  # the newest alerts only
 
 # Helper for health status color
 HEALTH_COLOR = {True: 'green', False: 'red'}
@@ -34,25 +92,316 @@ MODE_COLOR = {'on': 'green', 'dim': 'orange', 'off': 'gray', 'emergency': 'red',
 LIGHT_COLOR = {'ON': 'yellow', 'DIM': 'orange', 'OFF': 'gray', 'EMERGENCY': 'red'}
 
 API_KEY = 'changemeapikey'  # Set a secure key for production
+# Hashed, scoped API keys. API_KEY becomes the 'default' key, with every
+# scope, the first time the store is created.
+API_SCOPES = ('read', 'write', 'metrics', 'admin')
+api_keys = ApiKeyStore(API_KEYS_FILE)
+if not len(api_keys):
+    api_keys.create('default', ['*'], key=API_KEY)
+
+# Rendered chart PNGs kept in memory, and the sizes a client may ask for
+RENDER_CACHE_SIZE = 64
+MIN_CHART_PX = 50
+MAX_CHART_PX = 2000
+render_cache = RenderCache(RENDER_CACHE_SIZE)
+mesh_layout = MeshLayout()
+mesh_layout_lock = threading.Lock()
+mesh_router = MeshRouter()
+mesh_router_lock = threading.Lock()
+MAX_ROUTE_ALTERNATIVES = 8
+
+# Samples used for the analytics page forecast when no window is selected
+FORECAST_SAMPLES = 24 * 7
+
+# Events per page on /api/events and the analytics page
+EVENT_PAGE_SIZE = 100
+MAX_EVENT_PAGE_SIZE = 1000
+
+# Live state for /api/state and /api/state/stream
+RECENT_ALERTS_SHOWN = 20
+
+def collect_health():
+    # Cached results from health_scheduler; nothing is checked inline
+    return health_scheduler.status()
+
+def mesh_connectivity_summary():
+    with mesh_connectivity_lock:
+        return mesh_connectivity.summary()
+
+state_tracker = StateTracker()
+state_tracker.register('battery', lambda: {'pct': battery.calculate_percentage()})
+state_tracker.register('lighting', lambda: {'state': lighting.state, 'mode': power_mgmt.lighting_mode})
+state_tracker.register('mesh', lambda: {'mode': power_mgmt.mode})
+state_tracker.register('topology', lambda: mesh.get_topology(), keyed=True)
+state_tracker.register('nodes', lambda: mesh.get_node_statuses(), keyed=True)
+state_tracker.register('lights', lambda: dict(lighting_grid.statuses()), keyed=True)
+state_tracker.register('health', collect_health)
+state_tracker.register('connectivity', mesh_connectivity_summary)
+state_tracker.register('sessions', lambda: {'active': len(user_service.sessions)})
+state_tracker.register('alerts', lambda: RECENT_ALERTS[-RECENT_ALERTS_SHOWN:])
+
+# With several worker processes, set ROADMESH_STATE_ADDRESS (a Unix socket
+# path, or a loopback host:port) and ROADMESH_STATE_AUTHKEY (a random
+# secret). The first worker to bind it owns the subsystems; the others
+# read versioned snapshots from it, query it for charts, routes and
+# health, and send it their lighting commands and alerts. Unset, this
+# process serves everything itself.
+STATE_ADDRESS = os.environ.get('ROADMESH_STATE_ADDRESS')
+STATE_AUTHKEY = os.environ.get('ROADMESH_STATE_AUTHKEY', '').encode()
+if STATE_ADDRESS and not STATE_AUTHKEY:
+    raise RuntimeError('ROADMESH_STATE_ADDRESS needs ROADMESH_STATE_AUTHKEY, a random secret shared by the workers')
+state_owner = StateOwner(state_tracker, RECENT_ALERTS)
+
+def set_lighting_mode(action, user):
+    if action == 'ON':
+        lighting.turn_on()
+        power_mgmt.lighting_mode = 'on'
+    elif action == 'OFF':
+        lighting.turn_off()
+        power_mgmt.lighting_mode = 'off'
+    elif action == 'DIM':
+        lighting.dim()
+        power_mgmt.lighting_mode = 'dim'
+    state_owner.alert(f"Lighting set to {action} by {user}")
+
+def apply_lighting_commands(commands):
+    # Later commands win where they overlap
+    changes = lighting_grid.apply(commands)
+    return {'version': changes.version, 'changed': len(changes.indices)}
+
+def describe_lights(since=None):
+    # Every light, or only those changed after version `since`
+    changed = None if since is None else lighting_grid.changes_since(since)
+    full = changed is None
+    if full:
+        changed = range(len(lighting_grid))
+    return {'version': lighting_grid.version, 'full': full, 'lights': lighting_grid.describe(changed),
+            'counts': lighting_grid.counts()}
+
+state_owner.register('lighting_mode', set_lighting_mode, ['lighting', 'lights'])
+state_owner.register('lighting_commands', apply_lighting_commands, ['lights'])
+state_owner.register('describe_lights', describe_lights)
+
+# Reads of the subsystems themselves. Every worker, the owner included,
+# goes through shared_state.query(), so all of them read the same ones.
+def voltage_series():
+    return voltage_history.version, voltage_history.series(copy=True)
+
+def light_statuses():
+    return lighting_grid.version, lighting.get_light_statuses()
+
+def health_report():
+    health_scheduler.start()
+    return health_scheduler.report()
+
+def mesh_paths(src, dst, metric, k):
+    # None when either node is unknown
+    with mesh_router_lock:
+        mesh_router.sync(mesh)
+        if src not in mesh.nodes or dst not in mesh.nodes:
+            return None
+        return mesh_router.k_shortest_paths(src, dst, k, metric)
+
+def mesh_routes(dst, metric):
+    # Next hop and cost from every node that can reach dst; None when dst is unknown
+    with mesh_router_lock:
+        mesh_router.sync(mesh)
+        if dst not in mesh.nodes:
+            return None
+        tree = mesh_router.tree(dst, metric)
+        return {node: {'next_hop': tree.parent[node], 'cost': tree.dist[node]} for node in tree.parent}
+
+def connectivity_report(roots):
+    with mesh_connectivity_lock:
+        result = {
+            'partitions': [sorted(part, key=str) for part in mesh_connectivity.partitions()],
+            'down': sorted(mesh_connectivity.down_nodes(), key=str),
+            'critical_nodes': sorted(mesh_connectivity.critical_nodes(), key=str),
+            'bridges': sorted((sorted(link, key=str) for link in mesh_connectivity.bridges()), key=str),
+        }
+        if roots:
+            result['cut_off'] = sorted(mesh_connectivity.cut_off(roots), key=str)
+    return result
+
+state_owner.register_query('voltage_series', voltage_series)
+state_owner.register_query('light_statuses', light_statuses)
+state_owner.register_query('health_report', health_report)
+state_owner.register_query('mesh_paths', mesh_paths)
+state_owner.register_query('mesh_routes', mesh_routes)
+state_owner.register_query('connectivity', connectivity_report)
+shared_state = share(state_owner, STATE_ADDRESS, STATE_AUTHKEY)
+if STATE_ADDRESS and shared_state is state_owner:
+    telemetry_gateway.start_in_thread(host=TELEMETRY_HOST, **TELEMETRY_PORTS)
+
+# Metrics for /metrics. Requests are timed per endpoint; subsystem gauges
+# and health check timings are read from the owner when scraped.
+REQUEST_SECONDS = histogram('roadmesh_http_request_seconds', 'Request handling time', ['endpoint', 'method'])
+REQUESTS = counter('roadmesh_http_requests_total', 'Requests served', ['endpoint', 'method', 'status'])
+AUTH_SECONDS = histogram('roadmesh_auth_verify_seconds', 'Password verification time at login', ['result'])
+
+def subsystem_metrics():
+    partitions = mesh_connectivity_summary()['partitions']
+    families = [
+        Family('roadmesh_battery_percent', 'gauge', 'Battery charge',
+               [('roadmesh_battery_percent', {}, battery.calculate_percentage())]),
+        Family('roadmesh_lights', 'gauge', 'Lights by state',
+               [('roadmesh_lights', {'state': state}, n) for state, n in lighting_grid.counts().items()]),
+        Family('roadmesh_mesh_partitions', 'gauge', 'Connected mesh segments',
+               [('roadmesh_mesh_partitions', {}, partitions)]),
+        Family('roadmesh_alert_dispatcher_total', 'counter', 'Alert dispatcher activity',
+               [('roadmesh_alert_dispatcher_total', {'event': k}, v) for k, v in sorted(alert_dispatcher.stats.items())]),
+    ]
+    return families + health_scheduler.collect() + telemetry_gateway.collect()
+
+def dashboard_metrics():
+    # This worker's view of the sessions, and its own password checks
+    return [
+        Family('roadmesh_sessions', 'gauge', 'Live login sessions', [('roadmesh_sessions', {}, len(session_store))]),
+        Family('roadmesh_password_checks_total', 'counter', 'Password checks by outcome',
+               [('roadmesh_password_checks_total', {'event': k}, v) for k, v in sorted(password_verifier.stats.items())]),
+    ]
+
+state_owner.register_query('metrics', subsystem_metrics)
+REGISTRY.add_collector(dashboard_metrics)
+REGISTRY.add_collector(lambda: shared_state.query('metrics'))
+
+# Sampling profiler, off by default. POST /api/profiler sets the share of
+# requests profiled; ?profile=1 with the API key profiles a single request.
+profiler = SamplingProfiler()
+PROFILE_SAMPLE_RATE = 0.0
+
+@app.before_request
+def start_request():
+    g.request_started = time.perf_counter()
+    g.profile = None
+    sampled = PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE
+    if sampled or (request.args.get('profile') == '1' and require_api_key('admin') is None):
+        g.profile_block = profiler.profile(f'{request.method} {request.path}')
+        g.profile = g.profile_block.__enter__()
+
+@app.after_request
+def record_request(response):
+    endpoint = request.endpoint or 'unmatched'
+    if 'request_started' in g:
+        REQUEST_SECONDS.labels(endpoint, request.method).observe(time.perf_counter() - g.request_started)
+    REQUESTS.labels(endpoint, request.method, response.status_code).inc()
+    if g.get('profile') is not None:
+        response.headers['X-Profile-Id'] = str(g.profile.id)
+    return response
+
+@app.errorhandler(StateUnavailable)
+def state_unavailable(e):
+    logger.error(str(e))
+    return 'Dashboard state is unavailable, try again shortly', 503, {'Retry-After': '5'}
+
+@app.teardown_request
+def finish_profile(exc):
+    block = g.pop('profile_block', None)
+    if block is not None:
+        block.__exit__(None, None, None)
+
+def chart_size(default):
+    # Figure size in inches; ?w=&h= override it in pixels (100 dpi)
+    w, h = request.args.get('w', type=int), request.args.get('h', type=int)
+    if w is not None and h is not None:
+        return tuple(min(max(px, MIN_CHART_PX), MAX_CHART_PX) / 100 for px in (w, h))
+    return default
+
+def png_response(name, version, size, render):
+    # Answer from the render cache; a matching If-None-Match gets a 304
+    # without touching matplotlib at all
+    etag = render_cache.etag(name, version, size)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    chart = render_cache.get(name, version, size, render)
+    response = Response(chart.png, mimetype='image/png')
+    response.set_etag(chart.etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def require_api_key(scope=None):
+    # GET needs the 'read' scope and other methods 'write', unless the
+    # route asks for a specific one
+    key = request.headers.get('X-API-Key') or request.args.get('api_key', '')
+    scope = scope or ('read' if request.method in ('GET', 'HEAD') else 'write')
+    record = api_keys.check(key, scope)
+    if record is None:
+        if api_keys.check(key) is not None:
+            return jsonify({'error': f'API key lacks the {scope} scope'}), 403
+        return jsonify({'error': 'invalid API key'}), 401
+    return None
+
+def time_arg(name):
+    # Epoch seconds or an ISO timestamp
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value)
+
+def event_filters():
+    return {
+        'since': time_arg('since'),
+        'until': time_arg('until'),
+        'contains': request.args.get('q') or None,
+        'kind': request.args.get('type') or None,
+        'subsystem': request.args.get('subsystem') or None,
+        'node_id': request.args.get('node') or None,
+        'descending': request.args.get('order') == 'desc',
+    }
+
+# Fields of an event as served by the API; `seq` is the store's monotonic id
+EVENT_FIELDS = ('seq', 'timestamp', 'type', 'subsystem', 'node_id', 'old', 'new', 'value', 'event')
+
+def public_event(row):
+    return {field: row['id' if field == 'seq' else field] for field in EVENT_FIELDS}
+
+def ndjson_stream(rows, compress=False):
+    # Serialized row by row and sent in ~64 KB chunks
+    z = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None  # wbits=31: gzip framing
+    chunk = []
+    size = 0
+    for row in rows:
+        line = json.dumps(public_event(row), separators=(',', ':')) + '\n'
+        chunk.append(line)
+        size += len(line)
+        if size >= 65536:
+            data = ''.join(chunk).encode()
+            yield z.compress(data) if z else data
+            chunk, size = [], 0
+    data = ''.join(chunk).encode()
+    if z:
+        yield z.compress(data) + z.flush()
+    elif data:
+        yield data
+
+def format_forecast(fc):
+    if fc['direction'] not in ('depleting', 'charging'):
+        return 'Steady' if fc['direction'] == 'steady' else 'N/A'
+    label = 'Deplete in' if fc['direction'] == 'depleting' else 'Full in'
+    low, high = fc['band']
+    band = f"{low:.1f}-{high:.1f}" if high is not None else f">{low:.1f}"
+    return f"{label} {fc['hours']:.1f} hours ({band} at 95%)"
 
 @app.route('/')
 def index():
     if 'user' not in session:
         return redirect(url_for('login'))
-    pct = battery.calculate_percentage()
-    lighting_state = lighting.state
-    mesh_topology = mesh.get_topology()
-    sessions = user_service.sessions
-    health = {
-        'battery': battery.health_check(),
-        'lighting': lighting.health_check(),
-        'mesh': mesh.health_check(),
-        'user': user_service.health_check()
-    }
-    lighting_mode = power_mgmt.lighting_mode
-    mesh_mode = power_mgmt.mode
-    mesh_statuses = mesh.get_node_statuses()
-    light_statuses = lighting.get_light_statuses()
+    # Everything from one versioned snapshot, whichever worker serves it
+    shared_state.refresh()
+    state = shared_state.snapshot()['state']
+    pct = state['battery']['pct']
+    lighting_state, lighting_mode = state['lighting']['state'], state['lighting']['mode']
+    mesh_topology = state['topology']
+    sessions = state['sessions']['active']
+    health = state['health']
+    mesh_mode = state['mesh']['mode']
+    mesh_statuses = state['nodes']
+    light_statuses = state['lights'].items()
     return render_template_string('''
     <h1>RoadMesh Dashboard</h1>
     <a href="{{ url_for('analytics') }}">Analytics & Event Log</a><br>
@@ -104,90 +453,72 @@ def index():
     </form>
     {% endif %}
     ''', pct=pct, lighting_state=lighting_state, lighting_mode=lighting_mode, mesh_mode=mesh_mode,
-         mesh_topology=mesh.get_topology(), mesh_statuses=mesh_statuses, light_statuses=light_statuses,
-         mesh_graph=mesh_topology_graph(), sessions=sessions,
-         health=health, health_color=HEALTH_COLOR, mode_color=MODE_COLOR, recent_alerts=RECENT_ALERTS)
+         mesh_topology=mesh_topology, mesh_statuses=mesh_statuses, light_statuses=light_statuses,
+         mesh_graph=mesh_topology_graph(mesh_topology), sessions=sessions,
+         health=health, health_color=HEALTH_COLOR, mode_color=MODE_COLOR, recent_alerts=state['alerts'])
 
 @app.route('/lighting', methods=['POST'])
 def lighting_control():
     if 'user' not in session:
         return redirect(url_for('login'))
-    action = request.form['action']
-    if action == 'ON':
-        lighting.turn_on()
-        power_mgmt.lighting_mode = 'on'
-    elif action == 'OFF':
-        lighting.turn_off()
-        power_mgmt.lighting_mode = 'off'
-    elif action == 'DIM':
-        lighting.dim()
-        power_mgmt.lighting_mode = 'dim'
-    RECENT_ALERTS.append(f"Lighting set to {action} by {session['user']}")
+    shared_state.command('lighting_mode', request.form['action'], session['user'])
     return redirect(url_for('index'))
 
 @app.route('/battery_plot')
 def battery_plot():
-    # Plot battery voltage history
-    plt.figure(figsize=(4,2))
-    times = [d['timestamp'] for d in battery.voltage_data]
-    volts = [d['voltage'] for d in battery.voltage_data]
-    plt.plot(times, volts, label='Voltage')
-    plt.xlabel('Time')
-    plt.ylabel('Voltage (V)')
-    plt.legend()
-    plt.tight_layout()
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    plt.close()
-    buf.seek(0)
-    return send_file(buf, mimetype='image/png')
+    # Plot battery voltage history: raw readings while the ring holds them
+    # all, then the finest downsampled tier with its min/max band
+    # render() may run later, on the cache's pool, while readings arrive
+    version, series = shared_state.query('voltage_series')
+    def render(size):
+        offset = datetime.now().astimezone().utcoffset().total_seconds()
+        times = ((series.times + offset) * 1e6).astype('datetime64[us]')  # local wall time
+        fig = new_figure(size)
+        ax = fig.add_subplot()
+        if series.resolution:
+            ax.fill_between(times, series.low, series.high, alpha=0.3, label='Min/max')
+        ax.plot(times, series.mean, label='Voltage')
+        ax.set_xlabel('Time')
+        ax.set_ylabel('Voltage (V)')
+        ax.legend()
+        fig.tight_layout()
+        return figure_png(fig)
+    return png_response('battery_plot', version, chart_size((4, 2)), render)
 
 @app.route('/mesh_graph')
 def mesh_graph():
-    # Draw mesh topology as a graph
-    G = nx.Graph()
-    topo = mesh.get_topology()
-    for node, neighbors in topo.items():
-        for n in neighbors:
-            G.add_edge(node, n)
-    node_statuses = mesh.get_node_statuses()
-    color_map = []
-    for node in G.nodes():
-        status, power_mode, _ = node_statuses.get(node, ('DOWN', 'off', 0))
-        if status == 'UP' and power_mode == 'normal':
-            color_map.append('green')
-        elif status == 'UP' and power_mode == 'reduced':
-            color_map.append('orange')
-        elif status == 'UP' and power_mode == 'critical':
-            color_map.append('red')
-        else:
-            color_map.append('gray')
-    plt.figure(figsize=(4,2))
-    nx.draw(G, with_labels=True, node_color=color_map, node_size=500)
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    plt.close()
-    buf.seek(0)
-    return send_file(buf, mimetype='image/png')
+    # Draw mesh topology on the persistent layout; only changed links move
+    shared_state.refresh()
+    state = shared_state.snapshot()['state']
+    topo, node_statuses = state['topology'], state['nodes']
+    with mesh_layout_lock:
+        mesh_layout.sync(topo)
+        version = make_etag((mesh_layout.version, node_statuses))
+    def render(size):
+        fig = new_figure(size)
+        with mesh_layout_lock:
+            mesh_layout.draw(fig.add_subplot(), node_statuses)
+        return figure_png(fig)
+    return png_response('mesh_graph', version, chart_size((4, 2)), render)
 
 @app.route('/lighting_map')
 def lighting_map():
     # Draw lighting as a row of colored circles
-    statuses = lighting.get_light_statuses()
-    plt.figure(figsize=(6,1))
-    for i, (_, state) in enumerate(statuses):
-        plt.scatter(i, 0, s=800, c=LIGHT_COLOR.get(state, 'gray'), edgecolors='black')
-    plt.axis('off')
-    plt.xlim(-1, len(statuses))
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png', bbox_inches='tight', pad_inches=0.1)
-    plt.close()
-    buf.seek(0)
-    return send_file(buf, mimetype='image/png')
-
-def mesh_topology_graph():
+    version, statuses = shared_state.query('light_statuses')
+    def render(size):
+        fig = new_figure(size)
+        ax = fig.add_subplot()
+        ax.scatter(range(len(statuses)), [0] * len(statuses), s=800,
+                   c=[LIGHT_COLOR.get(state, 'gray') for _, state in statuses], edgecolors='black')
+        ax.axis('off')
+        ax.set_xlim(-1, len(statuses))
+        return figure_png(fig, bbox_inches='tight', pad_inches=0.1)
+    return png_response('lighting_map', version, chart_size((6, 1)), render)
+
+def mesh_topology_graph(topo=None):
     # Simple text graph
-    topo = mesh.get_topology()
+    if topo is None:
+        topo = mesh.get_topology()
     lines = []
     for node, neighbors in topo.items():
         lines.append(f"{node}: {', '.join(neighbors)}")
@@ -198,7 +529,13 @@ def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
-        if user_service.authenticate(username, password):
+        started = time.perf_counter()
+        try:
+            ok = user_service.authenticate(username, password)
+        except LoginBusy:
+            return 'Too many logins in progress, try again shortly', 503, {'Retry-After': '1'}
+        AUTH_SECONDS.labels('ok' if ok else 'failed').observe(time.perf_counter() - started)
+        if ok:
             session['user'] = username
             user_service.create_session(username)
             return redirect(url_for('index'))
@@ -224,58 +561,51 @@ def register():
         return 'Unauthorized', 403
     username = request.form['username']
     password = request.form['password']
-    if user_service.register_user(username, password):
-        RECENT_ALERTS.append(f"User {username} registered by admin.")
+    try:
+        registered = user_service.register_user(username, password)
+    except LoginBusy:
+        return 'Too many password operations in progress, try again shortly', 503, {'Retry-After': '1'}
+    if registered:
+        shared_state.alert(f"User {username} registered by admin.")
         return redirect(url_for('index'))
     else:
         return 'Registration failed', 400
 
 @app.route('/analytics')
 def analytics():
-    # Battery trend
-    battery_history = load_battery_history()
-    times = [row['timestamp'] for row in battery_history]
-    volts = [float(row['voltage']) for row in battery_history if row['voltage']]
-    charge = [float(row['charge_pct']) for row in battery_history if row['charge_pct']]
-    # Mesh uptime analytics
-    mesh_status_history = load_mesh_status_history()
-    total_steps = len(mesh_status_history)
-    all_up_steps = 0
-    node_up_counts = {}
-    for record in mesh_status_history:
-        statuses = record['node_statuses']
-        up_nodes = [n for n, (status, _, _) in statuses.items() if status == 'UP']
-        if len(up_nodes) == len(statuses):
-            all_up_steps += 1
-        for n in statuses:
-            if n not in node_up_counts:
-                node_up_counts[n] = 0
-            if statuses[n][0] == 'UP':
-                node_up_counts[n] += 1
-    mesh_uptime = f"{(all_up_steps/total_steps*100):.1f}%" if total_steps else 'N/A'
-    mesh_reliability = f"{(sum(node_up_counts.values())/(total_steps*len(node_up_counts))*100):.1f}%" if total_steps and node_up_counts else 'N/A'
-    # Lighting ON hours (count ON in history)
-    lighting_on_hours = sum(1 for v in charge if v > 50)
-    # Forecast battery depletion/recharge (simple linear extrapolation)
-    forecast = 'N/A'
-    if len(charge) > 2:
-        delta = charge[-1] - charge[0]
-        hours = len(charge)
-        if delta < 0:
-            # Depleting
-            rate = abs(delta) / hours
-            if rate > 0:
-                forecast = f"Deplete in {(charge[-1]/rate):.1f} hours"
-        elif delta > 0:
-            # Charging
-            rate = delta / hours
-            if rate > 0:
-                forecast = f"Full in {((100-charge[-1])/rate):.1f} hours"
-    # Event log
-    event_log = load_event_log()
+    # Counters are maintained incrementally by the aggregator; a page view
+    # only folds in records appended since the previous one
+    window = request.args.get('window')
+    if window not in WINDOWS:
+        window = None
+    analytics_aggregator.refresh(get_backend())
+    stats = analytics_aggregator.summary(window)
+    mesh_uptime = f"{stats['mesh_uptime']*100:.1f}%" if stats['mesh_uptime'] is not None else 'N/A'
+    mesh_reliability = f"{stats['mesh_reliability']*100:.1f}%" if stats['mesh_reliability'] is not None else 'N/A'
+    # Lighting ON hours (samples with charge above 50%)
+    lighting_on_hours = stats['lighting_on_hours']
+    # Least-squares depletion/recharge forecast over the recent trend
+    if window:
+        series = load_series(get_backend(), since=time.time() - WINDOWS[window])
+    else:
+        series = load_series(get_backend(), limit=FORECAST_SAMPLES)
+    forecast = format_forecast(battery_analytics.forecast(series))
+    transitions = event_counts(since=time.time() - WINDOWS[window] if window else None)
+    # Event log, newest first, one page at a time
+    try:
+        event_log, older = query_events(since=time.time() - WINDOWS[window] if window else None,
+                                        cursor=request.args.get('events'), limit=EVENT_PAGE_SIZE,
+                                        descending=True)
+    except ValueError:
+        return 'Invalid events cursor', 400
     return render_template_string('''
     <h1>Analytics & Event Log</h1>
     <a href="{{ url_for('index') }}">Back to Dashboard</a><br>
+    <p>Window:
+      <a href="{{ url_for('analytics') }}">All</a>
+      {% for w in windows %}<a href="{{ url_for('analytics', window=w) }}">{{ w }}</a> {% endfor %}
+      {% if window %}(showing last {{ window }}){% endif %}
+    </p>
     <h2>Battery Trend</h2>
     <img src="{{ url_for('battery_trend_plot') }}" alt="Battery Trend" height="200"><br>
     <h2>Mesh Uptime</h2>
@@ -286,44 +616,286 @@ def analytics():
     <p>{{ lighting_on_hours }}</p>
     <h2>Battery Forecast</h2>
     <p>{{ forecast }}</p>
+    <h2>Mode Transitions</h2>
+    <p>Mesh: {{ transitions.get('mesh_mode', 0) }}, Lighting: {{ transitions.get('lighting_mode', 0) }}</p>
     <h2>Event Log</h2>
     <table border="1"><tr><th>Timestamp</th><th>Event</th></tr>
     {% for row in event_log %}
       <tr><td>{{ row['timestamp'] }}</td><td>{{ row['event'] }}</td></tr>
     {% endfor %}
     </table>
-    ''', mesh_uptime=mesh_uptime, mesh_reliability=mesh_reliability, lighting_on_hours=lighting_on_hours, forecast=forecast, event_log=event_log)
+    {% if older %}<a href="{{ url_for('analytics', window=window, events=older) }}">Older events</a>{% endif %}
+    ''', mesh_uptime=mesh_uptime, mesh_reliability=mesh_reliability, lighting_on_hours=lighting_on_hours, forecast=forecast, event_log=event_log,
+       window=window, windows=WINDOWS, older=older, transitions=transitions)
 
 @app.route('/battery_trend_plot')
 def battery_trend_plot():
-    battery_history = load_battery_history()
-    times = [datetime.fromisoformat(row['timestamp']) for row in battery_history if row['timestamp']]
-    charge = [float(row['charge_pct']) for row in battery_history if row['charge_pct']]
-    plt.figure(figsize=(4,2))
-    plt.plot(times, charge, label='Charge %')
-    plt.xlabel('Time')
-    plt.ylabel('Charge (%)')
-    plt.legend()
-    plt.tight_layout()
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    plt.close()
-    buf.seek(0)
-    return send_file(buf, mimetype='image/png')
+    def render(size):
+        series = load_series(get_backend())
+        ok = ~np.isnan(series.charge_pct)
+        times = [datetime.fromtimestamp(ts) for ts in series.timestamps[ok].tolist()]
+        fig = new_figure(size)
+        ax = fig.add_subplot()
+        ax.plot(times, series.charge_pct[ok], label='Charge %')
+        ax.set_xlabel('Time')
+        ax.set_ylabel('Charge (%)')
+        ax.legend()
+        fig.tight_layout()
+        return figure_png(fig)
+    return png_response('battery_trend_plot', data_version('battery_history'), chart_size((4, 2)), render)
+
+@app.route('/api/battery/analytics', methods=['GET'])
+def api_battery_analytics():
+    auth = require_api_key()
+    if auth: return auth
+    # ?since=&until= (epoch or ISO), ?resample= seconds, ?confidence= in (0, 1)
+    try:
+        series = load_series(get_backend(), since=time_arg('since'), until=time_arg('until'),
+                             limit=request.args.get('limit', type=int))
+        return jsonify(battery_analytics.report(
+            series,
+            resample_seconds=request.args.get('resample', battery_analytics.HOUR, type=float),
+            confidence=request.args.get('confidence', 0.95, type=float)))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
 @app.route('/api/events', methods=['GET'])
 def api_events():
     auth = require_api_key()
     if auth: return auth
-    return jsonify(load_event_log())
+    # ?since=&until= (epoch or ISO), ?q= substring, ?type=, ?order=desc,
+    # ?cursor=&limit= for pages, or ?format=ndjson to stream every match
+    try:
+        filters = event_filters()
+        if request.args.get('format') == 'ndjson':
+            compress = 'gzip' in request.headers.get('Accept-Encoding', '')
+            response = Response(ndjson_stream(iter_events(**filters), compress),
+                                mimetype='application/x-ndjson')
+            if compress:
+                response.headers['Content-Encoding'] = 'gzip'
+            response.headers['Vary'] = 'Accept-Encoding'
+            return response
+        limit = min(request.args.get('limit', EVENT_PAGE_SIZE, type=int), MAX_EVENT_PAGE_SIZE)
+        rows, next_cursor = query_events(cursor=request.args.get('cursor'), limit=limit, **filters)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if request.args.get('format') == 'compact':
+        # Rows as arrays in EVENT_FIELDS order, without repeating the keys
+        return jsonify({'fields': EVENT_FIELDS, 'next_cursor': next_cursor,
+                        'events': [[row['id' if f == 'seq' else f] for f in EVENT_FIELDS] for row in rows]})
+    return jsonify({'events': [public_event(row) for row in rows], 'next_cursor': next_cursor})
+
+@app.route('/api/events/counts', methods=['GET'])
+def api_event_counts():
+    auth = require_api_key()
+    if auth: return auth
+    # ?by=type|subsystem|node_id plus the /api/events filters
+    try:
+        filters = event_filters()
+        del filters['contains'], filters['descending']
+        return jsonify(event_counts(request.args.get('by', 'type'), **filters))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/state', methods=['GET'])
+def api_state():
+    auth = require_api_key()
+    if auth: return auth
+    shared_state.refresh()
+    snapshot = shared_state.snapshot()
+    etag = str(snapshot['version'])
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(snapshot)
+    response.set_etag(etag)
+    return response
+
+@app.route('/api/state/diff', methods=['GET'])
+def api_state_diff():
+    auth = require_api_key()
+    if auth: return auth
+    shared_state.refresh()
+    return jsonify(shared_state.diff(request.args.get('since', type=int)))
+
+@app.route('/api/state/stream', methods=['GET'])
+def api_state_stream():
+    auth = require_api_key()
+    if auth: return auth
+    since = request.headers.get('Last-Event-ID', type=int) or request.args.get('since', type=int)
+    return Response(event_stream(shared_state, since), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/health', methods=['GET'])
+def api_health():
+    auth = require_api_key()
+    if auth: return auth
+    # Latest result, run counts and latency histogram per check
+    return jsonify(shared_state.query('health_report'))
+
+@app.route('/api/mesh/path', methods=['GET'])
+def api_mesh_path():
+    auth = require_api_key()
+    if auth: return auth
+    # ?src=&dst=&metric=etx|widest, ?k= for alternative paths
+    src, dst = request.args.get('src'), request.args.get('dst')
+    metric = request.args.get('metric', 'etx')
+    k = min(request.args.get('k', 1, type=int), MAX_ROUTE_ALTERNATIVES)
+    if metric not in ROUTE_METRICS:
+        return jsonify({'error': f'Unknown metric: {metric}'}), 400
+    paths = shared_state.query('mesh_paths', src, dst, metric, k)
+    if paths is None:
+        return jsonify({'error': 'Unknown node'}), 404
+    return jsonify({'src': src, 'dst': dst, 'metric': metric,
+                    'paths': [{'path': path, 'cost': cost if math.isfinite(cost) else None}
+                              for path, cost in paths]})
+
+@app.route('/api/mesh/routes', methods=['GET'])
+def api_mesh_routes():
+    auth = require_api_key()
+    if auth: return auth
+    # Next hop towards ?dst= from every node that can reach it
+    dst, metric = request.args.get('dst'), request.args.get('metric', 'etx')
+    if metric not in ROUTE_METRICS:
+        return jsonify({'error': f'Unknown metric: {metric}'}), 400
+    routes = shared_state.query('mesh_routes', dst, metric)
+    if routes is None:
+        return jsonify({'error': 'Unknown node'}), 404
+    return jsonify({'dst': dst, 'metric': metric, 'routes': routes})
+
+@app.route('/api/mesh/connectivity', methods=['GET'])
+def api_mesh_connectivity():
+    auth = require_api_key()
+    if auth: return auth
+    # Segments largest first, plus what a single failure would cut; ?root=
+    # (repeatable) lists the nodes with no path to any root
+    return jsonify(shared_state.query('connectivity', request.args.getlist('root')))
+
+@app.route('/api/lighting/commands', methods=['POST'])
+def api_lighting_commands():
+    auth = require_api_key()
+    if auth: return auth
+    # {"commands": [{"lights": "120-480" | "zone": "north", "state": "DIM", "level": 40}, ...]}
+    # applied as one batch; later commands win where they overlap
+    try:
+        body = request.get_json(force=True)
+        commands = [Command(c.get('zone') or c.get('lights', 'all'), c['state'], c.get('level'))
+                    for c in body['commands']]
+        return jsonify(shared_state.command('lighting_commands', commands))
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        return jsonify({'error': f'Bad lighting command: {e}'}), 400
+
+@app.route('/api/lighting/lights', methods=['GET'])
+def api_lighting_lights():
+    auth = require_api_key()
+    if auth: return auth
+    # Every light, or ?since=<version> for only the lights changed after it
+    return jsonify(shared_state.command('describe_lights', request.args.get('since', type=int)))
+
+# Largest bulk import accepted over the API. Each password is hashed at
+# the default cost on the login verifier's threads while the request
+# waits, so keep batches small; bigger imports go through the CLI
+# (python -m roadmesh.networking.user_provisioning users.csv).
+MAX_BULK_USERS = 16
+BULK_FORMATS = {'text/csv': 'csv', 'application/x-ndjson': 'jsonl', 'application/jsonl': 'jsonl'}
+
+@app.route('/api/users/bulk', methods=['POST'])
+def api_users_bulk():
+    auth = require_api_key('admin')
+    if auth: return auth
+    # Body: CSV (username,password) or JSON lines, by Content-Type or
+    # ?format=; ?dry_run=1 to only validate
+    fmt = request.args.get('format') or BULK_FORMATS.get(request.mimetype)
+    try:
+        rows = list(user_provisioning.parse_users(request.get_data(as_text=True), fmt))
+        if len(rows) > MAX_BULK_USERS:
+            return jsonify({'error': f'At most {MAX_BULK_USERS} users per request; '
+                                     'use the user_provisioning CLI for larger imports'}), 413
+        result = user_provisioning.provision_users(rows, user_service=user_service,
+                                                   dry_run=request.args.get('dry_run') == '1',
+                                                   hash_all=password_verifier.hash_many)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except LoginBusy:
+        return jsonify({'error': 'Too many password operations in progress, try again shortly'}), 503, \
+            {'Retry-After': '1'}
+    if result.added and request.args.get('dry_run') != '1':
+        shared_state.alert(f'{len(result.added)} users provisioned in bulk.')
+    return jsonify({'added': len(result.added), 'existing': result.existing, 'duplicates': result.duplicates,
+                    'invalid': [{'line': line, 'error': reason} for line, reason in result.invalid]})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    auth = require_api_key('metrics')
+    if auth: return auth
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+@app.route('/api/profiler', methods=['GET', 'POST'])
+def api_profiler():
+    auth = require_api_key('admin')
+    if auth: return auth
+    global PROFILE_SAMPLE_RATE
+    if request.method == 'POST':
+        # {"sample_rate": 0.01, "interval": 0.005}; a rate of 0 turns it off
+        body = request.get_json(silent=True) or {}
+        try:
+            rate = float(body.get('sample_rate', PROFILE_SAMPLE_RATE))
+            interval = float(body.get('interval', profiler.interval))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'sample_rate and interval must be numbers'}), 400
+        if not 0 <= rate <= 1 or interval <= 0:
+            return jsonify({'error': 'sample_rate must be 0-1 and interval positive'}), 400
+        PROFILE_SAMPLE_RATE, profiler.interval = rate, interval
+    # ?id=<X-Profile-Id> returns that request's collapsed stacks
+    profile_id = request.args.get('id', type=int)
+    if profile_id is not None:
+        profile = profiler.get(profile_id)
+        if profile is None:
+            return jsonify({'error': 'unknown profile'}), 404
+        return Response(profile.collapsed() + '\n', mimetype='text/plain')
+    return jsonify({'sample_rate': PROFILE_SAMPLE_RATE, 'interval': profiler.interval,
+                    'profiles': [p.summary() for p in reversed(profiler.recent)]})
 
 @app.route('/rotate_api_key', methods=['POST'])
 def rotate_api_key():
     if 'user' not in session or session['user'] != 'admin':
         return 'Unauthorized', 403
+    # form key_id= picks the key, default the 'default' key; the old key
+    # keeps working for a short grace period
     global API_KEY
-    API_KEY = secrets.token_hex(16)
-    return f'API key rotated. New key: {API_KEY}'
+    key_id = request.form.get('key_id') or getattr(api_keys.find('default'), 'key_id', None)
+    try:
+        record, key = api_keys.rotate(key_id)
+    except KeyError:
+        return 'Unknown API key', 404
+    if record.name == 'default':
+        API_KEY = key
+    return f'API key {record.name} rotated. New key: {key}'
+
+@app.route('/api_keys', methods=['GET', 'POST'])
+def manage_api_keys():
+    if 'user' not in session or session['user'] != 'admin':
+        return 'Unauthorized', 403
+    if request.method == 'POST':
+        # name=, scopes=read,write; the key is shown only in this response
+        scopes = [s.strip() for s in request.form.get('scopes', 'read').split(',') if s.strip()]
+        if not scopes or any(s not in API_SCOPES and s != '*' for s in scopes):
+            return jsonify({'error': f'scopes must be from {API_SCOPES}'}), 400
+        record, key = api_keys.create(request.form.get('name') or 'unnamed', scopes)
+        return jsonify({'id': record.key_id, 'name': record.name, 'scopes': record.scopes, 'key': key}), 201
+    return jsonify([{'id': k.key_id, 'name': k.name, 'scopes': k.scopes, 'created': k.created}
+                    for k in api_keys.keys()])
+
+@app.route('/api_keys/<key_id>/revoke', methods=['POST'])
+def revoke_api_key(key_id):
+    if 'user' not in session or session['user'] != 'admin':
+        return 'Unauthorized', 403
+    if not api_keys.revoke(key_id):
+        return 'Unknown API key', 404
+    return jsonify({'revoked': key_id})
 
 if __name__ == '__main__':
+    # With the debug reloader only the serving child owns the ports
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true' and not STATE_ADDRESS:
+        telemetry_gateway.start_in_thread(host=TELEMETRY_HOST, **TELEMETRY_PORTS)
     app.run(debug=True, ssl_context='adhoc') 
\ No newline at end of file
@@ -0,0 +1,138 @@
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBuffer:
+    # Write-behind queue in front of a storage backend. Records are held in
+    # memory and written in one batch per table once `max_records` are queued
+    # or `flush_interval` seconds have passed, whichever comes first.
+    def __init__(self, backend, max_records=1000, flush_interval=1.0, background=True):
+        self.backend = backend
+        self.max_records = max_records
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._battery_history = []
+        self._events = []
+        self._mesh_statuses = []
+        self._battery_state = None
+        self._pending = 0
+        self._closed = False
+        self._thread = None
+        if background:
+            self._thread = threading.Thread(target=self._run, name='write-buffer', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self):
+        return self._pending
+
+    # --- Producers ---
+    def append_battery_history(self, timestamp, voltage, current, charge_pct):
+        self._enqueue(self._battery_history, (timestamp, voltage, current, charge_pct))
+
+    def append_event_log(self, event, timestamp=None):
+        self._enqueue(self._events, (timestamp or datetime.now(), event))
+
+    def append_mesh_status(self, node_statuses, timestamp=None):
+        self._enqueue(self._mesh_statuses, (timestamp or datetime.now(), node_statuses))
+
+    def save_battery_state(self, current_charge_Ah):
+        # Only the latest state matters, so repeated saves collapse into one
+        with self._lock:
+            self._battery_state = current_charge_Ah
+
+    def _enqueue(self, queue, record):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('WriteBuffer is closed')
+            queue.append(record)
+            self._pending += 1
+            full = self._pending >= self.max_records
+            if full and self._thread is not None:
+                self._wakeup.notify()
+        if full and (self._thread is None or self._pending >= 4 * self.max_records):
+            # No writer thread, or it is falling behind: flush on the caller
+            self.flush()
+
+    # --- Flushing ---
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                battery_history, self._battery_history = self._battery_history, []
+                events, self._events = self._events, []
+                mesh_statuses, self._mesh_statuses = self._mesh_statuses, []
+                battery_state, self._battery_state = self._battery_state, None
+                self._pending = 0
+            if not (battery_history or events or mesh_statuses or battery_state is not None):
+                return 0
+            try:
+                with self.backend.batch():
+                    if battery_history:
+                        self.backend.append_battery_history(battery_history)
+                    if events:
+                        self.backend.append_events(events)
+                    if mesh_statuses:
+                        self.backend.append_mesh_status(mesh_statuses)
+                    if battery_state is not None:
+                        self.backend.save_battery_state(battery_state)
+            except Exception:
+                # Put the batch back ahead of anything queued meanwhile, so
+                # the next flush retries it in order
+                with self._lock:
+                    self._battery_history[:0] = battery_history
+                    self._events[:0] = events
+                    self._mesh_statuses[:0] = mesh_statuses
+                    if self._battery_state is None:
+                        self._battery_state = battery_state
+                    self._pending += len(battery_history) + len(events) + len(mesh_statuses)
+                raise
+            return len(battery_history) + len(events) + len(mesh_statuses)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                deadline = time.monotonic() + self.flush_interval
+                while not self._closed and self._pending < self.max_records:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._wakeup.wait(remaining)
+                closed = self._closed
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f'Write buffer flush failed: {e}')
+            if closed:
+                return
+
+    def close(self):
+        # Drain the queue and force it to disk; safe to call more than once
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join()
+            atexit.unregister(self.close)
+        # The writer thread's last flush may have failed and put its batch
+        # back: try once more here, where the error reaches the caller
+        try:
+            self.flush()
+        except Exception:
+            logger.error(f'Write buffer closed with {self._pending} records unwritten')
+            raise
+        self.backend.sync()